@@ -0,0 +1,176 @@
+"""forecast_normalizer のスループット計測
+
+以前の save_weather_to_db と同じ手順（need ごとに全体を走査し、リストを None で埋め、
+時刻ごとに dict を作る）と、1回の走査で全テーブルの行を作る normalize_forecast を比較する。
+
+使用例:
+    python bench_normalizer.py
+    python bench_normalizer.py --file forecast_130000.json --repeat 2000
+"""
+import argparse
+import copy
+import json
+import time
+
+from forecast_normalizer import NEED_TABLES, TABLE_COLUMNS, normalize_forecast, normalize_forecast_tables
+
+
+def build_sample_document(area_count=8):
+    """気象庁の forecast/{office}.json と同じ形のサンプルを作成"""
+    report = "2024-12-15T17:00:00+09:00"
+    three_days = ["2024-12-15T17:00:00+09:00", "2024-12-16T00:00:00+09:00", "2024-12-17T00:00:00+09:00"]
+    pop_times = ["2024-12-15T18:00:00+09:00"] + [f"2024-12-16T{hour:02d}:00:00+09:00" for hour in (0, 6, 12, 18)]
+    temp_times = ["2024-12-16T00:00:00+09:00", "2024-12-16T09:00:00+09:00"]
+    week = [f"2024-12-{day:02d}T00:00:00+09:00" for day in range(16, 23)]
+    areas = [(f"地域{i}", f"0110{i:02d}") for i in range(area_count)]
+    stations = [(f"地点{i}", f"110{i:02d}") for i in range(area_count)]
+    return [
+        {
+            "publishingOffice": "稚内地方気象台",
+            "reportDatetime": report,
+            "timeSeries": [
+                {"timeDefines": three_days, "areas": [
+                    {"area": {"name": name, "code": code},
+                     "weatherCodes": ["400", "406", "206"],
+                     "weathers": ["雪　で　ふぶく", "雪　時々　くもり", "くもり　時々　雪"],
+                     "winds": ["西の風　やや強く", "北西の風　強く", "北西の風"],
+                     # 波の情報は2日分しかない（不足分は None になる）
+                     "waves": ["２メートル", "２．５メートル"]}
+                    for name, code in areas]},
+                {"timeDefines": pop_times, "areas": [
+                    {"area": {"name": name, "code": code}, "pops": ["70", "50", "60", "60", "40"]}
+                    for name, code in areas]},
+                {"timeDefines": temp_times, "areas": [
+                    {"area": {"name": name, "code": code}, "temps": ["-6", "-5"]}
+                    for name, code in stations]},
+            ],
+        },
+        {
+            "publishingOffice": "稚内地方気象台",
+            "reportDatetime": report,
+            "timeSeries": [
+                {"timeDefines": week, "areas": [
+                    {"area": {"name": name, "code": code},
+                     "weatherCodes": ["406", "205", "206", "201", "201", "101", "201"],
+                     "pops": ["", "50", "50", "40", "30", "30", "40"],
+                     "reliabilities": ["", "", "B", "B", "C", "C", "C"]}
+                    for name, code in areas[:2]]},
+                {"timeDefines": week, "areas": [
+                    {"area": {"name": name, "code": code},
+                     "tempsMin": ["", "-6", "-5", "-4", "-5", "-3", "-2"],
+                     "tempsMinUpper": ["", "-5", "-3", "-2", "-3", "-1", "0"],
+                     "tempsMinLower": ["", "-8", "-7", "-6", "-7", "-6", "-5"],
+                     "tempsMax": ["", "-5", "-3", "-1", "-2", "0", "1"],
+                     "tempsMaxUpper": ["", "-3", "-1", "1", "0", "2", "3"],
+                     # 最終日の値が欠けている（「情報なし」として除外される）
+                     "tempsMaxLower": ["", "-6", "-5", "-3", "-4", "-2"]}
+                    for name, code in stations[:2]]},
+            ],
+            "tempAverage": {"areas": [{"area": {"name": name, "code": code}, "min": "-4.6", "max": "-0.5"}
+                                      for name, code in stations[:2]]},
+            "precipAverage": {"areas": [{"area": {"name": name, "code": code}, "min": "17.6", "max": "28.1"}
+                                        for name, code in stations[:2]]},
+        },
+    ]
+
+
+def legacy_rows(data, need):
+    """以前の save_weather_to_db と同じ手順で行を作成（比較用）"""
+    rows = []
+    for weather_entry in data:
+        publishing_office = weather_entry.get("publishingOffice", "不明")
+        report_datetime = weather_entry.get("reportDatetime", "不明")
+        for series in weather_entry.get("timeSeries", []):
+            time_defines = series.get("timeDefines", [])
+            for area in series.get("areas", []):
+                area_name = area.get("area", {}).get("name", "不明")
+                offices_code = area.get("area", {}).get("code", "不明")
+                weather_codes = area.get("weatherCodes", [])
+                weathers = area.get("weathers", [])
+                winds = area.get("winds", [])
+                waves = area.get("waves", [])
+                pops = area.get("pops", [])
+                temps = area.get("temps", [])
+                reliabilities = area.get("reliabilities", [])
+                max_len = max(len(weather_codes), len(weathers), len(winds), len(waves), len(pops), len(time_defines))
+                weather_codes += [None] * (max_len - len(weather_codes))
+                weathers += [None] * (max_len - len(weathers))
+                winds += [None] * (max_len - len(winds))
+                waves += [None] * (max_len - len(waves))
+                pops += [None] * (max_len - len(pops))
+                temps += [None] * (max_len - len(temps))
+                reliabilities += [None] * (max_len - len(reliabilities))
+                for idx, time_define in enumerate(time_defines):
+                    weather, wind, pop, temp, reliability = weathers[idx], winds[idx], pops[idx], temps[idx], reliabilities[idx]
+                    if (need == "weather" and weather is not None) or (need == "wind" and wind is not None) or (need == "pop" and pop is not None and reliability is None) or (need == "temp" and temp is not None) or (need == "reliabilities" and reliability is not None):
+                        rows.append({
+                            "offices_code": offices_code, "publishing_office": publishing_office,
+                            "report_datetime": report_datetime, "area_name": area_name, "time_define": time_define,
+                            "weather_code": weather_codes[idx], "weather": weather, "wind": wind, "wave": waves[idx],
+                            "pop": pop, "temp": temp, "reliabilities": reliability,
+                        })
+    columns = TABLE_COLUMNS[NEED_TABLES[need]]
+    return [tuple(record[col] for col in columns) for record in rows]
+
+
+def legacy_all_tables(data):
+    """以前の処理と同じく need ごとに（毎回新しく取得したJSONに対して）行を作成"""
+    return {NEED_TABLES[need]: legacy_rows(copy.deepcopy(data), need) for need in NEED_TABLES}
+
+
+def check_equivalence(data):
+    """新旧の処理で同じ行が得られることを確認"""
+    expected = legacy_all_tables(data)
+    original = json.dumps(data, ensure_ascii=False)
+    actual = normalize_forecast_tables(data)
+    for table_name, rows in expected.items():
+        if actual[table_name] != rows:
+            raise SystemExit(f"[ERROR] {table_name} の行が一致しません")
+    if json.dumps(data, ensure_ascii=False) != original:
+        raise SystemExit("[ERROR] 入力のJSONが変更されています")
+    print("[INFO] 新旧の出力が一致し、入力は変更されていません。")
+
+
+def measure(label, func, repeat, cell_count):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<24} {elapsed * 1000 / repeat:8.3f} ms/文書  {cell_count * repeat / elapsed / 1e6:6.2f} M行/秒")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="forecast_normalizer のスループット計測")
+    parser.add_argument("--file", help="計測に使う forecast JSON（省略時はサンプルを生成）")
+    parser.add_argument("--repeat", type=int, default=1000, help="繰り返し回数")
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, encoding="utf-8") as f:
+            data = json.load(f)
+    else:
+        data = build_sample_document()
+
+    check_equivalence(data)
+    row_count = sum(1 for _ in normalize_forecast(data))
+    # 以前の処理は週間気温・平均値のテーブルを含まない（比較は控えめな値になる）
+    legacy_row_count = sum(len(rows) for rows in legacy_all_tables(data).values())
+    print(f"[INFO] 1文書あたりの出力行数: {row_count}（以前の処理: {legacy_row_count}）")
+
+    # 以前の処理は need ごとにJSONを取得し直していたため、コピーの時間は含めずに比較する
+    copies = [[copy.deepcopy(data) for _ in NEED_TABLES] for _ in range(args.repeat)]
+    iterator = iter(copies)
+
+    def run_legacy():
+        documents = next(iterator)
+        for document, need in zip(documents, NEED_TABLES):
+            legacy_rows(document, need)
+
+    legacy = measure("legacy (need ごと)", run_legacy, args.repeat, legacy_row_count)
+    normalized = measure("normalize_forecast", lambda: normalize_forecast_tables(data), args.repeat, row_count)
+    print(f"[RESULT] 速度比: {legacy / normalized:.1f} 倍")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,591 @@
+"""region_data.db から画面表示用のデータを取得するクラス
+
+Flet の画面（new_weather_predict）と HTTP API（weather_api）の両方から使う。
+"""
+import queue
+import sqlite3
+import threading
+from collections import namedtuple
+
+from db_connection import IN_MEMORY_REPLICA, get_memory_replica, open_read_connection
+from forecast_search import SEARCH_COLUMNS, SEARCH_TABLE, build_match_query
+from forecast_values import build_threshold_query
+from ingest import DB_PATH, ensure_database_exists
+from region_hierarchy import AREA_COLUMNS, CLASS10, get_shared_hierarchy
+
+
+# 検索結果の行（SELECT の列の順）
+WeatherInfoRecord = namedtuple("WeatherInfoRecord", (
+    "offices_code", "publishing_office", "report_datetime", "area_name", "time_define",
+    "weather_code", "weather", "wind", "wave"))
+PopRecord = namedtuple("PopRecord", (
+    "offices_code", "publishing_office", "report_datetime", "area_name", "time_define", "pop"))
+TempRecord = namedtuple("TempRecord", (
+    "offices_code", "publishing_office", "report_datetime", "area_name", "time_define", "temp", "class20s_name"))
+WeeklyRecord = namedtuple("WeeklyRecord", (
+    "offices_code", "publishing_office", "report_datetime", "area_name", "time_define",
+    "weather_code", "pop", "reliabilities"))
+WeeklyTempRecord = namedtuple("WeeklyTempRecord", (
+    "offices_code", "publishing_office", "report_datetime", "area_name", "time_define",
+    "temps_min", "temps_min_upper", "temps_min_lower", "temps_max", "temps_max_upper", "temps_max_lower"))
+TempAverageRecord = namedtuple("TempAverageRecord", ("temps_ave_min", "temps_ave_max", "report_datetime", "area_name"))
+PopAverageRecord = namedtuple("PopAverageRecord", ("temps_pop_min", "temps_pop_max", "report_datetime", "area_name"))
+VerificationWeeklyRecord = namedtuple("VerificationWeeklyRecord", (
+    "variable", "grade", "count", "mae", "bias", "hit_rate", "computed_at"))
+VerificationRevisionRecord = namedtuple("VerificationRevisionRecord", (
+    "variable", "metric", "lead_time", "count", "mean", "mean_abs", "rms"))
+ValueRecord = namedtuple("ValueRecord", (
+    "kind", "class10_id", "area_name", "time_define", "value", "report_datetime"))
+AlertRuleRecord = namedtuple("AlertRuleRecord", (
+    "id", "kind", "operator", "threshold", "class10_id", "name", "enabled", "created_at"))
+AlertEventRecord = namedtuple("AlertEventRecord", (
+    "id", "rule_id", "kind", "operator", "threshold", "rule_name", "class10_id", "area_name", "time_define", "value",
+    "report_datetime", "created_at", "acknowledged"))
+DiffRecord = namedtuple("DiffRecord", (
+    "table_name", "area_code", "area_name", "time_define", "column_name", "old_value", "new_value",
+    "previous_report_datetime", "report_datetime"))
+SearchRecord = namedtuple("SearchRecord", (
+    "offices_code", "area_name", "time_define", "report_datetime", "weather", "wind", "wave"))
+OverviewRecord = namedtuple("OverviewRecord", (
+    "level", "area_id", "parent_id", "area_name", "date", "min_temp", "max_temp", "max_pop", "weather_code",
+    "report_datetime"))
+
+# 1つの地域（class10）の表示に必要なデータ一式
+RegionBundle = namedtuple("RegionBundle", (
+    "class10_id", "office_id", "weather_info", "pops", "temps",
+    "weekly", "weekly_temps", "temp_averages", "pop_averages"))
+
+
+WEATHER_INFO_SQL = """
+    SELECT wi.offices_code, wi.publishing_office, wi.report_datetime, wi.area_name,
+        wi.time_define, wi.weather_code, wi.weather, wi.wind, wi.wave
+    FROM weather_info wi
+    JOIN areas a ON wi.offices_code = a.class10s_id
+    WHERE a.class10s_id = ?
+"""
+
+WEATHER_POPS_SQL = """
+    SELECT wi.offices_code, wi.publishing_office, wi.report_datetime,
+        wi.area_name, wi.time_define, wi.pop
+    FROM weather_pops wi
+    JOIN areas a ON wi.offices_code = a.class10s_id
+    WHERE a.class10s_id = ?
+"""
+
+WEATHER_TEMPS_SQL = """
+    SELECT wi.offices_code, wi.publishing_office, wi.report_datetime,
+        wi.area_name, wi.time_define, wi.temp, a.class20s_name
+    FROM weather_temps wi
+    JOIN areas a ON a.class20s_name LIKE '%' || wi.area_name || '%'
+    WHERE a.class10s_id = ?
+"""
+
+WEATHER_RELIABILITIES_SQL = """
+    SELECT wr.offices_code, wr.publishing_office, wr.report_datetime,
+           wr.area_name, wr.time_define, wr.weather_code,
+           wr.pop, wr.reliabilities
+    FROM weather_reliabilities wr
+    JOIN areas a ON wr.offices_code = a.offices_id
+    WHERE a.offices_id = ?
+    ORDER BY wr.time_define
+"""
+
+WEATHER_TT_SQL = """
+    SELECT wt.offices_code, wt.publishing_office, wt.report_datetime,
+           wt.area_name, wt.time_define,
+           wt.temps_min, wt.temps_min_upper, wt.temps_min_lower,
+           wt.temps_max, wt.temps_max_upper, wt.temps_max_lower
+    FROM weather_tt wt
+    JOIN areas a ON a.class20s_name LIKE '%' || wt.area_name || '%'
+    WHERE a.class10s_id = ?
+"""
+
+TEMP_AVERAGES_SQL = """
+    SELECT DISTINCT wta.temps_ave_min, wta.temps_ave_max, wta.report_datetime, wta.area_name
+    FROM weather_temp_ave wta
+    JOIN areas a ON a.class20s_name LIKE '%' || wta.area_name || '%'
+    WHERE a.class10s_id = ?
+    ORDER BY wta.report_datetime DESC
+"""
+
+POP_AVERAGES_SQL = """
+    SELECT DISTINCT wpa.temps_pop_min, wpa.temps_pop_max, wpa.report_datetime, wpa.area_name
+    FROM weather_pop_ave wpa
+    JOIN areas a ON a.class20s_name LIKE '%' || wpa.area_name || '%'
+    WHERE a.class10s_id = ?
+    ORDER BY wpa.report_datetime DESC
+"""
+
+VERIFICATION_WEEKLY_SQL = """
+    SELECT variable, grade, count, mae, bias, hit_rate, computed_at
+    FROM verification_weekly
+    WHERE office_id = ?
+    ORDER BY variable, grade
+"""
+
+VERIFICATION_REVISIONS_SQL = """
+    SELECT variable, metric, lead_time, count, mean, mean_abs, rms
+    FROM verification_revisions
+    WHERE office_id = ?
+    ORDER BY variable, metric, rowid
+"""
+
+REGION_OVERVIEW_SQL = """
+    SELECT level, area_id, parent_id, area_name, date, min_temp, max_temp, max_pop, weather_code, report_datetime
+    FROM region_overview
+    ORDER BY level, area_id, date
+"""
+
+TEXT_SEARCH_SQL = f"""
+    SELECT wi.offices_code, wi.area_name, wi.time_define, wi.report_datetime, wi.weather, wi.wind, wi.wave
+    FROM {SEARCH_TABLE} f
+    JOIN weather_info wi ON wi.id = f.rowid
+    WHERE {SEARCH_TABLE} MATCH ?
+    ORDER BY wi.time_define, wi.offices_code, wi.id
+    LIMIT ?
+"""
+# 全文検索で返す行の数の上限
+MAX_SEARCH_RESULTS = 500
+
+REGION_DIFF_SQL = """
+    SELECT table_name, area_code, area_name, time_define, column_name, old_value, new_value,
+        previous_report_datetime, report_datetime
+    FROM region_diffs
+    WHERE office_id = ?
+    ORDER BY table_name, area_code, time_define, column_name
+"""
+
+ALERT_RULES_SQL = """
+    SELECT id, kind, operator, threshold, class10_id, name, enabled, created_at
+    FROM alert_rules
+    ORDER BY id
+"""
+
+# 新しい記録から順に（{where} に未確認だけにする条件を入れる）
+ALERT_EVENTS_SQL = """
+    SELECT e.id, e.rule_id, r.kind, r.operator, r.threshold, r.name, e.class10_id, e.area_name, e.time_define,
+        e.value, e.report_datetime, e.created_at, e.acknowledged
+    FROM alert_events e
+    JOIN alert_rules r ON r.id = e.rule_id
+    {where}
+    ORDER BY e.id DESC
+    LIMIT ?
+"""
+# アラートの記録で返す行の数の上限
+MAX_ALERT_EVENTS = 200
+
+# 複数の地域をまとめて取得する SQL（{keys} に IN の変数を入れる。先頭の列は地域・オフィスのコード）
+# 行の順は1地域用の SQL の実行結果と同じ順（予報のテーブルの行の順など）に揃える。
+# 平年値は DISTINCT の代わりに GROUP BY で重複を除き、同じ発表の中では最初の行の順に並べる。
+# 1回に IN (...) に渡す値の数の上限（SQLite の変数の数の上限 999 より小さくする）
+MAX_BATCH_SIZE = 500
+
+BATCH_OFFICES_SQL = """
+    SELECT class10s_id, MIN(offices_id) FROM areas WHERE class10s_id IN ({keys}) GROUP BY class10s_id
+"""
+
+BATCH_WEATHER_INFO_SQL = """
+    SELECT a.class10s_id, wi.offices_code, wi.publishing_office, wi.report_datetime, wi.area_name,
+        wi.time_define, wi.weather_code, wi.weather, wi.wind, wi.wave
+    FROM weather_info wi
+    JOIN areas a ON wi.offices_code = a.class10s_id
+    WHERE a.class10s_id IN ({keys})
+    ORDER BY wi.id, a.id
+"""
+
+BATCH_WEATHER_POPS_SQL = """
+    SELECT a.class10s_id, wi.offices_code, wi.publishing_office, wi.report_datetime,
+        wi.area_name, wi.time_define, wi.pop
+    FROM weather_pops wi
+    JOIN areas a ON wi.offices_code = a.class10s_id
+    WHERE a.class10s_id IN ({keys})
+    ORDER BY wi.id, a.id
+"""
+
+BATCH_WEATHER_RELIABILITIES_SQL = """
+    SELECT a.offices_id, wr.offices_code, wr.publishing_office, wr.report_datetime,
+           wr.area_name, wr.time_define, wr.weather_code,
+           wr.pop, wr.reliabilities
+    FROM weather_reliabilities wr
+    JOIN areas a ON wr.offices_code = a.offices_id
+    WHERE a.offices_id IN ({keys})
+    ORDER BY wr.time_define, wr.id, a.id
+"""
+
+# 気温・平年値は観測地点名（area_name）を class20s_name に部分一致させて結び付ける。
+# 地点名ごとの一致を先に求めてから等号で結合し、LIKE の評価を「地点名の種類×対象の地域の行」に抑える
+# （DISTINCT は外側の検索に展開されず、先に一致を求めさせるため。a.id を含むので行は減らない）。
+MATCHED_AREAS_SQL = """
+    SELECT DISTINCT a.id, a.class10s_id, a.class20s_name, names.area_name
+    FROM areas a
+    JOIN (SELECT DISTINCT area_name FROM {table}) names
+      ON a.class20s_name LIKE '%' || names.area_name || '%'
+    WHERE a.class10s_id IN ({{keys}})
+"""
+
+BATCH_WEATHER_TEMPS_SQL = """
+    WITH m AS (""" + MATCHED_AREAS_SQL.format(table="weather_temps") + """)
+    SELECT m.class10s_id, wi.offices_code, wi.publishing_office, wi.report_datetime,
+        wi.area_name, wi.time_define, wi.temp, m.class20s_name
+    FROM weather_temps wi
+    JOIN m ON m.area_name = wi.area_name
+    ORDER BY wi.id, m.class20s_name, m.id
+"""
+
+BATCH_WEATHER_TT_SQL = """
+    WITH m AS (""" + MATCHED_AREAS_SQL.format(table="weather_tt") + """)
+    SELECT m.class10s_id, wt.offices_code, wt.publishing_office, wt.report_datetime,
+           wt.area_name, wt.time_define,
+           wt.temps_min, wt.temps_min_upper, wt.temps_min_lower,
+           wt.temps_max, wt.temps_max_upper, wt.temps_max_lower
+    FROM weather_tt wt
+    JOIN m ON m.area_name = wt.area_name
+    ORDER BY wt.id, m.class20s_name, m.id
+"""
+
+BATCH_TEMP_AVERAGES_SQL = """
+    WITH m AS (""" + MATCHED_AREAS_SQL.format(table="weather_temp_ave") + """)
+    SELECT m.class10s_id, wta.temps_ave_min, wta.temps_ave_max, wta.report_datetime, wta.area_name
+    FROM weather_temp_ave wta
+    JOIN m ON m.area_name = wta.area_name
+    GROUP BY m.class10s_id, wta.temps_ave_min, wta.temps_ave_max, wta.report_datetime, wta.area_name
+    ORDER BY wta.report_datetime DESC, MIN(wta.id)
+"""
+
+BATCH_POP_AVERAGES_SQL = """
+    WITH m AS (""" + MATCHED_AREAS_SQL.format(table="weather_pop_ave") + """)
+    SELECT m.class10s_id, wpa.temps_pop_min, wpa.temps_pop_max, wpa.report_datetime, wpa.area_name
+    FROM weather_pop_ave wpa
+    JOIN m ON m.area_name = wpa.area_name
+    GROUP BY m.class10s_id, wpa.temps_pop_min, wpa.temps_pop_max, wpa.report_datetime, wpa.area_name
+    ORDER BY wpa.report_datetime DESC, MIN(wpa.id)
+"""
+
+
+class DatabaseManager:
+    """読み込み用の接続をスレッドごとに割り当てるデータベース管理クラス
+
+    Flet のウェブアプリでは複数のセッションやイベントハンドラのスレッドが同じインスタンスを使うため、
+    接続とカーソルはスレッドごとに持つ。使い終わった接続は release() でプールに戻し、
+    別のスレッドで再利用できる。
+
+    in_memory=True の場合は、ファイルではなくメモリ上の複製（db_connection.MemoryReplica）から読む。
+    複製が更新されると、次の検索から新しい世代への接続に切り替わる。
+    """
+
+    def __init__(self, db_path=DB_PATH, in_memory=IN_MEMORY_REPLICA):
+        self.db_path = db_path
+        self.local = threading.local()
+        self.idle_connections = queue.LifoQueue()
+        self.all_connections = []
+        self.lock = threading.Lock()
+        ensure_database_exists(db_path)
+        self.replica = get_memory_replica(db_path) if in_memory else None
+
+    @property
+    def connection(self):
+        return getattr(self.local, "connection", None)
+
+    @property
+    def cursor(self):
+        return getattr(self.local, "cursor", None)
+
+    def current_generation(self):
+        return self.replica.generation if self.replica else 0
+
+    def open_connection(self):
+        """新しい読み込み用の接続を開く
+
+        Returns:
+            tuple: (複製の世代, 接続)
+        """
+        if self.replica:
+            generation, connection = self.replica.open_connection()
+        else:
+            generation, connection = 0, open_read_connection(self.db_path)
+        with self.lock:
+            self.all_connections.append(connection)
+        return generation, connection
+
+    def discard_connection(self, connection):
+        """古い世代の複製への接続を閉じる"""
+        with self.lock:
+            if connection in self.all_connections:
+                self.all_connections.remove(connection)
+        connection.close()
+
+    def connect(self):
+        """現在のスレッドの接続を開く（プールに空きがあれば再利用）"""
+        generation = self.current_generation()
+        if self.connection is not None:
+            if self.local.generation == generation:
+                return
+            self.discard_connection(self.local.connection)
+
+        while True:
+            try:
+                connection_generation, connection = self.idle_connections.get_nowait()
+            except queue.Empty:
+                connection_generation, connection = self.open_connection()
+                break
+            if connection_generation == generation:
+                break
+            self.discard_connection(connection)
+        self.local.connection = connection
+        self.local.generation = connection_generation
+        self.local.cursor = connection.cursor()
+
+    def release(self):
+        """現在のスレッドの接続をプールに戻す（リクエストごとにスレッドが変わる場合に使う）"""
+        if self.connection is not None:
+            self.idle_connections.put((self.local.generation, self.local.connection))
+            self.local.connection = None
+            self.local.cursor = None
+
+    def fetch_region_tree(self):
+        """地域階層（region_hierarchy.RegionHierarchy）を取得
+
+        areas の内容が変わっていなければ、全セッションで共有している作成済みのものを返す。
+        作成元の area.json のハッシュが記録されていれば、それを鍵にしたキャッシュファイル
+        （データベースと同じ場所の *.hierarchy）から読み込み、areas の走査を省く。
+        """
+        self.connect()  # 接続が開かれていることを確認
+        try:
+            row = self.cursor.execute("SELECT content_hash FROM area_source LIMIT 1").fetchone()
+        except sqlite3.OperationalError:
+            # area_source が無い（ハッシュを記録する前に作成した）データベース
+            row = None
+        if row and row[0]:
+            version, cache_path = row[0], f"{self.db_path}.hierarchy"
+        else:
+            # areas は更新のたびに行を入れ直すため（AUTOINCREMENT）、最大の id と件数で変更を検出できる
+            version = tuple(self.cursor.execute("SELECT MAX(id), COUNT(*) FROM areas").fetchone())
+            cache_path = None
+
+        def load_rows():
+            return self.cursor.execute(f"SELECT {', '.join(AREA_COLUMNS)} FROM areas ORDER BY id").fetchall()
+
+        return get_shared_hierarchy(self.db_path, version, load_rows, cache_path)
+
+    def fetch_region_hierarchy(self):
+        """地域階層情報を入れ子の dict で取得（地方 / 府県予報区 / 一次細分区域）"""
+        return self.fetch_region_tree().to_nested_dict(CLASS10)
+
+    def fetch_records(self, sql, params, record_type):
+        """検索結果を record_type の名前付きタプルのリストとして取得"""
+        self.connect()
+        self.cursor.execute(sql, params)
+        return [record_type._make(row) for row in self.cursor.fetchall()]
+
+    def fetch_weather_info(self, class10_id):
+        """特定の地域の気象情報を取得"""
+        return self.fetch_records(WEATHER_INFO_SQL, (class10_id,), WeatherInfoRecord)
+
+    def fetch_weather_pops(self, class10_id):
+        """特定の地域の降水確率情報を取得"""
+        return self.fetch_records(WEATHER_POPS_SQL, (class10_id,), PopRecord)
+
+    def fetch_weather_temps(self, class10_id):
+        """特定の地域の気温情報を取得（class10の直下のclass20に対応）"""
+        return self.fetch_records(WEATHER_TEMPS_SQL, (class10_id,), TempRecord)
+
+    def fetch_weather_reliabilities(self, office_id):
+        """特定の地域の週間天気予報情報を取得"""
+        return self.fetch_records(WEATHER_RELIABILITIES_SQL, (office_id,), WeeklyRecord)
+
+    def fetch_weather_temps_by_name(self, class10_id):
+        """class10_idに基づいて気温情報を検索"""
+        return self.fetch_records(WEATHER_TT_SQL, (class10_id,), WeeklyTempRecord)
+
+    def fetch_temp_averages(self, class10_id):
+        """class10_idに基づいて平均気温情報を検索"""
+        return self.fetch_records(TEMP_AVERAGES_SQL, (class10_id,), TempAverageRecord)
+
+    def fetch_pop_averages(self, class10_id):
+        """class10_idに基づいて降水確率情報を検索"""
+        return self.fetch_records(POP_AVERAGES_SQL, (class10_id,), PopAverageRecord)
+
+    def fetch_region_bundle(self, class10_id):
+        """3日間の天気・週間天気の表示に必要なデータを1つの読み込みトランザクションでまとめて取得
+
+        全ての検索が同じ時点のデータを読むため、途中で更新がコミットされても3日間と週間の内容が食い違わない。
+
+        Returns:
+            RegionBundle: 地域のデータ（地域が見つからない場合も空のリストを持つ RegionBundle を返す）
+        """
+        return self.fetch_region_bundles([class10_id])[class10_id]
+
+    def fetch_batch(self, sql, keys, record_type):
+        """BATCH_*_SQL を実行し、先頭の列（地域・オフィスのコード）ごとのレコードのリストを返す
+
+        Returns:
+            dict: キーをキーとする record_type のリスト（該当する行が無いキーは空のリスト）
+        """
+        grouped = {key: [] for key in keys}
+        for start in range(0, len(keys), MAX_BATCH_SIZE):
+            chunk = keys[start:start + MAX_BATCH_SIZE]
+            self.cursor.execute(sql.format(keys=", ".join("?" * len(chunk))), chunk)
+            for row in self.cursor.fetchall():
+                grouped[row[0]].append(record_type(*row[1:]))
+        return grouped
+
+    def fetch_region_bundles(self, class10_ids):
+        """複数の地域のデータを、テーブルごとに1回の IN (...) の検索でまとめて取得
+
+        地域ごとに検索すると地域数×8回の検索になるが、こちらは地域数によらずテーブルごとに1回で済む
+        （MAX_BATCH_SIZE を超える場合はその分だけ増える）。全ての検索は1つの読み込みトランザクションで行う。
+
+        Returns:
+            dict: class10_id をキーとする RegionBundle（引数の順。地域が見つからない場合も空のリストを持つ）
+        """
+        class10_ids = list(dict.fromkeys(class10_ids))
+        if not class10_ids:
+            return {}
+        self.connect()
+        self.connection.execute("BEGIN")
+        try:
+            offices = {}
+            for start in range(0, len(class10_ids), MAX_BATCH_SIZE):
+                chunk = class10_ids[start:start + MAX_BATCH_SIZE]
+                self.cursor.execute(BATCH_OFFICES_SQL.format(keys=", ".join("?" * len(chunk))), chunk)
+                offices.update(self.cursor.fetchall())
+            office_ids = list(dict.fromkeys(office_id for office_id in offices.values() if office_id))
+
+            weather_info = self.fetch_batch(BATCH_WEATHER_INFO_SQL, class10_ids, WeatherInfoRecord)
+            pops = self.fetch_batch(BATCH_WEATHER_POPS_SQL, class10_ids, PopRecord)
+            temps = self.fetch_batch(BATCH_WEATHER_TEMPS_SQL, class10_ids, TempRecord)
+            weekly = self.fetch_batch(BATCH_WEATHER_RELIABILITIES_SQL, office_ids, WeeklyRecord)
+            weekly_temps = self.fetch_batch(BATCH_WEATHER_TT_SQL, class10_ids, WeeklyTempRecord)
+            temp_averages = self.fetch_batch(BATCH_TEMP_AVERAGES_SQL, class10_ids, TempAverageRecord)
+            pop_averages = self.fetch_batch(BATCH_POP_AVERAGES_SQL, class10_ids, PopAverageRecord)
+        finally:
+            self.connection.commit()
+
+        bundles = {}
+        for class10_id in class10_ids:
+            office_id = offices.get(class10_id)
+            bundles[class10_id] = RegionBundle(
+                class10_id=class10_id,
+                office_id=office_id,
+                weather_info=weather_info[class10_id],
+                pops=pops[class10_id],
+                temps=temps[class10_id],
+                weekly=weekly[office_id] if office_id else [],
+                weekly_temps=weekly_temps[class10_id],
+                temp_averages=temp_averages[class10_id],
+                pop_averages=pop_averages[class10_id],
+            )
+        return bundles
+
+    def fetch_verification_summary(self, office_id):
+        """オフィスの予報検証の集計結果を取得（未計算の場合は空のリスト）
+
+        Returns:
+            tuple: (VerificationWeeklyRecord のリスト, VerificationRevisionRecord のリスト)
+        """
+        try:
+            weekly = self.fetch_records(VERIFICATION_WEEKLY_SQL, (office_id,), VerificationWeeklyRecord)
+            revisions = self.fetch_records(VERIFICATION_REVISIONS_SQL, (office_id,), VerificationRevisionRecord)
+        except sqlite3.OperationalError:
+            # 集計テーブルがまだ作成されていない
+            return [], []
+        return weekly, revisions
+
+    def fetch_region_overview(self):
+        """全国の概況の集計（地方・オフィスごと、日付ごと）を1回の検索で取得（未作成の場合は空のリスト）"""
+        try:
+            return self.fetch_records(REGION_OVERVIEW_SQL, (), OverviewRecord)
+        except sqlite3.OperationalError:
+            # 集計テーブルがまだ作成されていない
+            return []
+
+    def fetch_text_search(self, query, columns=SEARCH_COLUMNS, limit=MAX_SEARCH_RESULTS):
+        """天気・風・波の文に検索語を含む行を取得（索引が未作成・検索語が空の場合は空のリスト）
+
+        Args:
+            query (str): 検索語（空白で区切った語は全て含むものを探す）
+            columns (tuple): 検索する列（weather / wind / wave）
+            limit (int): 返す行の数の上限
+        """
+        match = build_match_query(query, columns)
+        if match is None:
+            return []
+        try:
+            return self.fetch_records(TEXT_SEARCH_SQL, (match, limit), SearchRecord)
+        except sqlite3.OperationalError:
+            # 索引がまだ作成されていない
+            return []
+
+    def fetch_threshold(self, kind, min_value=None, max_value=None, start=None, end=None, descending=True,
+                        limit=None, per_area=False):
+        """全地域の降水確率・気温から条件に合う行を値の順に取得（未作成の場合は空のリスト）
+
+        例: 24時間以内に降水確率が70%以上の地域
+            fetch_threshold("pop", min_value=70, start=現在, end=24時間後, per_area=True)
+        例: 明日の最低気温が0℃未満の地域を低い順に10件
+            fetch_threshold("temp_min", max_value=0, start=明日, end=明後日, descending=False, limit=10)
+
+        引数は forecast_values.build_threshold_query を参照。
+        """
+        sql, params = build_threshold_query(kind, min_value, max_value, start, end, descending, limit, per_area)
+        try:
+            return self.fetch_records(sql, params, ValueRecord)
+        except sqlite3.OperationalError:
+            # 条件検索用のテーブルがまだ作成されていない
+            return []
+
+    def fetch_alert_rules(self):
+        """アラートのルールの一覧を取得（未作成の場合は空のリスト）"""
+        try:
+            return self.fetch_records(ALERT_RULES_SQL, (), AlertRuleRecord)
+        except sqlite3.OperationalError:
+            # アラートのテーブルがまだ作成されていない
+            return []
+
+    def fetch_alert_events(self, unacknowledged_only=False, limit=MAX_ALERT_EVENTS):
+        """アラートの記録を新しい順に取得（未作成の場合は空のリスト）"""
+        sql = ALERT_EVENTS_SQL.format(where="WHERE e.acknowledged = 0" if unacknowledged_only else "")
+        try:
+            return self.fetch_records(sql, (limit,), AlertEventRecord)
+        except sqlite3.OperationalError:
+            # アラートのテーブルがまだ作成されていない
+            return []
+
+    def fetch_office_report(self, office_id):
+        """オフィスの取り込み済みの最新の発表日時（未取り込み・未作成の場合は None）"""
+        self.connect()
+        try:
+            row = self.cursor.execute(
+                "SELECT report_datetime FROM ingest_offices WHERE office_id = ?", (office_id,)
+            ).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return row[0] if row else None
+
+    def fetch_region_diff(self, office_id):
+        """オフィスの前回の発表からの差分（forecast_diff）を取得（未作成の場合は空のリスト）"""
+        try:
+            return self.fetch_records(REGION_DIFF_SQL, (office_id,), DiffRecord)
+        except sqlite3.OperationalError:
+            # 差分のテーブルがまだ作成されていない
+            return []
+
+    def count_unacknowledged_alerts(self):
+        """未確認のアラートの記録の件数（未作成の場合は0）"""
+        self.connect()
+        try:
+            self.cursor.execute("SELECT COUNT(*) FROM alert_events WHERE acknowledged = 0")
+        except sqlite3.OperationalError:
+            # アラートのテーブルがまだ作成されていない
+            return 0
+        return self.cursor.fetchone()[0]
+
+    def close(self):
+        """全てのスレッドの接続を閉じる"""
+        with self.lock:
+            connections = self.all_connections
+            self.all_connections = []
+        for connection in connections:
+            connection.close()
+        self.idle_connections = queue.LifoQueue()
+        self.local = threading.local()
@@ -0,0 +1,138 @@
+"""region_data.db への接続の設定
+
+画面（複数のセッション）や HTTP API が読み込んでいる間に更新処理が書き込めるよう、
+データベースを WAL モードで使う。WAL では読み込みと書き込みが互いを待たず、
+読み込み側は書き込み中のトランザクションがコミットされるまで以前の内容を読み続ける。
+"""
+import os
+import sqlite3
+import threading
+
+# ロックを待つ最大時間（ミリ秒）
+BUSY_TIMEOUT_MS = 5000
+
+
+def enable_wal(connection):
+    """WAL モードに切り替える（設定はファイルに保存されるため、一度切り替わっていれば何もしない）"""
+    try:
+        connection.execute("PRAGMA journal_mode=WAL")
+    except sqlite3.OperationalError:
+        # 他の接続が書き込み中で切り替えられない場合は、そのまま続ける
+        pass
+
+
+def open_read_connection(db_path):
+    """読み込み専用の接続を開く
+
+    接続プールから別のスレッドに渡して使うため、同一スレッドの検査は行わない
+    （1つの接続を同時に使うのは常に1スレッドだけ）。
+    """
+    connection = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    connection.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    enable_wal(connection)
+    connection.execute("PRAGMA query_only=ON")
+    return connection
+
+
+def open_write_connection(db_path):
+    """更新処理用の接続を開く"""
+    connection = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000)
+    connection.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    enable_wal(connection)
+    # WAL ではコミットごとの fsync を省いても破損しない（電源断時に直近のコミットが失われるだけ）
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+def database_change_token(db_path):
+    """データベースファイル（WALを含む）の更新を検出するための値"""
+    token = []
+    for path in (db_path, db_path + "-wal"):
+        try:
+            stat = os.stat(path)
+            token.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            token.append(None)
+    return tuple(token)
+
+
+# 読み込みをメモリ上の複製に向けるかどうか（WEATHER_IN_MEMORY=1 で有効）
+IN_MEMORY_REPLICA = os.environ.get("WEATHER_IN_MEMORY") == "1"
+
+
+class MemoryReplica:
+    """region_data.db をメモリ上のデータベースに複製して読み込みに使う
+
+    ファイルは永続化のための元データのままとし、起動時と更新後に backup API で丸ごと複製する。
+    複製は共有キャッシュの名前付きメモリデータベース（file:...?mode=memory&cache=shared）なので、
+    複数のスレッドの接続から同じ内容を読める。
+    更新時は新しい世代のメモリデータベースに複製してから切り替えるため、読み込み中の接続を待たせない
+    （古い世代は、その接続が全て閉じられた時点で解放される）。
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        self.generation = 0
+        self.uri = None
+        self.anchor = None
+        self.refresh()
+
+    def refresh(self):
+        """ファイルの内容を新しい世代のメモリデータベースに複製して切り替える"""
+        with self.refresh_lock:
+            generation = self.generation + 1
+            uri = f"file:weather_replica_{id(self)}_{generation}?mode=memory&cache=shared"
+            # メモリデータベースは接続が1つでも開いている間だけ存在するため、世代ごとに1つ保持する
+            anchor = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            source = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, timeout=BUSY_TIMEOUT_MS / 1000)
+            try:
+                source.backup(anchor)
+            finally:
+                source.close()
+            with self.lock:
+                previous = self.anchor
+                self.uri, self.anchor, self.generation = uri, anchor, generation
+            if previous is not None:
+                previous.close()
+        print(f"[INFO] メモリ上の複製を更新しました（世代 {generation}）。")
+
+    def open_connection(self):
+        """現在の世代の複製への読み込み専用の接続を開く
+
+        Returns:
+            tuple: (世代, 接続)
+        """
+        # 切り替えと同時に古い世代が解放されないよう、接続を開き終えるまでロックを保持する
+        with self.lock:
+            connection = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+            generation = self.generation
+        connection.execute("PRAGMA query_only=ON")
+        return generation, connection
+
+    def close(self):
+        with self.lock:
+            if self.anchor is not None:
+                self.anchor.close()
+                self.anchor = None
+
+
+_replicas = {}
+_replicas_lock = threading.Lock()
+
+
+def get_memory_replica(db_path):
+    """データベースファイルごとに1つのメモリ上の複製を取得（全セッションで共有する）"""
+    with _replicas_lock:
+        if db_path not in _replicas:
+            _replicas[db_path] = MemoryReplica(db_path)
+        return _replicas[db_path]
+
+
+def refresh_memory_replica(db_path):
+    """更新後に呼び出し、複製が作られていればファイルの内容で作り直す"""
+    with _replicas_lock:
+        replica = _replicas.get(db_path)
+    if replica is not None:
+        replica.refresh()
@@ -1,14 +1,27 @@
-import sqlite3
-import requests
+import hashlib
+import json
+from datetime import datetime
+
+from db_connection import open_write_connection
+from forecast_normalizer import (NEED_TABLES, TABLE_COLUMNS, WEATHER_POP_AVE, WEATHER_TEMP_AVE, WEATHER_TT,
+                                 normalize_forecast, normalize_forecast_tables)
+from http_client import default_client
+
+def area_content_hash(region_data):
+    """area.json の内容のハッシュ（キーの順や空白の違いは無視する）"""
+    canonical = json.dumps(region_data, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
 
 # 地域データ管理クラス
 class RegionDataManager:
 
     AREA_JSON_URL = "http://www.jma.go.jp/bosai/common/const/area.json"
 
-    def __init__(self,database_name):
+    def __init__(self,database_name, client=None):
         self.database_name = database_name
-        self.connection = sqlite3.connect(database_name)
+        self.client = client or default_client
+        self.connection = open_write_connection(database_name)
         self.cursor = self.connection.cursor()
         self.initialize_database()
 
@@ -29,20 +42,28 @@ class RegionDataManager:
                 class20s_id TEXT
             )
         """)
+        # areas の作成元になった area.json のハッシュ（1行だけ保持する）
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS area_source (
+                content_hash TEXT,
+                updated_at TEXT
+            )
+        """)
         self.connection.commit()
 
-    def fetch_region_data(self):
-        """地域データを取得"""
-        try:
-            response = requests.get(self.AREA_JSON_URL)
-            if response.status_code == 200:
-                return response.json()
-            else:
-                print(f"[ERROR] 地域データ取得失敗: ステータスコード {response.status_code}")
-                return None
-        except Exception as e:
-            print(f"[EXCEPTION] 地域データ取得中にエラー発生: {e}")
+    def stored_content_hash(self):
+        """現在の areas の作成元の area.json のハッシュ（areas が空の場合は None）"""
+        if self.cursor.execute("SELECT 1 FROM areas LIMIT 1").fetchone() is None:
             return None
+        row = self.cursor.execute("SELECT content_hash FROM area_source LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def fetch_region_data(self, deadline=None):
+        """地域データを取得（リトライ後も失敗した場合は None）"""
+        region_data = self.client.get_json(self.AREA_JSON_URL, deadline=deadline)
+        if region_data is None:
+            print("[ERROR] 地域データの取得に失敗しました。")
+        return region_data
 
     def save_to_database(self, region_data):
         """地域データをデータベースに保存"""
@@ -96,6 +117,10 @@ class RegionDataManager:
                                 class10_name, class10_id, class15_name, class15_id,
                                 class20_name, class20_id
                             ))
+        # areas と同じトランザクションで作成元のハッシュを書き換える
+        self.cursor.execute("DELETE FROM area_source")
+        self.cursor.execute("INSERT INTO area_source (content_hash, updated_at) VALUES (?, ?)",
+                            (area_content_hash(region_data), datetime.now().isoformat()))
         self.connection.commit()
 
     def close_connection(self):
@@ -104,9 +129,10 @@ class RegionDataManager:
 
 class WeatherDataManager:
     AREA_URL = "http://www.jma.go.jp/bosai/forecast/data/forecast/{}.json"
-    def __init__(self,database_name):
+    def __init__(self,database_name, client=None):
         self.database_name = database_name
-        self.connection = sqlite3.connect(database_name)
+        self.client = client or default_client
+        self.connection = open_write_connection(database_name)
         self.cursor = self.connection.cursor()
 
     def create_table(self, table_name, columns):
@@ -117,21 +143,14 @@ class WeatherDataManager:
         self.cursor.execute(create_sql)
         self.connection.commit()
 
-    def fetch_weather_data(self, office_code):
-        """天気データを取得"""
+    def fetch_weather_data(self, office_code, deadline=None):
+        """天気データを取得（リトライ後も失敗した場合は None）"""
         url = self.AREA_URL.format(office_code)
         print(f"[INFO] 天気データを取得中: {url}")
-        try:
-            response = requests.get(url)
-            if response.status_code == 200:
-                print(f"[SUCCESS] 天気データ取得成功")
-                return response.json()
-            else:
-                print(f"[ERROR] 天気データ取得失敗: ステータスコード {response.status_code}")
-                return None
-        except Exception as e:
-            print(f"[EXCEPTION] 天気データ取得中にエラー発生: {e}")
-            return None
+        weather_data = self.client.get_json(url, deadline=deadline)
+        if weather_data is not None:
+            print(f"[SUCCESS] 天気データ取得成功")
+        return weather_data
 
     def save_data_to_db(self, table_name, columns, data):
         """動的なデータの保存"""
@@ -143,93 +162,34 @@ class WeatherDataManager:
             self.cursor.execute(insert_sql, values)
         self.connection.commit()
 
+    @staticmethod
+    def build_weather_rows(weather_columns, data, need):
+        """天気データから need に該当する行を `weather_columns` の順のタプルで作成"""
+        table_name = NEED_TABLES.get(need)
+        if table_name is None:
+            print(f"[ERROR] 未対応の need です: {need}")
+            return []
+        rows = [row for row_table, row in normalize_forecast(data) if row_table == table_name]
+
+        # 正規化後の列の並びと異なる場合のみ並べ替える
+        column_names = tuple(col[0] for col in weather_columns)
+        normalized_columns = TABLE_COLUMNS[table_name]
+        if column_names == normalized_columns:
+            return rows
+        indexes = [normalized_columns.index(col) for col in column_names]
+        return [tuple(row[i] for i in indexes) for row in rows]
+
     def save_weather_to_db(self, table_name, weather_columns, data, need):
         """天気データをDBに保存"""
-        weather_data = []
-        all_columns = set()  # すべてのカラムを追跡するためのセット
-
-        for weather_entry in data:
-            publishing_office = weather_entry.get("publishingOffice", "不明")
-            report_datetime = weather_entry.get("reportDatetime", "不明")
-            time_series = weather_entry.get("timeSeries", [])
-
-            if not time_series:
-                print("[ERROR] 'timeSeries'が見つかりませんでした")
-                continue
-
-            for series in time_series:
-                time_defines = series.get("timeDefines", [])
-                areas = series.get("areas", [])
-
-                for area in areas:
-                    area_name = area.get("area", {}).get("name", "不明")
-                    offices_code = area.get("area", {}).get("code", "不明")
-
-                    # 各データリストを取得
-                    weather_codes = area.get("weatherCodes", [])
-                    weathers = area.get("weathers", [])
-                    winds = area.get("winds", [])
-                    waves = area.get("waves", [])
-                    pops = area.get("pops", [])
-                    temps = area.get("temps", [])
-                    reliabilities = area.get("reliabilities", [])
-
-                    # 各リストの長さを確認し、最も長いリストの長さに合わせる
-                    max_len = max(len(weather_codes), len(weathers), len(winds), len(waves), len(pops), len(time_defines))
-                    
-                    # 各リストが不足している分、Noneで埋める
-                    weather_codes += [None] * (max_len - len(weather_codes))
-                    weathers += [None] * (max_len - len(weathers))
-                    winds += [None] * (max_len - len(winds))
-                    waves += [None] * (max_len - len(waves))
-                    pops += [None] * (max_len - len(pops))  # `pop`のリストも埋める
-                    temps += [None] * (max_len - len(temps))  # `temp`のリストも埋める
-                    reliabilities += [None] * (max_len - len(reliabilities))  # `reliabilities`のリストも埋める
-
-                    # 各timeDefineに対応する情報を保存
-                    for idx, time_define in enumerate(time_defines):
-                        weather_code = weather_codes[idx]
-                        weather = weathers[idx]
-                        wind = winds[idx]
-                        wave = waves[idx]
-                        pop = pops[idx]  # `pop`も収集
-                        temp = temps[idx]  # `temp`も収集
-                        reliability = reliabilities[idx]  # `reliabilities`も収集
-
-                        # `weather`と`wind`が必要な場合にのみ保存
-                        if (need == "weather" and weather is not None) or (need == "wind" and wind is not None) or (need == "pop" and pop is not None and reliability is None) or (need == "temp" and temp is not None) or (need == "reliabilities" and reliability is not None):
-                            # レコードの作成
-                            weather_data.append({
-                                "offices_code": offices_code,
-                                "publishing_office": publishing_office,
-                                "report_datetime": report_datetime,
-                                "area_name": area_name,
-                                "time_define": time_define,
-                                "weather_code": weather_code,
-                                "weather": weather,
-                                "wind": wind,
-                                "wave": wave,
-                                "pop": pop,  # `pop`は収集しつつ、テーブルには保存しない
-                                "temp": temp,  # `temp`も収集しつつ、テーブルには保存しない
-                                "reliabilities": reliability  # `reliabilities`も収集しつつ、テーブルには保存しない
-                            })
-
-                            # カラム名を全て追跡
-                            all_columns.update(["offices_code", "publishing_office", "report_datetime", "area_name", "time_define", 
-                                                "weather_code", "weather", "wind", "wave", "pop", "temp", "reliabilities"])
-
-        # `weather_columns`に基づいてカラムを選定
-        filtered_columns = [col[0] for col in weather_columns if col[0] in all_columns]
-        print(filtered_columns)
-        # テーブルの作成（`weather_columns`にあるカラムのみで作成）
-        weather_columns_filtered = [(col, "TEXT") for col in filtered_columns]
-        self.create_table(table_name, weather_columns_filtered)
-
-        # データの保存（`weather_columns`にあるカラムのみ保存）
-        filtered_weather_data = [
-            {key: value for key, value in record.items() if key in filtered_columns} for record in weather_data
-        ]
-        self.save_data_to_db(table_name, filtered_columns, filtered_weather_data)
+        rows = self.build_weather_rows(weather_columns, data, need)
+        self.create_table(table_name, weather_columns)
+
+        column_names = [col[0] for col in weather_columns]
+        placeholders = ", ".join(["?" for _ in column_names])
+        self.cursor.executemany(
+            f"INSERT INTO {table_name} ({', '.join(column_names)}) VALUES ({placeholders})", rows
+        )
+        self.connection.commit()
 
     def close_connection(self):
         """データベース接続を閉じる"""
@@ -239,13 +199,14 @@ class WeatherDataManager:
 class WeatherDataFetcher:
     AREA_URL = "http://www.jma.go.jp/bosai/forecast/data/forecast/{}.json"
 
-    def __init__(self, database_name):
+    def __init__(self, database_name, client=None):
         self.database_name = database_name
+        self.client = client or default_client
         self.setup_database()
 
     # SQLiteデータベースをセットアップ
     def setup_database(self):
-        conn = sqlite3.connect(self.database_name)
+        conn = open_write_connection(self.database_name)
         cursor = conn.cursor()
         
         # weather_tt テーブルの作成
@@ -296,7 +257,7 @@ class WeatherDataFetcher:
         conn.close()
 
     def save_weather_data(self, table_name, data):
-        conn = sqlite3.connect(self.database_name)
+        conn = open_write_connection(self.database_name)
         cursor = conn.cursor()
 
         # テーブルの列名を取得する
@@ -321,114 +282,37 @@ class WeatherDataFetcher:
 
 
     # 天気データを取得する関数
-    def fetch_weather_data(self, office_code):
-        """天気データを取得"""
+    def fetch_weather_data(self, office_code, deadline=None):
+        """天気データを取得（リトライ後も失敗した場合は None）"""
         url = self.AREA_URL.format(office_code)
-        try:
-            response = requests.get(url)
-            if response.status_code == 200:
-                print(f"[SUCCESS] 天気データ取得成功")
-                return response.json()
-            else:
-                print(f"[ERROR] 天気データ取得失敗: ステータスコード {response.status_code}")
-                return None
-        except Exception as e:
-            print(f"[EXCEPTION] 天気データ取得中にエラー発生: {e}")
-            return None
+        weather_data = self.client.get_json(url, deadline=deadline)
+        if weather_data is not None:
+            print(f"[SUCCESS] 天気データ取得成功")
+        return weather_data
+
+    # 週間予報の気温・平均値の行を作成
+    @staticmethod
+    def build_weekly_rows(weather_data):
+        """週間予報から weather_tt / weather_temp_ave / weather_pop_ave の行を作成
+
+        Returns:
+            dict: テーブル名をキーとする行タプルのリスト。データが不正な場合は None
+        """
+        if weather_data and isinstance(weather_data, list) and len(weather_data) > 1:
+            tables = normalize_forecast_tables(weather_data)
+            return {table_name: tables[table_name] for table_name in (WEATHER_TT, WEATHER_TEMP_AVE, WEATHER_POP_AVE)}
+        return None
 
     # メイン処理
     def process_weather_data(self, weather_data):
-        if weather_data and isinstance(weather_data, list) and len(weather_data) > 1:
+        weekly_rows = self.build_weekly_rows(weather_data)
+        if weekly_rows is not None:
             print(f"[INFO] 'weather_data'の処理を開始します。")
-            second_entry = weather_data[1]
-
-            # 発表局と発表日時
-            publishing_office = second_entry.get("publishingOffice", "不明")
-            report_datetime = second_entry.get("reportDatetime", "不明")
-            time_series = second_entry.get("timeSeries", [])
-            temp_average = second_entry.get("tempAverage", {})
-            precip_average = second_entry.get("precipAverage", {})
-
-            weather_tt_data = []
-            weather_temp_ave_data = []
-            weather_pop_ave_data = []
-
-            # timeSeriesの処理
-            for series in time_series:
-                time_defines = series.get("timeDefines", [])
-                areas = series.get("areas", [])
-
-                for area in areas:
-                    area_name = area.get("area", {}).get("name", "不明")
-                    area_code = area.get("area", {}).get("code", "不明")
-
-                    temps_min = area.get("tempsMin", [])
-                    temps_min_upper = area.get("tempsMinUpper", [])
-                    temps_min_lower = area.get("tempsMinLower", [])
-                    temps_max = area.get("tempsMax", [])
-                    temps_max_upper = area.get("tempsMaxUpper", [])
-                    temps_max_lower = area.get("tempsMaxLower", [])
-
-                    for idx, time_define in enumerate(time_defines):
-                        # 「情報なし」が含まれている場合は追加しない
-                        if any(val == "情報なし" for val in [
-                            temps_min[idx] if idx < len(temps_min) else "情報なし",
-                            temps_min_upper[idx] if idx < len(temps_min_upper) else "情報なし",
-                            temps_min_lower[idx] if idx < len(temps_min_lower) else "情報なし",
-                            temps_max[idx] if idx < len(temps_max) else "情報なし",
-                            temps_max_upper[idx] if idx < len(temps_max_upper) else "情報なし",
-                            temps_max_lower[idx] if idx < len(temps_max_lower) else "情報なし"
-                        ]):
-                            continue  # 情報なしが含まれていればこのデータはスキップ
-
-                        weather_tt_data.append((
-                            area_code, publishing_office, report_datetime,
-                            area_name, time_define,
-                            temps_min[idx] if idx < len(temps_min) else "情報なし",
-                            temps_min_upper[idx] if idx < len(temps_min_upper) else "情報なし",
-                            temps_min_lower[idx] if idx < len(temps_min_lower) else "情報なし",
-                            temps_max[idx] if idx < len(temps_max) else "情報なし",
-                            temps_max_upper[idx] if idx < len(temps_max_upper) else "情報なし",
-                            temps_max_lower[idx] if idx < len(temps_max_lower) else "情報なし"
-                        ))
-
-            # tempAverageの処理
-            for area in temp_average.get("areas", []):
-                area_name = area.get("area", {}).get("name", "不明")
-                area_code = area.get("area", {}).get("code", "不明")
-                min_temp = area.get("min", "情報なし")
-                max_temp = area.get("max", "情報なし")
-
-                if min_temp != "情報なし" and max_temp != "情報なし":  # 「情報なし」含まれていない場合のみ追加
-                    weather_temp_ave_data.append((
-                        area_code, publishing_office, report_datetime,
-                        area_name,   # time_defineは不明
-                        min_temp,
-                        max_temp
-                    ))
-
-            # precipAverageの処理
-            for area in precip_average.get("areas", []):
-                area_name = area.get("area", {}).get("name", "不明")
-                area_code = area.get("area", {}).get("code", "不明")
-                min_precip = area.get("min", "情報なし")
-                max_precip = area.get("max", "情報なし")
-
-                if min_precip != "情報なし" and max_precip != "情報なし":  # 「情報なし」含まれていない場合のみ追加
-                    weather_pop_ave_data.append((
-                        area_code, publishing_office, report_datetime,
-                        area_name,   # time_defineは不明
-                        min_precip,
-                        max_precip
-                    ))
 
             # データベースに保存
-            if weather_tt_data:
-                self.save_weather_data("weather_tt", weather_tt_data)
-            if weather_temp_ave_data:
-                self.save_weather_data("weather_temp_ave", weather_temp_ave_data)
-            if weather_pop_ave_data:
-                self.save_weather_data("weather_pop_ave", weather_pop_ave_data)
+            for table_name, rows in weekly_rows.items():
+                if rows:
+                    self.save_weather_data(table_name, rows)
 
             print("[INFO] 有効な天気データがデータベースに保存されました。")
         else:
@@ -0,0 +1,209 @@
+"""降水確率・気温の条件（アラートのルール）を取り込みごとに評価し、該当した地域と日時を記録する
+
+ルールは「種類（forecast_values の VALUE_KINDS）・比較（>=, >, <=, <）・しきい値・地域（class10_id、
+空の場合は全地域）」で、例えば「130010 の降水確率が80%以上」「最低気温が-5℃以下（全地域）」のように書く。
+
+- 取り込みはオフィスの行を全て削除して入れ直すため、追加された行ではなく値が変わった行だけを評価する。
+  書き込み段が forecast_diff の差分（書き換える前の行との比較）から値が変わった
+  (元のテーブル, 種類, 地域名, 日時) を集め、コミット前にその行の weather_values だけを読む。
+  初めて取り込むオフィスは全ての値が新しいものとして評価し、同じ発表を取り込み直した場合は評価しない
+- ルールは (種類, 地域) をキーにした辞書にまとめ、行ごとにその行の地域のルールと全地域のルールだけを調べる
+  （評価の費用は値が変わった行の数に比例し、ルールの数 × 地域の数にはならない）
+- 該当した行は alert_events に (ルール, 地域, 日時) ごとに1件だけ記録する
+  （次の発表でも同じ日時が条件を満たし続ける場合は新しい件にしない）
+
+ルールを追加したときは、その時点のデータ（weather_values）も1回だけ評価する。
+"""
+import sqlite3
+from datetime import datetime
+
+from forecast_values import VALUE_KINDS, VALUE_SOURCES
+
+ALERT_OPERATORS = {
+    ">=": lambda value, threshold: value >= threshold,
+    ">": lambda value, threshold: value > threshold,
+    "<=": lambda value, threshold: value <= threshold,
+    "<": lambda value, threshold: value < threshold,
+}
+
+KIND_LABELS = {"pop": "降水確率", "temp": "気温", "temp_min": "最低気温", "temp_max": "最高気温"}
+
+EVENT_COLUMNS = ("rule_id", "class10_id", "area_name", "time_define", "value", "report_datetime", "created_at")
+
+
+def initialize_alert_tables(connection):
+    """ルールと該当の記録のテーブルを作成（呼び出し側でコミットする）"""
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS alert_rules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            operator TEXT NOT NULL,
+            threshold REAL NOT NULL,
+            class10_id TEXT,
+            name TEXT,
+            enabled INTEGER DEFAULT 1,
+            created_at TEXT
+        )
+    """)
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS alert_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            rule_id INTEGER,
+            class10_id TEXT,
+            area_name TEXT,
+            time_define TEXT,
+            value REAL,
+            report_datetime TEXT,
+            created_at TEXT,
+            acknowledged INTEGER DEFAULT 0,
+            UNIQUE (rule_id, class10_id, time_define)
+        )
+    """)
+
+
+def rule_label(kind, operator, threshold, name=None):
+    """ルールの表示用の文字列（例: 降水確率 >= 80）"""
+    return name or f"{KIND_LABELS.get(kind, kind)} {operator} {threshold:g}"
+
+
+def add_alert_rule(connection, kind, operator, threshold, class10_id=None, name=None):
+    """ルールを追加し、現在のデータでも評価してコミットする
+
+    Returns:
+        tuple: (ルールの id, 記録した件数)
+    """
+    if kind not in VALUE_KINDS:
+        raise ValueError(f"値の種類が不正です: {kind}")
+    if operator not in ALERT_OPERATORS:
+        raise ValueError(f"比較の種類が不正です: {operator}")
+    initialize_alert_tables(connection)
+    cursor = connection.execute(
+        "INSERT INTO alert_rules (kind, operator, threshold, class10_id, name, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+        (kind, operator, float(threshold), class10_id or None, name, datetime.now().isoformat())
+    )
+    rule_id = cursor.lastrowid
+
+    # 現在のデータのうち条件を満たす行（(種類, 値) の索引で範囲を読む）
+    where = ["kind = ?", f"value {operator} ?"]
+    params = [kind, float(threshold)]
+    if class10_id:
+        where.append("class10_id = ?")
+        params.append(class10_id)
+    try:
+        rows = connection.execute(f"""
+            SELECT class10_id, area_name, time_define, value, report_datetime
+            FROM weather_values
+            WHERE {" AND ".join(where)}
+        """, params).fetchall()
+    except sqlite3.OperationalError as e:
+        # 条件検索用のテーブルがまだ作成されていない（次回の取り込みから評価する）
+        print(f"[WARNING] 現在のデータでルールを評価できませんでした: {e}")
+        rows = []
+    created_at = datetime.now().isoformat()
+    added = insert_events(connection, [(rule_id,) + tuple(row) + (created_at,) for row in rows])
+    connection.commit()
+    return rule_id, added
+
+
+def remove_alert_rule(connection, rule_id):
+    """ルールとその記録を削除してコミットする"""
+    initialize_alert_tables(connection)
+    connection.execute("DELETE FROM alert_events WHERE rule_id = ?", (rule_id,))
+    deleted = connection.execute("DELETE FROM alert_rules WHERE id = ?", (rule_id,)).rowcount
+    connection.commit()
+    return deleted > 0
+
+
+def acknowledge_alert_events(connection, event_ids=None):
+    """記録を確認済みにしてコミットする（event_ids を省略した場合は全件）"""
+    initialize_alert_tables(connection)
+    if event_ids is None:
+        connection.execute("UPDATE alert_events SET acknowledged = 1 WHERE acknowledged = 0")
+    else:
+        connection.executemany("UPDATE alert_events SET acknowledged = 1 WHERE id = ?",
+                               [(event_id,) for event_id in event_ids])
+    connection.commit()
+
+
+def insert_events(connection, events):
+    """記録を追加（同じルール・地域・日時の記録が既にある場合は追加しない）
+
+    Returns:
+        int: 追加した件数
+    """
+    before = connection.total_changes
+    connection.executemany(
+        f"INSERT OR IGNORE INTO alert_events ({', '.join(EVENT_COLUMNS)}) VALUES ({', '.join('?' * len(EVENT_COLUMNS))})",
+        events
+    )
+    return connection.total_changes - before
+
+
+def load_rule_index(connection):
+    """有効なルールを (種類, class10_id) をキーにした辞書にする（全地域のルールのキーは (種類, None)）"""
+    index = {}
+    for rule_id, kind, operator, threshold, class10_id in connection.execute(
+        "SELECT id, kind, operator, threshold, class10_id FROM alert_rules WHERE enabled = 1"
+    ):
+        compare = ALERT_OPERATORS.get(operator)
+        if compare is not None:
+            index.setdefault((kind, class10_id or None), []).append((rule_id, compare, threshold))
+    return index
+
+
+def changed_value_keys(changes):
+    """forecast_diff の差分から、値が変わった (元のテーブル, 種類, 地域名, 日時) を取り出す
+
+    Args:
+        changes (list): diff_office の結果（(テーブル名, 地域コード, 地域名, 日時, 列名, 変更前, 変更後) のリスト）
+
+    Returns:
+        set: 評価する行のキー（値が無くなった行は含めない）
+    """
+    keys = set()
+    for table_name, area_code, area_name, time_define, column, old_value, new_value in changes:
+        if new_value is None:
+            continue
+        for kind, value_column in VALUE_SOURCES.get(table_name, ()):
+            if value_column == column:
+                keys.add((table_name, kind, area_name, time_define))
+    return keys
+
+
+def evaluate_alert_rules(connection, changed_keys):
+    """値が変わった行をルールで評価（呼び出し側でコミットする）
+
+    sync_value_index の後に呼ぶ。
+
+    Args:
+        changed_keys (set): changed_value_keys の結果
+
+    Returns:
+        int: 記録した件数
+    """
+    if not changed_keys:
+        return 0
+    rule_index = load_rule_index(connection)
+    if not rule_index:
+        # ルールを追加したときの評価は add_alert_rule が行う
+        return 0
+    connection.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS alert_changes (source TEXT, kind TEXT, area_name TEXT, time_define TEXT)
+    """)
+    connection.execute("DELETE FROM temp.alert_changes")
+    connection.executemany("INSERT INTO temp.alert_changes VALUES (?, ?, ?, ?)", sorted(changed_keys))
+    created_at = datetime.now().isoformat()
+    events = []
+    # (種類, 日時) の索引で、変わった行の値だけを読む
+    for kind, class10_id, area_name, time_define, value, report_datetime in connection.execute("""
+        SELECT v.kind, v.class10_id, v.area_name, v.time_define, v.value, v.report_datetime
+        FROM temp.alert_changes c
+        JOIN weather_values v
+          ON v.kind = c.kind AND v.time_define = c.time_define AND v.source = c.source AND v.area_name = c.area_name
+    """):
+        for rules in (rule_index.get((kind, class10_id)), rule_index.get((kind, None))):
+            for rule_id, compare, threshold in rules or ():
+                if compare(value, threshold):
+                    events.append((rule_id, class10_id, area_name, time_define, value, report_datetime, created_at))
+    connection.execute("DELETE FROM temp.alert_changes")
+    return insert_events(connection, events)
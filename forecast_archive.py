@@ -0,0 +1,164 @@
+"""発表ごとの予報を残す履歴アーカイブ
+
+region_data.db の各テーブルは常に最新の発表だけを保持する。アーカイブを有効にすると、
+取り込んだ発表（reportDatetime）ごとの行を月単位のデータベースファイル
+（archive/forecast_YYYYMM.db）に追記する。最新データのテーブルとは別ファイルなので、
+何か月分の履歴があっても画面側の DatabaseManager の検索は遅くならない。
+"""
+import glob
+import os
+import re
+import sqlite3
+from datetime import datetime
+
+from forecast_normalizer import TABLE_COLUMNS
+
+# アーカイブの保存先（未設定の場合はアーカイブしない）と保持する月数
+ARCHIVE_DIR = os.environ.get("WEATHER_ARCHIVE_DIR")
+ARCHIVE_RETENTION_MONTHS = int(os.environ.get("WEATHER_ARCHIVE_RETENTION_MONTHS", "12"))
+
+PARTITION_PATTERN = re.compile(r"forecast_(\d{6})\.db$")
+
+
+def partition_key(report_datetime):
+    """発表日時から月のパーティション名（YYYYMM）を作成"""
+    try:
+        return datetime.fromisoformat(report_datetime).strftime("%Y%m")
+    except (ValueError, TypeError):
+        return datetime.now().strftime("%Y%m")
+
+
+def month_index(key):
+    """YYYYMM を月の通し番号に変換（保持期間の計算用）"""
+    return int(key[:4]) * 12 + int(key[4:]) - 1
+
+
+class ForecastArchive:
+    """月単位のパーティションに発表ごとの予報を追記するアーカイブ"""
+
+    def __init__(self, archive_dir, retention_months=ARCHIVE_RETENTION_MONTHS):
+        self.archive_dir = archive_dir
+        self.retention_months = retention_months
+        self.connections = {}
+        os.makedirs(archive_dir, exist_ok=True)
+
+    def partition_path(self, key):
+        return os.path.join(self.archive_dir, f"forecast_{key}.db")
+
+    def list_partitions(self):
+        """保存済みのパーティション名（YYYYMM）を古い順に返す"""
+        keys = []
+        for path in glob.glob(os.path.join(self.archive_dir, "forecast_*.db")):
+            match = PARTITION_PATTERN.search(path)
+            if match:
+                keys.append(match.group(1))
+        return sorted(keys)
+
+    def get_partition(self, key):
+        """書き込み用のパーティション接続を取得（無ければ作成）"""
+        if key not in self.connections:
+            connection = sqlite3.connect(self.partition_path(key))
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    office_id TEXT,
+                    report_datetime TEXT,
+                    archived_at TEXT,
+                    PRIMARY KEY (office_id, report_datetime)
+                )
+            """)
+            for table_name, columns in TABLE_COLUMNS.items():
+                columns_str = ", ".join(f"{col} TEXT" for col in columns)
+                connection.execute(f"CREATE TABLE IF NOT EXISTS {table_name} (office_id TEXT, {columns_str})")
+                connection.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_{table_name}_area ON {table_name} (offices_code, report_datetime)"
+                )
+            connection.commit()
+            self.connections[key] = connection
+        return self.connections[key]
+
+    def append_snapshot(self, office_id, report_datetime, tables):
+        """1オフィス・1発表分の行を追記（同じ発表が既にある場合は何もしない）
+
+        Args:
+            office_id (str): オフィスID
+            report_datetime (str): 発表日時
+            tables (dict): テーブル名をキーとする行タプル（TABLE_COLUMNS の順）のリスト
+
+        Returns:
+            bool: 新しく追記した場合は True
+        """
+        connection = self.get_partition(partition_key(report_datetime))
+        cursor = connection.execute(
+            "INSERT OR IGNORE INTO snapshots (office_id, report_datetime, archived_at) VALUES (?, ?, ?)",
+            (office_id, report_datetime, datetime.now().isoformat())
+        )
+        if cursor.rowcount == 0:
+            return False
+        for table_name, rows in tables.items():
+            if not rows:
+                continue
+            placeholders = ", ".join(["?" for _ in range(len(TABLE_COLUMNS[table_name]) + 1)])
+            connection.executemany(
+                f"INSERT INTO {table_name} VALUES ({placeholders})",
+                [(office_id,) + tuple(row) for row in rows]
+            )
+        return True
+
+    def commit(self):
+        for connection in self.connections.values():
+            connection.commit()
+
+    def close(self):
+        for connection in self.connections.values():
+            connection.close()
+        self.connections = {}
+
+    def prune(self, now=None):
+        """保持期間を過ぎたパーティションのファイルを削除
+
+        Returns:
+            list: 削除したパーティション名
+        """
+        if not self.retention_months or self.retention_months <= 0:
+            return []
+        current = month_index((now or datetime.now()).strftime("%Y%m"))
+        removed = []
+        for key in self.list_partitions():
+            if current - month_index(key) >= self.retention_months:
+                connection = self.connections.pop(key, None)
+                if connection:
+                    connection.close()
+                os.remove(self.partition_path(key))
+                removed.append(key)
+        if removed:
+            print(f"[INFO] 保持期間を過ぎたアーカイブを削除しました: {', '.join(removed)}")
+        return removed
+
+    def iter_history(self, table_name, columns, start_key=None, end_key=None, area_codes=None):
+        """期間内のパーティションから履歴の行を順に読み出す（読み取り専用で1ファイルずつ開く）
+
+        Args:
+            table_name (str): テーブル名
+            columns (list): 取得する列（office_id も指定できる）
+            start_key (str): 開始月（YYYYMM、省略時は最古）
+            end_key (str): 終了月（YYYYMM、省略時は最新）
+            area_codes (list): 指定した場合、この地域コードの行だけを読む
+
+        Yields:
+            tuple: columns の順の行
+        """
+        where = ""
+        params = []
+        if area_codes:
+            where = f"WHERE offices_code IN ({', '.join(['?' for _ in area_codes])})"
+            params = list(area_codes)
+        for key in self.list_partitions():
+            if (start_key and key < start_key) or (end_key and key > end_key):
+                continue
+            connection = sqlite3.connect(f"file:{self.partition_path(key)}?mode=ro", uri=True)
+            try:
+                yield from connection.execute(
+                    f"SELECT {', '.join(columns)} FROM {table_name} {where} ORDER BY report_datetime", params
+                )
+            finally:
+                connection.close()
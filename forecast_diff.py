@@ -0,0 +1,128 @@
+"""前回の発表と新しい発表の差分（地域・日時・列ごとの変更）
+
+取り込みでオフィスの予報を書き換える前に、そのオフィスの地域の行を読み、新しい行と比べて
+変わった値だけを region_diffs に保存する（オフィスごとに最新の1回分だけを持つ）。
+
+- 行は (地域コード, 地域名, 日時) で対応させる（気温は観測地点の行）
+- 新しい日時の行は変更前の値を NULL、無くなった日時の行は変更後の値を NULL にする
+- 初めて取り込むオフィス（前回の発表が無い場合）や、同じ発表を取り込み直した場合は差分を作らない
+
+画面は開いている地域のオフィスの差分を読み、変わった値の表示だけを書き換える。
+"""
+from datetime import datetime
+
+from forecast_normalizer import (TABLE_COLUMNS, WEATHER_INFO, WEATHER_POPS, WEATHER_RELIABILITIES, WEATHER_TEMPS,
+                                 WEATHER_TT)
+
+# 比べるテーブルと値の列（平年値のテーブルは日時を持たないため比べない）
+DIFF_COLUMNS = {
+    WEATHER_INFO: ("weather_code", "weather", "wind", "wave"),
+    WEATHER_POPS: ("pop",),
+    WEATHER_TEMPS: ("temp",),
+    WEATHER_RELIABILITIES: ("weather_code", "pop", "reliabilities"),
+    WEATHER_TT: ("temps_min", "temps_min_upper", "temps_min_lower", "temps_max", "temps_max_upper", "temps_max_lower"),
+}
+KEY_COLUMNS = ("offices_code", "area_name", "time_define")
+
+
+def initialize_diff_table(connection):
+    """差分のテーブルを作成（呼び出し側でコミットする）"""
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS region_diffs (
+            office_id TEXT,
+            table_name TEXT,
+            area_code TEXT,
+            area_name TEXT,
+            time_define TEXT,
+            column_name TEXT,
+            old_value TEXT,
+            new_value TEXT,
+            previous_report_datetime TEXT,
+            report_datetime TEXT,
+            created_at TEXT
+        )
+    """)
+    connection.execute("CREATE INDEX IF NOT EXISTS idx_region_diffs_office ON region_diffs (office_id)")
+
+
+def table_values(table_name, rows):
+    """行を (地域コード, 地域名, 日時) → 値の列のタプルの dict にする（同じキーは最初の行）"""
+    columns = TABLE_COLUMNS[table_name]
+    key_indexes = [columns.index(column) for column in KEY_COLUMNS]
+    value_indexes = [columns.index(column) for column in DIFF_COLUMNS[table_name]]
+    values = {}
+    for row in rows:
+        key = tuple(row[index] for index in key_indexes)
+        if key not in values:
+            values[key] = tuple(row[index] for index in value_indexes)
+    return values
+
+
+def snapshot_office(connection, tables):
+    """新しい行の地域コードについて、書き換える前の行を読む（書き換えの前に呼ぶ）
+
+    Args:
+        tables (dict): 新しい発表のテーブルごとの行（normalize_forecast_tables の結果）
+
+    Returns:
+        dict: テーブル名 → table_values の dict
+    """
+    snapshot = {}
+    for table_name in DIFF_COLUMNS:
+        codes = sorted({row[0] for row in tables.get(table_name, ())})
+        if codes:
+            snapshot[table_name] = snapshot_table(connection, table_name, codes)
+    return snapshot
+
+
+def snapshot_area_codes(connection, area_codes):
+    """オフィスの全ての地域コードについて、書き換える前の行を読む（書き換えの前に呼ぶ）
+
+    取り込みは地域コードの行を全テーブルから削除して書き直すため、新しい行が無くなったテーブルの行も
+    差分（変更後が NULL）に含まれる。新しい行を Python で作らない JSON1 モードでも使える。
+
+    Returns:
+        dict: テーブル名 → table_values の dict
+    """
+    codes = sorted(set(area_codes))
+    if not codes:
+        return {}
+    return {table_name: snapshot_table(connection, table_name, codes) for table_name in DIFF_COLUMNS}
+
+
+def snapshot_table(connection, table_name, codes):
+    placeholders = ", ".join("?" * len(codes))
+    return table_values(table_name, connection.execute(
+        f"SELECT {', '.join(TABLE_COLUMNS[table_name])} FROM {table_name} WHERE offices_code IN ({placeholders})",
+        codes
+    ))
+
+
+def diff_office(previous, tables):
+    """書き換える前の行と新しい行の差分
+
+    Returns:
+        list: (テーブル名, 地域コード, 地域名, 日時, 列名, 変更前, 変更後) のリスト
+    """
+    changes = []
+    for table_name, columns in DIFF_COLUMNS.items():
+        old_values = previous.get(table_name, {})
+        new_values = table_values(table_name, tables.get(table_name, ()))
+        empty = (None,) * len(columns)
+        for key in sorted(set(old_values) | set(new_values), key=lambda key: tuple(str(part) for part in key)):
+            old = old_values.get(key, empty)
+            new = new_values.get(key, empty)
+            for column, old_value, new_value in zip(columns, old, new):
+                if old_value != new_value:
+                    changes.append((table_name,) + key + (column, old_value, new_value))
+    return changes
+
+
+def save_office_diff(connection, office_id, changes, previous_report_datetime, report_datetime):
+    """オフィスの差分を最新の1回分に置き換える（呼び出し側でコミットする）"""
+    created_at = datetime.now().isoformat()
+    connection.execute("DELETE FROM region_diffs WHERE office_id = ?", (office_id,))
+    connection.executemany(
+        "INSERT INTO region_diffs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [(office_id,) + change + (previous_report_datetime, report_datetime, created_at) for change in changes]
+    )
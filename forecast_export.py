@@ -0,0 +1,283 @@
+"""予報テーブルを分析用の列指向ファイルに書き出す
+
+region_data.db の weather_info / weather_pops / weather_temps / weather_tt / 平均値のテーブルを、
+型付きの列（日時は datetime64、値は float、地域・気象台名は辞書エンコード）に変換して書き出す。
+pyarrow があれば Parquet、無ければ NumPy の .npz に書き出す。
+
+- fetchmany でチャンクごとに読み、チャンクごとに書き出すため、メモリ使用量はテーブルの大きさに依存しない
+- manifest.json にテーブル・地域ごとの最新の report_datetime を記録し、次回はそれより新しい発表の行だけを追記する
+
+日時はタイムゾーンを持たない値として保存する（気象庁のデータは全て日本時間）。
+"""
+import glob
+import json
+import os
+import sqlite3
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+from forecast_normalizer import (TABLE_COLUMNS, WEATHER_INFO, WEATHER_POP_AVE, WEATHER_POPS, WEATHER_TEMP_AVE,
+                                 WEATHER_TEMPS, WEATHER_TT, to_number)
+
+EXPORT_TABLES = (WEATHER_INFO, WEATHER_POPS, WEATHER_TEMPS, WEATHER_TT, WEATHER_TEMP_AVE, WEATHER_POP_AVE)
+
+FORMAT_AUTO = "auto"
+FORMAT_PARQUET = "parquet"
+FORMAT_NPZ = "npz"
+
+DEFAULT_CHUNK_SIZE = 50000
+MANIFEST_NAME = "manifest.json"
+
+# 列の型（ここに無い列は文字列として書き出す）
+DICTIONARY_COLUMNS = {"offices_code", "publishing_office", "area_name", "weather_code", "reliabilities"}
+TIME_COLUMNS = {"report_datetime", "time_define"}
+NUMERIC_COLUMNS = {"pop", "temp", "temps_min", "temps_min_upper", "temps_min_lower",
+                   "temps_max", "temps_max_upper", "temps_max_lower",
+                   "temps_ave_min", "temps_ave_max", "temps_pop_min", "temps_pop_max"}
+
+
+def resolve_format(export_format):
+    """auto の場合は pyarrow の有無で書き出し形式を決める"""
+    if export_format == FORMAT_AUTO:
+        return FORMAT_PARQUET if pa is not None else FORMAT_NPZ
+    if export_format == FORMAT_PARQUET and pa is None:
+        raise RuntimeError("Parquet への書き出しには pyarrow が必要です")
+    return export_format
+
+
+def to_numeric_array(values):
+    """数値でない値は NaN"""
+    return np.array([to_number(value) for value in values], dtype=np.float64)
+
+
+def to_time_array(values):
+    """ISO形式の日時文字列を datetime64[s] に変換（「不明」などは NaT）"""
+    return np.array([value[:19] if value and value[0].isdigit() else "NaT" for value in values],
+                    dtype="datetime64[s]")
+
+
+def to_string_array(values):
+    return np.array(["" if value is None else value for value in values], dtype=str)
+
+
+def dictionary_encode(values):
+    """文字列の配列を (辞書, int32 のコード) に変換"""
+    dictionary, codes = np.unique(to_string_array(values), return_inverse=True)
+    return dictionary, codes.astype(np.int32)
+
+
+def load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {"tables": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(output_dir, manifest):
+    """manifest.json を書き換える（途中で中断しても壊れないよう一時ファイルから置き換える）"""
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(temporary_path, path)
+
+
+class ParquetTableWriter:
+    """1テーブル分のチャンクを1つの Parquet ファイルに追記"""
+
+    extension = "parquet"
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = columns
+        self.schema = pa.schema([(column, self.column_type(column)) for column in columns])
+        self.writer = None
+
+    @staticmethod
+    def column_type(column):
+        if column in DICTIONARY_COLUMNS:
+            return pa.dictionary(pa.int32(), pa.string())
+        if column in TIME_COLUMNS:
+            return pa.timestamp("s")
+        if column in NUMERIC_COLUMNS:
+            return pa.float64()
+        return pa.string()
+
+    def build_array(self, column, values):
+        if column in DICTIONARY_COLUMNS:
+            return pa.array(values, pa.string()).dictionary_encode().cast(self.schema.field(column).type)
+        if column in TIME_COLUMNS:
+            return pa.array(to_time_array(values), pa.timestamp("s"))
+        if column in NUMERIC_COLUMNS:
+            return pa.array(to_numeric_array(values), pa.float64(), from_pandas=True)
+        return pa.array(values, pa.string())
+
+    def write_chunk(self, rows):
+        values_by_column = list(zip(*rows))
+        batch = pa.record_batch(
+            [self.build_array(column, values) for column, values in zip(self.columns, values_by_column)],
+            schema=self.schema
+        )
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, self.schema)
+        self.writer.write_batch(batch)
+        return [self.path]
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+class NpzTableWriter:
+    """1テーブル分のチャンクを、チャンクごとの .npz ファイルに書き出す
+
+    辞書エンコードした列は「列名__dict」（辞書）と「列名__codes」（コード）の2つの配列になる。
+    """
+
+    extension = "npz"
+
+    def __init__(self, path, columns):
+        self.base_path = path[:-len(".npz")]
+        self.columns = columns
+        self.chunk_index = 0
+
+    def write_chunk(self, rows):
+        arrays = {}
+        for column, values in zip(self.columns, zip(*rows)):
+            if column in DICTIONARY_COLUMNS:
+                arrays[f"{column}__dict"], arrays[f"{column}__codes"] = dictionary_encode(values)
+            elif column in TIME_COLUMNS:
+                arrays[column] = to_time_array(values)
+            elif column in NUMERIC_COLUMNS:
+                arrays[column] = to_numeric_array(values)
+            else:
+                arrays[column] = to_string_array(values)
+        path = f"{self.base_path}-{self.chunk_index:05d}.npz"
+        np.savez_compressed(path, **arrays)
+        self.chunk_index += 1
+        return [path]
+
+    def close(self):
+        pass
+
+
+def clear_table_parts(output_dir, table_name):
+    """テーブルのディレクトリから以前に書き出したファイルを削除（全件の書き出し用）"""
+    for path in glob.glob(os.path.join(output_dir, table_name, "part-*")):
+        os.remove(path)
+
+
+def export_table(connection, table_name, output_dir, export_format, marks, chunk_size, run_id):
+    """1テーブルを書き出す
+
+    Args:
+        marks (dict): 地域コードをキーとする、前回までに書き出した最新の report_datetime
+
+    Returns:
+        tuple: (書き出した行数, 書き出したファイルのリスト, 更新後の marks)
+    """
+    columns = TABLE_COLUMNS[table_name]
+    connection.execute("DROP TABLE IF EXISTS temp.export_marks")
+    connection.execute("CREATE TEMP TABLE export_marks (offices_code TEXT PRIMARY KEY, report_datetime TEXT)")
+    connection.executemany("INSERT INTO temp.export_marks VALUES (?, ?)", marks.items())
+    # 地域ごとに、前回より新しい発表の行だけを選ぶ（「不明」などの日時でない値は一度だけ書き出す）
+    cursor = connection.execute(f"""
+        SELECT {', '.join(f't.{column}' for column in columns)}
+        FROM {table_name} t
+        LEFT JOIN temp.export_marks m ON m.offices_code = t.offices_code
+        WHERE m.report_datetime IS NULL
+           OR (t.report_datetime > m.report_datetime AND t.report_datetime GLOB '[0-9]*')
+        ORDER BY t.id
+    """)
+
+    table_dir = os.path.join(output_dir, table_name)
+    os.makedirs(table_dir, exist_ok=True)
+    writer_class = ParquetTableWriter if export_format == FORMAT_PARQUET else NpzTableWriter
+    writer = writer_class(os.path.join(table_dir, f"part-{run_id}.{writer_class.extension}"), columns)
+    area_index = columns.index("offices_code")
+    report_index = columns.index("report_datetime")
+
+    marks = dict(marks)
+    row_count = 0
+    files = []
+    try:
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for path in writer.write_chunk(rows):
+                if path not in files:
+                    files.append(path)
+            row_count += len(rows)
+            for row in rows:
+                area_code, report_datetime = row[area_index], row[report_index]
+                if report_datetime[:1].isdigit() and report_datetime > marks.get(area_code, ""):
+                    marks[area_code] = report_datetime
+                else:
+                    # 日時でない発表は空文字を記録し、次回からは日時の発表だけを対象にする
+                    marks.setdefault(area_code, "")
+    finally:
+        writer.close()
+    return row_count, files, marks
+
+
+def export_tables(db_path, output_dir, export_format=FORMAT_AUTO, chunk_size=DEFAULT_CHUNK_SIZE,
+                  incremental=True, tables=EXPORT_TABLES):
+    """予報テーブルを列指向ファイルに書き出す
+
+    Args:
+        db_path (str): データベースのパス
+        output_dir (str): 書き出し先のディレクトリ
+        export_format (str): auto / parquet / npz
+        chunk_size (int): 1回に読み込む行数
+        incremental (bool): True の場合、前回書き出した発表より新しい行だけを追記
+        tables (tuple): 書き出すテーブル
+
+    Returns:
+        dict: テーブル名をキーとする書き出した行数
+    """
+    export_format = resolve_format(export_format)
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    if manifest.get("format") not in (None, export_format):
+        raise RuntimeError(f"{output_dir} には {manifest['format']} 形式で書き出されています")
+    manifest["format"] = export_format
+
+    # 同じ秒に書き出しても前回のファイルを上書きしないよう、日時の後に一意な値を付ける
+    run_id = f"{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}"
+    connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    counts = {}
+    try:
+        for table_name in tables:
+            if incremental:
+                state = manifest["tables"].get(table_name, {})
+            else:
+                # 全件の書き出しでは以前のファイルを削除する（残すと同じ行が二重に読まれる）
+                clear_table_parts(output_dir, table_name)
+                state = {}
+            row_count, files, marks = export_table(
+                connection, table_name, output_dir, export_format,
+                state.get("last_report_datetime", {}), chunk_size, run_id
+            )
+            counts[table_name] = row_count
+            state["last_report_datetime"] = marks
+            state["rows"] = state.get("rows", 0) + row_count
+            state["parts"] = state.get("parts", []) + [os.path.relpath(path, output_dir) for path in files]
+            manifest["tables"][table_name] = state
+            manifest["updated_at"] = datetime.now().isoformat()
+            save_manifest(output_dir, manifest)
+            print(f"[INFO] {table_name}: {row_count} 行を書き出しました。")
+    finally:
+        connection.close()
+    return counts
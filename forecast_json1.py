@@ -0,0 +1,236 @@
+"""生の予報JSONを raw_forecasts に1回だけ保存し、SQLite の JSON1 関数で各テーブルを作成する
+
+各テーブルの形は json_each / json_extract を使ったビュー（v_weather_info など）として定義し、
+取り込み時はオフィス単位でビューから実テーブルへ INSERT ... SELECT する。
+全国の概況の集計や発表間の差分に使う行も、Python でJSONを展開せず、作り直した行を読み出す。
+Python 側で行を組み立てないため、行ごとのオーバーヘッドがほとんどなく、
+元のJSONもそのまま残るので後から再処理できる。
+"""
+from datetime import datetime
+
+from forecast_normalizer import (TABLE_COLUMNS, WEATHER_INFO, WEATHER_POP_AVE, WEATHER_POPS, WEATHER_RELIABILITIES,
+                                 WEATHER_TEMP_AVE, WEATHER_TEMPS, WEATHER_TT)
+
+# 生データのテーブル（オフィスごとに最新の発表を1件保持）
+RAW_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS raw_forecasts (
+        office_id TEXT PRIMARY KEY,
+        report_datetime TEXT,
+        fetched_at TEXT,
+        body TEXT
+    )
+"""
+
+# timeSeries の各時刻を1行に展開する共通部分（3日間予報・週間予報の両方）
+_TIME_SERIES_FROM = """
+    FROM raw_forecasts r,
+         json_each(r.body) e,
+         json_each(e.value, '$.timeSeries') s,
+         json_each(s.value, '$.areas') a,
+         json_each(s.value, '$.timeDefines') t
+"""
+
+# 週間予報（2番目の要素）の timeSeries だけを展開する部分
+_WEEKLY_FROM = """
+    FROM raw_forecasts r,
+         json_each(r.body, '$[1].timeSeries') s,
+         json_each(s.value, '$.areas') a,
+         json_each(s.value, '$.timeDefines') t
+"""
+
+_AREA_COLUMNS = """
+    r.office_id AS office_id,
+    COALESCE(json_extract(a.value, '$.area.code'), '不明') AS offices_code,
+    COALESCE(json_extract({entry}, '$.publishingOffice'), '不明') AS publishing_office,
+    COALESCE(json_extract({entry}, '$.reportDatetime'), '不明') AS report_datetime,
+    COALESCE(json_extract(a.value, '$.area.name'), '不明') AS area_name
+"""
+
+
+def _item(key, index="t.key"):
+    """地域の配列 key の index 番目の要素（無い場合は NULL）"""
+    return f"json_extract(a.value, '$.{key}[' || {index} || ']')"
+
+
+def _has_value(path):
+    """path の値があり「情報なし」でない条件
+
+    JSON の null は値として扱う（forecast_normalizer と同じく行を残し、列は NULL になる）。
+    """
+    return f"(json_type(a.value, {path}) IS NOT NULL AND json_extract(a.value, {path}) IS NOT '情報なし')"
+
+
+def _weekly_item_path(key):
+    """週間気温の配列 key の、この時刻の要素のパス"""
+    return f"'$.{key}[' || t.key || ']'"
+
+
+_TT_KEYS = ("tempsMin", "tempsMinUpper", "tempsMinLower", "tempsMax", "tempsMaxUpper", "tempsMaxLower")
+
+# テーブルごとの派生ビュー（列の並びは forecast_normalizer.TABLE_COLUMNS と同じ）
+VIEW_SQL = {
+    WEATHER_INFO: f"""
+        SELECT {_AREA_COLUMNS.format(entry="e.value")},
+            t.value AS time_define,
+            {_item("weatherCodes")} AS weather_code,
+            {_item("weathers")} AS weather,
+            {_item("winds")} AS wind,
+            {_item("waves")} AS wave,
+            e.key AS entry_index, s.key AS series_index, a.key AS area_index, t.key AS time_index
+        {_TIME_SERIES_FROM}
+        WHERE {_item("weathers")} IS NOT NULL
+    """,
+    WEATHER_POPS: f"""
+        SELECT {_AREA_COLUMNS.format(entry="e.value")},
+            t.value AS time_define,
+            {_item("pops")} AS pop,
+            e.key AS entry_index, s.key AS series_index, a.key AS area_index, t.key AS time_index
+        {_TIME_SERIES_FROM}
+        WHERE {_item("pops")} IS NOT NULL AND {_item("reliabilities")} IS NULL
+    """,
+    WEATHER_TEMPS: f"""
+        SELECT {_AREA_COLUMNS.format(entry="e.value")},
+            t.value AS time_define,
+            {_item("temps")} AS temp,
+            e.key AS entry_index, s.key AS series_index, a.key AS area_index, t.key AS time_index
+        {_TIME_SERIES_FROM}
+        WHERE {_item("temps")} IS NOT NULL
+    """,
+    WEATHER_RELIABILITIES: f"""
+        SELECT {_AREA_COLUMNS.format(entry="e.value")},
+            t.value AS time_define,
+            {_item("weatherCodes")} AS weather_code,
+            {_item("pops")} AS pop,
+            {_item("reliabilities")} AS reliabilities,
+            e.key AS entry_index, s.key AS series_index, a.key AS area_index, t.key AS time_index
+        {_TIME_SERIES_FROM}
+        WHERE {_item("reliabilities")} IS NOT NULL
+    """,
+    WEATHER_TT: f"""
+        SELECT {_AREA_COLUMNS.format(entry="json_extract(r.body, '$[1]')")},
+            t.value AS time_define,
+            {_item("tempsMin")} AS temps_min,
+            {_item("tempsMinUpper")} AS temps_min_upper,
+            {_item("tempsMinLower")} AS temps_min_lower,
+            {_item("tempsMax")} AS temps_max,
+            {_item("tempsMaxUpper")} AS temps_max_upper,
+            {_item("tempsMaxLower")} AS temps_max_lower,
+            1 AS entry_index, s.key AS series_index, a.key AS area_index, t.key AS time_index
+        {_WEEKLY_FROM}
+        WHERE {" AND ".join(_has_value(_weekly_item_path(key)) for key in _TT_KEYS)}
+    """,
+}
+
+# 週間の平均値（tempAverage / precipAverage）のビュー
+for _table_name, _key, _min_column, _max_column in (
+    (WEATHER_TEMP_AVE, "tempAverage", "temps_ave_min", "temps_ave_max"),
+    (WEATHER_POP_AVE, "precipAverage", "temps_pop_min", "temps_pop_max"),
+):
+    VIEW_SQL[_table_name] = f"""
+        SELECT {_AREA_COLUMNS.format(entry="json_extract(r.body, '$[1]')")},
+            json_extract(a.value, '$.min') AS {_min_column},
+            json_extract(a.value, '$.max') AS {_max_column},
+            1 AS entry_index, 0 AS series_index, a.key AS area_index, 0 AS time_index
+        FROM raw_forecasts r, json_each(r.body, '$[1].{_key}.areas') a
+        WHERE {_has_value("'$.min'")} AND {_has_value("'$.max'")}
+    """
+
+# 生データに含まれる全ての地域コード（古い行の削除に使う）
+AREA_CODES_SQL = """
+    SELECT DISTINCT j.value
+    FROM raw_forecasts r, json_tree(r.body) j
+    WHERE r.office_id = ? AND j.key = 'code' AND j.path LIKE '%.area'
+"""
+
+
+def view_name(table_name):
+    return f"v_{table_name}"
+
+
+def initialize_json1_schema(connection):
+    """raw_forecasts テーブルと派生ビューを作成（ビューは定義を変えた場合に備えて毎回作り直す）"""
+    connection.execute(RAW_TABLE_SQL)
+    for table_name, select_sql in VIEW_SQL.items():
+        connection.execute(f"DROP VIEW IF EXISTS {view_name(table_name)}")
+        connection.execute(f"CREATE VIEW {view_name(table_name)} AS {select_sql}")
+    connection.commit()
+
+
+def store_raw_forecast(connection, office_id, raw_text):
+    """生の予報JSONを保存（呼び出し側でコミットする）
+
+    Returns:
+        str: 発表日時
+
+    Raises:
+        ValueError: JSONとして不正な場合
+    """
+    # json_extract は不正なJSONでエラーになるため、先に確認する
+    if not connection.execute("SELECT json_valid(?)", (raw_text,)).fetchone()[0]:
+        raise ValueError("JSONとして不正なデータです")
+    report_datetime = connection.execute("SELECT json_extract(?, '$[0].reportDatetime')", (raw_text,)).fetchone()[0]
+    connection.execute(
+        "INSERT OR REPLACE INTO raw_forecasts (office_id, report_datetime, fetched_at, body) VALUES (?, ?, ?, ?)",
+        (office_id, report_datetime or "不明", datetime.now().isoformat(), raw_text)
+    )
+    return report_datetime or "不明"
+
+
+def office_area_codes(connection, office_id):
+    """保存済みの生データに含まれる全ての地域コード"""
+    return [row[0] for row in connection.execute(AREA_CODES_SQL, (office_id,))]
+
+
+def derive_office_tables(connection, office_id, load_rows=False, area_codes=None):
+    """保存済みの生データから、そのオフィスの行を各テーブルに作り直す（呼び出し側でコミットする）
+
+    load_rows が True の場合は、作り直した行を normalize_forecast_tables と同じ形で返す。
+    新しい行は挿入する前の最大の id より後ろにまとまっているため、id の範囲だけを読む。
+    area_codes には office_area_codes で取得済みの地域コードを渡せる。
+    """
+    if area_codes is None:
+        area_codes = office_area_codes(connection, office_id)
+    if area_codes:
+        placeholders = ", ".join(["?" for _ in area_codes])
+        for table_name in TABLE_COLUMNS:
+            connection.execute(f"DELETE FROM {table_name} WHERE offices_code IN ({placeholders})", area_codes)
+
+    tables = {}
+    for table_name, columns in TABLE_COLUMNS.items():
+        column_list = ", ".join(columns)
+        last_id = connection.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table_name}").fetchone()[0]
+        connection.execute(f"""
+            INSERT INTO {table_name} ({column_list})
+            SELECT {column_list} FROM {view_name(table_name)}
+            WHERE office_id = ?
+            ORDER BY entry_index, series_index, area_index, time_index
+        """, (office_id,))
+        if load_rows:
+            tables[table_name] = connection.execute(
+                f"SELECT {column_list} FROM {table_name} WHERE id > ? ORDER BY id", (last_id,)
+            ).fetchall()
+    return tables if load_rows else None
+
+
+def load_office_tables(connection, office_id):
+    """保存済みのそのオフィスの行を normalize_forecast_tables と同じ形で読む（作り直さずに集計する場合）"""
+    area_codes = office_area_codes(connection, office_id)
+    tables = {table_name: [] for table_name in TABLE_COLUMNS}
+    if not area_codes:
+        return tables
+    placeholders = ", ".join(["?" for _ in area_codes])
+    for table_name, columns in TABLE_COLUMNS.items():
+        tables[table_name] = connection.execute(
+            f"SELECT {', '.join(columns)} FROM {table_name} WHERE offices_code IN ({placeholders}) ORDER BY id",
+            area_codes
+        ).fetchall()
+    return tables
+
+
+def rebuild_from_raw(connection):
+    """raw_forecasts の全オフィスについて各テーブルを作り直す（再処理用）"""
+    office_ids = [row[0] for row in connection.execute("SELECT office_id FROM raw_forecasts")]
+    for office_id in office_ids:
+        derive_office_tables(connection, office_id)
+    connection.commit()
+    return len(office_ids)
@@ -0,0 +1,182 @@
+"""気象庁の予報JSONを各テーブルの行タプルに展開する正規化処理
+
+予報ドキュメントを1回だけ走査し、weather_info / weather_pops / weather_temps /
+weather_reliabilities / weather_tt / weather_temp_ave / weather_pop_ave の行を
+同時に生成する。入力のJSONは変更せず、セルごとに作るのは出力の行タプルのみ。
+"""
+
+WEATHER_INFO = "weather_info"
+WEATHER_POPS = "weather_pops"
+WEATHER_TEMPS = "weather_temps"
+WEATHER_RELIABILITIES = "weather_reliabilities"
+WEATHER_TT = "weather_tt"
+WEATHER_TEMP_AVE = "weather_temp_ave"
+WEATHER_POP_AVE = "weather_pop_ave"
+
+# 各テーブルの行タプルの並び（id列を除く）
+TABLE_COLUMNS = {
+    WEATHER_INFO: ("offices_code", "publishing_office", "report_datetime", "area_name", "time_define",
+                   "weather_code", "weather", "wind", "wave"),
+    WEATHER_POPS: ("offices_code", "publishing_office", "report_datetime", "area_name", "time_define", "pop"),
+    WEATHER_TEMPS: ("offices_code", "publishing_office", "report_datetime", "area_name", "time_define", "temp"),
+    WEATHER_RELIABILITIES: ("offices_code", "publishing_office", "report_datetime", "area_name", "time_define",
+                            "weather_code", "pop", "reliabilities"),
+    WEATHER_TT: ("offices_code", "publishing_office", "report_datetime", "area_name", "time_define",
+                 "temps_min", "temps_min_upper", "temps_min_lower",
+                 "temps_max", "temps_max_upper", "temps_max_lower"),
+    WEATHER_TEMP_AVE: ("offices_code", "publishing_office", "report_datetime", "area_name",
+                       "temps_ave_min", "temps_ave_max"),
+    WEATHER_POP_AVE: ("offices_code", "publishing_office", "report_datetime", "area_name",
+                      "temps_pop_min", "temps_pop_max"),
+}
+
+# save_weather_to_db の need と出力先テーブルの対応
+NEED_TABLES = {
+    "weather": WEATHER_INFO,
+    "pop": WEATHER_POPS,
+    "temp": WEATHER_TEMPS,
+    "reliabilities": WEATHER_RELIABILITIES,
+}
+
+# 週間気温の値が欠けていることを表す文字列
+NO_INFO = "情報なし"
+
+# 週間気温のキー（weather_tt の列の順）
+_TT_KEYS = ("tempsMin", "tempsMinUpper", "tempsMinLower", "tempsMax", "tempsMaxUpper", "tempsMaxLower")
+
+# 既定値として使う空のコンテナ（呼び出しごとに新しく作らない）
+_EMPTY_LIST = ()
+_EMPTY_DICT = {}
+
+
+def to_number(value):
+    """予報の値（文字列）を float に変換（空文字・None・「情報なし」など数値でない値は None）"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _normalize_time_series(entry):
+    """timeSeries を走査して weather_info / pops / temps / reliabilities の行を生成"""
+    publishing_office = entry.get("publishingOffice", "不明")
+    report_datetime = entry.get("reportDatetime", "不明")
+
+    for series in entry.get("timeSeries", _EMPTY_LIST):
+        time_defines = series.get("timeDefines", _EMPTY_LIST)
+        for area in series.get("areas", _EMPTY_LIST):
+            weathers = area.get("weathers", _EMPTY_LIST)
+            pops = area.get("pops", _EMPTY_LIST)
+            temps = area.get("temps", _EMPTY_LIST)
+            reliabilities = area.get("reliabilities", _EMPTY_LIST)
+            n_weathers, n_pops, n_temps, n_reliabilities = len(weathers), len(pops), len(temps), len(reliabilities)
+            # どのテーブルにも行を出さない地域（週間気温など）は読み飛ばす
+            if not (n_weathers or n_pops or n_temps or n_reliabilities):
+                continue
+
+            area_info = area.get("area", _EMPTY_DICT)
+            area_name = area_info.get("name", "不明")
+            area_code = area_info.get("code", "不明")
+            weather_codes = area.get("weatherCodes", _EMPTY_LIST)
+            winds = area.get("winds", _EMPTY_LIST)
+            waves = area.get("waves", _EMPTY_LIST)
+            n_codes, n_winds, n_waves = len(weather_codes), len(winds), len(waves)
+
+            # 足りない要素は None として扱う（入力のリストは変更しない）
+            for idx, time_define in enumerate(time_defines):
+                weather = weathers[idx] if idx < n_weathers else None
+                pop = pops[idx] if idx < n_pops else None
+                temp = temps[idx] if idx < n_temps else None
+                reliability = reliabilities[idx] if idx < n_reliabilities else None
+
+                if weather is not None:
+                    yield WEATHER_INFO, (
+                        area_code, publishing_office, report_datetime, area_name, time_define,
+                        weather_codes[idx] if idx < n_codes else None,
+                        weather,
+                        winds[idx] if idx < n_winds else None,
+                        waves[idx] if idx < n_waves else None,
+                    )
+                if pop is not None and reliability is None:
+                    yield WEATHER_POPS, (area_code, publishing_office, report_datetime, area_name, time_define, pop)
+                if temp is not None:
+                    yield WEATHER_TEMPS, (area_code, publishing_office, report_datetime, area_name, time_define, temp)
+                if reliability is not None:
+                    yield WEATHER_RELIABILITIES, (
+                        area_code, publishing_office, report_datetime, area_name, time_define,
+                        weather_codes[idx] if idx < n_codes else None,
+                        pop,
+                        reliability,
+                    )
+
+
+def _normalize_weekly(entry):
+    """週間予報から weather_tt / weather_temp_ave / weather_pop_ave の行を生成"""
+    publishing_office = entry.get("publishingOffice", "不明")
+    report_datetime = entry.get("reportDatetime", "不明")
+
+    for series in entry.get("timeSeries", _EMPTY_LIST):
+        time_defines = series.get("timeDefines", _EMPTY_LIST)
+        for area in series.get("areas", _EMPTY_LIST):
+            temps_min = area.get("tempsMin", _EMPTY_LIST)
+            temps_min_upper = area.get("tempsMinUpper", _EMPTY_LIST)
+            temps_min_lower = area.get("tempsMinLower", _EMPTY_LIST)
+            temps_max = area.get("tempsMax", _EMPTY_LIST)
+            temps_max_upper = area.get("tempsMaxUpper", _EMPTY_LIST)
+            temps_max_lower = area.get("tempsMaxLower", _EMPTY_LIST)
+            # 1つでも欠けている日は「情報なし」として除外されるため、最短の長さまでを見ればよい
+            count = min(len(time_defines), len(temps_min), len(temps_min_upper), len(temps_min_lower),
+                        len(temps_max), len(temps_max_upper), len(temps_max_lower))
+            if not count:
+                continue
+
+            area_info = area.get("area", _EMPTY_DICT)
+            area_name = area_info.get("name", "不明")
+            area_code = area_info.get("code", "不明")
+            for idx in range(count):
+                values = (temps_min[idx], temps_min_upper[idx], temps_min_lower[idx],
+                          temps_max[idx], temps_max_upper[idx], temps_max_lower[idx])
+                if NO_INFO in values:
+                    continue
+                yield WEATHER_TT, (area_code, publishing_office, report_datetime, area_name, time_defines[idx]) + values
+
+    for table_name, key in ((WEATHER_TEMP_AVE, "tempAverage"), (WEATHER_POP_AVE, "precipAverage")):
+        for area in entry.get(key, _EMPTY_DICT).get("areas", _EMPTY_LIST):
+            minimum = area.get("min", NO_INFO)
+            maximum = area.get("max", NO_INFO)
+            if minimum == NO_INFO or maximum == NO_INFO:
+                continue
+            area_info = area.get("area", _EMPTY_DICT)
+            yield table_name, (area_info.get("code", "不明"), publishing_office, report_datetime,
+                               area_info.get("name", "不明"), minimum, maximum)
+
+
+def normalize_forecast(weather_data):
+    """予報ドキュメントを1回走査し、(テーブル名, 行タプル) を順に生成
+
+    Args:
+        weather_data (list): forecast/{office}.json を解析したリスト
+
+    Yields:
+        tuple: (テーブル名, TABLE_COLUMNS の順に並んだ行タプル)
+    """
+    if not weather_data or not isinstance(weather_data, list):
+        return
+    for entry in weather_data:
+        yield from _normalize_time_series(entry)
+    # 週間予報（2番目の要素）の気温と平均値
+    if len(weather_data) > 1:
+        yield from _normalize_weekly(weather_data[1])
+
+
+def normalize_forecast_tables(weather_data):
+    """予報ドキュメントをテーブルごとの行リストに展開
+
+    Returns:
+        dict: テーブル名をキーとする行タプルのリスト（全テーブルのキーを含む）
+    """
+    tables = {table_name: [] for table_name in TABLE_COLUMNS}
+    appenders = {table_name: rows.append for table_name, rows in tables.items()}
+    for table_name, row in normalize_forecast(weather_data):
+        appenders[table_name](row)
+    return tables
@@ -0,0 +1,97 @@
+"""weather_info の天気・風・波の文に対する全文検索（FTS5）
+
+「くもり　時々　雪」のような日本語の文は単語の区切りが無いため、2文字ずつの組（bigram）を
+語として索引に入れる。
+
+- 文は NFKC で正規化し（全角の数字・空白を半角にする）、文字と数字以外の文字で区切る
+- 区切った部分ごとに、2文字の組と末尾の1文字を空白区切りの語にして FTS5（unicode61）に入れる
+  例: 「くもり　時々　雪」→「くも もり り 時々 々 雪」
+- 検索語は同じ規則で語に分け、2文字以上の部分は語の並び（フレーズ）、1文字の部分は前方一致で探す
+  （1文字は、その文字で始まる組か末尾の1文字のどちらかとして必ず索引にある）
+
+SQLite 標準の trigram トークナイザは3文字未満の検索語（「雪」「時々」）を扱えないため使わない。
+索引の行の rowid は weather_info の id と同じにし、取り込みのコミット前に sync_search_index で
+追加・削除された行だけを反映する（weather_info の id は AUTOINCREMENT なので、新しい行は常に
+索引済みの最大の id より大きい）。
+"""
+import unicodedata
+
+SEARCH_TABLE = "weather_text_fts"
+SEARCH_COLUMNS = ("weather", "wind", "wave")
+
+
+def initialize_search_index(connection):
+    """検索用のテーブルを作成し、未反映の行を索引に入れる（呼び出し側でコミットする）"""
+    connection.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE}
+        USING fts5({", ".join(SEARCH_COLUMNS)}, tokenize='unicode61 remove_diacritics 0')
+    """)
+    sync_search_index(connection)
+
+
+def text_segments(text):
+    """正規化した文を、文字と数字だけの部分に分ける"""
+    segments = []
+    current = []
+    for char in unicodedata.normalize("NFKC", text or "").lower():
+        if char.isalnum():
+            current.append(char)
+        elif current:
+            segments.append("".join(current))
+            current = []
+    if current:
+        segments.append("".join(current))
+    return segments
+
+
+def segment_terms(segment):
+    """部分を2文字の組と末尾の1文字に分ける"""
+    return [segment[i:i + 2] for i in range(len(segment) - 1)] + [segment[-1]]
+
+
+def index_text(text):
+    """索引に入れる文（空白区切りの語）"""
+    return " ".join(term for segment in text_segments(text) for term in segment_terms(segment))
+
+
+def build_match_query(query, columns=SEARCH_COLUMNS):
+    """検索語から FTS5 の MATCH 式を作成（空白で区切った語は全て含むものを探す）
+
+    Returns:
+        str: MATCH 式（検索できる文字が無い場合は None）
+    """
+    expressions = []
+    for segment in text_segments(query):
+        if len(segment) == 1:
+            expressions.append(f'"{segment}"*')
+        else:
+            # 末尾の1文字は不要（最後の組に含まれる）
+            expressions.append('"' + " ".join(segment_terms(segment)[:-1]) + '"')
+    if not expressions:
+        return None
+    return f"{{{' '.join(columns)}}} : ({' AND '.join(expressions)})"
+
+
+def sync_search_index(connection):
+    """weather_info の追加・削除を索引に反映（呼び出し側でコミットする）
+
+    Returns:
+        int: 索引に追加した行の数
+    """
+    connection.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid NOT IN (SELECT id FROM weather_info)")
+    last_id = connection.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {SEARCH_TABLE}").fetchone()[0]
+    rows = connection.execute(
+        f"SELECT id, {', '.join(SEARCH_COLUMNS)} FROM weather_info WHERE id > ?", (last_id,)
+    ).fetchall()
+    connection.executemany(
+        f"INSERT INTO {SEARCH_TABLE} (rowid, {', '.join(SEARCH_COLUMNS)}) VALUES (?, ?, ?, ?)",
+        [(row[0],) + tuple(index_text(value) for value in row[1:]) for row in rows]
+    )
+    return len(rows)
+
+
+def rebuild_search_index(connection):
+    """索引を作り直す（再処理用）"""
+    connection.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+    initialize_search_index(connection)
+    connection.commit()
@@ -0,0 +1,199 @@
+"""降水確率・気温の値を数値の列で持つ、全地域を対象にした条件検索用のテーブル
+
+weather_pops / weather_temps / weather_tt の値は文字列（空文字を含む）で、気温は観測地点ごとの行のため、
+「24時間以内に降水確率が70%以上の地域」のような検索は地域ごとに読み込むしかない。
+取り込み時にこれらの行を weather_values（種類, 日時, 数値, class10_id）に展開し、
+(種類, 日時, 値) と (種類, 値) の索引で範囲の条件と上位の件数を検索できるようにする。
+
+- 降水確率（pop）は weather_pops の地域（class10）の行をそのまま使う
+- 気温（temp: 3日間の気温、temp_min / temp_max: 週間の最低・最高気温）は観測地点の行を、
+  画面と同じ規則（地点名を class20s_name に部分一致させる）で class10 の地域ごとの行にする
+- 数値でない値（空文字など）は入れない
+
+行は元の行の id（source_id）を持ち、取り込みのコミット前に sync_value_index で追加・削除された行だけを
+反映する（元のテーブルの id は AUTOINCREMENT なので、新しい行は常に反映済みの最大の id より大きい）。
+"""
+from datetime import datetime, timedelta, timezone
+
+VALUE_POP = "pop"
+VALUE_TEMP = "temp"
+VALUE_TEMP_MIN = "temp_min"
+VALUE_TEMP_MAX = "temp_max"
+VALUE_KINDS = (VALUE_POP, VALUE_TEMP, VALUE_TEMP_MIN, VALUE_TEMP_MAX)
+
+# 元のテーブルごとの (種類, 値の列)
+VALUE_SOURCES = {
+    "weather_pops": ((VALUE_POP, "pop"),),
+    "weather_temps": ((VALUE_TEMP, "temp"),),
+    "weather_tt": ((VALUE_TEMP_MIN, "temps_min"), (VALUE_TEMP_MAX, "temps_max")),
+}
+# 地域（class10）の行を持つテーブル（それ以外は観測地点の行）
+CLASS10_SOURCES = ("weather_pops",)
+
+# time_define は日本時間の ISO 形式（+09:00）なので、比較する日時も同じ形にする
+JST = timezone(timedelta(hours=9))
+
+
+def numeric_condition(column):
+    """文字列の列が数値（符号・小数点を含む）かどうかの条件"""
+    return (f"({column} <> '' AND {column} GLOB '*[0-9]*' AND NOT {column} GLOB '*[^0-9.+-]*')")
+
+
+def initialize_value_table(connection):
+    """条件検索用のテーブルを作成し、未反映の行を入れる（呼び出し側でコミットする）"""
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS weather_values (
+            kind TEXT,
+            time_define TEXT,
+            value REAL,
+            class10_id TEXT,
+            area_name TEXT,
+            report_datetime TEXT,
+            source TEXT,
+            source_id INTEGER
+        )
+    """)
+    connection.execute(
+        "CREATE INDEX IF NOT EXISTS idx_weather_values_kind_time_value ON weather_values (kind, time_define, value)"
+    )
+    # 日時の範囲を指定しない上位 k 件の検索用
+    connection.execute(
+        "CREATE INDEX IF NOT EXISTS idx_weather_values_kind_value ON weather_values (kind, value, time_define)"
+    )
+    connection.execute("CREATE INDEX IF NOT EXISTS idx_weather_values_source ON weather_values (source, source_id)")
+    sync_value_index(connection)
+
+
+def sync_value_index(connection):
+    """元のテーブルの追加・削除を weather_values に反映（呼び出し側でコミットする）
+
+    Returns:
+        int: 追加した行の数
+    """
+    # WITH … INSERT では cursor.rowcount が -1 になるため、変更件数の差分で数える
+    before = connection.total_changes
+    deleted = 0
+    # 初回の取り込みでは areas や weather_tt を作成する前にも呼ばれるため、まだ無いテーブルは飛ばす
+    tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for source, values in VALUE_SOURCES.items():
+        if source not in tables or (source not in CLASS10_SOURCES and "areas" not in tables):
+            continue
+        deleted += connection.execute(
+            f"DELETE FROM weather_values WHERE source = ? AND source_id NOT IN (SELECT id FROM {source})", (source,)
+        ).rowcount
+        last_id = connection.execute(
+            "SELECT COALESCE(MAX(source_id), 0) FROM weather_values WHERE source = ?", (source,)
+        ).fetchone()[0]
+        for kind, column in values:
+            if source in CLASS10_SOURCES:
+                connection.execute(f"""
+                    INSERT INTO weather_values (kind, time_define, value, class10_id, area_name, report_datetime,
+                                                source, source_id)
+                    SELECT ?, s.time_define, CAST(s.{column} AS REAL), s.offices_code, s.area_name, s.report_datetime,
+                           ?, s.id
+                    FROM {source} s
+                    WHERE s.id > ? AND {numeric_condition("s." + column)}
+                """, (kind, source, last_id))
+            else:
+                # 地点名ごとに一致する地域を先に求めてから結合する（database_manager の MATCHED_AREAS_SQL と同じ規則）
+                connection.execute(f"""
+                    WITH names AS (
+                        SELECT DISTINCT area_name FROM {source} WHERE id > ?
+                    ), m AS (
+                        SELECT DISTINCT names.area_name, a.class10s_id
+                        FROM names
+                        JOIN areas a ON a.class20s_name LIKE '%' || names.area_name || '%'
+                    )
+                    INSERT INTO weather_values (kind, time_define, value, class10_id, area_name, report_datetime,
+                                                source, source_id)
+                    SELECT ?, s.time_define, CAST(s.{column} AS REAL), m.class10s_id, s.area_name, s.report_datetime,
+                           ?, s.id
+                    FROM {source} s
+                    JOIN m ON m.area_name = s.area_name
+                    WHERE s.id > ? AND {numeric_condition("s." + column)}
+                """, (last_id, kind, source, last_id))
+    return connection.total_changes - before - deleted
+
+
+def rebuild_value_index(connection):
+    """weather_values を作り直す（再処理用・地域データの更新後）"""
+    connection.execute("DROP TABLE IF EXISTS weather_values")
+    initialize_value_table(connection)
+    connection.commit()
+
+
+def time_window(hours=None, date=None, now=None):
+    """検索する日時の範囲（time_define と比較できる文字列）
+
+    Args:
+        hours (float): 現在から何時間後までか
+        date (str): 日付（YYYY-MM-DD）。その日の0時から翌日の0時まで
+
+    Returns:
+        tuple: (開始, 終了)。指定が無い場合は (None, None)
+    """
+    if date:
+        start = datetime.fromisoformat(date).replace(tzinfo=JST)
+        return start.isoformat(), (start + timedelta(days=1)).isoformat()
+    if hours:
+        now = (now or datetime.now(JST)).astimezone(JST).replace(microsecond=0)
+        return now.isoformat(), (now + timedelta(hours=hours)).isoformat()
+    return None, None
+
+
+def build_threshold_query(kind, min_value=None, max_value=None, start=None, end=None, descending=True,
+                          limit=None, per_area=False):
+    """条件検索の SQL と変数を作成
+
+    Args:
+        kind (str): 値の種類（VALUE_KINDS）
+        min_value (float): 値の下限（以上）
+        max_value (float): 値の上限（未満）
+        start (str): 日時の下限（以上、time_define と同じ ISO 形式）
+        end (str): 日時の上限（未満）
+        descending (bool): True は値の大きい順、False は小さい順
+        limit (int): 返す行の数（上位 k 件）
+        per_area (bool): True の場合、地域ごとに1行（大きい順なら最大、小さい順なら最小の値の行）にまとめる
+
+    Returns:
+        tuple: (SQL, 変数)
+    """
+    if kind not in VALUE_KINDS:
+        raise ValueError(f"値の種類が不正です: {kind}")
+    where = ["kind = ?"]
+    params = [kind]
+    if start:
+        where.append("time_define >= ?")
+        params.append(start)
+    if end:
+        where.append("time_define < ?")
+        params.append(end)
+    if min_value is not None:
+        where.append("value >= ?")
+        params.append(min_value)
+    if max_value is not None:
+        where.append("value < ?")
+        params.append(max_value)
+    direction = "DESC" if descending else "ASC"
+
+    if per_area:
+        # MAX / MIN と同時に選んだ列は、その値を持つ行の値になる（SQLite の集約の仕様）
+        aggregate = "MAX" if descending else "MIN"
+        sql = f"""
+            SELECT kind, class10_id, area_name, time_define, {aggregate}(value) AS value, report_datetime
+            FROM weather_values
+            WHERE {" AND ".join(where)}
+            GROUP BY class10_id
+            ORDER BY value {direction}, time_define, class10_id
+        """
+    else:
+        sql = f"""
+            SELECT kind, class10_id, area_name, time_define, value, report_datetime
+            FROM weather_values
+            WHERE {" AND ".join(where)}
+            ORDER BY value {direction}, time_define, class10_id, area_name
+        """
+    if limit:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+    return sql, params
@@ -0,0 +1,304 @@
+"""履歴アーカイブを使った予報の検証
+
+同じ対象時刻（time_define）に対する発表ごとの予報を並べ、次の統計をNumPyでまとめて計算する。
+
+- 修正量: 前回の発表からの値の変化（オフィス・リードタイム別）
+- 最終値との差: 各発表の値と、最後の（最もリードタイムの短い）発表の値との差
+- 週間予報の検証: 週間予報の降水確率（信頼度別）と気温の予測範囲を、
+  後から発表された短期予報の値と比較
+
+結果は region_data.db の verification_revisions / verification_weekly に保存し、
+画面からは DatabaseManager で即座に読み出せるようにする。
+"""
+from datetime import datetime
+
+import numpy as np
+
+from db_connection import open_write_connection
+from forecast_archive import ForecastArchive
+from forecast_normalizer import to_number
+
+# リードタイム（時間）の区切り（対象時刻が発表日時より前の予報は "<0h" に分ける）
+LEAD_BINS = np.array([0, 6, 12, 24, 48, 72, 120, 168])
+LEAD_LABELS = ["<0h", "0-6h", "6-12h", "12-24h", "24-48h", "48-72h", "72-120h", "120-168h", "168h-"]
+
+# 短期予報の気温の時刻（00:00 は朝の最低気温、09:00 は日中の最高気温）
+SHORT_TEMP_MIN_HOUR = 0
+SHORT_TEMP_MAX_HOUR = 9
+
+
+def initialize_verification_tables(connection):
+    """検証結果を保存するテーブルを作成"""
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS verification_revisions (
+            office_id TEXT,
+            variable TEXT,
+            metric TEXT,
+            lead_time TEXT,
+            count INTEGER,
+            mean REAL,
+            mean_abs REAL,
+            rms REAL,
+            computed_at TEXT
+        )
+    """)
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS verification_weekly (
+            office_id TEXT,
+            variable TEXT,
+            grade TEXT,
+            count INTEGER,
+            mae REAL,
+            bias REAL,
+            hit_rate REAL,
+            computed_at TEXT
+        )
+    """)
+    connection.commit()
+
+
+def to_float_array(values):
+    """文字列の値を float 配列に変換（空文字・None・「情報なし」など数値でない値は NaN）"""
+    return np.array([to_number(value) for value in values], dtype=float)
+
+
+def to_datetime_array(values):
+    """ISO形式の日時文字列を datetime64 配列に変換（タイムゾーン部分は全て +09:00 のため切り捨てる）"""
+    return np.array(values, dtype="U19").astype("datetime64[s]")
+
+
+def encode(*arrays):
+    """複数の文字列配列を共通の語彙で整数にエンコード
+
+    Returns:
+        tuple: (語彙の配列, エンコード後の配列のリスト)
+    """
+    vocabulary, inverse = np.unique(np.concatenate([np.asarray(a, dtype=str) for a in arrays]), return_inverse=True)
+    encoded = []
+    offset = 0
+    for array in arrays:
+        encoded.append(inverse[offset:offset + len(array)])
+        offset += len(array)
+    return vocabulary, encoded
+
+
+def load_history(archive, table_name, value_columns):
+    """アーカイブから履歴の行を列ごとの配列として読み込む"""
+    columns = ["office_id", "offices_code", "report_datetime", "time_define"] + list(value_columns)
+    rows = list(archive.iter_history(table_name, columns))
+    if not rows:
+        return None
+    data = {name: np.array(values, dtype=object) for name, values in zip(columns, zip(*rows))}
+    data["report_datetime"] = to_datetime_array(data["report_datetime"])
+    data["time_define"] = to_datetime_array(data["time_define"])
+    for name in value_columns:
+        if name != "reliabilities":
+            data[name] = to_float_array(data[name])
+    return data
+
+
+def grouped_statistics(group, values, group_count):
+    """グループごとの件数・平均・平均絶対値・二乗平均平方根を計算"""
+    count = np.bincount(group, minlength=group_count)
+    total = np.bincount(group, weights=values, minlength=group_count)
+    total_abs = np.bincount(group, weights=np.abs(values), minlength=group_count)
+    total_sq = np.bincount(group, weights=values * values, minlength=group_count)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return count, total / count, total_abs / count, np.sqrt(total_sq / count)
+
+
+def revision_statistics(data, value_column):
+    """同じ地域・対象時刻の発表を並べ、修正量と最終値との差をオフィス・リードタイム別に集計
+
+    Returns:
+        list: verification_revisions の行（computed_at を除く）
+    """
+    value = data[value_column]
+    valid = ~np.isnan(value)
+    offices, (office,) = encode(data["office_id"][valid])
+    _, (area,) = encode(data["offices_code"][valid])
+    report = data["report_datetime"][valid]
+    target = data["time_define"][valid]
+    value = value[valid]
+    if len(value) == 0:
+        return []
+
+    # 地域 → 対象時刻 → 発表日時 の順に並べる
+    order = np.lexsort((report, target, area))
+    office, area, report, target, value = office[order], area[order], report[order], target[order], value[order]
+    lead_hours = (target - report) / np.timedelta64(1, "h")
+    bucket = np.digitize(lead_hours, LEAD_BINS)
+    bucket_count = len(LEAD_LABELS)
+    group_count = len(offices) * bucket_count
+
+    results = []
+    # 修正量: 同じ地域・対象時刻で連続する発表の差（新しい方の発表のリードタイムで集計）
+    same = (area[1:] == area[:-1]) & (target[1:] == target[:-1])
+    revision = (value[1:] - value[:-1])[same]
+    group = (office[1:] * bucket_count + bucket[1:])[same]
+    results.extend(_statistics_rows(offices, "revision", value_column, group, revision, group_count))
+
+    # 最終値との差: 各グループの最後の発表を基準にする
+    is_last = np.ones(len(value), dtype=bool)
+    is_last[:-1] = ~same
+    last_index = np.flatnonzero(is_last)
+    group_last = last_index[np.searchsorted(last_index, np.arange(len(value)))]
+    error = (value - value[group_last])[~is_last]
+    group = (office * bucket_count + bucket)[~is_last]
+    results.extend(_statistics_rows(offices, "error_vs_final", value_column, group, error, group_count))
+    return results
+
+
+def _statistics_rows(offices, metric, variable, group, values, group_count):
+    count, mean, mean_abs, rms = grouped_statistics(group, values, group_count)
+    bucket_count = len(LEAD_LABELS)
+    rows = []
+    for index in np.flatnonzero(count):
+        office_index, bucket = divmod(int(index), bucket_count)
+        rows.append((offices[office_index], variable, metric, LEAD_LABELS[bucket],
+                     int(count[index]), float(mean[index]), float(mean_abs[index]), float(rms[index])))
+    return rows
+
+
+def latest_by_key(key, report, *values):
+    """キーごとに最新の発表の値だけを残す
+
+    Returns:
+        tuple: (ソート済みの一意なキー, 最新の発表日時, 各値の配列...)
+    """
+    order = np.lexsort((report, key))
+    key, report = key[order], report[order]
+    is_last = np.ones(len(key), dtype=bool)
+    is_last[:-1] = key[1:] != key[:-1]
+    return (key[is_last], report[is_last]) + tuple(v[order][is_last] for v in values)
+
+
+def day_key(area, day, area_count):
+    """地域と日付を1つの整数キーにまとめる"""
+    return day.astype("datetime64[D]").astype(np.int64) * area_count + area
+
+
+def match_later(weekly_key, weekly_report, short_key, short_report):
+    """週間予報の各行に対応する、それより後の短期予報の位置を求める（無い場合は -1）"""
+    if len(short_key) == 0:
+        return np.full(len(weekly_key), -1)
+    position = np.minimum(np.searchsorted(short_key, weekly_key), len(short_key) - 1)
+    found = (short_key[position] == weekly_key) & (short_report[position] > weekly_report)
+    return np.where(found, position, -1)
+
+
+def weekly_pop_statistics(weekly, pops):
+    """週間予報の降水確率を、後の短期予報の日最大降水確率と信頼度別に比較"""
+    _, (weekly_area, short_area) = encode(weekly["offices_code"], pops["offices_code"])
+    area_count = int(max(weekly_area.max(initial=0), short_area.max(initial=0))) + 1
+
+    # 短期予報: 発表ごとの日最大値を求め、その日について最新の発表の値を使う
+    short_pop = pops["pop"]
+    valid = ~np.isnan(short_pop)
+    key = day_key(short_area[valid], pops["time_define"][valid], area_count)
+    report = pops["report_datetime"][valid]
+    report_seconds = report.astype(np.int64)
+    order = np.lexsort((report_seconds, key))
+    key, report, short_pop = key[order], report[order], short_pop[valid][order]
+    starts = np.flatnonzero(np.r_[True, (key[1:] != key[:-1]) | (report[1:] != report[:-1])])
+    daily_max = np.maximum.reduceat(short_pop, starts) if len(starts) else short_pop
+    short_key, short_report, short_daily = latest_by_key(key[starts], report[starts], daily_max)
+
+    weekly_pop = weekly["pop"]
+    valid = ~np.isnan(weekly_pop)
+    weekly_key = day_key(weekly_area[valid], weekly["time_define"][valid], area_count)
+    position = match_later(weekly_key, weekly["report_datetime"][valid], short_key, short_report)
+    matched = position >= 0
+    error = weekly_pop[valid][matched] - short_daily[position[matched]]
+    grades = np.where(weekly["reliabilities"][valid][matched] == "", "-", weekly["reliabilities"][valid][matched])
+    return _weekly_rows(weekly["office_id"][valid][matched], grades.astype(str), "pop", error, None)
+
+
+def weekly_temp_statistics(weekly_tt, temps):
+    """週間予報の最低・最高気温（予測範囲）を、後の短期予報の気温と比較"""
+    _, (weekly_area, short_area) = encode(weekly_tt["offices_code"], temps["offices_code"])
+    area_count = int(max(weekly_area.max(initial=0), short_area.max(initial=0))) + 1
+    hours = (temps["time_define"] - temps["time_define"].astype("datetime64[D]")) / np.timedelta64(1, "h")
+
+    rows = []
+    for variable, hour, center, lower, upper in (
+        ("temps_min", SHORT_TEMP_MIN_HOUR, "temps_min", "temps_min_lower", "temps_min_upper"),
+        ("temps_max", SHORT_TEMP_MAX_HOUR, "temps_max", "temps_max_lower", "temps_max_upper"),
+    ):
+        valid = (hours == hour) & ~np.isnan(temps["temp"])
+        key = day_key(short_area[valid], temps["time_define"][valid], area_count)
+        short_key, short_report, short_value = latest_by_key(key, temps["report_datetime"][valid], temps["temp"][valid])
+
+        predicted = weekly_tt[center]
+        valid = ~np.isnan(predicted)
+        weekly_key = day_key(weekly_area[valid], weekly_tt["time_define"][valid], area_count)
+        position = match_later(weekly_key, weekly_tt["report_datetime"][valid], short_key, short_report)
+        matched = position >= 0
+        observed = short_value[position[matched]]
+        error = predicted[valid][matched] - observed
+        with np.errstate(invalid="ignore"):
+            hit = (weekly_tt[lower][valid][matched] <= observed) & (observed <= weekly_tt[upper][valid][matched])
+        grades = np.full(int(matched.sum()), "-")
+        rows.extend(_weekly_rows(weekly_tt["office_id"][valid][matched], grades, variable, error, hit))
+    return rows
+
+
+def _weekly_rows(office_ids, grades, variable, error, hit):
+    """オフィス・信頼度別に誤差を集計して verification_weekly の行を作成"""
+    if len(error) == 0:
+        return []
+    labels, (group,) = encode(np.char.add(np.char.add(office_ids.astype(str), "|"), grades))
+    count, bias, mae, _ = grouped_statistics(group, error, len(labels))
+    hit_rate = None
+    if hit is not None:
+        hit_rate = np.bincount(group, weights=hit.astype(float), minlength=len(labels)) / count
+    rows = []
+    for index, label in enumerate(labels):
+        office_id, grade = label.split("|")
+        rows.append((office_id, variable, grade, int(count[index]), float(mae[index]), float(bias[index]),
+                     float(hit_rate[index]) if hit_rate is not None else None))
+    return rows
+
+
+def update_verification_summary(db_path, archive_dir):
+    """アーカイブから検証統計を計算し、データベースの集計テーブルを置き換える
+
+    Returns:
+        tuple: (verification_revisions の行数, verification_weekly の行数)
+    """
+    archive = ForecastArchive(archive_dir)
+    pops = load_history(archive, "weather_pops", ["pop"])
+    temps = load_history(archive, "weather_temps", ["temp"])
+    weekly = load_history(archive, "weather_reliabilities", ["pop", "reliabilities"])
+    weekly_tt = load_history(archive, "weather_tt", ["temps_min", "temps_min_upper", "temps_min_lower",
+                                                      "temps_max", "temps_max_upper", "temps_max_lower"])
+
+    revision_rows = []
+    if pops is not None:
+        revision_rows.extend(revision_statistics(pops, "pop"))
+    if temps is not None:
+        revision_rows.extend(revision_statistics(temps, "temp"))
+    weekly_rows = []
+    if weekly is not None and pops is not None:
+        weekly_rows.extend(weekly_pop_statistics(weekly, pops))
+    if weekly_tt is not None and temps is not None:
+        weekly_rows.extend(weekly_temp_statistics(weekly_tt, temps))
+
+    computed_at = datetime.now().isoformat()
+    connection = open_write_connection(db_path)
+    try:
+        initialize_verification_tables(connection)
+        connection.execute("DELETE FROM verification_revisions")
+        connection.execute("DELETE FROM verification_weekly")
+        connection.executemany(
+            "INSERT INTO verification_revisions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [row + (computed_at,) for row in revision_rows]
+        )
+        connection.executemany(
+            "INSERT INTO verification_weekly VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [row + (computed_at,) for row in weekly_rows]
+        )
+        connection.commit()
+    finally:
+        connection.close()
+    return len(revision_rows), len(weekly_rows)
@@ -0,0 +1,146 @@
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+
+
+class CircuitBreaker:
+    """ホスト単位のサーキットブレーカー
+
+    連続して failure_threshold 回失敗すると open になり、reset_timeout 秒の間は
+    リクエストを送らずに即座に失敗させる。時間経過後は1件だけ試行を許可し（half-open）、
+    成功すれば closed に戻る。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """リクエストを送ってよいかを判定"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                # 試行は1件だけ許可する
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class ResilientClient:
+    """リトライ・指数バックオフ・サーキットブレーカー付きのHTTPクライアント"""
+
+    # リトライ対象のステータスコード
+    RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+    def __init__(self, max_retries=3, backoff_base=0.5, backoff_max=8.0, timeout=10.0,
+                 failure_threshold=5, reset_timeout=30.0):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.breakers = {}
+        self._lock = threading.Lock()
+
+    def get_breaker(self, url):
+        """URLのホストに対応するサーキットブレーカーを取得"""
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self.breakers:
+                self.breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return self.breakers[host]
+
+    def backoff_delay(self, attempt):
+        """ジッター付き指数バックオフの待ち時間（full jitter）"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def get(self, url, deadline=None):
+        """GETリクエストを送信し、成功したレスポンスを返す
+
+        Args:
+            url (str): 取得するURL
+            deadline (float): time.monotonic() 基準の締め切り時刻。超えた場合は諦める
+
+        Returns:
+            requests.Response: 成功時のレスポンス。失敗時は None
+        """
+        breaker = self.get_breaker(url)
+
+        for attempt in range(self.max_retries + 1):
+            timeout = self.timeout
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    print(f"[ERROR] 締め切り時刻を超えたため取得を中止しました: {url}")
+                    return None
+                timeout = min(timeout, remaining)
+
+            if not breaker.allow_request():
+                print(f"[ERROR] サーキットブレーカーが作動中のため取得をスキップしました: {url}")
+                return None
+
+            retryable = True
+            try:
+                response = requests.get(url, timeout=timeout)
+                if response.status_code == 200:
+                    breaker.record_success()
+                    return response
+                print(f"[ERROR] 取得失敗: ステータスコード {response.status_code} ({url})")
+                retryable = response.status_code in self.RETRY_STATUS_CODES
+            except Exception as e:
+                print(f"[EXCEPTION] 取得中にエラー発生: {e} ({url})")
+
+            if not retryable:
+                # 4xx はサーバーが応答しているので障害には数えず、ブレーカーを閉じる
+                # （half-open の試行が 4xx だった場合に、次のリクエストを止めたままにしない）
+                breaker.record_success()
+                return None
+            breaker.record_failure()
+
+            if attempt < self.max_retries:
+                delay = self.backoff_delay(attempt)
+                if deadline is not None:
+                    delay = min(delay, max(0.0, deadline - time.monotonic()))
+                time.sleep(delay)
+
+        return None
+
+    def get_json(self, url, deadline=None):
+        """GETリクエストを送信し、JSONを返す（失敗時は None）"""
+        response = self.get(url, deadline=deadline)
+        if response is None:
+            return None
+        try:
+            return response.json()
+        except ValueError as e:
+            print(f"[ERROR] JSONの解析に失敗しました: {e} ({url})")
+            return None
+
+
+# アプリ全体で共有するクライアント（ブレーカーの状態をホスト単位で共有する）
+default_client = ResilientClient()
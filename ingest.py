@@ -0,0 +1,849 @@
+import json
+import os
+import queue
+import sqlite3
+import subprocess
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from db_connection import open_write_connection
+from db_creater import RegionDataManager, WeatherDataManager, WeatherDataFetcher, area_content_hash
+from forecast_alerts import changed_value_keys, evaluate_alert_rules, initialize_alert_tables
+from forecast_archive import ARCHIVE_RETENTION_MONTHS, ForecastArchive
+from forecast_diff import diff_office, initialize_diff_table, save_office_diff, snapshot_area_codes
+from forecast_json1 import (derive_office_tables, initialize_json1_schema, load_office_tables, office_area_codes,
+                            store_raw_forecast)
+from forecast_normalizer import normalize_forecast_tables
+from forecast_search import initialize_search_index, sync_search_index
+from forecast_values import initialize_value_table, rebuild_value_index, sync_value_index
+from http_client import default_client
+from profiling import profile_hook
+from raw_archive import RawArchive
+from region_overview import initialize_overview_table, load_overview_offices, update_office_overview
+
+# データベースのパス（別の場所で作成したデータベースを読む場合は WEATHER_DB_PATH で指定）
+DB_PATH = os.environ.get("WEATHER_DB_PATH", "region_data.db")
+
+# 天気データのテーブル構造
+TABLE_STRUCTURE = {
+    "weather_info": [
+        ("offices_code", "TEXT"),
+        ("publishing_office", "TEXT"),
+        ("report_datetime", "TEXT"),
+        ("area_name", "TEXT"),
+        ("time_define", "TEXT"),
+        ("weather_code", "TEXT"),
+        ("weather", "TEXT"),
+        ("wind", "TEXT"),
+        ("wave", "TEXT")
+    ],
+    "weather_pops": [
+        ("offices_code", "TEXT"),
+        ("publishing_office", "TEXT"),
+        ("report_datetime", "TEXT"),
+        ("area_name", "TEXT"),
+        ("time_define", "TEXT"),
+        ("pop", "TEXT")
+    ],
+    "weather_temps": [
+        ("offices_code", "TEXT"),
+        ("publishing_office", "TEXT"),
+        ("report_datetime", "TEXT"),
+        ("area_name", "TEXT"),
+        ("time_define", "TEXT"),
+        ("temp", "TEXT")
+    ],
+    "weather_reliabilities": [
+        ("offices_code", "TEXT"),
+        ("publishing_office", "TEXT"),
+        ("report_datetime", "TEXT"),
+        ("area_name", "TEXT"),
+        ("time_define", "TEXT"),
+        ("weather_code", "TEXT"),
+        ("pop", "TEXT"),
+        ("reliabilities", "TEXT")
+    ]
+}
+
+# WeatherDataFetcher が保存するテーブル
+FETCHER_TABLES = ["weather_tt", "weather_temp_ave", "weather_pop_ave"]
+
+# 画面の更新ボタンから実行する場合の締め切り（秒）と並列数
+REFRESH_DEADLINE_SECONDS = 60
+REFRESH_WORKERS = 8
+
+# パイプラインの既定値（解析プロセス数・段間キューの長さ・コミット単位のオフィス数）
+DEFAULT_PARSE_WORKERS = min(4, os.cpu_count() or 1)
+DEFAULT_QUEUE_SIZE = 16
+DEFAULT_BATCH_SIZE = 8
+
+# 取り込みモード（Python で行に展開 / 生のJSONを保存して SQLite の JSON1 関数で展開）
+MODE_PYTHON = "python"
+MODE_JSON1 = "json1"
+
+# 画面から実行する更新ではプロセスを起動せずスレッド内で解析する
+REFRESH_PARSE_WORKERS = 0
+
+# パイプラインの終端を表す値
+PIPELINE_END = None
+
+# 中断した取り込みを再開できる期間（秒）。これより古い実行は最初からやり直す
+RESUME_MAX_AGE_SECONDS = 3 * 60 * 60
+
+# 実行中の取り込みが生存を記録する間隔の上限（秒）。これより長く記録が無い実行は中断したものとみなす
+RUN_HEARTBEAT_TIMEOUT_SECONDS = 10 * 60
+
+# このプロセスを表す値（コンテナの再起動などで同じPIDが再利用されても、前のプロセスの実行と区別する）
+PROCESS_TOKEN = uuid.uuid4().hex
+
+# 地域データ（area.json）の保存完了を表すチェックポイント名
+AREAS_CHECKPOINT = "__areas__"
+
+# 有効なデータベースに必要なテーブル
+REQUIRED_TABLES = ['areas', 'weather_info', 'weather_pops', 'weather_temps']
+
+
+class IngestSummary:
+    """取り込み処理の結果を集計するクラス"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.elapsed = 0.0
+        self.offices_total = 0
+        self.offices_updated = []
+        self.offices_skipped = []
+        self.offices_resumed = []
+        self.bytes_downloaded = 0
+        self.pipeline_errors = []
+        self.offices_failed = []
+        self.region_failed = False
+        self.alerts_raised = 0
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started_at
+
+    @property
+    def has_failures(self):
+        return self.region_failed or bool(self.offices_failed) or bool(self.pipeline_errors)
+
+    def print_summary(self):
+        """スループットと失敗件数を表示"""
+        processed = len(self.offices_updated) + len(self.offices_skipped)
+        rate = processed / self.elapsed if self.elapsed > 0 else 0.0
+        print("[SUMMARY] 取り込み結果")
+        print(f"  対象オフィス数: {self.offices_total}")
+        print(f"  更新: {len(self.offices_updated)} / 変更なし: {len(self.offices_skipped)} / 失敗: {len(self.offices_failed)}")
+        print(f"  ダウンロード量: {self.bytes_downloaded / 1024:.1f} KiB")
+        if self.offices_resumed:
+            print(f"  前回の実行で完了済み: {len(self.offices_resumed)}")
+        if self.alerts_raised:
+            print(f"  アラート: {self.alerts_raised} 件")
+        print(f"  所要時間: {self.elapsed:.2f} 秒 ({rate:.2f} オフィス/秒)")
+        if self.region_failed:
+            print("  [ERROR] 地域データの取得に失敗しました。")
+        if self.offices_failed:
+            print(f"  失敗したオフィス: {', '.join(self.offices_failed)}")
+        for error in self.pipeline_errors:
+            print(f"  [ERROR] パイプラインのエラー: {error}")
+
+
+def collect_office_ids(region_data):
+    """地域データから全オフィスのIDを収集"""
+    offices = []
+    for center_info in region_data.get("centers", {}).values():
+        offices.extend(center_info.get("children", []))
+    return offices
+
+
+def collect_area_codes(weather_data):
+    """天気データに含まれる全ての地域コードを収集"""
+    codes = set()
+    for weather_entry in weather_data:
+        for series in weather_entry.get("timeSeries", []):
+            for area in series.get("areas", []):
+                codes.add(area.get("area", {}).get("code", "不明"))
+        for key in ("tempAverage", "precipAverage"):
+            for area in weather_entry.get(key, {}).get("areas", []):
+                codes.add(area.get("area", {}).get("code", "不明"))
+    return codes
+
+
+def initialize_ingest_tables(connection):
+    """取り込み状態を管理するテーブルを作成"""
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_offices (
+            office_id TEXT PRIMARY KEY,
+            report_datetime TEXT,
+            updated_at TEXT
+        )
+    """)
+    # 取り込みの実行単位
+    # pid・process_token・heartbeat_at は実行中のプロセスと最後に生存を記録した日時（実行中の取り込みを再開しないため）
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_runs (
+            run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            started_at TEXT,
+            finished_at TEXT,
+            status TEXT,
+            pid INTEGER,
+            heartbeat_at TEXT,
+            process_token TEXT
+        )
+    """)
+    # 列を追加する前に作成したデータベース
+    run_columns = {row[1] for row in connection.execute("PRAGMA table_info(ingest_runs)")}
+    for column, column_type in (("pid", "INTEGER"), ("heartbeat_at", "TEXT"), ("process_token", "TEXT")):
+        if column not in run_columns:
+            connection.execute(f"ALTER TABLE ingest_runs ADD COLUMN {column} {column_type}")
+    # 実行ごとのオフィス単位の完了記録（地域データは AREAS_CHECKPOINT として記録）
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_checkpoints (
+            run_id INTEGER,
+            office_id TEXT,
+            report_datetime TEXT,
+            completed_at TEXT,
+            PRIMARY KEY (run_id, office_id)
+        )
+    """)
+    connection.commit()
+
+
+def process_exists(pid, process_token):
+    """実行を記録したプロセスが存在するかを確認（確認できない環境では存在するものとして扱う）"""
+    if pid == os.getpid():
+        # 同じPIDでも、記録した値が異なれば再利用される前の別のプロセス
+        return process_token == PROCESS_TOKEN
+    if os.name != "posix":
+        # Windows の os.kill はシグナル 0 でもプロセスを終了させるため使わない
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def run_is_alive(pid, process_token, heartbeat_at, now=None):
+    """実行中のプロセスがまだ取り込みを続けているか
+
+    最後の生存の記録が RUN_HEARTBEAT_TIMEOUT_SECONDS より古い場合、またはプロセスが存在しない場合は中断したものとみなす。
+    """
+    if not heartbeat_at:
+        return False
+    now = now or datetime.now()
+    if now - datetime.fromisoformat(heartbeat_at) > timedelta(seconds=RUN_HEARTBEAT_TIMEOUT_SECONDS):
+        return False
+    return pid is None or process_exists(pid, process_token)
+
+
+def find_resumable_run(connection):
+    """再開できる直近の実行を探す
+
+    次の実行を再開し、チェックポイントの無い（取得に失敗した・未処理の）オフィスだけを取り込む。
+    - status が running のまま残っていて、実行していたプロセスが生きていない実行（中断した実行）
+    - 取得に失敗したオフィスを記録して終了した実行（partial）
+    完了した実行や、他のプロセスが実行中の実行は再開しない。
+
+    Returns:
+        int: 実行ID。再開できる実行がない場合は None
+    """
+    row = connection.execute(
+        "SELECT run_id, started_at, status, pid, heartbeat_at, process_token "
+        "FROM ingest_runs ORDER BY run_id DESC LIMIT 1"
+    ).fetchone()
+    if not row or row[2] not in ("running", "partial"):
+        return None
+    run_id, started_at, status, pid, heartbeat_at, process_token = row
+    # 古すぎる実行のデータは新しい発表と混ざるため再開しない
+    if datetime.now() - datetime.fromisoformat(started_at) > timedelta(seconds=RESUME_MAX_AGE_SECONDS):
+        return None
+    if status == "running" and run_is_alive(pid, process_token, heartbeat_at):
+        return None
+    return run_id
+
+
+def has_resumable_run(db_path=DB_PATH):
+    """データベースに再開できる取り込みが残っているかを確認"""
+    if not os.path.exists(db_path):
+        return False
+    conn = sqlite3.connect(db_path)
+    try:
+        return find_resumable_run(conn) is not None
+    except sqlite3.Error:
+        return False
+    finally:
+        conn.close()
+
+
+def start_or_resume_run(connection, resume=True):
+    """取り込みの実行を開始、または中断した実行を再開
+
+    Returns:
+        tuple: (実行ID, 完了済みオフィスIDの集合)
+    """
+    # 探してから記録するまでを書き込みのロックの中で行い、同時に起動した2つのプロセスが同じ実行を再開しないようにする
+    connection.commit()
+    connection.execute("BEGIN IMMEDIATE")
+    now = datetime.now().isoformat()
+    run_id = find_resumable_run(connection) if resume else None
+    if run_id is None:
+        cursor = connection.execute(
+            "INSERT INTO ingest_runs (started_at, status, pid, heartbeat_at, process_token) "
+            "VALUES (?, 'running', ?, ?, ?)",
+            (now, os.getpid(), now, PROCESS_TOKEN)
+        )
+        connection.commit()
+        return cursor.lastrowid, set()
+
+    connection.execute(
+        "UPDATE ingest_runs SET status = 'running', pid = ?, heartbeat_at = ?, process_token = ?, finished_at = NULL "
+        "WHERE run_id = ?",
+        (os.getpid(), now, PROCESS_TOKEN, run_id)
+    )
+    connection.commit()
+    done = {row[0] for row in connection.execute(
+        "SELECT office_id FROM ingest_checkpoints WHERE run_id = ?", (run_id,)
+    )}
+    print(f"[INFO] 前回の取り込み (run {run_id}) を再開します。完了済み: {len(done)} 件")
+    return run_id, done
+
+
+def record_checkpoint(connection, run_id, office_id, report_datetime=None):
+    """オフィスの取り込み完了と実行の生存を記録（呼び出し側でコミットする）"""
+    now = datetime.now().isoformat()
+    connection.execute(
+        "INSERT OR REPLACE INTO ingest_checkpoints (run_id, office_id, report_datetime, completed_at) VALUES (?, ?, ?, ?)",
+        (run_id, office_id, report_datetime, now)
+    )
+    connection.execute("UPDATE ingest_runs SET heartbeat_at = ? WHERE run_id = ?", (now, run_id))
+
+
+def finish_run(connection, run_id, status):
+    """実行の終了を記録"""
+    connection.execute(
+        "UPDATE ingest_runs SET finished_at = ?, status = ? WHERE run_id = ?",
+        (datetime.now().isoformat(), status, run_id)
+    )
+    connection.commit()
+
+
+def load_office_ids(connection):
+    """保存済みの地域データからオフィスIDを読み込む（再開時は area.json を取得し直さない）"""
+    return [row[0] for row in connection.execute(
+        "SELECT offices_id FROM areas GROUP BY offices_id ORDER BY MIN(id)"
+    )]
+
+
+def delete_office_rows(connection, area_codes):
+    """指定した地域コードの天気データを全テーブルから削除（呼び出し側でコミットする）"""
+    if not area_codes:
+        return
+    placeholders = ", ".join(["?" for _ in area_codes])
+    for table_name in list(TABLE_STRUCTURE) + FETCHER_TABLES:
+        connection.execute(f"DELETE FROM {table_name} WHERE offices_code IN ({placeholders})", list(area_codes))
+
+
+def parse_forecast_document(office, raw):
+    """天気データのJSONを解析し、テーブルごとの行タプルに展開（プロセスプールで実行）
+
+    Returns:
+        tuple: (オフィスID, 解析結果のdict)。解析に失敗した場合は "error" キーを持つ
+    """
+    try:
+        weather_data = json.loads(raw)
+    except ValueError as e:
+        return office, {"error": f"JSONの解析に失敗しました: {e}", "size": len(raw)}
+    if not weather_data or not isinstance(weather_data, list):
+        return office, {"error": "天気データの形式が不正です", "size": len(raw)}
+
+    try:
+        rows = normalize_forecast_tables(weather_data)
+    except Exception as e:
+        return office, {"error": f"天気データの展開に失敗しました: {e}", "size": len(raw)}
+    return office, {
+        "report_datetime": weather_data[0].get("reportDatetime", "不明"),
+        "area_codes": sorted(collect_area_codes(weather_data)),
+        "rows": rows,
+        "size": len(raw),
+    }
+
+
+def download_stage(client, offices, deadline, workers, raw_queue):
+    """ダウンロード段: 生のJSONバイト列を raw_queue に流す
+
+    キューが一杯の間は put で待機するため、後段が遅い場合はダウンロードも抑制される。
+    """
+    def download(office):
+        try:
+            response = client.get(WeatherDataManager.AREA_URL.format(office), deadline=deadline)
+            raw = response.content if response is not None else None
+        except Exception as e:
+            # 1件の例外で残りのオフィスを止めず、このオフィスを取得失敗として扱う
+            print(f"[EXCEPTION] {office} の天気データの取得中にエラー発生: {e}")
+            raw = None
+        raw_queue.put((office, raw))
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            for future in [executor.submit(download, office) for office in offices]:
+                future.result()
+    finally:
+        raw_queue.put(PIPELINE_END)
+
+
+def replay_stage(documents, raw_queue):
+    """再処理用の取得段: アーカイブの生データ（(オフィスID, 発表日時, 本文) の列）を順に raw_queue に流す"""
+    try:
+        for office, report_datetime, raw in documents:
+            raw_queue.put((office, raw))
+    finally:
+        raw_queue.put(PIPELINE_END)
+
+
+def drain_queue(stage_queue):
+    """前段が止まらないように、終端までキューを読み捨てる"""
+    while stage_queue.get() is not PIPELINE_END:
+        pass
+
+
+def pass_raw_document(office, raw):
+    """JSON1モード用: 解析せずに生のJSON文字列をそのまま書き込み段へ渡す"""
+    try:
+        return office, {"raw": raw.decode("utf-8"), "size": len(raw)}
+    except UnicodeDecodeError as e:
+        return office, {"error": f"文字コードが不正です: {e}", "size": len(raw)}
+
+
+def with_document(item, raw):
+    """解析結果に生データを加える（生データのアーカイブに保存する場合のみ）"""
+    office, parsed = item
+    if parsed is not None and "error" not in parsed:
+        parsed["document"] = raw
+    return office, parsed
+
+
+def parse_stage(raw_queue, parsed_queue, parse_workers, summary, parse_func=parse_forecast_document,
+                keep_document=False):
+    """解析段: raw_queue のJSONをプロセスプールで解析し parsed_queue に流す
+
+    parse_workers が 0 の場合はこのスレッド内で解析する。
+    keep_document が True の場合は、解析結果に生データ（"document"）を加えて書き込み段に渡す。
+    生データはこの段で加えるため、プロセスプールの結果として送り返すことはない。
+    """
+    def finish(item, raw):
+        return with_document(item, raw) if keep_document else item
+
+    try:
+        if parse_workers <= 0:
+            while True:
+                item = raw_queue.get()
+                if item is PIPELINE_END:
+                    break
+                office, raw = item
+                parsed_queue.put(finish(parse_func(office, raw), raw) if raw is not None else (office, None))
+            return
+
+        with ProcessPoolExecutor(max_workers=parse_workers) as pool:
+            pending = deque()
+            while True:
+                item = raw_queue.get()
+                if item is PIPELINE_END:
+                    break
+                office, raw = item
+                if raw is None:
+                    parsed_queue.put((office, None))
+                    continue
+                pending.append((pool.submit(parse_func, office, raw), raw))
+                # 処理中のタスク数を制限してメモリ使用量を抑える
+                while pending and (len(pending) >= parse_workers * 2 or pending[0][0].done()):
+                    future, document = pending.popleft()
+                    parsed_queue.put(finish(future.result(), document))
+            while pending:
+                future, document = pending.popleft()
+                parsed_queue.put(finish(future.result(), document))
+    except Exception as e:
+        print(f"[EXCEPTION] 天気データの解析中にエラー発生: {e}")
+        summary.pipeline_errors.append(str(e))
+        drain_queue(raw_queue)
+    finally:
+        parsed_queue.put(PIPELINE_END)
+
+
+def build_insert_statements(connection):
+    """テーブル定義から id 列を除いた INSERT 文を作成"""
+    statements = {}
+    for table_name in list(TABLE_STRUCTURE) + FETCHER_TABLES:
+        column_names = [col[1] for col in connection.execute(f"PRAGMA table_info({table_name})")][1:]
+        placeholders = ", ".join(["?" for _ in column_names])
+        statements[table_name] = f"INSERT INTO {table_name} ({', '.join(column_names)}) VALUES ({placeholders})"
+    return statements
+
+
+def write_stage(db_path, parsed_queue, run_id, incremental, batch_size, summary, archive=None, raw_archive=None):
+    """書き込み段: 単一の接続で解析結果を保存し、batch_size オフィスごとにコミット
+
+    archive を指定した場合は、更新したオフィスの発表を履歴アーカイブにも追記する。
+    raw_archive を指定した場合は、取得した生データを（更新の有無に関係なく）生データのアーカイブに保存する。
+    全国の概況の集計（region_overview）、全文検索の索引、条件検索用の値（weather_values）も、
+    オフィスのデータと同じトランザクションで書き換え、値が変わった行でアラートのルールを評価する。
+    前回の発表があるオフィスは、書き換える前の行と比べた差分を region_diffs に保存する。
+    """
+    connection = open_write_connection(db_path)
+    # コミットまでに値が変わった行（アラートのルールで評価する）
+    changed_keys = set()
+
+    def commit_batch():
+        sync_search_index(connection)
+        sync_value_index(connection)
+        summary.alerts_raised += evaluate_alert_rules(connection, changed_keys)
+        changed_keys.clear()
+        # アーカイブを先にコミットする。チェックポイントを含む本体のコミットの前に中断した場合、
+        # 次の実行で同じオフィスを書き直すが、アーカイブの追記は同じ発表を二重に追加しない
+        if archive is not None:
+            archive.commit()
+        if raw_archive is not None:
+            raw_archive.commit()
+        connection.commit()
+
+    try:
+        insert_statements = build_insert_statements(connection)
+        previous_reports = dict(connection.execute(
+            "SELECT office_id, report_datetime FROM ingest_offices"
+        ).fetchall())
+        overview_offices = load_overview_offices(connection)
+        uncommitted = 0
+
+        while True:
+            item = parsed_queue.get()
+            if item is PIPELINE_END:
+                break
+            office, parsed = item
+            if parsed is None or "error" in parsed:
+                reason = parsed["error"] if parsed else "取得に失敗しました"
+                print(f"[ERROR] {office} の天気データ: {reason}。前回のデータを保持します。")
+                summary.offices_failed.append(office)
+                continue
+
+            summary.bytes_downloaded += parsed["size"]
+            if "raw" in parsed:
+                # JSON1モード: 生データを保存し、発表日時もSQLite側で取り出す
+                try:
+                    report_datetime = store_raw_forecast(connection, office, parsed["raw"])
+                except ValueError as e:
+                    print(f"[ERROR] {office} の天気データ: {e}。前回のデータを保持します。")
+                    summary.offices_failed.append(office)
+                    continue
+            else:
+                report_datetime = parsed["report_datetime"]
+            if raw_archive is not None:
+                raw_archive.store_forecast(office, report_datetime, parsed["document"])
+
+            if incremental and previous_reports.get(office) == report_datetime:
+                print(f"[INFO] {office} のデータは更新されていません。")
+                summary.offices_skipped.append(office)
+                if office not in overview_offices:
+                    # 集計テーブルを追加する前に取り込んだオフィス（JSON1モードでは保存済みの行から集計する）
+                    tables = parsed["rows"] if "rows" in parsed else load_office_tables(connection, office)
+                    update_office_overview(connection, office, tables, report_datetime)
+                    overview_offices.add(office)
+            else:
+                previous_report = previous_reports.get(office)
+                area_codes = parsed["area_codes"] if "area_codes" in parsed else office_area_codes(connection, office)
+                # 書き換える前の行（同じ発表を取り込み直す場合は直前の差分を残すため読まない）
+                previous = (snapshot_area_codes(connection, area_codes)
+                            if previous_report and previous_report != report_datetime else None)
+                if "raw" in parsed:
+                    # JSON1モード: SQLite で作り直した行を、集計・差分などの入力として読み出す
+                    tables = derive_office_tables(connection, office, load_rows=True, area_codes=area_codes)
+                else:
+                    tables = parsed["rows"]
+                    delete_office_rows(connection, area_codes)
+                    for table_name, rows in parsed["rows"].items():
+                        if rows:
+                            connection.executemany(insert_statements[table_name], rows)
+                if previous is not None:
+                    changes = diff_office(previous, tables)
+                    save_office_diff(connection, office, changes, previous_report, report_datetime)
+                    changed_keys.update(changed_value_keys(changes))
+                elif not previous_report:
+                    # 初めて取り込むオフィスは全ての値が新しい
+                    changed_keys.update(changed_value_keys(diff_office({}, tables)))
+                if archive is not None:
+                    archive.append_snapshot(office, report_datetime, tables)
+                update_office_overview(connection, office, tables, report_datetime)
+                overview_offices.add(office)
+                connection.execute(
+                    "INSERT OR REPLACE INTO ingest_offices (office_id, report_datetime, updated_at) VALUES (?, ?, ?)",
+                    (office, report_datetime, datetime.now().isoformat())
+                )
+                # 再処理では同じオフィスの発表が続くため、次の発表はこの発表と比べる
+                previous_reports[office] = report_datetime
+                summary.offices_updated.append(office)
+                print(f"[SUCCESS] {office} のデータを保存しました。")
+            # チェックポイントはデータと同じトランザクションでコミットされる
+            record_checkpoint(connection, run_id, office, report_datetime)
+
+            uncommitted += 1
+            if uncommitted >= batch_size or parsed_queue.empty():
+                commit_batch()
+                uncommitted = 0
+        commit_batch()
+    except Exception as e:
+        # コミットされていないオフィスはチェックポイントがないため、次回の実行でやり直される
+        print(f"[EXCEPTION] 天気データの保存中にエラー発生: {e}")
+        summary.pipeline_errors.append(str(e))
+        drain_queue(parsed_queue)
+    finally:
+        connection.close()
+        if archive is not None:
+            archive.close()
+
+
+@profile_hook("create_database")
+def run_ingest(db_path=DB_PATH, workers=4, incremental=False, only_offices=None,
+               deadline_seconds=None, client=None, resume=True, parse_workers=DEFAULT_PARSE_WORKERS,
+               queue_size=DEFAULT_QUEUE_SIZE, batch_size=DEFAULT_BATCH_SIZE, mode=MODE_PYTHON,
+               archive_dir=None, retention_months=ARCHIVE_RETENTION_MONTHS, raw_archive_path=None,
+               replay=False, replay_since=None, replay_until=None):
+    """地域データと天気データを取得してデータベースに保存
+
+    取得に失敗したオフィスのデータは削除せず、前回取り込んだ内容をそのまま残す。
+
+    Args:
+        db_path (str): データベースのパス
+        workers (int): 天気データを並列に取得するスレッド数
+        incremental (bool): Trueの場合、発表日時が変わっていないオフィスをスキップ
+        only_offices (list): 指定した場合、このオフィスIDのみを取り込む
+        deadline_seconds (float): 取得全体の締め切り（秒）。超えたオフィスは失敗として扱う
+        client (ResilientClient): HTTPクライアント（省略時は共有クライアント）
+        resume (bool): Trueの場合、中断した実行や一部のオフィスが失敗した実行の完了済みオフィスをスキップして再開
+        parse_workers (int): JSONを解析するプロセス数（0の場合はスレッド内で解析）
+        queue_size (int): 各段の間のキューの最大長（メモリ使用量の上限）
+        batch_size (int): 書き込み段がまとめてコミットするオフィス数
+        mode (str): "python" は Python で行に展開、"json1" は生のJSONを raw_forecasts に保存し
+            SQLite の JSON1 関数で各テーブルを作成する
+        archive_dir (str): 指定した場合、発表ごとの予報を月単位の履歴アーカイブに追記する
+        retention_months (int): 履歴アーカイブを保持する月数
+        raw_archive_path (str): 指定した場合、取得した生データを生データのアーカイブ（raw_archive）に保存する
+        replay (bool): Trueの場合、気象庁から取得する代わりに raw_archive_path のアーカイブの生データを
+            発表日時の順に取り込み直す（中断した実行の再開は行わない）
+        replay_since (str): 再処理する発表日時の下限（ISO形式、省略時は最古）
+        replay_until (str): 再処理する発表日時の上限（ISO形式、省略時は最新）。地域データもこの時点のものを使う
+
+    Returns:
+        IngestSummary: 取り込み結果
+    """
+    summary = IngestSummary()
+    deadline = time.monotonic() + deadline_seconds if deadline_seconds else None
+
+    if replay and not raw_archive_path:
+        raise ValueError("再処理には生データのアーカイブ（raw_archive_path）が必要です")
+    raw_archive = RawArchive(raw_archive_path) if raw_archive_path else None
+
+    # 天気データを管理
+    weather_manager = WeatherDataManager(db_path, client=client)
+    try:
+        for table_name, columns in TABLE_STRUCTURE.items():
+            weather_manager.create_table(table_name, columns)
+        initialize_ingest_tables(weather_manager.connection)
+        initialize_overview_table(weather_manager.connection)
+        initialize_search_index(weather_manager.connection)
+        initialize_value_table(weather_manager.connection)
+        initialize_alert_tables(weather_manager.connection)
+        initialize_diff_table(weather_manager.connection)
+        weather_manager.connection.commit()
+        run_id, done_offices = start_or_resume_run(weather_manager.connection, resume and not replay)
+
+        if AREAS_CHECKPOINT in done_offices:
+            offices = load_office_ids(weather_manager.connection)
+        else:
+            # 地域データを管理
+            region_manager = RegionDataManager(db_path, client=client)
+            try:
+                if replay:
+                    print("[INFO] アーカイブから地域データを読み込み中...")
+                    region_data = raw_archive.latest_area(until=replay_until)
+                else:
+                    print("[INFO] 地域データを取得中...")
+                    region_data = region_manager.fetch_region_data(deadline=deadline)
+                if not region_data:
+                    summary.region_failed = True
+                    finish_run(weather_manager.connection, run_id, "partial")
+                    summary.finish()
+                    return summary
+                if raw_archive is not None and not replay:
+                    raw_archive.store_area(region_data)
+                    raw_archive.commit()
+
+                if area_content_hash(region_data) == region_manager.stored_content_hash():
+                    # 地域データは年に数回しか変わらないため、同じ内容であれば書き換えない
+                    print("[INFO] 地域データに変更はありません。保存を省略します。")
+                else:
+                    print("[INFO] データをデータベースに保存中...")
+                    region_manager.cursor.execute("DELETE FROM areas")
+                    region_manager.save_to_database(region_data)
+                    print("[SUCCESS] 地域データの保存が完了しました。")
+                    # 観測地点と地域の対応が変わりうるため作り直す
+                    rebuild_value_index(weather_manager.connection)
+            finally:
+                region_manager.close_connection()
+            record_checkpoint(weather_manager.connection, run_id, AREAS_CHECKPOINT)
+            weather_manager.connection.commit()
+            offices = collect_office_ids(region_data)
+
+        if only_offices:
+            offices = [office for office in offices if office in only_offices]
+        summary.offices_total = len(offices)
+        summary.offices_resumed = [office for office in offices if office in done_offices]
+        pending_offices = [office for office in offices if office not in done_offices]
+        print(f"[INFO] オフィスコードリスト: {pending_offices}")
+
+        # weather_tt などのテーブルを作成
+        WeatherDataFetcher(db_path, client=client)
+        weather_manager.connection.commit()
+
+        # ダウンロード → 解析 → 書き込みの各段を並行に実行
+        print("[INFO] 天気データを取得中...")
+        raw_queue = queue.Queue(maxsize=queue_size)
+        parsed_queue = queue.Queue(maxsize=queue_size)
+        if replay:
+            print("[INFO] アーカイブの生データを取り込み直します...")
+            downloader = threading.Thread(
+                target=replay_stage,
+                args=(raw_archive.iter_forecasts(pending_offices, replay_since, replay_until), raw_queue),
+                daemon=True,
+            )
+        else:
+            downloader = threading.Thread(
+                target=download_stage,
+                args=(client or default_client, pending_offices, deadline, workers, raw_queue),
+                daemon=True,
+            )
+        # 生データのアーカイブに保存する場合だけ、解析結果と一緒に生データを書き込み段へ渡す
+        keep_document = raw_archive is not None and not replay
+        if mode == MODE_JSON1:
+            initialize_json1_schema(weather_manager.connection)
+            parser = threading.Thread(
+                target=parse_stage,
+                args=(raw_queue, parsed_queue, 0, summary, pass_raw_document, keep_document),
+                daemon=True,
+            )
+        else:
+            parser = threading.Thread(
+                target=parse_stage,
+                args=(raw_queue, parsed_queue, parse_workers, summary, parse_forecast_document, keep_document),
+                daemon=True,
+            )
+        archive = ForecastArchive(archive_dir, retention_months) if archive_dir else None
+        writer = threading.Thread(
+            target=write_stage,
+            args=(db_path, parsed_queue, run_id, incremental, batch_size, summary, archive,
+                  None if replay else raw_archive),
+            daemon=True,
+        )
+        for stage in (downloader, parser, writer):
+            stage.start()
+        for stage in (downloader, parser, writer):
+            stage.join()
+        if archive is not None:
+            archive.prune()
+
+        finish_run(weather_manager.connection, run_id, "partial" if summary.has_failures else "completed")
+    finally:
+        weather_manager.close_connection()
+        if raw_archive is not None:
+            raw_archive.close()
+
+    summary.finish()
+    return summary
+
+
+def create_database(db_path=DB_PATH, workers=4):
+    """データベースを新規作成"""
+    summary = run_ingest(db_path, workers=workers)
+    summary.print_summary()
+    return summary
+
+
+def ensure_database_exists(db_path=DB_PATH):
+    """データベースファイルの存在確認とcreate_database.pyの実行"""
+    required_tables = REQUIRED_TABLES
+
+    # 新規作成が必要かどうかのフラグ
+    need_creation = False
+
+    if os.path.exists(db_path):
+        # データベースが存在する場合、中身を確認
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        try:
+            # テーブルの存在確認
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+            tables = [row[0] for row in cursor.fetchall()]
+
+            # 必要なテーブルが全て存在し、データが入っているか確認
+            if not all(table in tables for table in required_tables):
+                need_creation = True
+            else:
+                for table in required_tables:
+                    cursor.execute(f"SELECT COUNT(*) FROM {table}")
+                    if cursor.fetchone()[0] == 0:
+                        need_creation = True
+                        break
+        except sqlite3.Error:
+            need_creation = True
+        finally:
+            conn.close()
+    else:
+        need_creation = True
+
+    if not need_creation:
+        print("有効なデータベースが存在します。既存のデータベースを使用します。")
+        return True
+
+    # 作成の途中で中断した取り込みが残っている場合は、最初からではなく続きから再開する
+    resumable = has_resumable_run(db_path)
+    print("データベースの作成を開始します...")
+    try:
+        # 再開できない既存のファイルがある場合は削除
+        if os.path.exists(db_path) and not resumable:
+            os.remove(db_path)
+
+        create_database(db_path)
+
+
+        # 作成後の確認
+        if os.path.exists(db_path):
+            conn = sqlite3.connect(db_path)
+            cursor = conn.cursor()
+            try:
+                for table in required_tables:
+                    cursor.execute(f"SELECT COUNT(*) FROM {table}")
+                    if cursor.fetchone()[0] == 0:
+                        print(f"Error: {table}テーブルにデータがありません。")
+                        return False
+                print("データベースの作成が完了しました。")
+                return True
+            except sqlite3.Error as e:
+                print(f"データベース確認中にエラー: {e}")
+                return False
+            finally:
+                conn.close()
+        return False
+
+    except subprocess.CalledProcessError as e:
+        print(f"データベース作成中にエラーが発生しました:")
+        if e.stdout:
+            print(f"標準出力: {e.stdout}")
+        if e.stderr:
+            print(f"エラー出力: {e.stderr}")
+        return False
+    except Exception as e:
+        print(f"予期せぬエラーが発生しました: {e}")
+        return False
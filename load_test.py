@@ -0,0 +1,371 @@
+"""Flet アプリの同時セッション負荷試験
+
+描画を行わないダミーの flet モジュールを差し込んで new_weather_predict を読み込み、
+N 個のセッション（スレッド）がそれぞれ main を実行してから、オフィスを開いての地域の選択・週間天気への切り替え・
+日付の切り替えといった操作を繰り返す。全てローカルで実行し、次の値を表示する。
+
+- 操作（ハンドラ）ごとのレイテンシの p50 / p95 / p99
+- SQLite の競合: 検索の所要時間と、ロック待ちで失敗した回数（--writer-interval で更新処理を模擬できる）
+- セッションあたりのメモリ（tracemalloc で計測した Python オブジェクトの増加量）
+
+天気アイコンの確認（requests.head）は既定ではネットワークに接続せずに解決する（--online-icons で実際に確認）。
+
+使用例:
+    python load_test.py --sessions 20 --clicks 30
+    python load_test.py --sessions 50 --clicks 10 --writer-interval 0.5 --writer-hold 0.2
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+import types
+
+# 負荷試験で記録する操作の種類
+ACTION_MAIN = "main"
+ACTION_EXPAND_OFFICE = "expand_office"
+ACTION_SELECT_REGION = "select_region"
+ACTION_WEEKLY = "view_weekly"
+ACTION_THREE_DAY = "view_three_day"
+ACTION_DATE = "change_date"
+
+
+class StubControlType(type):
+    """ft.FontWeight.BOLD のようなクラス属性の参照を受け付ける"""
+
+    def __getattr__(cls, name):
+        return StubNamespace(f"{cls.__name__}.{name}")
+
+
+class StubControl(metaclass=StubControlType):
+    """描画しないコントロール（渡された引数を属性として保持するだけ）"""
+
+    def __init__(self, *args, **kwargs):
+        self.args = args
+        self.controls = []
+        self.value = None
+        self.disabled = False
+        if args and isinstance(args[0], list):
+            self.controls = args[0]
+        elif args:
+            self.value = args[0]
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+
+    def update(self):
+        pass
+
+
+class StubNamespace:
+    """ft.colors.RED や ft.border.all(...) のような参照を全て受け付ける名前空間"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, name):
+        if name[:1].isupper() and not name.isupper():
+            # ft.dropdown.Option などのクラス
+            return type(name, (StubControl,), {})
+        return StubNamespace(f"{self.name}.{name}")
+
+    def __call__(self, *args, **kwargs):
+        return StubControl(*args, **kwargs)
+
+    def __str__(self):
+        return self.name
+
+
+class StubPage:
+    """ft.Page の代わり（update の回数を数える）"""
+
+    def __init__(self):
+        self.controls = []
+        self.update_count = 0
+
+    def add(self, *controls):
+        self.controls.extend(controls)
+
+    def clean(self):
+        self.controls = []
+
+    def update(self):
+        self.update_count += 1
+
+
+def build_stub_flet():
+    """描画を行わないダミーの flet モジュールを作成"""
+    module = types.ModuleType("flet")
+    module.Page = StubPage
+
+    def module_getattr(name):
+        if name[:1].isupper() and not name.isupper():
+            control_class = type(name, (StubControl,), {})
+            setattr(module, name, control_class)
+            return control_class
+        namespace = StubNamespace(name)
+        setattr(module, name, namespace)
+        return namespace
+
+    module.__getattr__ = module_getattr
+    module.app = lambda *args, **kwargs: None
+    return module
+
+
+def iter_controls(control):
+    """コントロールの木を深さ優先でたどる"""
+    stack = [control]
+    while stack:
+        current = stack.pop()
+        yield current
+        children = list(getattr(current, "controls", None) or [])
+        content = getattr(current, "content", None)
+        if content is not None:
+            children.append(content)
+        stack.extend(reversed(children))
+
+
+def find_controls(root_controls, class_name, predicate=None):
+    found = []
+    for root in root_controls:
+        for control in iter_controls(root):
+            if type(control).__name__ == class_name and (predicate is None or predicate(control)):
+                found.append(control)
+    return found
+
+
+def option_values(dropdown):
+    return [option.value for option in getattr(dropdown, "options", [])]
+
+
+class Event:
+    """ハンドラに渡すイベント（e.control.value と e.data だけを使う）"""
+
+    def __init__(self, control, data=None):
+        self.control = control
+        self.data = data
+
+
+class Metrics:
+    """全セッションの計測値を集める"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.query_times = []
+        self.lock_errors = 0
+        self.handler_errors = []
+
+    def record(self, action, elapsed):
+        with self.lock:
+            self.latencies.setdefault(action, []).append(elapsed)
+
+    def record_query(self, elapsed):
+        with self.lock:
+            self.query_times.append(elapsed)
+
+    def record_error(self, action, error):
+        with self.lock:
+            if isinstance(error, sqlite3.OperationalError) and "locked" in str(error):
+                self.lock_errors += 1
+            self.handler_errors.append(f"{action}: {error!r}")
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def instrument_database_manager(database_manager_class, metrics):
+    """DatabaseManager の fetch_* の所要時間を記録するように置き換える"""
+    for name in dir(database_manager_class):
+        if not name.startswith("fetch_"):
+            continue
+        original = getattr(database_manager_class, name)
+
+        def timed(self, *args, __original=original, **kwargs):
+            start = time.perf_counter()
+            try:
+                return __original(self, *args, **kwargs)
+            finally:
+                metrics.record_query(time.perf_counter() - start)
+
+        setattr(database_manager_class, name, timed)
+
+
+class Session:
+    """1人の利用者の操作を再現する"""
+
+    def __init__(self, app, index, clicks, think_time, metrics, seed):
+        self.app = app
+        self.index = index
+        self.clicks = clicks
+        self.think_time = think_time
+        self.metrics = metrics
+        self.random = random.Random(seed + index)
+        self.page = StubPage()
+
+    def timed(self, action, func, *args):
+        start = time.perf_counter()
+        try:
+            func(*args)
+        except Exception as e:
+            self.metrics.record_error(action, e)
+        finally:
+            self.metrics.record(action, time.perf_counter() - start)
+
+    def think(self):
+        if self.think_time > 0:
+            time.sleep(self.random.expovariate(1 / self.think_time))
+
+    def view_dropdown(self):
+        dropdowns = find_controls(self.page.controls, "Dropdown", lambda d: "週間天気" in option_values(d))
+        return dropdowns[0] if dropdowns else None
+
+    def date_dropdown(self):
+        dropdowns = find_controls(self.page.controls, "Dropdown", lambda d: "週間天気" not in option_values(d))
+        return dropdowns[0] if dropdowns else None
+
+    def change_dropdown(self, dropdown, value):
+        dropdown.value = value
+        dropdown.on_change(Event(dropdown))
+
+    def run(self):
+        self.timed(ACTION_MAIN, self.app.main, self.page)
+        tiles = find_controls(self.page.controls, "ListTile", lambda tile: getattr(tile, "on_click", None))
+        if not tiles:
+            return
+        offices = find_controls(self.page.controls, "ExpansionTile",
+                                lambda tile: getattr(tile, "on_change", None) and
+                                any(type(child).__name__ == "ListTile" for child in tile.controls))
+        for _ in range(self.clicks):
+            self.think()
+            if offices:
+                # オフィスを開いてから、配下の地域を選ぶ
+                office = self.random.choice(offices)
+                self.timed(ACTION_EXPAND_OFFICE, office.on_change, Event(office, "true"))
+                self.think()
+                tile = self.random.choice(office.controls)
+            else:
+                tile = self.random.choice(tiles)
+            self.timed(ACTION_SELECT_REGION, tile.on_click, Event(tile))
+
+            roll = self.random.random()
+            if roll < 0.4:
+                # 3日間の天気で日付を切り替える
+                dropdown = self.date_dropdown()
+                if dropdown and getattr(dropdown, "on_change", None) and dropdown.options:
+                    self.think()
+                    option = self.random.choice(dropdown.options)
+                    self.timed(ACTION_DATE, self.change_dropdown, dropdown, option.value)
+            elif roll < 0.8:
+                # 週間天気を見てから3日間の天気に戻る
+                dropdown = self.view_dropdown()
+                if dropdown and getattr(dropdown, "on_change", None):
+                    self.think()
+                    self.timed(ACTION_WEEKLY, self.change_dropdown, dropdown, "週間天気")
+                    self.think()
+                    self.timed(ACTION_THREE_DAY, self.change_dropdown, dropdown, "3日間の天気")
+
+
+def run_writer(db_path, interval, hold, stop_event, metrics):
+    """更新処理を模擬し、書き込みトランザクションを一定時間保持する"""
+    from db_connection import open_write_connection
+
+    connection = open_write_connection(db_path)
+    try:
+        while not stop_event.wait(interval):
+            try:
+                connection.execute("BEGIN IMMEDIATE")
+                connection.execute("UPDATE weather_info SET wave = wave WHERE id IN (SELECT id FROM weather_info LIMIT 200)")
+                time.sleep(hold)
+                connection.commit()
+            except sqlite3.OperationalError as e:
+                connection.rollback()
+                metrics.record_error("writer", e)
+    finally:
+        connection.close()
+
+
+def load_app(db_path, online_icons):
+    """ダミーの flet を差し込んで new_weather_predict を読み込む"""
+    os.environ["WEATHER_DB_PATH"] = db_path
+    sys.modules["flet"] = build_stub_flet()
+    import new_weather_predict
+
+    if not online_icons:
+        base_url = "https://www.jma.go.jp/bosai/forecast/img/"
+        new_weather_predict.find_valid_weather_icon = lambda code: f"{base_url}{code}.svg"
+    return new_weather_predict
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flet アプリの同時セッション負荷試験")
+    parser.add_argument("--db", default=os.environ.get("WEATHER_DB_PATH", "region_data.db"), help="データベースのパス")
+    parser.add_argument("--sessions", type=int, default=10, help="同時に実行するセッション数")
+    parser.add_argument("--clicks", type=int, default=20, help="セッションごとの地域選択の回数")
+    parser.add_argument("--think-time", type=float, default=0.05, help="操作の間隔の平均（秒）")
+    parser.add_argument("--seed", type=int, default=0, help="操作の乱数の種")
+    parser.add_argument("--online-icons", action="store_true", help="天気アイコンの存在を実際にネットワークで確認")
+    parser.add_argument("--writer-interval", type=float, default=0, help="更新処理を模擬する間隔（秒、0で無効）")
+    parser.add_argument("--writer-hold", type=float, default=0.1, help="模擬した書き込みトランザクションの保持時間（秒）")
+    args = parser.parse_args()
+
+    app = load_app(args.db, args.online_icons)
+    metrics = Metrics()
+    instrument_database_manager(app.DatabaseManager, metrics)
+    # main の出力（データベースの確認メッセージなど）を試験結果と混ぜないよう、ここから先は集計だけを表示する
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+
+    sessions = [Session(app, index, args.clicks, args.think_time, metrics, args.seed) for index in range(args.sessions)]
+    stop_writer = threading.Event()
+    writer = None
+    if args.writer_interval > 0:
+        writer = threading.Thread(target=run_writer,
+                                  args=(args.db, args.writer_interval, args.writer_hold, stop_writer, metrics))
+        writer.start()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=session.run) for session in sessions]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    stop_writer.set()
+    if writer:
+        writer.join()
+
+    # セッションの画面（コントロールの木）を保持したまま計測する
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print()
+    print(f"[RESULT] セッション数 {args.sessions} / 経過時間 {wall:.2f} 秒")
+    print(f"{'操作':<16} {'件数':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for action in (ACTION_MAIN, ACTION_EXPAND_OFFICE, ACTION_SELECT_REGION, ACTION_WEEKLY, ACTION_THREE_DAY, ACTION_DATE):
+        values = metrics.latencies.get(action, [])
+        if values:
+            print(f"{action:<16} {len(values):>6} {percentile(values, 50) * 1000:>9.1f} "
+                  f"{percentile(values, 95) * 1000:>9.1f} {percentile(values, 99) * 1000:>9.1f}")
+    if metrics.query_times:
+        print(f"[RESULT] 検索 {len(metrics.query_times)} 件  平均 {statistics.mean(metrics.query_times) * 1000:.2f} ms  "
+              f"p99 {percentile(metrics.query_times, 99) * 1000:.2f} ms  ロック待ちの失敗 {metrics.lock_errors} 件")
+    cache_stats = app.region_cache.stats
+    print(f"[RESULT] 地域データのキャッシュ: ヒット {cache_stats['hits']} 件 / 取得 {cache_stats['misses']} 件")
+    print(f"[RESULT] メモリ: セッションあたり {(retained - baseline) / max(args.sessions, 1) / 1024:.1f} KiB"
+          f"（ピーク {peak / 1024 / 1024:.1f} MiB）")
+    if metrics.handler_errors:
+        print(f"[WARNING] ハンドラのエラー {len(metrics.handler_errors)} 件（先頭: {metrics.handler_errors[0]}）")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
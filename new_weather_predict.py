@@ -4,205 +4,32 @@ import flet as ft
 import sys
 import os
 import subprocess
+import threading
+import time
 from sqlalchemy import create_engine, Column, Integer, String, ForeignKey
 from sqlalchemy.orm import declarative_base, relationship, sessionmaker
 from datetime import datetime
 from datetime import timedelta
 # create_database.py
-from db_creater import RegionDataManager, WeatherDataManager, WeatherDataFetcher
-
+from ingest import (DB_PATH, REFRESH_DEADLINE_SECONDS, REFRESH_PARSE_WORKERS, REFRESH_WORKERS,
+                    ensure_database_exists, run_ingest)
+from forecast_archive import ARCHIVE_DIR
+from raw_archive import RAW_ARCHIVE_PATH
+from database_manager import DatabaseManager
+from db_connection import database_change_token, open_write_connection, refresh_memory_replica
+from forecast_alerts import (ALERT_OPERATORS, KIND_LABELS, acknowledge_alert_events, add_alert_rule,
+                             remove_alert_rule, rule_label)
+from region_hierarchy import CENTER, CLASS10, OFFICE
+from region_overview import LEVEL_CENTER, LEVEL_OFFICE
+from region_prefetch import RegionCache, RegionPrefetcher
+from profiling import profile_hook
+
+# 地域ごとの RegionBundle のキャッシュ（全セッションで共有し、データベースが更新されたら破棄する）
+region_cache = RegionCache(DB_PATH)
 
 # SQLAlchemyのベースクラスを作成
 Base = declarative_base()
 
-def create_database():
-    # データベースのパス
-    DB_PATH = "region_data.db"
-    
-    try:
-        # 地域データを管理
-        region_manager = RegionDataManager(DB_PATH)
-        print("[INFO] 地域データを取得中...")
-        region_data = region_manager.fetch_region_data()
-
-        if region_data:
-            print("[INFO] データをデータベースに保存中...")
-            region_manager.save_to_database(region_data)
-            print("[SUCCESS] 地域データの保存が完了しました。")
-
-        # 全オフィスのIDをリストに格納
-        offices = []
-        centers = region_data.get("centers", {})
-        offices_data = region_data.get("offices", {})
-
-        # 各センター内のオフィスIDを収集
-        for center_info in centers.values():
-            children_offices = center_info.get("children", [])
-            offices.extend(children_offices)
-
-        print(f"[INFO] オフィスコードリスト: {offices}")
-
-        # 天気データを管理
-        weather_manager = WeatherDataManager(DB_PATH)
-        table_structure = {
-            "weather_info": [
-                ("offices_code", "TEXT"),
-                ("publishing_office", "TEXT"),
-                ("report_datetime", "TEXT"),
-                ("area_name", "TEXT"),
-                ("time_define", "TEXT"),
-                ("weather_code", "TEXT"),
-                ("weather", "TEXT"),
-                ("wind", "TEXT"),
-                ("wave", "TEXT")
-            ],
-            "weather_pops": [
-                ("offices_code", "TEXT"),
-                ("publishing_office", "TEXT"),
-                ("report_datetime", "TEXT"),
-                ("area_name", "TEXT"),
-                ("time_define", "TEXT"),
-                ("pop", "TEXT")
-            ],
-            "weather_temps": [
-                ("offices_code", "TEXT"),
-                ("publishing_office", "TEXT"),
-                ("report_datetime", "TEXT"),
-                ("area_name", "TEXT"),
-                ("time_define", "TEXT"),
-                ("temp", "TEXT")
-            ],
-            "weather_reliabilities": [
-                ("offices_code", "TEXT"),
-                ("publishing_office", "TEXT"),
-                ("report_datetime", "TEXT"),
-                ("area_name", "TEXT"),
-                ("time_define", "TEXT"),
-                ("weather_code", "TEXT"),
-                ("pop", "TEXT"),
-                ("reliabilities", "TEXT")
-            ]
-        }
-
-        print("[INFO] 天気データを取得中...")
-        for table_name, columns in table_structure.items():
-            print(f"[INFO] テーブル {table_name} を作成中...")
-            print(f"[INFO] カラム: {columns}")
-            weather_manager.create_table(table_name, columns)
-            for office in offices:
-                print(f"[INFO] {office} の天気データを取得中...")
-                weather_data = weather_manager.fetch_weather_data(office)
-                if weather_data:
-                    if table_name == "weather_info":
-                        need = "weather"
-                    elif table_name == "weather_pops":
-                        need = "pop"
-                    elif table_name == "weather_temps":
-                        need = "temp"
-                    elif table_name == "weather_reliabilities":
-                        need = "reliabilities"
-
-                    weather_manager.save_weather_to_db(table_name, columns, weather_data, need)
-                    print(f"[SUCCESS] {office} のデータを {table_name} に保存しました。")
-                else:
-                    print(f"[ERROR] {office} の天気データの取得に失敗しました。")
-        
-        # WeatherDataFetcherの実行部分を修正
-        weather_fetcher = WeatherDataFetcher(DB_PATH)
-        for office in offices:
-            print(f"[INFO] {office} の天気データを取得中...")
-            weather_data = weather_fetcher.fetch_weather_data(office)
-            if weather_data:
-                # weather_dataを引数として渡す
-                weather_fetcher.process_weather_data(weather_data)  # ここを修正
-                print(f"[SUCCESS] {office} のデータを取得しました。")
-            else:
-                print(f"[ERROR] {office} の天気データの取得に失敗しました。")
-
-    finally:
-        if 'weather_manager' in locals():
-            weather_manager.close_connection()
-
-
-
-def ensure_database_exists():
-    """データベースファイルの存在確認とcreate_database.pyの実行"""
-    db_path = "region_data.db"
-    required_tables = []
-    
-    # 新規作成が必要かどうかのフラグ
-    need_creation = False
-    
-    if os.path.exists(db_path):
-        # データベースが存在する場合、中身を確認
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        try:
-            # テーブルの存在確認
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-            tables = [row[0] for row in cursor.fetchall()]
-            required_tables = ['areas', 'weather_info', 'weather_pops', 'weather_temps']
-            
-            # 必要なテーブルが全て存在し、データが入っているか確認
-            if not all(table in tables for table in required_tables):
-                need_creation = True
-            else:
-                for table in required_tables:
-                    cursor.execute(f"SELECT COUNT(*) FROM {table}")
-                    if cursor.fetchone()[0] == 0:
-                        need_creation = True
-                        break
-        except sqlite3.Error:
-            need_creation = True
-        finally:
-            conn.close()
-    else:
-        need_creation = True
-
-    if not need_creation:
-        print("有効なデータベースが存在します。既存のデータベースを使用します。")
-        return True
-
-    print("データベースの新規作成を開始します...")
-    try:
-        # 既存のファイルがある場合は削除
-        if os.path.exists(db_path):
-            os.remove(db_path)
-            
-        create_database()
-        
-        
-        # 作成後の確認
-        if os.path.exists(db_path):
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            try:
-                for table in required_tables:
-                    cursor.execute(f"SELECT COUNT(*) FROM {table}")
-                    if cursor.fetchone()[0] == 0:
-                        print(f"Error: {table}テーブルにデータがありません。")
-                        return False
-                print("データベースの作成が完了しました。")
-                return True
-            except sqlite3.Error as e:
-                print(f"データベース確認中にエラー: {e}")
-                return False
-            finally:
-                conn.close()
-        return False
-            
-    except subprocess.CalledProcessError as e:
-        print(f"データベース作成中にエラーが発生しました:")
-        if e.stdout:
-            print(f"標準出力: {e.stdout}")
-        if e.stderr:
-            print(f"エラー出力: {e.stderr}")
-        return False
-    except Exception as e:
-        print(f"予期せぬエラーが発生しました: {e}")
-        return False
-
-
 # ORMモデルの定義
 class Area(Base):
     __tablename__ = 'areas'
@@ -245,7 +72,7 @@ class Class10(Base):
     areas = relationship('Area', back_populates='class10')
 
 # データベース接続とセッション作成
-DATABASE_URL = "sqlite:///region_data.db"  # ここを適切に設定
+DATABASE_URL = f"sqlite:///{DB_PATH}"  # ここを適切に設定
 engine = create_engine(DATABASE_URL)
 Session = sessionmaker(bind=engine)
 
@@ -253,142 +80,17 @@ Session = sessionmaker(bind=engine)
 Base.metadata.create_all(engine)
 
 
-class DatabaseManager:
-    def __init__(self, db_path="region_data.db"):
-        self.db_path = db_path
-        self.connection = None
-        self.cursor = None
-        ensure_database_exists()
-
-    def connect(self):
-        """データベースへの接続を開く"""
-        if not self.connection:
-            self.connection = sqlite3.connect(self.db_path)
-            self.cursor = self.connection.cursor()
-            
-
-    def fetch_region_hierarchy(self):
-        """地域階層情報をデータベースから取得"""
-        self.connect()  # 接続が開かれていることを確認
-        centers = {}
-        self.cursor.execute("SELECT centers_name, centers_id, offices_name, offices_id, class10s_name, class10s_id FROM areas")
-        rows = self.cursor.fetchall()
-        for row in rows:
-            center_name, center_id, office_name, office_id, class10_name, class10_id = row
-            if center_id not in centers:
-                centers[center_id] = {"name": center_name, "children": {}}
-            if office_id not in centers[center_id]["children"]:
-                centers[center_id]["children"][office_id] = {"name": office_name, "children": {}}
-            if class10_id:
-                centers[center_id]["children"][office_id]["children"][class10_id] = {"name": class10_name}
-        return centers
-
-    def fetch_weather_info(self, class10_id):
-        """特定の地域の気象情報を取得"""
-        self.connect()  # 接続が開かれていることを確認
-        self.cursor.execute("""
-            SELECT wi.offices_code, wi.publishing_office, wi.report_datetime, wi.area_name,
-                wi.time_define, wi.weather_code, wi.weather, wi.wind, wi.wave
-            FROM weather_info wi
-            JOIN areas a ON wi.offices_code = a.class10s_id
-            WHERE a.class10s_id = ?
-        """, (class10_id,))
-        rows = self.cursor.fetchall()
-        return rows
-
-    def fetch_weather_pops(self, class10_id):
-        """特定の地域の降水確率情報を取得"""
-        self.connect()  # 接続が開かれていることを確認
-        self.cursor.execute("""
-            SELECT wi.offices_code, wi.publishing_office, wi.report_datetime, 
-                wi.area_name, wi.time_define, wi.pop
-            FROM weather_pops wi
-            JOIN areas a ON wi.offices_code = a.class10s_id
-            WHERE a.class10s_id = ?
-        """, (class10_id,))
-        rows = self.cursor.fetchall()
-        return rows
-    
-    def fetch_weather_temps(self, class10_id):
-        """特定の地域の気温情報を取得（class10の直下のclass20に対応）"""
-        self.connect()
-        self.cursor.execute("""
-            SELECT wi.offices_code, wi.publishing_office, wi.report_datetime, 
-                wi.area_name, wi.time_define, wi.temp, a.class20s_name
-            FROM weather_temps wi
-            JOIN areas a ON a.class20s_name LIKE '%' || wi.area_name || '%'
-            WHERE a.class10s_id = ?
-        """, (class10_id,))
-        rows = self.cursor.fetchall()
-        
-        return rows
-    
-    def fetch_weather_reliabilities(self, office_id):
-        """特定の地域の週間天気予報情報を取得"""
-        self.connect()  # 接続が開かれていることを確認
-        self.cursor.execute("""
-            SELECT wr.offices_code, wr.publishing_office, wr.report_datetime, 
-                   wr.area_name, wr.time_define, wr.weather_code, 
-                   wr.pop, wr.reliabilities
-            FROM weather_reliabilities wr
-            JOIN areas a ON wr.offices_code = a.offices_id
-            WHERE a.offices_id = ?
-            ORDER BY wr.time_define
-        """, (office_id,))
-        rows = self.cursor.fetchall()
-        return rows
-    
-    def fetch_weather_temps_by_name(self, class10_id):
-        """class10_idに基づいて気温情報を検索"""
-        self.connect()
-        self.cursor.execute("""
-            SELECT wt.offices_code, wt.publishing_office, wt.report_datetime, 
-                   wt.area_name, wt.time_define, 
-                   wt.temps_min, wt.temps_min_upper, wt.temps_min_lower,
-                   wt.temps_max, wt.temps_max_upper, wt.temps_max_lower
-            FROM weather_tt wt
-            JOIN areas a ON a.class20s_name LIKE '%' || wt.area_name || '%'
-            WHERE a.class10s_id = ?
-        """, (class10_id,))
-        return self.cursor.fetchall()
-
-    def fetch_temp_averages(self, class10_id):
-        """class10_idに基づいて平均気温情報を検索"""
-        self.connect()
-        self.cursor.execute("""
-            SELECT DISTINCT wta.temps_ave_min, wta.temps_ave_max, wta.report_datetime, wta.area_name
-            FROM weather_temp_ave wta
-            JOIN areas a ON a.class20s_name LIKE '%' || wta.area_name || '%'
-            WHERE a.class10s_id = ?
-            ORDER BY wta.report_datetime DESC
-        """, (class10_id,))
-        return self.cursor.fetchall()
-
-    def fetch_pop_averages(self, class10_id):
-        """class10_idに基づいて降水確率情報を検索"""
-        self.connect()
-        self.cursor.execute("""
-            SELECT DISTINCT wpa.temps_pop_min, wpa.temps_pop_max, wpa.report_datetime, wpa.area_name
-            FROM weather_pop_ave wpa
-            JOIN areas a ON a.class20s_name LIKE '%' || wpa.area_name || '%'
-            WHERE a.class10s_id = ?
-            ORDER BY wpa.report_datetime DESC
-        """, (class10_id,))
-        return self.cursor.fetchall()
-
-    def close(self):
-        """データベース接続を閉じる"""
-        if self.connection:
-            self.connection.close()
-            self.connection = None
-            self.cursor = None
-
-
 # サイドバーを構築するクラス
 class Sidebar:
-    def __init__(self, region_data, on_selection_change):
-        self.region_data = region_data
+    def __init__(self, hierarchy, on_selection_change, on_office_expand=None, on_overview=None, on_search=None,
+                 on_alerts=None, alert_count=0):
+        self.hierarchy = hierarchy  # region_hierarchy.RegionHierarchy（全セッションで共有する読み取り専用の構造）
         self.on_selection_change = on_selection_change
+        self.on_office_expand = on_office_expand  # オフィスを開いたときに配下の class10_id のリストを渡す
+        self.on_overview = on_overview  # 「全国の概況」を選んだときの処理
+        self.on_search = on_search  # 検索語を入力したときの処理（検索語を渡す）
+        self.on_alerts = on_alerts  # 「アラート」を選んだときの処理
+        self.alert_count = alert_count  # 未確認のアラートの件数
         self.is_processing = False  # 処理状態を追跡
         self.controls = []  # サイドバーのコントロールを保持
 
@@ -407,21 +109,58 @@ class Sidebar:
             self.set_processing_state(True)  # 処理開始時に無効化
             self.on_selection_change(center_id, office_id, class10_id, self)
 
+    def on_office_change(self, e, office_id, class10_ids):
+        """オフィスの開閉時の処理（開いたときだけ通知する）"""
+        if self.on_office_expand and e.data == "true":
+            self.on_office_expand(office_id, class10_ids)
+
+    @profile_hook("Sidebar.build_sidebar")
     def build_sidebar(self):
         """サイドバーを作成"""
         expansion_tiles = []
         self.controls = []  # コントロールリストをリセット
 
-        for center_id, center_info in self.region_data.items():
-            center_name = center_info["name"]
+        if self.on_search:
+            search_field = ft.TextField(
+                hint_text="天気・風・波を検索（例: 雪）",
+                color=ft.colors.WHITE,
+                dense=True,
+                on_submit=lambda e: self.on_search(e.control.value) if not self.is_processing else None,
+            )
+            expansion_tiles.append(search_field)
+            self.controls.append(search_field)
+
+        if self.on_overview:
+            overview_tile = ft.ListTile(
+                title=ft.Text("全国の概況", color=ft.colors.WHITE),
+                on_click=lambda e: self.on_overview() if not self.is_processing else None,
+            )
+            expansion_tiles.append(overview_tile)
+            self.controls.append(overview_tile)
+
+        if self.on_alerts:
+            alert_title = f"アラート（未確認 {self.alert_count} 件）" if self.alert_count else "アラート"
+            alerts_tile = ft.ListTile(
+                title=ft.Text(alert_title, color=ft.colors.AMBER if self.alert_count else ft.colors.WHITE),
+                on_click=lambda e: self.on_alerts() if not self.is_processing else None,
+            )
+            expansion_tiles.append(alerts_tile)
+            self.controls.append(alerts_tile)
+
+        hierarchy = self.hierarchy
+        for center in hierarchy.nodes(CENTER):
+            center_id = hierarchy.node_id(CENTER, center)
+            center_name = hierarchy.name(CENTER, center)
             office_tiles = []
 
-            for office_id, office_info in center_info["children"].items():
-                office_name = office_info["name"]
+            for office in hierarchy.children(CENTER, center):
+                office_id = hierarchy.node_id(OFFICE, office)
+                office_name = hierarchy.name(OFFICE, office)
                 class10_tiles = []
 
-                for class10_id, class10_info in office_info["children"].items():
-                    class10_name = class10_info["name"]
+                for class10 in hierarchy.children(OFFICE, office):
+                    class10_id = hierarchy.node_id(CLASS10, class10)
+                    class10_name = hierarchy.name(CLASS10, class10)
                     
                     # class10sレベルのタイル
                     tile = ft.ListTile(
@@ -436,6 +175,9 @@ class Sidebar:
                 office_expansion = ft.ExpansionTile(
                     title=ft.Text(office_name, color=ft.colors.WHITE),
                     controls=class10_tiles,
+                    on_change=lambda e, o=office_id, office=office:
+                        self.on_office_change(e, o, [hierarchy.node_id(CLASS10, class10)
+                                                     for class10 in hierarchy.children(OFFICE, office)]),
                 )
                 office_tiles.append(office_expansion)
                 self.controls.append(office_expansion)
@@ -495,6 +237,11 @@ def format_datetime(datetime_str):
         return datetime_str
 
 
+# 天気コードごとの確認済みのアイコンのURL（確認には requests.head が必要なため、一度だけ行う）
+weather_icon_cache = {}
+weather_icon_lock = threading.Lock()
+
+
 def find_valid_weather_icon(weather_code):
     """
     指定された天気コードの画像が存在するまで、コードを1ずつ下げて探す
@@ -505,6 +252,10 @@ def find_valid_weather_icon(weather_code):
     Returns:
         str: 存在する天気コードのURL
     """
+    with weather_icon_lock:
+        if weather_code in weather_icon_cache:
+            return weather_icon_cache[weather_code]
+
     base_url = "https://www.jma.go.jp/bosai/forecast/img/"
     
     # 元のコードから始める
@@ -518,6 +269,8 @@ def find_valid_weather_icon(weather_code):
             
             # 200 OKの場合は有効な画像とみなす
             if response.status_code == 200:
+                with weather_icon_lock:
+                    weather_icon_cache[weather_code] = f"{base_url}{current_code}.svg"
                 return f"{base_url}{current_code}.svg"
             
             # 画像が見つからない場合は1を引く
@@ -530,6 +283,13 @@ def find_valid_weather_icon(weather_code):
     # 全て失敗した場合はデフォルト画像や空文字を返す
     return ""  # または、デフォルトの画像パスを返すことも可能
 
+
+def warm_weather_icons(bundle):
+    """地域のデータに含まれる天気コードのアイコンを確認しておく（先読み用）"""
+    for weather_code in dict.fromkeys(record.weather_code for record in bundle.weather_info + bundle.weekly):
+        if weather_code and weather_code.isdigit():
+            find_valid_weather_icon(weather_code)
+
 def truncate_and_wrap_text(text, max_length=23):
     """文字列を一定の長さで改行する"""
     if text is None:
@@ -553,7 +313,9 @@ class WeatherView:
             width=200,
             options=[
                 ft.dropdown.Option("3日間の天気"),
-                ft.dropdown.Option("週間天気")
+                ft.dropdown.Option("週間天気"),
+                ft.dropdown.Option("予報検証"),
+                ft.dropdown.Option("地域比較")
             ],
             value="3日間の天気"
         )
@@ -563,7 +325,9 @@ class ThreeDayWeatherView:
         self.db_manager = db_manager
         self.all_weather_data = []
         self.date_dropdown = None
+        self.live_controls = {}  # 表示中の値のコントロール（差分の反映で値だけを書き換える）
     
+    @profile_hook("ThreeDayWeatherView.process_weather_data")
     def process_weather_data(self):
         """天気データの処理とall_weather_dataの作成"""
         self.all_weather_data = []  # リセット
@@ -573,13 +337,13 @@ class ThreeDayWeatherView:
                 # 対応する降水確率データを検索
                 pops_for_time = [
                     pop for pop in self.weather_pops_data 
-                    if format_datetime(pop[4]) == format_datetime(record[4])
+                    if format_datetime(pop.time_define) == format_datetime(record.time_define)
                 ]
                 
                 # 対応する気温データを検索
                 temps_for_date = [
                     temp for temp in self.weather_temps_data 
-                    if format_datetime(temp[4]) == format_datetime(record[4])
+                    if format_datetime(temp.time_define) == format_datetime(record.time_define)
                 ]
 
                 # 温度情報を抽出
@@ -588,9 +352,9 @@ class ThreeDayWeatherView:
                 max_temp = "--"
 
                 if temps_for_date and len(temps_for_date) >= 2:
-                    area_name = temps_for_date[0][6]
-                    min_temp = safe_replace_none(temps_for_date[0][5])
-                    max_temp = safe_replace_none(temps_for_date[1][5])
+                    area_name = temps_for_date[0].class20s_name
+                    min_temp = safe_replace_none(temps_for_date[0].temp)
+                    max_temp = safe_replace_none(temps_for_date[1].temp)
                 
                 # 6時間ごとの時間帯を定義
                 time_ranges = [
@@ -605,30 +369,30 @@ class ThreeDayWeatherView:
                 for time_range in time_ranges:
                     matching_pops = [
                         pop for pop in pops_for_time 
-                        if time_range['start'] <= datetime.fromisoformat(pop[4]).hour < time_range['end']
+                        if time_range['start'] <= datetime.fromisoformat(pop.time_define).hour < time_range['end']
                     ]
-                    pops = matching_pops[0][5] if matching_pops else '--'
+                    pops = matching_pops[0].pop if matching_pops else '--'
                     pops_details.append({
                         'time_range': time_range['range'],
                         'pops': pops
                     })
                 
-                weather_icon_url = find_valid_weather_icon(record[5])
+                weather_icon_url = find_valid_weather_icon(record.weather_code)
                 self.all_weather_data.append({
-                    'area_name': record[3],
+                    'area_name': record.area_name,
                     'temp_area_name': area_name,
                     'min_temp': min_temp,
                     'max_temp': max_temp,
                     'pops_data': pops_details,
-                    'publishing_office': record[1],
-                    'report_datetime': record[2],
-                    'time_define': record[4],
-                    'formatted_time_define': format_datetime(record[4]),
+                    'publishing_office': record.publishing_office,
+                    'report_datetime': record.report_datetime,
+                    'time_define': record.time_define,
+                    'formatted_time_define': format_datetime(record.time_define),
                     'weather_icon_url': weather_icon_url,
-                    'weather_code': record[5],
-                    'weather': safe_replace_none(record[6]),
-                    'wind': safe_replace_none(record[7]),
-                    'wave': safe_replace_none(record[8]),
+                    'weather_code': record.weather_code,
+                    'weather': safe_replace_none(record.weather),
+                    'wind': safe_replace_none(record.wind),
+                    'wave': safe_replace_none(record.wave),
                 })
 
     def get_weather_data_for_date(self, selected_date):
@@ -656,17 +420,35 @@ class ThreeDayWeatherView:
 
     def fetch_weather_data(self, class10_id):
         """天気データの取得"""
-        self.weather_data = self.db_manager.fetch_weather_info(class10_id)
-        self.weather_pops_data = self.db_manager.fetch_weather_pops(class10_id)
-        self.weather_temps_data = self.db_manager.fetch_weather_temps(class10_id)
+        self.load_bundle(self.db_manager.fetch_region_bundle(class10_id))
 
-    def create_date_dropdown(self):
-        """日付選択用ドロップダウンの作成"""
+    def load_bundle(self, bundle):
+        """fetch_region_bundle で取得したデータを使う"""
+        self.weather_data = bundle.weather_info
+        self.weather_pops_data = bundle.pops
+        self.weather_temps_data = bundle.temps
+
+    def display_dates(self):
+        """日付選択用ドロップダウンに表示する日付"""
         today = datetime.today().strftime('%Y年%m月%d日')
-        unique_dates = sorted(set(format_datetime(record[4]) for record in self.weather_data))
-        display_dates = [
+        unique_dates = sorted(set(format_datetime(record.time_define) for record in self.weather_data))
+        return [
             f"{date}（今日）" if date == today else date for date in unique_dates
         ]
+
+    def update_date_options(self):
+        """日付が増減した場合だけドロップダウンの選択肢を書き換える（書き換えた場合は True）"""
+        display_dates = self.display_dates()
+        if self.date_dropdown is None or [option.key for option in self.date_dropdown.options] == display_dates:
+            return False
+        self.date_dropdown.options = [ft.dropdown.Option(display_date) for display_date in display_dates]
+        if self.date_dropdown.value not in display_dates:
+            self.date_dropdown.value = display_dates[0] if display_dates else None
+        return True
+
+    def create_date_dropdown(self):
+        """日付選択用ドロップダウンの作成"""
+        display_dates = self.display_dates()
         
         self.date_dropdown = ft.Dropdown(
             options=[ft.dropdown.Option(display_date) for display_date in display_dates],
@@ -675,13 +457,64 @@ class ThreeDayWeatherView:
         )
         return self.date_dropdown
 
+    def display_values(self, weather_data):
+        """表示する値（コントロール名 → (文字列, 色)）"""
+        def value_with_unit(value, unit):
+            if value == '--':
+                return '--', ft.colors.GREY_600
+            return f"{value}{unit}", ft.colors.BLUE_900
+
+        values = {
+            'report': (f"報告日時： {format_datetime(weather_data['report_datetime'])}", ft.colors.GREY_600),
+            'weather': (f"天気: {truncate_and_wrap_text(weather_data['weather'])}", None),
+            'wind': (f"風速: {truncate_and_wrap_text(weather_data['wind'])}", None),
+            'wave': (f"波: {truncate_and_wrap_text(weather_data['wave'])}", None),
+            'temp_area': (f"地域: {weather_data['temp_area_name']}", None),
+            'min_temp': value_with_unit(weather_data['min_temp'], "℃"),
+            'max_temp': value_with_unit(weather_data['max_temp'], "℃"),
+        }
+        for index, pop in enumerate(weather_data['pops_data']):
+            values[f"pop_{index}"] = value_with_unit(pop['pops'], "%")
+        return values
+
+    def live_text(self, name, values):
+        """値のコントロールを作成し、差分の反映用に保持"""
+        text, color = values[name]
+        control = ft.Text(text, color=color) if color else ft.Text(text)
+        self.live_controls[name] = control
+        return control
+
+    def apply_weather_data(self, weather_data):
+        """表示中のコントロールのうち、値が変わったものだけを書き換える（画面は作り直さない）
+
+        Returns:
+            list: 書き換えたコントロール
+        """
+        changed = []
+        for name, (text, color) in self.display_values(weather_data).items():
+            control = self.live_controls.get(name)
+            if control is None:
+                continue
+            if control.value != text or (color and control.color != color):
+                control.value = text
+                if color:
+                    control.color = color
+                changed.append(control)
+        icon = self.live_controls.get('icon')
+        if icon is not None and weather_data['weather_icon_url'] and icon.src != weather_data['weather_icon_url']:
+            icon.src = weather_data['weather_icon_url']
+            changed.append(icon)
+        return changed
+
     def create_weather_info_container(self, weather_data):
         """天気情報のコンテナを作成"""
+        values = self.display_values(weather_data)
         return ft.Container(
             content=ft.Column([
                 ft.Text(f" {weather_data['area_name']}", weight=ft.FontWeight.BOLD, size=16, color=ft.colors.BLUE_900),
                 ft.Text(f"気象台： {weather_data['publishing_office']}", weight=ft.FontWeight.BOLD),
-                ft.Text(f"報告日時： {format_datetime(weather_data['report_datetime'])}", color=ft.colors.GREY_600),
+                self.live_text('report', values),
+                self.live_controls.setdefault('changes', ft.Text("", color=ft.colors.ORANGE_800, size=12)),
             ]),
             padding=10,
             margin=5,
@@ -691,19 +524,25 @@ class ThreeDayWeatherView:
 
     def create_weather_details_container(self, weather_data):
         """天気詳細のコンテナを作成"""
+        values = self.display_values(weather_data)
+        if weather_data['weather_icon_url']:
+            icon = ft.Image(
+                src=weather_data['weather_icon_url'],
+                width=100,
+                height=100
+            )
+            self.live_controls['icon'] = icon
+        else:
+            icon = ft.Text("画像なし")
         return ft.Container(
             content=ft.Column([
                 self.date_dropdown,
                 ft.Row([
-                    ft.Image(
-                        src=weather_data['weather_icon_url'],
-                        width=100,
-                        height=100
-                    ) if weather_data['weather_icon_url'] else ft.Text("画像なし"),
+                    icon,
                     ft.Column([
-                        ft.Text(f"天気: {truncate_and_wrap_text(weather_data['weather'])}"),
-                        ft.Text(f"風速: {truncate_and_wrap_text(weather_data['wind'])}"),
-                        ft.Text(f"波: {truncate_and_wrap_text(weather_data['wave'])}"),
+                        self.live_text('weather', values),
+                        self.live_text('wind', values),
+                        self.live_text('wave', values),
                     ])
                 ])
             ]),
@@ -719,7 +558,7 @@ class ThreeDayWeatherView:
         return ft.Container(
             content=ft.Column([
                 ft.Row([
-                    self.create_pops_container(weather_data['pops_data']),
+                    self.create_pops_container(weather_data),
                     self.create_temps_container(weather_data)
                 ]),
             ]),
@@ -729,19 +568,17 @@ class ThreeDayWeatherView:
             bgcolor=ft.colors.WHITE,
         )
 
-    def create_pops_container(self, pops_data):
+    def create_pops_container(self, weather_data):
         """降水確率のコンテナを作成"""
+        values = self.display_values(weather_data)
         return ft.Container(
             content=ft.Column([
                 ft.Text("降水確率", weight=ft.FontWeight.BOLD),
                 ft.Column([
                     ft.Row([
                         ft.Text(f"{pop['time_range']}", expand=True),
-                        ft.Text(
-                            f"{pop['pops']}%" if pop['pops'] != '--' else '--', 
-                            color=ft.colors.BLUE_900 if pop['pops'] != '--' else ft.colors.GREY_600
-                        )
-                    ]) for pop in pops_data
+                        self.live_text(f"pop_{index}", values),
+                    ]) for index, pop in enumerate(weather_data['pops_data'])
                 ]),
             ]),
             padding=10,
@@ -754,23 +591,20 @@ class ThreeDayWeatherView:
 
     def create_temps_container(self, weather_data):
         """気温のコンテナを作成"""
+        values = self.display_values(weather_data)
+        temp_area = self.live_text('temp_area', values)
+        temp_area.weight = ft.FontWeight.BOLD
         return ft.Container(
             content=ft.Column([
                 ft.Text("気温", weight=ft.FontWeight.BOLD),
-                ft.Text(f"地域: {weather_data['temp_area_name']}", weight=ft.FontWeight.BOLD),
+                temp_area,
                 ft.Row([
                     ft.Text("最低気温:", expand=True),
-                    ft.Text(
-                        f"{weather_data['min_temp']}℃" if weather_data['min_temp'] != '--' else '--',
-                        color=ft.colors.BLUE_900 if weather_data['min_temp'] != '--' else ft.colors.GREY_600
-                    )
+                    self.live_text('min_temp', values),
                 ]),
                 ft.Row([
                     ft.Text("最高気温:", expand=True),
-                    ft.Text(
-                        f"{weather_data['max_temp']}℃" if weather_data['max_temp'] != '--' else '--',
-                        color=ft.colors.BLUE_900 if weather_data['max_temp'] != '--' else ft.colors.GREY_600
-                    )
+                    self.live_text('max_temp', values),
                 ])
             ]),
             padding=10,
@@ -783,6 +617,7 @@ class ThreeDayWeatherView:
 
     def build_view(self, weather_data):
         """3日間の天気ビューを構築"""
+        self.live_controls = {}
         return ft.Column([
             self.create_weather_info_container(weather_data),
             self.create_weather_details_container(weather_data),
@@ -796,10 +631,12 @@ class WeeklyWeatherView:
         self.temp_data = None
         self.averages_data = None
 
-    def fetch_weekly_data(self, office_id, class10_id):
-        """週間天気データと気温データの取得"""
-        self.weather_data = self.db_manager.fetch_weather_reliabilities(office_id)
-        self.temp_data = self.db_manager.fetch_weather_temps_by_name(class10_id)
+    def load_bundle(self, bundle):
+        """fetch_region_bundle で取得した週間天気・気温・平均値のデータを使う"""
+        self.weather_data = bundle.weekly
+        self.temp_data = bundle.weekly_temps
+        self.temp_averages_data = bundle.temp_averages
+        self.pop_averages_data = bundle.pop_averages
 
 
     def format_temp_range(self, min_temp, min_upper, min_lower, max_temp, max_upper, max_lower):
@@ -810,7 +647,7 @@ class WeeklyWeatherView:
 
     def create_daily_weather_card(self, weather_data, temp_data):
         """1日分の天気カードを作成"""
-        weather_icon_url = find_valid_weather_icon(weather_data[5])
+        weather_icon_url = find_valid_weather_icon(weather_data.weather_code)
         
         # 気温情報の整形
         min_range = "--～--"
@@ -819,16 +656,16 @@ class WeeklyWeatherView:
         
         if temp_data:
             min_range, max_range = self.format_temp_range(
-                temp_data[5], temp_data[6], temp_data[7],  # min temps
-                temp_data[8], temp_data[9], temp_data[10]  # max temps
+                temp_data.temps_min, temp_data.temps_min_upper, temp_data.temps_min_lower,
+                temp_data.temps_max, temp_data.temps_max_upper, temp_data.temps_max_lower
             )
-            area_name = temp_data[3]
+            area_name = temp_data.area_name
 
         return ft.Container(
             content=ft.Column([
                 # 日付
                 ft.Text(
-                    format_datetime(weather_data[4]),
+                    format_datetime(weather_data.time_define),
                     weight=ft.FontWeight.BOLD,
                     size=16
                 ),
@@ -848,8 +685,8 @@ class WeeklyWeatherView:
                         fit=ft.ImageFit.CONTAIN
                     ) if weather_icon_url else ft.Text("画像なし"),
                     ft.Column([
-                        ft.Text(f"降水確率: {weather_data[6]}%"),
-                        ft.Text(f"信頼度: {weather_data[7]}")
+                        ft.Text(f"降水確率: {weather_data.pop}%"),
+                        ft.Text(f"信頼度: {weather_data.reliabilities}")
                     ]),
                 ], alignment=ft.MainAxisAlignment.CENTER),
                 # 気温情報
@@ -878,11 +715,6 @@ class WeeklyWeatherView:
             width=200,
         )
         
-    def load_averages_data(self, class10_id):
-        """平均気温と降水確率のデータを読み込む"""
-        self.temp_averages_data = self.db_manager.fetch_temp_averages(class10_id)
-        self.pop_averages_data = self.db_manager.fetch_pop_averages(class10_id)
-
     def create_averages_card(self):
         """週間平均情報カードを作成"""
         if not self.temp_averages_data and not self.pop_averages_data:
@@ -894,10 +726,10 @@ class WeeklyWeatherView:
 
         # 地域名を取得（気温データまたは降水確率データから）
         area_name = "不明"
-        if temp_ave and len(temp_ave) > 3:
-            area_name = temp_ave[3]
-        elif pop_ave and len(pop_ave) > 3:
-            area_name = pop_ave[3]
+        if temp_ave:
+            area_name = temp_ave.area_name
+        elif pop_ave:
+            area_name = pop_ave.area_name
         
         return ft.Container(
             content=ft.Column([
@@ -923,13 +755,13 @@ class WeeklyWeatherView:
                     ft.Container(
                         content=ft.Row([
                             ft.Text(
-                                f"最低 {temp_ave[0] if temp_ave else '--'}℃",
+                                f"最低 {temp_ave.temps_ave_min if temp_ave else '--'}℃",
                                 color=ft.colors.BLUE,
                                 size=16
                             ),
                             ft.Text(" / "),
                             ft.Text(
-                                f"最高 {temp_ave[1] if temp_ave else '--'}℃",
+                                f"最高 {temp_ave.temps_ave_max if temp_ave else '--'}℃",
                                 color=ft.colors.RED,
                                 size=16
                             ),
@@ -944,13 +776,13 @@ class WeeklyWeatherView:
                     ft.Container(
                         content=ft.Row([
                             ft.Text(
-                                f"最小 {pop_ave[0] if pop_ave else '--'}%",
+                                f"最小 {pop_ave.temps_pop_min if pop_ave else '--'}%",
                                 color=ft.colors.CYAN,
                                 size=16
                             ),
                             ft.Text(" / "),
                             ft.Text(
-                                f"最大 {pop_ave[1] if pop_ave else '--'}%",
+                                f"最大 {pop_ave.temps_pop_max if pop_ave else '--'}%",
                                 color=ft.colors.INDIGO,
                                 size=16
                             ),
@@ -965,12 +797,10 @@ class WeeklyWeatherView:
             ])
         )
 
-    def build_view(self, office_id, class10_id):
-        # まずデータを読み込む
-        self.load_averages_data(class10_id)
-
+    @profile_hook("WeeklyWeatherView.build_view")
+    def build_view(self, bundle):
         """週間天気ビューを構築"""
-        self.fetch_weekly_data(office_id, class10_id)
+        self.load_bundle(bundle)
         
         if not self.weather_data:
             return ft.Container(
@@ -986,9 +816,9 @@ class WeeklyWeatherView:
         first_data = self.weather_data[0]
         header = ft.Container(
             content=ft.Column([
-                ft.Text(f"{first_data[3]}", weight=ft.FontWeight.BOLD, size=16, color=ft.colors.BLUE_900),
-                ft.Text(f"気象台： {first_data[1]}", weight=ft.FontWeight.BOLD),
-                ft.Text(f"報告日時： {format_datetime(first_data[2])}", color=ft.colors.GREY_600),
+                ft.Text(f"{first_data.area_name}", weight=ft.FontWeight.BOLD, size=16, color=ft.colors.BLUE_900),
+                ft.Text(f"気象台： {first_data.publishing_office}", weight=ft.FontWeight.BOLD),
+                ft.Text(f"報告日時： {format_datetime(first_data.report_datetime)}", color=ft.colors.GREY_600),
             ]),
             padding=10,
             margin=5,
@@ -999,13 +829,13 @@ class WeeklyWeatherView:
         # 日付ごとのデータをグループ化
         daily_data = {}
         for weather in self.weather_data:
-            date = format_datetime(weather[4])
+            date = format_datetime(weather.time_define)
             if date not in daily_data:
                 daily_data[date] = {'weather': weather, 'temp': None}
 
         # 気温データを日付ごとのデータに追加
         for temp in self.temp_data:
-            date = format_datetime(temp[4])
+            date = format_datetime(temp.time_define)
             if date in daily_data:
                 daily_data[date]['temp'] = temp
 
@@ -1031,17 +861,625 @@ class WeeklyWeatherView:
         ])
 
 
-def display_selected_region(center_id, office_id, class10_id, db_manager, main_content, page, sidebar=None):
+class VerificationView:
+    """予報検証の集計結果（verification_weekly / verification_revisions）を表示"""
+
+    VARIABLE_LABELS = {"pop": "降水確率", "temp": "気温", "temps_min": "最低気温", "temps_max": "最高気温"}
+    METRIC_LABELS = {"revision": "発表ごとの修正量", "error_vs_final": "最終発表との差"}
+
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+
+    def format_number(self, value, suffix=""):
+        return "--" if value is None else f"{value:.1f}{suffix}"
+
+    def create_table(self, columns, rows):
+        return ft.DataTable(
+            columns=[ft.DataColumn(ft.Text(column, weight=ft.FontWeight.BOLD)) for column in columns],
+            rows=[ft.DataRow(cells=[ft.DataCell(ft.Text(str(value))) for value in row]) for row in rows],
+        )
+
+    def build_view(self, office_id):
+        weekly, revisions = self.db_manager.fetch_verification_summary(office_id)
+        if not weekly and not revisions:
+            return ft.Container(
+                content=ft.Text("予報検証の結果がありません（アーカイブを有効にして検証を実行してください）",
+                                color=ft.colors.RED),
+                padding=10,
+                margin=10,
+                border_radius=10,
+                bgcolor=ft.colors.GREY_200,
+                border=ft.border.all(1, ft.colors.GREY_400)
+            )
+
+        weekly_rows = [
+            (self.VARIABLE_LABELS.get(variable, variable), grade, count, self.format_number(mae),
+             self.format_number(bias), self.format_number(hit_rate * 100 if hit_rate is not None else None, "%"))
+            for variable, grade, count, mae, bias, hit_rate, _ in weekly
+        ]
+        revision_rows = [
+            (self.VARIABLE_LABELS.get(variable, variable), self.METRIC_LABELS.get(metric, metric), lead_time, count,
+             self.format_number(mean), self.format_number(mean_abs), self.format_number(rms))
+            for variable, metric, lead_time, count, mean, mean_abs, rms in revisions
+        ]
+        computed_at = weekly[0].computed_at if weekly else ""
+        return ft.Column([
+            ft.Container(
+                content=ft.Column([
+                    ft.Text("週間予報と後の短期予報の比較", weight=ft.FontWeight.BOLD, size=16, color=ft.colors.BLUE_900),
+                    ft.Text(f"計算日時： {computed_at[:16]}", color=ft.colors.GREY_600),
+                    self.create_table(["項目", "信頼度", "件数", "平均絶対誤差", "バイアス", "範囲内の割合"], weekly_rows),
+                ]),
+                padding=10,
+                margin=5,
+                border_radius=10,
+                bgcolor=ft.colors.BLUE_50
+            ),
+            ft.Container(
+                content=ft.Column([
+                    ft.Text("リードタイム別の修正量と誤差", weight=ft.FontWeight.BOLD, size=16, color=ft.colors.BLUE_900),
+                    self.create_table(["項目", "指標", "リードタイム", "件数", "平均", "平均絶対値", "RMS"], revision_rows),
+                ], scroll=ft.ScrollMode.AUTO),
+                padding=10,
+                margin=5,
+                border_radius=10,
+                bgcolor=ft.colors.WHITE
+            ),
+        ], scroll=ft.ScrollMode.AUTO)
+
+
+class ComparisonView:
+    """複数の地域（class10）の3日間・週間の予報を1つの表に並べて比較
+
+    比較する地域はセッションの間保持し、表示のたびに fetch_region_bundles でまとめて取得する。
+    """
+
+    MAX_REGIONS = 20
+    MAX_DAYS = 7
+
+    def __init__(self, db_manager, hierarchy):
+        self.db_manager = db_manager
+        self.hierarchy = hierarchy
+        self.class10_ids = []
+
+    def region_name(self, class10_id):
+        class10 = self.hierarchy.index(CLASS10, class10_id)
+        return class10_id if class10 is None else self.hierarchy.name(CLASS10, class10)
+
+    def add(self, class10_id):
+        """比較に地域を追加（上限を超えた場合は古いものから外す）"""
+        if class10_id not in self.class10_ids:
+            self.class10_ids.append(class10_id)
+            del self.class10_ids[:-self.MAX_REGIONS]
+
+    def remove(self, class10_id):
+        if class10_id in self.class10_ids:
+            self.class10_ids.remove(class10_id)
+
+    def clear(self):
+        self.class10_ids = []
+
+    def summarize(self, bundle):
+        """地域の予報を日付（YYYY-MM-DD）ごとの1行の文字列にまとめる
+
+        3日間の天気がある日はその天気・気温・最大の降水確率、それ以降の日は週間天気の気温・降水確率を使う。
+        """
+        daily = {}
+        for record in bundle.weather_info:
+            date = record.time_define[:10]
+            if date in daily:
+                continue
+            temps = [temp.temp for temp in bundle.temps if temp.time_define[:10] == date]
+            pops = [int(pop.pop) for pop in bundle.pops if pop.time_define[:10] == date and str(pop.pop).isdigit()]
+            # 3日間の天気の表示と同じく、その日の1件目を最低気温、2件目を最高気温とする
+            min_temp, max_temp = "--", "--"
+            if len(temps) >= 2:
+                min_temp, max_temp = safe_replace_none(temps[0]), safe_replace_none(temps[1])
+            weather = safe_replace_none(record.weather).replace("\u3000", " ")
+            if len(weather) > 8:
+                weather = weather[:8] + "…"
+            daily[date] = f"{weather} {min_temp}/{max_temp}℃ {max(pops) if pops else '--'}%"
+
+        weekly_temps = {}
+        for temp in bundle.weekly_temps:
+            weekly_temps.setdefault(temp.time_define[:10], temp)
+        for record in bundle.weekly:
+            date = record.time_define[:10]
+            if date in daily:
+                continue
+            temp = weekly_temps.get(date)
+            min_temp = (temp.temps_min if temp else None) or "--"
+            max_temp = (temp.temps_max if temp else None) or "--"
+            daily[date] = f"{min_temp}/{max_temp}℃ {record.pop or '--'}% {record.reliabilities or ''}".rstrip()
+        return daily
+
+    @profile_hook("ComparisonView.build_view")
+    def build_view(self, on_change):
+        """比較表を作成（地域を外したときは on_change() で表示し直す）"""
+        if not self.class10_ids:
+            return ft.Text("比較する地域がありません。", color=ft.colors.RED)
+
+        bundles = self.db_manager.fetch_region_bundles(self.class10_ids)
+        summaries = {class10_id: self.summarize(bundle) for class10_id, bundle in bundles.items()}
+        dates = sorted({date for summary in summaries.values() for date in summary})[:self.MAX_DAYS]
+
+        def remove_region(class10_id):
+            self.remove(class10_id)
+            on_change()
+
+        def clear_regions(e):
+            self.clear()
+            on_change()
+
+        rows = []
+        for class10_id in self.class10_ids:
+            cells = [ft.DataCell(ft.Row([
+                ft.IconButton(icon=ft.icons.CLOSE, icon_size=16, tooltip="比較から外す",
+                              on_click=lambda e, c=class10_id: remove_region(c)),
+                ft.Text(self.region_name(class10_id)),
+            ]))]
+            cells += [ft.DataCell(ft.Text(summaries[class10_id].get(date, "--"), size=12)) for date in dates]
+            rows.append(ft.DataRow(cells=cells))
+
+        table = ft.DataTable(
+            columns=[ft.DataColumn(ft.Text("地域", weight=ft.FontWeight.BOLD))] +
+                    [ft.DataColumn(ft.Text(f"{date[5:7]}/{date[8:10]}", weight=ft.FontWeight.BOLD)) for date in dates],
+            rows=rows,
+        )
+        return ft.Column([
+            ft.Container(
+                content=ft.Row([
+                    ft.Text(f"地域の比較（{len(self.class10_ids)} 地域）", weight=ft.FontWeight.BOLD, size=16,
+                            color=ft.colors.BLUE_900),
+                    ft.TextButton("比較をクリア", on_click=clear_regions),
+                ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
+                padding=10,
+                margin=5,
+                border_radius=10,
+                bgcolor=ft.colors.BLUE_50
+            ),
+            ft.Text("天気 最低/最高気温 降水確率（週間予報の日は信頼度も表示）。地域を選んでこの表示に切り替えると比較に追加されます。",
+                    color=ft.colors.GREY_600, size=12),
+            ft.Row([table], scroll=ft.ScrollMode.AUTO),
+        ], scroll=ft.ScrollMode.AUTO)
+
+
+def region_path(hierarchy, class10_id):
+    """class10_id から (center_id, office_id, class10_id) を取得（地域階層に無い場合は None）"""
+    class10 = hierarchy.index(CLASS10, class10_id)
+    if class10 is None:
+        return None
+    office = hierarchy.parent(CLASS10, class10)
+    center = hierarchy.parent(OFFICE, office)
+    return hierarchy.node_id(CENTER, center), hierarchy.node_id(OFFICE, office), class10_id
+
+
+class SearchView:
+    """天気・風・波の文の全文検索の結果（該当する地域と日時）を表示
+
+    地域名を押すと、その地域の天気を表示する。
+    """
+
+    def __init__(self, db_manager, hierarchy):
+        self.db_manager = db_manager
+        self.hierarchy = hierarchy
+
+    def region_path(self, class10_id):
+        return region_path(self.hierarchy, class10_id)
+
+    @profile_hook("SearchView.build_view")
+    def build_view(self, query, on_select):
+        started = time.perf_counter()
+        records = self.db_manager.fetch_text_search(query)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if not records:
+            return ft.Text(f"「{query}」を含む予報はありません。", color=ft.colors.RED)
+
+        rows = []
+        for record in records:
+            path = self.region_path(record.offices_code)
+            area_name = safe_replace_none(record.area_name)
+            if path:
+                region_cell = ft.TextButton(area_name, on_click=lambda e, p=path: on_select(*p))
+            else:
+                region_cell = ft.Text(area_name)
+            rows.append(ft.DataRow(cells=[
+                ft.DataCell(region_cell),
+                ft.DataCell(ft.Text(f"{record.time_define[5:7]}/{record.time_define[8:10]} {record.time_define[11:16]}")),
+                ft.DataCell(ft.Text(safe_replace_none(record.weather), size=12)),
+                ft.DataCell(ft.Text(safe_replace_none(record.wind), size=12)),
+                ft.DataCell(ft.Text(safe_replace_none(record.wave), size=12)),
+            ]))
+
+        table = ft.DataTable(
+            columns=[ft.DataColumn(ft.Text(name, weight=ft.FontWeight.BOLD)) for name in ("地域", "日時", "天気", "風", "波")],
+            rows=rows,
+        )
+        return ft.Column([
+            ft.Container(
+                content=ft.Column([
+                    ft.Text(f"「{query}」の検索結果", weight=ft.FontWeight.BOLD, size=16, color=ft.colors.BLUE_900),
+                    ft.Text(f"{len(records)} 件（{elapsed_ms:.1f} ミリ秒）　地域名を押すとその地域の天気を表示します",
+                            color=ft.colors.GREY_600),
+                ]),
+                padding=10,
+                margin=5,
+                border_radius=10,
+                bgcolor=ft.colors.BLUE_50
+            ),
+            ft.Row([table], scroll=ft.ScrollMode.AUTO),
+        ], scroll=ft.ScrollMode.AUTO)
+
+
+class AlertView:
+    """アラートのルールの追加・削除と、取り込みごとに記録された該当（地域と日時）の一覧
+
+    ルールの評価は取り込み時に行うため、画面はルールと記録のテーブルを読むだけ。
+    ルールの追加・削除・確認済みへの変更は書き込み用の接続で行う。
+    """
+
+    def __init__(self, db_manager, hierarchy):
+        self.db_manager = db_manager
+        self.hierarchy = hierarchy
+
+    def area_label(self, class10_id):
+        if not class10_id:
+            return "全地域"
+        class10 = self.hierarchy.index(CLASS10, class10_id)
+        return self.hierarchy.name(CLASS10, class10) if class10 is not None else class10_id
+
+    def write(self, action, *args, **kwargs):
+        """書き込み用の接続で action を実行し、読み込み側に反映する"""
+        connection = open_write_connection(self.db_manager.db_path)
+        try:
+            return action(connection, *args, **kwargs)
+        finally:
+            connection.close()
+            refresh_memory_replica(self.db_manager.db_path)
+
+    def create_rule_form(self, on_change, default_class10_id=None):
+        kind_dropdown = ft.Dropdown(
+            label="種類",
+            width=140,
+            value="pop",
+            options=[ft.dropdown.Option(key=kind, text=label) for kind, label in KIND_LABELS.items()],
+        )
+        operator_dropdown = ft.Dropdown(
+            label="比較",
+            width=90,
+            value=">=",
+            options=[ft.dropdown.Option(operator) for operator in ALERT_OPERATORS],
+        )
+        threshold_field = ft.TextField(label="しきい値", width=100, value="80")
+        class10_field = ft.TextField(label="地域コード（空欄は全地域）", width=200, value=default_class10_id or "")
+        message = ft.Text("", color=ft.colors.RED)
+
+        def add_rule(e):
+            try:
+                threshold = float(threshold_field.value)
+            except (TypeError, ValueError):
+                message.value = "しきい値は数値で入力してください。"
+                message.update()
+                return
+            class10_id = (class10_field.value or "").strip() or None
+            if class10_id and self.hierarchy.index(CLASS10, class10_id) is None:
+                message.value = f"地域コード {class10_id} はありません。"
+                message.update()
+                return
+            self.write(add_alert_rule, kind_dropdown.value, operator_dropdown.value, threshold, class10_id)
+            on_change()
+
+        return ft.Column([
+            ft.Row([kind_dropdown, operator_dropdown, threshold_field, class10_field,
+                    ft.ElevatedButton("ルールを追加", on_click=add_rule)], wrap=True),
+            message,
+        ])
+
+    def create_rules_list(self, rules, on_change):
+        def remove_rule(rule_id):
+            self.write(remove_alert_rule, rule_id)
+            on_change()
+
+        if not rules:
+            return ft.Text("ルールはありません。", color=ft.colors.GREY_600)
+        return ft.Column([
+            ft.Row([
+                ft.Text(f"{rule_label(rule.kind, rule.operator, rule.threshold, rule.name)}"
+                        f"（{self.area_label(rule.class10_id)}）"),
+                ft.IconButton(icon=ft.icons.DELETE, tooltip="ルールを削除",
+                              on_click=lambda e, rule_id=rule.id: remove_rule(rule_id)),
+            ])
+            for rule in rules
+        ], spacing=0)
+
+    @profile_hook("AlertView.build_view")
+    def build_view(self, on_select, on_change, default_class10_id=None):
+        rules = self.db_manager.fetch_alert_rules()
+        events = self.db_manager.fetch_alert_events()
+        unacknowledged = self.db_manager.count_unacknowledged_alerts()
+
+        def acknowledge_all(e):
+            self.write(acknowledge_alert_events)
+            on_change()
+
+        rows = []
+        for event in events:
+            path = region_path(self.hierarchy, event.class10_id)
+            area_name = safe_replace_none(event.area_name)
+            if path:
+                region_cell = ft.TextButton(area_name, on_click=lambda e, p=path: on_select(*p))
+            else:
+                region_cell = ft.Text(area_name)
+            weight = ft.FontWeight.NORMAL if event.acknowledged else ft.FontWeight.BOLD
+            rows.append(ft.DataRow(cells=[
+                ft.DataCell(ft.Text(rule_label(event.kind, event.operator, event.threshold, event.rule_name),
+                                    weight=weight)),
+                ft.DataCell(region_cell),
+                ft.DataCell(ft.Text(f"{event.time_define[5:7]}/{event.time_define[8:10]} {event.time_define[11:16]}")),
+                ft.DataCell(ft.Text(f"{event.value:g}", weight=weight)),
+                ft.DataCell(ft.Text(format_datetime(event.report_datetime), size=12)),
+            ]))
+        events_view = ft.Row([ft.DataTable(
+            columns=[ft.DataColumn(ft.Text(name, weight=ft.FontWeight.BOLD))
+                     for name in ("ルール", "地域", "日時", "値", "発表")],
+            rows=rows,
+        )], scroll=ft.ScrollMode.AUTO) if rows else ft.Text("該当した記録はありません。", color=ft.colors.GREY_600)
+
+        return ft.Column([
+            ft.Container(
+                content=ft.Column([
+                    ft.Text("アラート", weight=ft.FontWeight.BOLD, size=16, color=ft.colors.BLUE_900),
+                    ft.Text(f"未確認 {unacknowledged} 件　ルールはデータベースの更新ごとに新しい発表の値で評価します",
+                            color=ft.colors.GREY_600),
+                ]),
+                padding=10,
+                margin=5,
+                border_radius=10,
+                bgcolor=ft.colors.BLUE_50
+            ),
+            self.create_rule_form(on_change, default_class10_id),
+            self.create_rules_list(rules, on_change),
+            ft.TextButton("全て確認済みにする", on_click=acknowledge_all, disabled=not unacknowledged),
+            events_view,
+        ], scroll=ft.ScrollMode.AUTO)
+
+
+def watch_database(db_manager, on_change, name, poll_seconds, error_message):
+    """データベースが更新されたら on_change() を呼ぶ監視スレッドを開始
+
+    Returns:
+        threading.Event: set() すると監視を止める
+    """
+    stop = threading.Event()
+
+    def watch():
+        token = database_change_token(db_manager.db_path)
+        while not stop.wait(poll_seconds):
+            current = database_change_token(db_manager.db_path)
+            if current == token:
+                continue
+            token = current
+            try:
+                on_change()
+            except Exception as e:
+                print(f"[WARNING] {error_message}: {e}")
+            finally:
+                db_manager.release()
+
+    threading.Thread(target=watch, name=name, daemon=True).start()
+    return stop
+
+
+def region_changes(changes, bundle):
+    """オフィスの差分から、表示中の地域（RegionBundle）に関係する変更だけを取り出す"""
+    codes = {bundle.class10_id} | {record.offices_code for record in bundle.weekly}
+    names = {record.area_name for record in bundle.temps} | {record.area_name for record in bundle.weekly_temps}
+    return [
+        change for change in changes
+        if change.area_code in codes or (change.table_name in ("weather_temps", "weather_tt") and change.area_name in names)
+    ]
+
+
+def describe_changes(changes):
+    """変更の要約（例: 前回の発表から変わった値: 降水確率 2件・気温 1件（12/16, 12/17））"""
+    if not changes:
+        return "前回の発表から変わった値はありません。"
+    labels = {"weather_info": "天気", "weather_pops": "降水確率", "weather_temps": "気温",
+              "weather_reliabilities": "週間天気", "weather_tt": "週間気温"}
+    counts = {}
+    for change in changes:
+        label = labels.get(change.table_name, change.table_name)
+        counts[label] = counts.get(label, 0) + 1
+    dates = sorted({f"{change.time_define[5:7]}/{change.time_define[8:10]}" for change in changes
+                    if str(change.time_define)[:1].isdigit()})
+    summary = "・".join(f"{label} {count}件" for label, count in counts.items())
+    return f"前回の発表から変わった値: {summary}（{', '.join(dates)}）"
+
+
+class RegionLiveUpdate:
+    """開いている地域の表示に、取り込みで変わった値だけを反映する
+
+    データベースの更新を検出したら、オフィスの発表日時が変わった場合だけ地域のデータを1回読み直し、
+    取り込み時に作成した差分（region_diffs）のうちこの地域の変更を apply(bundle, changes) に渡す。
+    画面の作り直しは行わず、値が変わったコントロールだけを書き換えるのは apply 側の役割。
+    """
+
+    POLL_SECONDS = 2
+
+    def __init__(self, db_manager, office_id, class10_id, apply):
+        self.db_manager = db_manager
+        self.office_id = office_id
+        self.class10_id = class10_id
+        self.apply = apply
+        self.lock = threading.Lock()
+        self.report_datetime = db_manager.fetch_office_report(office_id)
+        self.watch_stop = None
+
+    def check(self):
+        """発表が変わっていれば差分を反映する（反映した場合は True）"""
+        with self.lock:
+            report_datetime = self.db_manager.fetch_office_report(self.office_id)
+            if report_datetime is None or report_datetime == self.report_datetime:
+                return False
+            bundle = self.db_manager.fetch_region_bundle(self.class10_id)
+            changes = region_changes(self.db_manager.fetch_region_diff(self.office_id), bundle)
+            self.report_datetime = report_datetime
+            self.apply(bundle, changes)
+            return True
+
+    def start(self):
+        self.stop()
+        self.watch_stop = watch_database(self.db_manager, self.check, "region-watch", self.POLL_SECONDS,
+                                         "表示中の地域の更新に失敗しました")
+
+    def stop(self):
+        if self.watch_stop is not None:
+            self.watch_stop.set()
+            self.watch_stop = None
+
+
+class OverviewView:
+    """全国の概況（地方・オフィスごとの日別の天気・気温・降水確率）を1つの表で表示
+
+    取り込み時に作成した region_overview を1回読むだけで表示する。
+    start_watch() を呼ぶと、データベースが更新されるたびに表示し直す（更新中はコミットされたオフィスから順に埋まる）。
+    """
+
+    MAX_DAYS = 7
+    POLL_SECONDS = 2
+
+    def __init__(self, db_manager, hierarchy):
+        self.db_manager = db_manager
+        self.hierarchy = hierarchy
+        self.watch_stop = None
+
+    def create_cell(self, record):
+        if record is None:
+            return ft.DataCell(ft.Text("--", color=ft.colors.GREY_500))
+        weather_icon_url = find_valid_weather_icon(record.weather_code) if record.weather_code else ""
+        min_temp = "--" if record.min_temp is None else f"{record.min_temp:g}"
+        max_temp = "--" if record.max_temp is None else f"{record.max_temp:g}"
+        max_pop = "--" if record.max_pop is None else record.max_pop
+        return ft.DataCell(ft.Row([
+            ft.Image(src=weather_icon_url, width=24, height=24) if weather_icon_url else ft.Text(""),
+            ft.Text(f"{min_temp}/{max_temp}℃ {max_pop}%", size=12),
+        ], spacing=4))
+
+    @profile_hook("OverviewView.build_view")
+    def build_view(self):
+        records = self.db_manager.fetch_region_overview()
+        if not records:
+            return ft.Text("地域を選択してください。（全国の概況は次回の更新後に表示されます）")
+
+        by_area = {}
+        for record in records:
+            by_area.setdefault((record.level, record.area_id), {})[record.date] = record
+        dates = sorted({record.date for record in records})[:self.MAX_DAYS]
+
+        # サイドバーと同じ順に、地方の行の下へ配下のオフィスの行を並べる
+        rows = []
+        hierarchy = self.hierarchy
+        for center in hierarchy.nodes(CENTER):
+            center_days = by_area.get((LEVEL_CENTER, hierarchy.node_id(CENTER, center)), {})
+            rows.append(ft.DataRow(cells=[
+                ft.DataCell(ft.Text(hierarchy.name(CENTER, center), weight=ft.FontWeight.BOLD))
+            ] + [self.create_cell(center_days.get(date)) for date in dates], color=ft.colors.BLUE_50))
+            for office in hierarchy.children(CENTER, center):
+                office_days = by_area.get((LEVEL_OFFICE, hierarchy.node_id(OFFICE, office)), {})
+                rows.append(ft.DataRow(cells=[
+                    ft.DataCell(ft.Text(f"　{hierarchy.name(OFFICE, office)}"))
+                ] + [self.create_cell(office_days.get(date)) for date in dates]))
+
+        report_datetime = max(record.report_datetime or "" for record in records)
+        table = ft.DataTable(
+            columns=[ft.DataColumn(ft.Text("地域", weight=ft.FontWeight.BOLD))] +
+                    [ft.DataColumn(ft.Text(f"{date[5:7]}/{date[8:10]}", weight=ft.FontWeight.BOLD)) for date in dates],
+            rows=rows,
+        )
+        return ft.Column([
+            ft.Container(
+                content=ft.Column([
+                    ft.Text("全国の概況", weight=ft.FontWeight.BOLD, size=16, color=ft.colors.BLUE_900),
+                    ft.Text(f"最新の発表： {format_datetime(report_datetime)}　（最低/最高気温 最大の降水確率）",
+                            color=ft.colors.GREY_600),
+                ]),
+                padding=10,
+                margin=5,
+                border_radius=10,
+                bgcolor=ft.colors.BLUE_50
+            ),
+            ft.Row([table], scroll=ft.ScrollMode.AUTO),
+        ], scroll=ft.ScrollMode.AUTO)
+
+    def start_watch(self, on_change):
+        """データベースが更新されたら on_change() を呼ぶ監視スレッドを開始（以前の監視は止める）"""
+        self.stop_watch()
+        self.watch_stop = watch_database(self.db_manager, on_change, "overview-watch", self.POLL_SECONDS,
+                                         "全国の概況の更新に失敗しました")
+
+    def stop_watch(self):
+        if self.watch_stop is not None:
+            self.watch_stop.set()
+            self.watch_stop = None
+
+
+@profile_hook("display_selected_region")
+def display_selected_region(center_id, office_id, class10_id, db_manager, main_content, page, sidebar=None,
+                            prefetcher=None, comparison_view=None):
+    """地域の天気を表示
+
+    Returns:
+        RegionLiveUpdate: 表示中の画面に取り込みの差分を反映する監視（呼び出し側で start() / stop() する）
+    """
+    live_update = None
+    if prefetcher:
+        # 表示が終わるまで先読みを止める
+        prefetcher.begin_foreground()
     try:
         # ビューの初期化
         weather_view = WeatherView(db_manager)
         three_day_view = ThreeDayWeatherView(db_manager)
         weekly_view = WeeklyWeatherView(db_manager)
+        verification_view = VerificationView(db_manager)
+        if comparison_view is None:
+            comparison_view = ComparisonView(db_manager, db_manager.fetch_region_tree())
+
+        # 3日間の天気・週間天気の両方に必要なデータを1回でまとめて取得（先読み済みであればキャッシュから）
+        if prefetcher:
+            bundle = prefetcher.fetch_bundle(class10_id)
+        else:
+            bundle = db_manager.fetch_region_bundle(class10_id)
 
         # ビュー選択用ドロップダウンの作成
         view_dropdown = weather_view.create_view_dropdown()
         view_dropdown.disabled = False
 
+        def apply_update(new_bundle, changes):
+            """取り込みの差分を表示中の画面に反映（3日間の天気は値が変わったコントロールだけを書き換える）"""
+            nonlocal bundle
+            bundle = new_bundle
+            if view_dropdown.value == "週間天気":
+                # 週間天気はカードの構成ごと変わりうるため作り直す
+                main_content.update_content([ft.Column([view_dropdown, weekly_view.build_view(bundle)])], page)
+                return
+            if view_dropdown.value != "3日間の天気" or not three_day_view.live_controls:
+                return
+            three_day_view.load_bundle(bundle)
+            three_day_view.process_weather_data()
+            changed = []
+            if three_day_view.update_date_options():
+                changed.append(three_day_view.date_dropdown)
+            selected_date = (three_day_view.date_dropdown.value or "").replace("（今日）", "")
+            weather_data = (three_day_view.get_weather_data_for_date(selected_date) or
+                            three_day_view.get_initial_weather_data())
+            changed.extend(three_day_view.apply_weather_data(weather_data))
+            changes_text = three_day_view.live_controls.get('changes')
+            if changes_text is not None:
+                changes_text.value = describe_changes(changes)
+                changed.append(changes_text)
+            for control in changed:
+                control.update()
+
         def on_view_change(e):
             if view_dropdown.disabled:
                 return
@@ -1051,13 +1489,23 @@ def display_selected_region(center_id, office_id, class10_id, db_manager, main_c
                 page.update()
 
                 if e.control.value == "週間天気":
-                    weekly_content = weekly_view.build_view(office_id, class10_id)
+                    weekly_content = weekly_view.build_view(bundle)
                     main_content.update_content([
                         ft.Column([
                             view_dropdown,
                             weekly_content
                         ])
                     ], page)
+                elif e.control.value == "予報検証":
+                    main_content.update_content([
+                        ft.Column([
+                            view_dropdown,
+                            verification_view.build_view(office_id)
+                        ])
+                    ], page)
+                elif e.control.value == "地域比較":
+                    comparison_view.add(class10_id)
+                    display_comparison()
                 else:
                     display_three_day_weather()
 
@@ -1067,8 +1515,16 @@ def display_selected_region(center_id, office_id, class10_id, db_manager, main_c
 
         view_dropdown.on_change = on_view_change
 
+        def display_comparison():
+            main_content.update_content([
+                ft.Column([
+                    view_dropdown,
+                    comparison_view.build_view(on_change=display_comparison)
+                ])
+            ], page)
+
         def display_three_day_weather():
-            three_day_view.fetch_weather_data(class10_id)
+            three_day_view.load_bundle(bundle)
             
             if three_day_view.weather_data:
                 three_day_view.process_weather_data()
@@ -1124,10 +1580,14 @@ def display_selected_region(center_id, office_id, class10_id, db_manager, main_c
 
         # 初期表示
         display_three_day_weather()
+        live_update = RegionLiveUpdate(db_manager, office_id, class10_id, apply_update)
 
     finally:
+        if prefetcher:
+            prefetcher.end_foreground()
         if sidebar:
             sidebar.set_processing_state(False)
+    return live_update
 
 
 def update_main_content(selected_display_date, unique_dates, all_weather_data, main_content, weather_dropdown, page):
@@ -1243,16 +1703,30 @@ def update_main_content(selected_display_date, unique_dates, all_weather_data, m
         )
         main_content.update_content([no_data_container], page)
 
+def update_verification(db_path, archive_dir):
+    """アーカイブから予報検証の集計テーブルを更新（NumPyが無い場合は何もしない）"""
+    try:
+        from forecast_verification import update_verification_summary
+    except ImportError as e:
+        print(f"[WARNING] 予報検証を更新できません: {e}")
+        return
+    update_verification_summary(db_path, archive_dir)
+
+
 def update_database():
-    """データベースを再作成する関数"""
-    db_path = "region_data.db"
+    """データベースを更新する関数（取得に失敗したオフィスは前回のデータを保持）"""
     try:
-        # 既存のデータベースを削除
-        if os.path.exists(db_path):
-            os.remove(db_path)
-            print("既存のデータベースを削除しました。")
-        
-        # データベースを再作成
+        # 既存のデータベースは削除せず、取得できたオフィスだけを置き換える
+        # （更新ボタンは最新の発表を取りに行くため、中断した実行は再開せず全オフィスを取得し直す）
+        summary = run_ingest(DB_PATH, workers=REFRESH_WORKERS, deadline_seconds=REFRESH_DEADLINE_SECONDS,
+                             resume=False, parse_workers=REFRESH_PARSE_WORKERS, archive_dir=ARCHIVE_DIR,
+                             raw_archive_path=RAW_ARCHIVE_PATH)
+        summary.print_summary()
+        if ARCHIVE_DIR:
+            update_verification(DB_PATH, ARCHIVE_DIR)
+        # メモリ上の複製から読んでいる場合は、更新後のファイルで作り直す
+        refresh_memory_replica(DB_PATH)
+        region_cache.clear()
         return ensure_database_exists()
     except Exception as e:
         print(f"データベース更新中にエラーが発生しました: {e}")
@@ -1266,6 +1740,10 @@ def main(page: ft.Page):
         sys.exit(1)
 
     page.title = "天気予報アプリ"
+    prefetcher = None
+    overview_view = None
+    region_live_update = None  # 地域を表示している間、取り込みの差分を反映する監視
+    sidebar = None
     
     # プログレスリング用のコンテナを作成
     progress_container = ft.Container(
@@ -1276,9 +1754,34 @@ def main(page: ft.Page):
 
 
 
+    def update_in_place():
+        """地域を表示したまま更新し、変わった値だけを画面に反映する"""
+        progress_container.visible = True
+        sidebar.set_processing_state(True)
+        page.update()
+        try:
+            updated = update_database()
+            if updated:
+                print("データベースの更新が完了しました")
+                region_live_update.check()
+            else:
+                print("データベースの更新に失敗しました")
+        finally:
+            progress_container.visible = False
+            sidebar.set_processing_state(False)
+            page.update()
+
     def update_button_clicked(e):
         print("更新ボタンがクリックされました")  # デバッグ用
 
+        if region_live_update is not None:
+            # 地域を表示している場合は画面を作り直さない（更新中もコミットされた差分から順に反映される）
+            try:
+                update_in_place()
+            except Exception as e:
+                print(f"エラーが発生しました: {str(e)}")
+            return
+
         # 画面を白紙に戻す
         page.clean()
         
@@ -1299,13 +1802,29 @@ def main(page: ft.Page):
             expand=True,
         )
         
+        # 更新中も、コミットされたオフィスから順に全国の概況を表示する（メモリ上の複製ではなくファイルから読む）
+        if overview_view:
+            overview_view.stop_watch()
+        overview_manager = DatabaseManager(in_memory=False)
+        loading_overview_view = OverviewView(overview_manager, overview_manager.fetch_region_tree())
+        loading_overview = ft.Container(content=loading_overview_view.build_view(), padding=10)
+        loading_display.content.controls.append(loading_overview)
+
+        def refresh_loading_overview():
+            loading_overview.content = loading_overview_view.build_view()
+            page.update()
+
         page.add(loading_display)
         page.update()
+        loading_overview_view.start_watch(refresh_loading_overview)
 
 
         try:
             # データベースを更新
-            if update_database():
+            updated = update_database()
+            loading_overview_view.stop_watch()
+            overview_manager.close()
+            if updated:
                 print("データベースの更新が完了しました")
                 page.clean()
                 create_title_bar()
@@ -1353,27 +1872,83 @@ def main(page: ft.Page):
 
     # メインの画面を初期化する関数
     def initialize_main_view():
+        nonlocal prefetcher, overview_view, region_live_update, sidebar
         page.scroll = ft.ScrollMode.AUTO
         page.horizontal_alignment = ft.CrossAxisAlignment.START
 
         db_manager = DatabaseManager()
 
-        # 地域データの取得
-        region_data = db_manager.fetch_region_hierarchy()
+        # オフィスを開いたときに配下の地域を先読みする（作り直す場合は以前のワーカーを止める）
+        if prefetcher:
+            prefetcher.stop()
+        prefetcher = RegionPrefetcher(region_cache, db_manager.fetch_region_bundle,
+                                      warm=warm_weather_icons, release=db_manager.release)
+
+        # 地域データの取得（全セッションで共有する地域階層）
+        hierarchy = db_manager.fetch_region_tree()
 
         # 地域データが空の場合の処理
-        if not region_data:
+        if not len(hierarchy):
             page.add(ft.Text("データベースに地域データがありません。"))
             return
 
+        if region_live_update is not None:
+            region_live_update.stop()
+            region_live_update = None
+
         # メインコンテンツエリアの初期化
         main_content = MainContent()
+        # 比較する地域は地域を選び直しても保持する
+        comparison_view = ComparisonView(db_manager, hierarchy)
+        overview_view = OverviewView(db_manager, hierarchy)
+        search_view = SearchView(db_manager, hierarchy)
+        alert_view = AlertView(db_manager, hierarchy)
+
+        def stop_region_live_update():
+            nonlocal region_live_update
+            if region_live_update is not None:
+                region_live_update.stop()
+                region_live_update = None
+
+        def show_search(query):
+            if not query or not query.strip():
+                return
+            overview_view.stop_watch()
+            stop_region_live_update()
+            main_content.update_content(
+                [search_view.build_view(query.strip(), lambda c, o, cl: sidebar.on_tile_click(None, c, o, cl))], page
+            )
+
+        def show_alerts():
+            overview_view.stop_watch()
+            stop_region_live_update()
+            main_content.update_content([alert_view.build_view(
+                lambda c, o, cl: sidebar.on_tile_click(None, c, o, cl), show_alerts
+            )], page)
+
+        def show_overview():
+            stop_region_live_update()
+            main_content.update_content([overview_view.build_view()], page)
+            overview_view.start_watch(lambda: main_content.update_content([overview_view.build_view()], page))
+
+        def on_selection_change(center_id, office_id, class10_id, sb):
+            nonlocal region_live_update
+            overview_view.stop_watch()
+            stop_region_live_update()
+            region_live_update = display_selected_region(center_id, office_id, class10_id, db_manager, main_content,
+                                                         page, sb, prefetcher, comparison_view)
+            if region_live_update is not None:
+                region_live_update.start()
 
         # サイドバーの初期化
         sidebar = Sidebar(
-            region_data=region_data,
-            on_selection_change=lambda center_id, office_id, class10_id, sb: 
-                display_selected_region(center_id, office_id, class10_id, db_manager, main_content, page, sb)
+            hierarchy=hierarchy,
+            on_selection_change=on_selection_change,
+            on_office_expand=lambda office_id, class10_ids: prefetcher.prefetch(class10_ids),
+            on_overview=show_overview,
+            on_search=show_search,
+            on_alerts=show_alerts,
+            alert_count=db_manager.count_unacknowledged_alerts()
         )
 
         # サイドバーとメインコンテンツの配置
@@ -1384,6 +1959,8 @@ def main(page: ft.Page):
                 alignment=ft.MainAxisAlignment.START,
             )
         )
+        # 地域を選ぶまでは全国の概況を表示する
+        show_overview()
 
     # 初期画面の表示
     create_title_bar()
@@ -1391,4 +1968,5 @@ def main(page: ft.Page):
     page.update()
 
 # Fletアプリケーションを開始
-ft.app(target=main)
\ No newline at end of file
+if __name__ == "__main__":
+    ft.app(target=main)
\ No newline at end of file
@@ -0,0 +1,128 @@
+import os
+import sys
+import time
+import threading
+import functools
+import cProfile
+import pstats
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+# プロファイリングの有効化フラグ（環境変数またはコマンドライン引数で切り替え）
+PROFILE_ENABLED = os.environ.get("WEATHER_PROFILE") == "1" or "--profile" in sys.argv
+MEMORY_PROFILE_ENABLED = os.environ.get("WEATHER_PROFILE_MEMORY") == "1" or "--profile-memory" in sys.argv
+PROFILE_DIR = os.environ.get("WEATHER_PROFILE_DIR", "profiles")
+SAMPLE_INTERVAL = float(os.environ.get("WEATHER_PROFILE_INTERVAL", "0.005"))
+
+_local = threading.local()
+_counter_lock = threading.Lock()
+_invocation_counter = 0
+
+
+def _next_output_prefix(name):
+    """呼び出しごとに一意な出力ファイル名のプレフィックスを作成"""
+    global _invocation_counter
+    with _counter_lock:
+        _invocation_counter += 1
+        number = _invocation_counter
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    return os.path.join(PROFILE_DIR, f"{name}-{timestamp}-{os.getpid()}-{number}")
+
+
+class StackSampler:
+    """対象スレッドのスタックを一定間隔でサンプリングし、collapsed形式で集計する"""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            # ルートから末端の順に並べる
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def write(self, path):
+        """flamegraph.pl などで読める collapsed stack 形式で書き出す"""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def _run_profiled(name, func, args, kwargs):
+    """cProfile・スタックサンプラー・tracemalloc を有効にして関数を実行"""
+    prefix = _next_output_prefix(name)
+    profiler = cProfile.Profile()
+    sampler = StackSampler(threading.get_ident())
+    started_tracemalloc = False
+    if MEMORY_PROFILE_ENABLED and not tracemalloc.is_tracing():
+        tracemalloc.start(25)
+        started_tracemalloc = True
+
+    _local.active = True
+    sampler.start()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profiler.disable()
+        elapsed = time.perf_counter() - start
+        sampler.stop()
+        _local.active = False
+
+        profiler.dump_stats(f"{prefix}.prof")
+        sampler.write(f"{prefix}.collapsed")
+        print(f"[PROFILE] {name}: {elapsed * 1000:.1f} ms ({prefix}.prof, {prefix}.collapsed)")
+
+        if MEMORY_PROFILE_ENABLED:
+            snapshot = tracemalloc.take_snapshot()
+            snapshot.dump(f"{prefix}.tracemalloc")
+            current, peak = tracemalloc.get_traced_memory()
+            print(f"[PROFILE] {name}: メモリ使用量 現在 {current / 1024:.1f} KiB / ピーク {peak / 1024:.1f} KiB")
+            if started_tracemalloc:
+                tracemalloc.stop()
+
+
+def profile_hook(name):
+    """関数をプロファイラで包むデコレータ
+
+    プロファイリングが無効な場合は元の関数をそのまま返すため、実行時のオーバーヘッドはない。
+    同じスレッド内で入れ子になった呼び出しは外側のプロファイルに含める。
+    """
+    def decorator(func):
+        if not PROFILE_ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if getattr(_local, "active", False):
+                return func(*args, **kwargs)
+            return _run_profiled(name, func, args, kwargs)
+        return wrapper
+    return decorator
+
+
+def print_profile_summary(path, limit=20):
+    """保存した pstats ファイルの上位を表示"""
+    stats = pstats.Stats(path)
+    stats.sort_stats("cumulative").print_stats(limit)
@@ -0,0 +1,323 @@
+"""気象庁から取得した生データ（area.json / forecast/{office}.json）のアーカイブ
+
+再現や再処理のために、取得した生のJSONを1つのデータベースファイルに保存する。
+
+- 本文は内容の SHA-256 をキーとして1回だけ保存する（同じ内容を何度取得しても増えない）
+- 本文は zstd（zstandard が入っていれば）または DEFLATE で圧縮する
+- 連続する発表の本文はほとんど同じなので、過去の本文から学習した辞書を使うとさらに小さくなる
+  （train_dictionary で作成し、以降に保存する本文に使う。辞書は保存した本文ごとに記録する）
+- 本文の一覧は (種類, オフィスID, 発表日時) を主キーとして持ち、1件を索引で直接取り出せる
+- iter_forecasts で発表日時の順に1件ずつ読み出し、取り込みのパイプラインに流し直せる
+  （ingest.run_ingest の replay）
+
+area.json は解析済みの値を正規化したJSON（db_creater.area_content_hash と同じ形）で保存し、
+前回と内容が変わったときだけ取得日時をキーとして追加する。
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# アーカイブの保存先（未設定の場合は保存しない）
+RAW_ARCHIVE_PATH = os.environ.get("WEATHER_RAW_ARCHIVE")
+
+KIND_AREA = "area"
+KIND_FORECAST = "forecast"
+
+CODEC_ZSTD = "zstd"
+CODEC_DEFLATE = "deflate"
+DEFAULT_CODEC = CODEC_ZSTD if zstandard is not None else CODEC_DEFLATE
+
+ZSTD_LEVEL = 19
+DEFLATE_LEVEL = 9
+# DEFLATE の辞書は直近 32 KiB しか参照されない
+DEFLATE_DICTIONARY_SIZE = 32 * 1024
+DEFAULT_DICTIONARY_SIZE = 32 * 1024
+DEFAULT_DICTIONARY_SAMPLES = 500
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class RawArchive:
+    """内容のハッシュで重複を除き、圧縮して保存する生データのアーカイブ
+
+    取り込みでは、地域データの保存（メインスレッド）と天気データの保存（書き込み段のスレッド）が
+    順に同じインスタンスを使うため、接続はスレッドの検査を行わずロックで保護する。
+    """
+
+    def __init__(self, path, codec=DEFAULT_CODEC):
+        if codec == CODEC_ZSTD and zstandard is None:
+            print("[WARNING] zstandard が無いため、DEFLATE で圧縮します。")
+            codec = CODEC_DEFLATE
+        self.path = path
+        self.codec = codec
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.initialize_tables()
+        self.dictionaries = {}
+        # 新しく保存する本文に使う辞書（この圧縮方式で最後に学習したもの）
+        row = self.connection.execute(
+            "SELECT MAX(id) FROM dictionaries WHERE codec = ?", (self.codec,)
+        ).fetchone()
+        self.dictionary_id = row[0]
+
+    def initialize_tables(self):
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                hash TEXT PRIMARY KEY,
+                codec TEXT,
+                dictionary_id INTEGER,
+                size INTEGER,
+                data BLOB
+            )
+        """)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                kind TEXT,
+                office_id TEXT,
+                report_datetime TEXT,
+                hash TEXT,
+                fetched_at TEXT,
+                PRIMARY KEY (kind, office_id, report_datetime)
+            )
+        """)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS dictionaries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                codec TEXT,
+                data BLOB,
+                created_at TEXT
+            )
+        """)
+        self.connection.commit()
+
+    def get_dictionary(self, dictionary_id):
+        if dictionary_id not in self.dictionaries:
+            row = self.connection.execute(
+                "SELECT data FROM dictionaries WHERE id = ?", (dictionary_id,)
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"辞書 {dictionary_id} がアーカイブにありません")
+            self.dictionaries[dictionary_id] = row[0]
+        return self.dictionaries[dictionary_id]
+
+    def compress(self, data):
+        dictionary = self.get_dictionary(self.dictionary_id) if self.dictionary_id is not None else None
+        if self.codec == CODEC_ZSTD:
+            dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+            return zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dict_data).compress(data)
+        compressor = (zlib.compressobj(DEFLATE_LEVEL, zdict=dictionary) if dictionary
+                      else zlib.compressobj(DEFLATE_LEVEL))
+        return compressor.compress(data) + compressor.flush()
+
+    def decompress(self, codec, dictionary_id, data):
+        dictionary = self.get_dictionary(dictionary_id) if dictionary_id is not None else None
+        if codec == CODEC_ZSTD:
+            if zstandard is None:
+                raise RuntimeError("zstd で圧縮された本文を読むには zstandard が必要です")
+            dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+            return zstandard.ZstdDecompressor(dict_data=dict_data).decompress(data)
+        decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+        return decompressor.decompress(data) + decompressor.flush()
+
+    def store_document(self, kind, office_id, report_datetime, data):
+        """本文を保存（呼び出し側でコミットする）
+
+        Returns:
+            bool: 新しい (種類, オフィスID, 発表日時) として追加した場合は True
+        """
+        digest = content_hash(data)
+        with self.lock:
+            if self.connection.execute("SELECT 1 FROM blobs WHERE hash = ?", (digest,)).fetchone() is None:
+                self.connection.execute(
+                    "INSERT INTO blobs (hash, codec, dictionary_id, size, data) VALUES (?, ?, ?, ?, ?)",
+                    (digest, self.codec, self.dictionary_id, len(data), self.compress(data))
+                )
+            cursor = self.connection.execute(
+                "INSERT OR IGNORE INTO documents (kind, office_id, report_datetime, hash, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (kind, office_id, report_datetime, digest, datetime.now().isoformat())
+            )
+            return cursor.rowcount > 0
+
+    def store_forecast(self, office_id, report_datetime, raw):
+        return self.store_document(KIND_FORECAST, office_id, report_datetime, raw)
+
+    def store_area(self, region_data):
+        """地域データを保存（直前に保存したものと同じ内容であれば何もしない）"""
+        data = json.dumps(region_data, sort_keys=True, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT hash FROM documents WHERE kind = ? ORDER BY report_datetime DESC LIMIT 1", (KIND_AREA,)
+            ).fetchone()
+        if row and row[0] == content_hash(data):
+            return False
+        # 発表日時と比べられるよう、取得日時はタイムゾーン付きで記録する
+        return self.store_document(KIND_AREA, "", datetime.now().astimezone().isoformat(timespec="seconds"), data)
+
+    def read_blob(self, digest):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT codec, dictionary_id, data FROM blobs WHERE hash = ?", (digest,)
+            ).fetchone()
+            return self.decompress(*row) if row else None
+
+    def get_document(self, kind, office_id, report_datetime):
+        """1件の本文を取得（無い場合は None）"""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT hash FROM documents WHERE kind = ? AND office_id = ? AND report_datetime = ?",
+                (kind, office_id, report_datetime)
+            ).fetchone()
+        return self.read_blob(row[0]) if row else None
+
+    def get_forecast(self, office_id, report_datetime):
+        return self.get_document(KIND_FORECAST, office_id, report_datetime)
+
+    def latest_area(self, until=None):
+        """until（取得日時）までに保存した最新の地域データ
+
+        until より前のものが無い場合は最も古いものを返す（地域データを1件も保存していない場合は None）。
+        """
+        with self.lock:
+            row = None
+            if until:
+                row = self.connection.execute(
+                    "SELECT hash FROM documents WHERE kind = ? AND report_datetime <= ? "
+                    "ORDER BY report_datetime DESC LIMIT 1", (KIND_AREA, until)
+                ).fetchone()
+            if row is None:
+                row = self.connection.execute(
+                    "SELECT hash FROM documents WHERE kind = ? ORDER BY report_datetime "
+                    f"{'ASC' if until else 'DESC'} LIMIT 1", (KIND_AREA,)
+                ).fetchone()
+        return json.loads(self.read_blob(row[0])) if row else None
+
+    def forecast_filter(self, office_ids=None, since=None, until=None):
+        where = ["d.kind = ?"]
+        params = [KIND_FORECAST]
+        if office_ids is not None:
+            where.append(f"d.office_id IN ({', '.join(['?' for _ in office_ids])})")
+            params.extend(office_ids)
+        if since:
+            where.append("d.report_datetime >= ?")
+            params.append(since)
+        if until:
+            where.append("d.report_datetime <= ?")
+            params.append(until)
+        return " AND ".join(where), params
+
+    def forecast_offices(self, since=None, until=None):
+        """期間内に本文があるオフィスIDのリスト"""
+        where, params = self.forecast_filter(since=since, until=until)
+        with self.lock:
+            return [row[0] for row in self.connection.execute(
+                f"SELECT DISTINCT d.office_id FROM documents d WHERE {where} ORDER BY d.office_id", params
+            )]
+
+    def iter_forecasts(self, office_ids=None, since=None, until=None):
+        """天気データの本文を発表日時の順に1件ずつ読み出す
+
+        Yields:
+            tuple: (オフィスID, 発表日時, 本文のバイト列)
+        """
+        where, params = self.forecast_filter(office_ids, since, until)
+        # 読み出し中も保存できるよう、読み出し用の接続を別に開く
+        connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        try:
+            for office_id, report_datetime, codec, dictionary_id, data in connection.execute(f"""
+                SELECT d.office_id, d.report_datetime, b.codec, b.dictionary_id, b.data
+                FROM documents d
+                JOIN blobs b ON b.hash = d.hash
+                WHERE {where}
+                ORDER BY d.report_datetime, d.office_id
+            """, params):
+                with self.lock:
+                    raw = self.decompress(codec, dictionary_id, data)
+                yield office_id, report_datetime, raw
+        finally:
+            connection.close()
+
+    def train_dictionary(self, size=DEFAULT_DICTIONARY_SIZE, samples=DEFAULT_DICTIONARY_SAMPLES):
+        """最近の天気データの本文から辞書を作成し、以降に保存する本文に使う
+
+        zstd では zstandard.train_dictionary で学習する。DEFLATE では辞書は直近 32 KiB の
+        参照元として使われるだけなので、オフィスごとの最新の本文を古い順に並べたものを辞書にする。
+
+        Returns:
+            int: 作成した辞書のID（本文が足りない場合は None）
+        """
+        with self.lock:
+            rows = self.connection.execute("""
+                SELECT d.office_id, b.codec, b.dictionary_id, b.data
+                FROM documents d
+                JOIN blobs b ON b.hash = d.hash
+                WHERE d.kind = ?
+                ORDER BY d.report_datetime DESC
+                LIMIT ?
+            """, (KIND_FORECAST, samples)).fetchall()
+            documents = [(office_id, self.decompress(codec, dictionary_id, data))
+                         for office_id, codec, dictionary_id, data in rows]
+        if not documents:
+            print("[WARNING] 辞書を作成するための本文がありません。")
+            return None
+
+        if self.codec == CODEC_ZSTD:
+            try:
+                dictionary = zstandard.train_dictionary(size, [data for _, data in documents]).as_bytes()
+            except zstandard.ZstdError as e:
+                print(f"[WARNING] 辞書の学習に失敗しました（本文 {len(documents)} 件）: {e}")
+                return None
+        else:
+            latest = {}
+            for office_id, data in documents:
+                latest.setdefault(office_id, data)
+            # 後ろにあるほど参照されやすいため、新しい本文を後ろに置く
+            dictionary = b"".join(reversed(list(latest.values())))[-min(size, DEFLATE_DICTIONARY_SIZE):]
+
+        with self.lock:
+            cursor = self.connection.execute(
+                "INSERT INTO dictionaries (codec, data, created_at) VALUES (?, ?, ?)",
+                (self.codec, dictionary, datetime.now().isoformat())
+            )
+            self.connection.commit()
+            self.dictionary_id = cursor.lastrowid
+        print(f"[INFO] 辞書を作成しました（ID {self.dictionary_id}、{len(dictionary)} バイト、本文 {len(documents)} 件）。")
+        return self.dictionary_id
+
+    def stats(self):
+        """保存している本文の件数と、圧縮前後の大きさ"""
+        with self.lock:
+            documents, = self.connection.execute("SELECT COUNT(*) FROM documents").fetchone()
+            referenced, = self.connection.execute("""
+                SELECT COALESCE(SUM(b.size), 0) FROM documents d JOIN blobs b ON b.hash = d.hash
+            """).fetchone()
+            blobs, size, stored = self.connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(data)), 0) FROM blobs"
+            ).fetchone()
+        return {"documents": documents, "blobs": blobs, "raw_bytes": referenced, "unique_bytes": size,
+                "stored_bytes": stored}
+
+    def commit(self):
+        with self.lock:
+            self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.commit()
+                self.connection.close()
+                self.connection = None
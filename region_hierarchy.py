@@ -0,0 +1,235 @@
+"""地域階層（地方 / 府県予報区 / 一次細分区域 / 市町村等をまとめた地域 / 市町村等）の読み取り専用の構造
+
+areas テーブルの行から一度だけ作成し、全セッションで共有する。
+
+- 階層ごとに ID・名前・親の添字を並列の配列で持ち、各ノードは階層内の整数の添字で表す
+- 子は親の順に並べ替えて連続させ、親ごとに子の範囲（start, end）を持つ
+  （子孫も連続するため、任意の深さの子孫を1つの range で取り出せる）
+- ID から添字、名前から添字を引く辞書を持つ
+
+ノードごとの dict を作らないため、class15 / class20 まで含めてもメモリと走査の費用が小さい。
+
+作成した階層は作成元の area.json のハッシュを鍵としてバイナリのキャッシュファイルに保存し、
+次回の起動では areas を走査せずにファイルから読み込む（ハッシュが変わったら作り直す）。
+"""
+import marshal
+import os
+import sys
+import threading
+from array import array
+
+CENTER = 0
+OFFICE = 1
+CLASS10 = 2
+CLASS15 = 3
+CLASS20 = 4
+LEVEL_NAMES = ("centers", "offices", "class10s", "class15s", "class20s")
+
+# areas から読む列（階層ごとの ID と名前）
+AREA_COLUMNS = ("centers_id", "centers_name", "offices_id", "offices_name", "class10s_id", "class10s_name",
+                "class15s_id", "class15s_name", "class20s_id", "class20s_name")
+
+# キャッシュファイルの先頭の識別子と形式の版（形式を変えたら版を上げ、古いファイルは読まない）
+CACHE_MAGIC = b"WXRH"
+CACHE_FORMAT_VERSION = 1
+
+
+class RegionLevel:
+    """1つの階層のノード（並列の配列）"""
+
+    __slots__ = ("ids", "names", "parents", "child_start", "child_end", "index_by_id", "indexes_by_name")
+
+    def __init__(self, ids, names, parents, child_start=None, child_end=None):
+        self.ids = tuple(ids)
+        self.names = tuple(names)
+        self.parents = array("i", parents)
+        # 子の範囲は次の階層を作ってから設定する（最下層は空の範囲のまま）
+        self.child_start = array("i", child_start if child_start is not None else [0] * len(self.ids))
+        self.child_end = array("i", child_end if child_end is not None else [0] * len(self.ids))
+        self.index_by_id = {node_id: index for index, node_id in enumerate(self.ids)}
+        indexes_by_name = {}
+        for index, name in enumerate(self.names):
+            indexes_by_name.setdefault(name, []).append(index)
+        self.indexes_by_name = {name: tuple(indexes) for name, indexes in indexes_by_name.items()}
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class RegionHierarchy:
+    """地域階層（作成後は変更しない）"""
+
+    __slots__ = ("levels", "version")
+
+    def __init__(self, levels, version=None):
+        self.levels = levels
+        self.version = version
+
+    @classmethod
+    def from_rows(cls, rows, version=None):
+        """areas の行（AREA_COLUMNS の順）から作成
+
+        ID が空のノードとその子孫は含めない。同じ ID が複数の行に現れる場合は最初の行の親に属する。
+        """
+        order = [{} for _ in LEVEL_NAMES]  # 階層ごとの ID -> (出現順, 名前, 親の ID)
+        for row in rows:
+            parent_id = None
+            for level in range(len(LEVEL_NAMES)):
+                node_id, name = row[level * 2], row[level * 2 + 1]
+                if not node_id:
+                    break
+                node_id = sys.intern(str(node_id))
+                if node_id not in order[level]:
+                    order[level][node_id] = (len(order[level]), name or "", parent_id)
+                parent_id = node_id
+
+        levels = []
+        for level, nodes in enumerate(order):
+            if level == 0:
+                sorted_ids = sorted(nodes, key=lambda node_id: nodes[node_id][0])
+                parents = [-1] * len(sorted_ids)
+            else:
+                # 親の順に並べ替えて、同じ親の子を連続させる
+                parent_index = levels[level - 1].index_by_id
+                sorted_ids = sorted(nodes, key=lambda node_id: (parent_index[nodes[node_id][2]], nodes[node_id][0]))
+                parents = [parent_index[nodes[node_id][2]] for node_id in sorted_ids]
+            levels.append(RegionLevel(sorted_ids, [nodes[node_id][1] for node_id in sorted_ids], parents))
+
+        for parent_level, child_level in zip(levels, levels[1:]):
+            # 子が無い親は、直前の親の終わりを開始位置とする空の範囲にする
+            position = 0
+            for child_index, parent in enumerate(child_level.parents):
+                while position <= parent:
+                    parent_level.child_start[position] = child_index
+                    parent_level.child_end[position] = child_index
+                    position += 1
+                parent_level.child_end[parent] = child_index + 1
+            while position < len(parent_level):
+                parent_level.child_start[position] = len(child_level)
+                parent_level.child_end[position] = len(child_level)
+                position += 1
+        return cls(levels, version)
+
+    def __len__(self):
+        return len(self.levels[CENTER])
+
+    def nodes(self, level):
+        """階層の全ノードの添字"""
+        return range(len(self.levels[level]))
+
+    def children(self, level, index):
+        """子（1つ下の階層）の添字の範囲"""
+        return range(self.levels[level].child_start[index], self.levels[level].child_end[index])
+
+    def descendants(self, level, index, target_level):
+        """target_level の階層にある子孫の添字の範囲（子孫は連続している）"""
+        start, stop = index, index + 1
+        for current in range(level, target_level):
+            if start >= stop:
+                return range(0)
+            start, stop = self.levels[current].child_start[start], self.levels[current].child_end[stop - 1]
+        return range(start, stop)
+
+    def parent(self, level, index):
+        return self.levels[level].parents[index]
+
+    def node_id(self, level, index):
+        return self.levels[level].ids[index]
+
+    def name(self, level, index):
+        return self.levels[level].names[index]
+
+    def index(self, level, node_id):
+        """ID からノードの添字を取得（見つからない場合は None）"""
+        return self.levels[level].index_by_id.get(node_id)
+
+    def find_by_name(self, name, level=None):
+        """名前が一致するノードを (階層, 添字) のリストで返す"""
+        levels = range(len(self.levels)) if level is None else (level,)
+        return [(current, index) for current in levels for index in self.levels[current].indexes_by_name.get(name, ())]
+
+    def to_nested_dict(self, depth=CLASS10):
+        """従来の fetch_region_hierarchy と同じ入れ子の dict に変換（JSON の応答用）"""
+        def build(level, index):
+            node = {"name": self.name(level, index)}
+            if level < depth:
+                node["children"] = {self.node_id(level + 1, child): build(level + 1, child)
+                                    for child in self.children(level, index)}
+            return node
+        return {self.node_id(CENTER, index): build(CENTER, index) for index in self.nodes(CENTER)}
+
+
+def save_hierarchy_cache(path, hierarchy):
+    """階層をキャッシュファイルに保存（鍵は hierarchy.version）
+
+    形式: 識別子 + 形式の版（1バイト）+ marshal した (鍵, 階層ごとの (ID, 名前, 親, 子の開始, 子の終わり))。
+    添字の配列はバイト列のまま保存するため、読み込みは marshal の復元と配列のコピーだけで済む。
+    書き込み途中のファイルを読まないよう、一時ファイルに書いてから置き換える。
+    """
+    payload = (hierarchy.version, tuple(
+        (level.ids, level.names, level.parents.tobytes(), level.child_start.tobytes(), level.child_end.tobytes())
+        for level in hierarchy.levels
+    ))
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(CACHE_MAGIC + bytes([CACHE_FORMAT_VERSION]))
+            marshal.dump(payload, f)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"[WARNING] 地域階層のキャッシュを保存できませんでした: {e}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def load_hierarchy_cache(path, version):
+    """キャッシュファイルから階層を読み込む（無い・壊れている・鍵が異なる場合は None）"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    header = CACHE_MAGIC + bytes([CACHE_FORMAT_VERSION])
+    if not data.startswith(header):
+        return None
+    try:
+        cached_version, payload = marshal.loads(data[len(header):])
+    except (ValueError, EOFError, TypeError):
+        return None
+    if cached_version != version or len(payload) != len(LEVEL_NAMES):
+        return None
+
+    levels = []
+    for ids, names, parents, child_start, child_end in payload:
+        arrays = []
+        for raw in (parents, child_start, child_end):
+            values = array("i")
+            values.frombytes(raw)
+            arrays.append(values)
+        levels.append(RegionLevel(ids, names, *arrays))
+    return RegionHierarchy(levels, version)
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_hierarchy(db_path, version, load_rows, cache_path=None):
+    """データベースごとに1つの RegionHierarchy を共有する
+
+    Args:
+        db_path (str): データベースのパス
+        version: areas の内容を表す値（変わった場合だけ作り直す）
+        load_rows (callable): areas の行（AREA_COLUMNS の順）を返す関数
+        cache_path (str): キャッシュファイルのパス（None の場合はファイルに保存しない）
+    """
+    with _shared_lock:
+        hierarchy = _shared.get(db_path)
+        if hierarchy is None or hierarchy.version != version:
+            hierarchy = load_hierarchy_cache(cache_path, version) if cache_path else None
+            if hierarchy is None:
+                hierarchy = RegionHierarchy.from_rows(load_rows(), version)
+                if cache_path:
+                    save_hierarchy_cache(cache_path, hierarchy)
+            _shared[db_path] = hierarchy
+        return hierarchy
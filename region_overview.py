@@ -0,0 +1,166 @@
+"""全国の概況を表示するための集計テーブル
+
+取り込み時にオフィスごとの予報（正規化したテーブルの行）から、日付ごとに次の値を計算して
+region_overview に保存する。地方（center）の行は、その配下のオフィスの行から集計する。
+
+- 最低気温・最高気温（短期予報の気温と週間予報の気温の最小・最大）
+- 最大の降水確率
+- 最も多い天気コード（短期予報がある日は短期予報の天気、それ以外は週間予報の天気）
+
+画面はこのテーブルを1回読むだけで全国を表示できる（地域ごとの検索は行わない）。
+オフィスの行は取り込みと同じトランザクションで書き換えるため、更新の途中でもコミット済みの
+オフィスから順に新しい値になる。
+"""
+from collections import Counter
+from datetime import datetime
+
+from forecast_json1 import load_office_tables
+from forecast_normalizer import (TABLE_COLUMNS, WEATHER_INFO, WEATHER_POPS, WEATHER_RELIABILITIES, WEATHER_TEMPS,
+                                 WEATHER_TT, to_number)
+
+LEVEL_CENTER = "center"
+LEVEL_OFFICE = "office"
+
+
+def initialize_overview_table(connection):
+    """集計テーブルを作成（呼び出し側でコミットする）"""
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS region_overview (
+            level TEXT,
+            area_id TEXT,
+            parent_id TEXT,
+            area_name TEXT,
+            date TEXT,
+            min_temp REAL,
+            max_temp REAL,
+            max_pop INTEGER,
+            weather_code TEXT,
+            report_datetime TEXT,
+            updated_at TEXT,
+            PRIMARY KEY (level, area_id, date)
+        )
+    """)
+
+
+def column_values(tables, table_name, *columns):
+    """正規化したテーブルの行から、指定した列の値を取り出す（日時でない time_define の行は除く）"""
+    indexes = [TABLE_COLUMNS[table_name].index(column) for column in columns]
+    time_index = TABLE_COLUMNS[table_name].index("time_define")
+    for row in tables.get(table_name, []):
+        if str(row[time_index])[:1].isdigit():
+            yield tuple(row[index] for index in indexes)
+
+
+def dominant_code(counter):
+    """最も多い天気コード（同数の場合は小さいコード）"""
+    if not counter:
+        return None
+    return min(counter.items(), key=lambda item: (-item[1], item[0]))[0]
+
+
+def summarize_office(tables):
+    """オフィスの予報を日付ごとに集計
+
+    Returns:
+        dict: 日付（YYYY-MM-DD）をキーとする (最低気温, 最高気温, 最大の降水確率, 天気コード)
+    """
+    days = {}
+
+    def day(time_define):
+        return days.setdefault(time_define[:10], {
+            "temps": [], "pops": [], "short_codes": Counter(), "weekly_codes": Counter()
+        })
+
+    for time_define, weather_code in column_values(tables, WEATHER_INFO, "time_define", "weather_code"):
+        if weather_code:
+            day(time_define)["short_codes"][weather_code] += 1
+    for time_define, weather_code, pop in column_values(tables, WEATHER_RELIABILITIES,
+                                                        "time_define", "weather_code", "pop"):
+        if weather_code:
+            day(time_define)["weekly_codes"][weather_code] += 1
+        day(time_define)["pops"].append(to_number(pop))
+    for time_define, pop in column_values(tables, WEATHER_POPS, "time_define", "pop"):
+        day(time_define)["pops"].append(to_number(pop))
+    for time_define, temp in column_values(tables, WEATHER_TEMPS, "time_define", "temp"):
+        day(time_define)["temps"].append(to_number(temp))
+    for time_define, temps_min, temps_max in column_values(tables, WEATHER_TT, "time_define", "temps_min", "temps_max"):
+        day(time_define)["temps"].extend([to_number(temps_min), to_number(temps_max)])
+
+    summary = {}
+    for date, values in days.items():
+        temps = [value for value in values["temps"] if value is not None]
+        pops = [value for value in values["pops"] if value is not None]
+        summary[date] = (
+            min(temps) if temps else None,
+            max(temps) if temps else None,
+            int(max(pops)) if pops else None,
+            dominant_code(values["short_codes"] or values["weekly_codes"]),
+        )
+    return summary
+
+
+def update_office_overview(connection, office_id, tables, report_datetime):
+    """オフィスとその地方の集計を書き換える（呼び出し側でコミットする）"""
+    row = connection.execute(
+        "SELECT centers_id, offices_name FROM areas WHERE offices_id = ? LIMIT 1", (office_id,)
+    ).fetchone()
+    center_id, office_name = row if row else (None, office_id)
+    updated_at = datetime.now().isoformat()
+    connection.execute("DELETE FROM region_overview WHERE level = ? AND area_id = ?", (LEVEL_OFFICE, office_id))
+    connection.executemany(
+        "INSERT INTO region_overview VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [(LEVEL_OFFICE, office_id, center_id, office_name, date, min_temp, max_temp, max_pop, weather_code,
+          report_datetime, updated_at)
+         for date, (min_temp, max_temp, max_pop, weather_code) in sorted(summarize_office(tables).items())]
+    )
+    if center_id is not None:
+        update_center_overview(connection, center_id)
+
+
+def update_center_overview(connection, center_id):
+    """地方の集計を配下のオフィスの行から作り直す（呼び出し側でコミットする）"""
+    row = connection.execute("SELECT centers_name FROM areas WHERE centers_id = ? LIMIT 1", (center_id,)).fetchone()
+    center_name = row[0] if row else center_id
+    days = {}
+    for date, min_temp, max_temp, max_pop, weather_code, report_datetime in connection.execute("""
+        SELECT date, min_temp, max_temp, max_pop, weather_code, report_datetime
+        FROM region_overview
+        WHERE level = ? AND parent_id = ?
+    """, (LEVEL_OFFICE, center_id)):
+        values = days.setdefault(date, {"mins": [], "maxes": [], "pops": [], "codes": Counter(), "reports": []})
+        if min_temp is not None:
+            values["mins"].append(min_temp)
+        if max_temp is not None:
+            values["maxes"].append(max_temp)
+        if max_pop is not None:
+            values["pops"].append(max_pop)
+        if weather_code:
+            values["codes"][weather_code] += 1
+        values["reports"].append(report_datetime or "")
+
+    updated_at = datetime.now().isoformat()
+    connection.execute("DELETE FROM region_overview WHERE level = ? AND area_id = ?", (LEVEL_CENTER, center_id))
+    connection.executemany(
+        "INSERT INTO region_overview VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [(LEVEL_CENTER, center_id, None, center_name, date,
+          min(values["mins"], default=None), max(values["maxes"], default=None), max(values["pops"], default=None),
+          dominant_code(values["codes"]), max(values["reports"]), updated_at)
+         for date, values in sorted(days.items())]
+    )
+
+
+def load_overview_offices(connection):
+    """集計済みのオフィスIDの集合"""
+    return {row[0] for row in connection.execute(
+        "SELECT DISTINCT area_id FROM region_overview WHERE level = ?", (LEVEL_OFFICE,)
+    )}
+
+
+def rebuild_overview_from_raw(connection):
+    """raw_forecasts の全オフィスについて集計を作り直す（再処理用。rebuild_from_raw で作り直した行から集計する）"""
+    initialize_overview_table(connection)
+    rows = connection.execute("SELECT office_id, report_datetime FROM raw_forecasts").fetchall()
+    for office_id, report_datetime in rows:
+        update_office_overview(connection, office_id, load_office_tables(connection, office_id), report_datetime)
+    connection.commit()
+    return len(rows)
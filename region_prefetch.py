@@ -0,0 +1,202 @@
+"""地域データの先読み
+
+オフィスの一覧を開いた利用者は、ほとんどの場合そのまま配下の地域（class10）のどれかを選ぶ。
+開いた時点で配下の地域のデータ（RegionBundle）と天気アイコンを裏で取得しておき、
+選択時にはキャッシュから表示する。
+
+- 先読みは1本のワーカースレッドで1地域ずつ行い、1回に先読みする地域の数には上限を設ける
+- 別のオフィスが開かれたら、まだ取得していない地域の先読みは取り消す
+- 画面の表示（前景の処理）が行われている間は先読みを止め、表示を待たせない
+- キャッシュはデータベースファイル（WALを含む）が更新されたら破棄する
+"""
+import threading
+from collections import OrderedDict
+
+from db_connection import database_change_token
+
+# 1回の先読みで取得する地域の数の上限
+MAX_PREFETCH_REGIONS = 8
+# キャッシュに保持する地域の数の上限（古く使われていないものから捨てる）
+MAX_CACHED_REGIONS = 64
+
+
+class RegionCache:
+    """class10_id をキーとする RegionBundle のキャッシュ（全セッションで共有できる）"""
+
+    def __init__(self, db_path, max_entries=MAX_CACHED_REGIONS):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        # 取得中の地域（同じ地域を前景と先読みで二重に取得しないよう、完了を待てるようにする）
+        self.loading = {}
+        self.token = None
+        self.stats = {"hits": 0, "misses": 0}
+
+    def check_token(self):
+        """データベースが更新されていればキャッシュを破棄し、現在の値を返す（ロックを保持して呼ぶ）"""
+        token = database_change_token(self.db_path)
+        if token != self.token:
+            self.entries.clear()
+            self.token = token
+        return token
+
+    def contains(self, class10_id):
+        with self.lock:
+            self.check_token()
+            return class10_id in self.entries
+
+    def get_or_fetch(self, class10_id, fetch, count=True):
+        """キャッシュにあればそれを返し、無ければ fetch(class10_id) で取得して保持する
+
+        Args:
+            class10_id (str): 地域コード
+            fetch (callable): RegionBundle を返す関数
+            count (bool): ヒット率の集計に含めるかどうか（先読みでは含めない）
+        """
+        while True:
+            with self.lock:
+                token = self.check_token()
+                if class10_id in self.entries:
+                    self.entries.move_to_end(class10_id)
+                    if count:
+                        self.stats["hits"] += 1
+                    return self.entries[class10_id]
+                event = self.loading.get(class10_id)
+                if event is None:
+                    event = threading.Event()
+                    self.loading[class10_id] = event
+                    if count:
+                        self.stats["misses"] += 1
+                    break
+            # 他のスレッドが取得中であれば、完了を待ってからキャッシュを見直す
+            event.wait()
+
+        try:
+            bundle = fetch(class10_id)
+            with self.lock:
+                # 取得中にデータベースが更新された場合は、古い内容を保持しない
+                if token == self.token:
+                    self.entries[class10_id] = bundle
+                    while len(self.entries) > self.max_entries:
+                        self.entries.popitem(last=False)
+            return bundle
+        finally:
+            with self.lock:
+                self.loading.pop(class10_id, None)
+            event.set()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.token = None
+
+
+class RegionPrefetcher:
+    """オフィスを開いたときに、配下の地域をバックグラウンドで先読みする
+
+    Args:
+        cache (RegionCache): 先読みした RegionBundle の保存先
+        fetch (callable): class10_id から RegionBundle を取得する関数
+        warm (callable): 取得した RegionBundle を受け取り、表示に必要な付随データ（天気アイコン等）を用意する関数
+        release (callable): 1地域の先読みを終えるたびに呼ぶ関数（ワーカーの接続をプールに戻す）
+        max_regions (int): 1回に先読みする地域の数の上限
+    """
+
+    def __init__(self, cache, fetch, warm=None, release=None, max_regions=MAX_PREFETCH_REGIONS):
+        self.cache = cache
+        self.fetch = fetch
+        self.warm = warm
+        self.release = release
+        self.max_regions = max_regions
+        self.condition = threading.Condition()
+        self.pending = []
+        # 先読みの依頼ごとに増やす番号（古い依頼の残りを取り消すために使う）
+        self.request_id = 0
+        self.stopped = False
+        self.worker = None
+        # 前景の処理の数と、それが0のときにセットされるイベント
+        self.foreground_count = 0
+        self.idle = threading.Event()
+        self.idle.set()
+        self.stats = {"prefetched": 0, "cancelled": 0, "errors": 0}
+
+    def prefetch(self, class10_ids):
+        """地域の先読みを依頼する（未完了の以前の依頼は取り消す）"""
+        with self.condition:
+            if self.stopped:
+                return
+            self.request_id += 1
+            self.stats["cancelled"] += len(self.pending)
+            self.pending = [class10_id for class10_id in class10_ids
+                            if not self.cache.contains(class10_id)][:self.max_regions]
+            if self.worker is None:
+                self.worker = threading.Thread(target=self.run, name="region-prefetch", daemon=True)
+                self.worker.start()
+            self.condition.notify()
+
+    def cancel(self):
+        """未完了の先読みを取り消す"""
+        with self.condition:
+            self.request_id += 1
+            self.stats["cancelled"] += len(self.pending)
+            self.pending = []
+
+    def begin_foreground(self):
+        """前景の処理の開始（終わるまで先読みを止める）"""
+        with self.condition:
+            self.foreground_count += 1
+            self.idle.clear()
+
+    def end_foreground(self):
+        with self.condition:
+            self.foreground_count -= 1
+            if self.foreground_count == 0:
+                self.idle.set()
+
+    def fetch_bundle(self, class10_id):
+        """前景から地域のデータを取得（先読み済みであればキャッシュから返す）"""
+        return self.cache.get_or_fetch(class10_id, self.fetch)
+
+    def next_region(self):
+        """次に先読みする地域と、その依頼の番号を取り出す（停止した場合は None）"""
+        with self.condition:
+            while not self.pending and not self.stopped:
+                self.condition.wait()
+            if self.stopped:
+                return None
+            return self.pending.pop(0), self.request_id
+
+    def is_current(self, request_id):
+        with self.condition:
+            return request_id == self.request_id and not self.stopped
+
+    def run(self):
+        while True:
+            item = self.next_region()
+            if item is None:
+                return
+            class10_id, request_id = item
+            # 前景の処理が終わるまで待ち、その間に取り消されていれば取得しない
+            self.idle.wait()
+            if not self.is_current(request_id):
+                continue
+            try:
+                bundle = self.cache.get_or_fetch(class10_id, self.fetch, count=False)
+                if self.warm is not None and self.is_current(request_id):
+                    self.warm(bundle)
+                self.stats["prefetched"] += 1
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"[WARNING] 地域 {class10_id} の先読みに失敗しました: {e}")
+            finally:
+                if self.release is not None:
+                    self.release()
+
+    def stop(self):
+        """ワーカースレッドを止める"""
+        with self.condition:
+            self.stopped = True
+            self.pending = []
+            self.condition.notify()
+        self.idle.set()
@@ -0,0 +1,100 @@
+"""forecast_alerts のルールの評価のテスト"""
+import sqlite3
+
+import pytest
+
+from forecast_alerts import (add_alert_rule, changed_value_keys, evaluate_alert_rules, initialize_alert_tables,
+                             remove_alert_rule)
+from forecast_values import initialize_value_table
+
+TIMES = ("2026-10-19T06:00:00+09:00", "2026-10-19T12:00:00+09:00")
+# (種類, 日時, 値, class10_id, 地域名, 発表日時, 元のテーブル, 元の行の id)
+VALUES = [
+    ("pop", TIMES[0], 80.0, "130010", "東京地方", "2026-10-19T05:00:00+09:00", "weather_pops", 1),
+    ("pop", TIMES[1], 20.0, "130010", "東京地方", "2026-10-19T05:00:00+09:00", "weather_pops", 2),
+    ("pop", TIMES[0], 90.0, "140010", "東部", "2026-10-19T05:00:00+09:00", "weather_pops", 3),
+    ("temp", TIMES[0], -6.0, "130010", "東京", "2026-10-19T05:00:00+09:00", "weather_temps", 1),
+    ("temp", TIMES[0], -6.0, "130020", "東京", "2026-10-19T05:00:00+09:00", "weather_temps", 1),
+]
+
+
+@pytest.fixture
+def connection():
+    connection = sqlite3.connect(":memory:")
+    initialize_value_table(connection)
+    initialize_alert_tables(connection)
+    connection.executemany("INSERT INTO weather_values VALUES (?, ?, ?, ?, ?, ?, ?, ?)", VALUES)
+    yield connection
+    connection.close()
+
+
+def add_rule(connection, kind, operator, threshold, class10_id=None):
+    """現在のデータを評価せずにルールを追加"""
+    return connection.execute("INSERT INTO alert_rules (kind, operator, threshold, class10_id) VALUES (?, ?, ?, ?)",
+                              (kind, operator, threshold, class10_id)).lastrowid
+
+
+def events(connection):
+    return sorted(connection.execute("SELECT rule_id, class10_id, time_define, value FROM alert_events"))
+
+
+def test_changed_value_keys_keeps_value_columns_only():
+    changes = [
+        ("weather_pops", "130010", "東京地方", TIMES[0], "pop", "30", "80"),
+        ("weather_pops", "130010", "東京地方", TIMES[1], "pop", "20", None),
+        ("weather_info", "130010", "東京地方", TIMES[0], "weather", "晴れ", "雨"),
+        ("weather_tt", "44132", "東京", TIMES[0], "temps_min_upper", "5", "6"),
+        ("weather_tt", "44132", "東京", TIMES[1], "temps_max", None, "20"),
+    ]
+    assert changed_value_keys(changes) == {
+        ("weather_pops", "pop", "東京地方", TIMES[0]),
+        ("weather_tt", "temp_max", "東京", TIMES[1]),
+    }
+
+
+def test_evaluate_alert_rules_reads_changed_rows_only(connection):
+    """値が変わった行だけを評価し、条件を満たす行を記録する"""
+    all_areas = add_rule(connection, "pop", ">=", 50)
+    tokyo = add_rule(connection, "pop", ">=", 10, "130010")
+    changed = {("weather_pops", "pop", "東京地方", TIMES[0]), ("weather_pops", "pop", "東京地方", TIMES[1])}
+    assert evaluate_alert_rules(connection, changed) == 3
+    assert events(connection) == [
+        (all_areas, "130010", TIMES[0], 80.0),
+        (tokyo, "130010", TIMES[0], 80.0),
+        (tokyo, "130010", TIMES[1], 20.0),
+    ]
+    # 140010 の行は変わっていないため、全地域のルールを満たしていても記録しない
+    assert evaluate_alert_rules(connection, changed) == 0
+
+
+def test_evaluate_alert_rules_matches_brute_force(connection):
+    """全ての行を変わったものとした場合、全行 × 全ルールを調べた結果と一致する"""
+    rules = [("pop", ">=", 50, None), ("pop", "<", 30, "130010"), ("temp", "<=", -5, None), ("temp", ">", 0, None)]
+    for rule in rules:
+        add_rule(connection, *rule)
+    changed = {(source, kind, area_name, time_define)
+               for kind, time_define, _, _, area_name, _, source, _ in VALUES}
+    evaluate_alert_rules(connection, changed)
+
+    compare = {">=": lambda a, b: a >= b, "<": lambda a, b: a < b, "<=": lambda a, b: a <= b, ">": lambda a, b: a > b}
+    expected = sorted({
+        (rule_id, class10_id, time_define, value)
+        for rule_id, (kind, operator, threshold, rule_area) in enumerate(rules, 1)
+        for value_kind, time_define, value, class10_id, *_ in VALUES
+        if value_kind == kind and rule_area in (None, class10_id) and compare[operator](value, threshold)
+    })
+    assert events(connection) == expected
+
+
+def test_evaluate_alert_rules_without_changes_or_rules(connection):
+    assert evaluate_alert_rules(connection, set()) == 0
+    assert evaluate_alert_rules(connection, {("weather_pops", "pop", "東京地方", TIMES[0])}) == 0
+
+
+def test_add_alert_rule_evaluates_current_values(connection):
+    rule_id, added = add_alert_rule(connection, "temp", "<=", -5)
+    assert added == 2
+    assert remove_alert_rule(connection, rule_id)
+    assert events(connection) == []
+    with pytest.raises(ValueError):
+        add_alert_rule(connection, "pop", "==", 50)
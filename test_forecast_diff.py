@@ -0,0 +1,128 @@
+"""forecast_diff の発表間の差分のテスト"""
+import random
+import sqlite3
+
+import pytest
+
+from forecast_diff import (DIFF_COLUMNS, KEY_COLUMNS, diff_office, initialize_diff_table, save_office_diff,
+                           snapshot_area_codes, snapshot_office)
+from forecast_normalizer import TABLE_COLUMNS, WEATHER_INFO, WEATHER_POPS, WEATHER_TEMPS
+
+TIMES = [f"2026-10-{day:02d}T{hour:02d}:00:00+09:00" for day in (19, 20) for hour in (0, 6, 12, 18)]
+
+
+def pop_row(code, time_define, pop, report="2026-10-19T05:00:00+09:00"):
+    return (code, "気象台", report, f"地域{code}", time_define, pop)
+
+
+def random_tables(rng, codes, report, times):
+    """天気・降水確率・気温の行（normalize_forecast_tables と同じ形）"""
+    return {
+        WEATHER_INFO: [(code, "気象台", report, f"地域{code}", time_define, rng.choice(["100", "200"]),
+                        rng.choice(["晴れ", "くもり"]), "北の風", rng.choice([None, "１メートル"]))
+                       for code in codes for time_define in times[:3]],
+        WEATHER_POPS: [pop_row(code, time_define, rng.choice(["", "10", "30"]), report)
+                       for code in codes for time_define in times],
+        WEATHER_TEMPS: [(code + "1", "気象台", report, f"地点{code}", time_define, str(rng.randint(0, 3)))
+                        for code in codes for time_define in times[:2]],
+    }
+
+
+def write_tables(connection, tables):
+    for table_name, rows in tables.items():
+        columns = TABLE_COLUMNS[table_name]
+        codes = sorted({row[0] for row in rows})
+        connection.execute(f"DELETE FROM {table_name} WHERE offices_code IN ({', '.join('?' * len(codes))})", codes)
+        connection.executemany(
+            f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", rows
+        )
+
+
+def table_state(connection, table_name):
+    """テーブルの全行を {キー: 値の列} にする（差分の期待値用。同じキーは id の小さい行）"""
+    select = ", ".join(KEY_COLUMNS + DIFF_COLUMNS[table_name])
+    return {tuple(row[:len(KEY_COLUMNS)]): tuple(row[len(KEY_COLUMNS):])
+            for row in connection.execute(f"SELECT {select} FROM {table_name} ORDER BY id DESC")}
+
+
+@pytest.fixture
+def connection():
+    connection = sqlite3.connect(":memory:")
+    for table_name in DIFF_COLUMNS:
+        columns = ", ".join(f"{column} TEXT" for column in TABLE_COLUMNS[table_name])
+        connection.execute(f"CREATE TABLE {table_name} (id INTEGER PRIMARY KEY AUTOINCREMENT, {columns})")
+    initialize_diff_table(connection)
+    yield connection
+    connection.close()
+
+
+def test_diff_office_changed_added_and_removed_times():
+    previous = {WEATHER_POPS: {("130010", "地域130010", TIMES[0]): ("30",), ("130010", "地域130010", TIMES[1]): ("10",),
+                               ("130010", "地域130010", TIMES[2]): ("50",)}}
+    tables = {WEATHER_POPS: [pop_row("130010", TIMES[1], "10"), pop_row("130010", TIMES[2], "70"),
+                             pop_row("130010", TIMES[3], "20")]}
+    assert diff_office(previous, tables) == [
+        (WEATHER_POPS, "130010", "地域130010", TIMES[0], "pop", "30", None),
+        (WEATHER_POPS, "130010", "地域130010", TIMES[2], "pop", "50", "70"),
+        (WEATHER_POPS, "130010", "地域130010", TIMES[3], "pop", None, "20"),
+    ]
+    # 同じ値の発表は差分なし
+    unchanged = [pop_row("130010", time_define, value[0])
+                 for (_, _, time_define), value in previous[WEATHER_POPS].items()]
+    assert diff_office(previous, {WEATHER_POPS: unchanged}) == []
+
+
+def test_diff_office_uses_first_row_of_duplicate_keys():
+    tables = {WEATHER_POPS: [pop_row("130010", TIMES[0], "30"), pop_row("130010", TIMES[0], "90")]}
+    assert diff_office({}, tables) == [(WEATHER_POPS, "130010", "地域130010", TIMES[0], "pop", None, "30")]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_snapshot_diff_matches_full_table_comparison(connection, seed):
+    """書き換える前の行との差分が、書き換えの前後の全行を比べた結果と一致する"""
+    rng = random.Random(seed)
+    codes = ["130010", "140010", "270000"]
+    write_tables(connection, random_tables(rng, codes, "2026-10-19T05:00:00+09:00", TIMES[:6]))
+    tables = random_tables(rng, codes[:2], "2026-10-19T11:00:00+09:00", TIMES[1:])
+
+    before = {table_name: table_state(connection, table_name) for table_name in DIFF_COLUMNS}
+    previous = snapshot_office(connection, tables)
+    write_tables(connection, tables)
+    changes = diff_office(previous, tables)
+
+    office_codes = {row[0] for rows in tables.values() for row in rows}
+    expected = set()
+    for table_name, columns in DIFF_COLUMNS.items():
+        after = table_state(connection, table_name)
+        for key in set(before[table_name]) | set(after):
+            if key[0] not in office_codes:
+                continue
+            old = before[table_name].get(key, (None,) * len(columns))
+            new = after.get(key, (None,) * len(columns))
+            expected.update((table_name,) + key + (column, old_value, new_value)
+                            for column, old_value, new_value in zip(columns, old, new) if old_value != new_value)
+    assert set(changes) == expected
+    assert len(changes) == len(expected)
+
+
+def test_snapshot_area_codes_includes_tables_without_new_rows(connection):
+    """新しい発表に行が無いテーブルでも、地域コードの行は書き換えで消えるため差分に含める"""
+    write_tables(connection, random_tables(random.Random(0), ["130010"], "2026-10-19T05:00:00+09:00", TIMES[:2]))
+    tables = {WEATHER_POPS: [pop_row("130010", time_define, "10") for time_define in TIMES[:2]]}
+    previous = snapshot_area_codes(connection, ["130010", "1300101"])
+    assert set(previous) == set(DIFF_COLUMNS)
+    assert previous[WEATHER_TEMPS] == table_state(connection, WEATHER_TEMPS)
+    # 新しい行の地域コードだけを読む snapshot_office には、気温の行が含まれない
+    assert WEATHER_TEMPS not in snapshot_office(connection, tables)
+    removed = [change for change in diff_office(previous, tables) if change[0] == WEATHER_TEMPS]
+    assert len(removed) == 2 and all(change[-1] is None for change in removed)
+    assert snapshot_area_codes(connection, []) == {}
+
+
+def test_save_office_diff_keeps_latest_only(connection):
+    save_office_diff(connection, "130000", [(WEATHER_POPS, "130010", "地域", TIMES[0], "pop", "10", "30")],
+                     "2026-10-19T05:00:00+09:00", "2026-10-19T11:00:00+09:00")
+    save_office_diff(connection, "130000", [(WEATHER_POPS, "130010", "地域", TIMES[1], "pop", "30", "50")],
+                     "2026-10-19T11:00:00+09:00", "2026-10-19T17:00:00+09:00")
+    rows = connection.execute("SELECT time_define, old_value, new_value, report_datetime FROM region_diffs").fetchall()
+    assert rows == [(TIMES[1], "30", "50", "2026-10-19T17:00:00+09:00")]
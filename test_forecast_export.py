@@ -0,0 +1,61 @@
+"""forecast_export の列指向ファイルへの書き出しのテスト"""
+import json
+import os
+import sqlite3
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from forecast_export import FORMAT_NPZ, MANIFEST_NAME, export_tables
+from forecast_normalizer import TABLE_COLUMNS, WEATHER_POPS
+
+
+def insert_pops(db_path, report_datetime, codes):
+    connection = sqlite3.connect(db_path)
+    columns = TABLE_COLUMNS[WEATHER_POPS]
+    connection.execute(f"CREATE TABLE IF NOT EXISTS {WEATHER_POPS} "
+                       f"(id INTEGER PRIMARY KEY AUTOINCREMENT, {', '.join(columns)})")
+    connection.executemany(
+        f"INSERT INTO {WEATHER_POPS} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+        [(code, "気象台", report_datetime, code, "2026-10-19T06:00:00+09:00", "30") for code in codes]
+    )
+    connection.commit()
+    connection.close()
+
+
+def table_parts(output_dir):
+    return sorted(os.listdir(os.path.join(output_dir, WEATHER_POPS)))
+
+
+def manifest_parts(output_dir):
+    with open(os.path.join(output_dir, MANIFEST_NAME), encoding="utf-8") as f:
+        return sorted(os.path.basename(path) for path in json.load(f)["tables"][WEATHER_POPS]["parts"])
+
+
+def test_export_runs_in_the_same_second_do_not_overwrite(tmp_path):
+    """続けて書き出しても前回のファイルを上書きしない"""
+    db_path, output_dir = str(tmp_path / "weather.db"), str(tmp_path / "export")
+    insert_pops(db_path, "2026-10-19T05:00:00+09:00", ["130010", "140010"])
+    assert export_tables(db_path, output_dir, FORMAT_NPZ, tables=(WEATHER_POPS,)) == {WEATHER_POPS: 2}
+    insert_pops(db_path, "2026-10-19T11:00:00+09:00", ["130010"])
+    assert export_tables(db_path, output_dir, FORMAT_NPZ, tables=(WEATHER_POPS,)) == {WEATHER_POPS: 1}
+
+    parts = table_parts(output_dir)
+    assert len(parts) == 2
+    assert manifest_parts(output_dir) == parts
+
+
+def test_full_export_clears_previous_parts(tmp_path):
+    """全件の書き出しでは以前のファイルを削除し、一覧と実際のファイルを一致させる"""
+    db_path, output_dir = str(tmp_path / "weather.db"), str(tmp_path / "export")
+    insert_pops(db_path, "2026-10-19T05:00:00+09:00", ["130010", "140010"])
+    export_tables(db_path, output_dir, FORMAT_NPZ, tables=(WEATHER_POPS,))
+    insert_pops(db_path, "2026-10-19T11:00:00+09:00", ["130010"])
+    export_tables(db_path, output_dir, FORMAT_NPZ, tables=(WEATHER_POPS,))
+
+    assert export_tables(db_path, output_dir, FORMAT_NPZ, incremental=False,
+                         tables=(WEATHER_POPS,)) == {WEATHER_POPS: 3}
+    parts = table_parts(output_dir)
+    assert len(parts) == 1
+    assert manifest_parts(output_dir) == parts
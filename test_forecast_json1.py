@@ -0,0 +1,88 @@
+"""forecast_json1 の JSON1 関数による展開のテスト"""
+import copy
+import json
+import sqlite3
+
+import pytest
+
+from bench_normalizer import build_sample_document
+from forecast_json1 import derive_office_tables, initialize_json1_schema, load_office_tables, store_raw_forecast
+from forecast_normalizer import TABLE_COLUMNS, normalize_forecast_tables
+
+
+def sample_documents():
+    """サンプルと、欠けた値や null を含む変形"""
+    document = build_sample_document()
+    nulls = copy.deepcopy(document)
+    weekly = nulls[1]
+    weekly["tempAverage"]["areas"][0]["min"] = None
+    del weekly["precipAverage"]["areas"][1]["max"]
+    weekly["tempAverage"]["areas"][1]["max"] = "情報なし"
+    weekly["timeSeries"][1]["areas"][0]["tempsMax"][2] = None
+    weekly["timeSeries"][1]["areas"][1]["tempsMinLower"][3] = "情報なし"
+    nulls[0]["timeSeries"][0]["areas"][1]["weathers"][1] = None
+    nulls[0]["timeSeries"][1]["areas"][0]["pops"] = ["70", None, "60"]
+    return {"sample": document, "nulls": nulls, "short_only": document[:1]}
+
+
+@pytest.fixture
+def connection():
+    connection = sqlite3.connect(":memory:")
+    for table_name, columns in TABLE_COLUMNS.items():
+        column_list = ", ".join(f"{column} TEXT" for column in columns)
+        connection.execute(f"CREATE TABLE {table_name} (id INTEGER PRIMARY KEY AUTOINCREMENT, {column_list})")
+    initialize_json1_schema(connection)
+    yield connection
+    connection.close()
+
+
+@pytest.mark.parametrize("name", ["sample", "nulls", "short_only"])
+def test_derived_tables_match_normalizer(connection, name):
+    """ビューから作った行が、同じ文書を normalize_forecast_tables で展開した行とテーブルごとに一致する"""
+    document = sample_documents()[name]
+    assert store_raw_forecast(connection, "011000", json.dumps(document, ensure_ascii=False)) == \
+        "2024-12-15T17:00:00+09:00"
+    derive_office_tables(connection, "011000")
+
+    expected = normalize_forecast_tables(document)
+    for table_name, columns in TABLE_COLUMNS.items():
+        rows = connection.execute(f"SELECT {', '.join(columns)} FROM {table_name} ORDER BY id").fetchall()
+        assert rows == expected[table_name], table_name
+    if name != "short_only":
+        assert all(expected[table_name] for table_name in TABLE_COLUMNS)
+
+
+@pytest.mark.parametrize("name", ["sample", "nulls"])
+def test_loaded_rows_match_normalizer(connection, name):
+    """作り直した行（id の範囲で読む）と保存済みの行（地域コードで読む）が normalize_forecast_tables と一致する"""
+    other = build_sample_document(area_count=3)
+    for entry in other:
+        areas = [area for series in entry["timeSeries"] for area in series["areas"]]
+        areas += entry.get("tempAverage", {}).get("areas", []) + entry.get("precipAverage", {}).get("areas", [])
+        for area in areas:
+            area["area"]["code"] = "02" + area["area"]["code"]
+    store_raw_forecast(connection, "020000", json.dumps(other, ensure_ascii=False))
+    derive_office_tables(connection, "020000")
+
+    document = sample_documents()[name]
+    store_raw_forecast(connection, "011000", json.dumps(document, ensure_ascii=False))
+    expected = normalize_forecast_tables(document)
+    assert derive_office_tables(connection, "011000", load_rows=True) == expected
+    assert load_office_tables(connection, "011000") == expected
+    assert derive_office_tables(connection, "020000") is None
+
+
+def test_derive_replaces_previous_rows(connection):
+    document = build_sample_document()
+    store_raw_forecast(connection, "011000", json.dumps(document, ensure_ascii=False))
+    derive_office_tables(connection, "011000")
+    document[0]["timeSeries"][1]["areas"][0]["pops"] = ["0", "0", "0", "0", "0"]
+    store_raw_forecast(connection, "011000", json.dumps(document, ensure_ascii=False))
+    derive_office_tables(connection, "011000")
+    rows = connection.execute("SELECT offices_code, pop FROM weather_pops ORDER BY id").fetchall()
+    assert rows == [(row[0], row[5]) for row in normalize_forecast_tables(document)["weather_pops"]]
+
+
+def test_store_raw_forecast_rejects_invalid_json(connection):
+    with pytest.raises(ValueError):
+        store_raw_forecast(connection, "011000", "[{")
@@ -0,0 +1,27 @@
+"""forecast_normalizer の1回の走査で全テーブルの行を作る処理のテスト"""
+import copy
+
+import pytest
+
+from bench_normalizer import build_sample_document, legacy_all_tables
+from forecast_normalizer import TABLE_COLUMNS, WEATHER_POPS, normalize_forecast_tables
+
+
+@pytest.mark.parametrize("area_count", [1, 8, 30])
+def test_normalizer_matches_legacy_rows(area_count):
+    """以前の need ごとの処理と同じ行を作り、入力の JSON を変更しない"""
+    data = build_sample_document(area_count)
+    original = copy.deepcopy(data)
+    actual = normalize_forecast_tables(data)
+    for table_name, rows in legacy_all_tables(data).items():
+        assert actual[table_name] == rows
+    assert data == original
+
+
+def test_normalizer_pads_missing_values():
+    """要素が足りない系列は None として扱う"""
+    data = build_sample_document(1)
+    area = data[0]["timeSeries"][1]["areas"][0]
+    area["pops"] = area["pops"][:2]
+    rows = normalize_forecast_tables(data)[WEATHER_POPS]
+    assert [row[TABLE_COLUMNS[WEATHER_POPS].index("pop")] for row in rows] == area["pops"]
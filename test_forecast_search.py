@@ -0,0 +1,87 @@
+"""forecast_search の全文検索（bigram の FTS5 索引）のテスト"""
+import random
+import sqlite3
+
+import pytest
+
+from forecast_search import (SEARCH_COLUMNS, SEARCH_TABLE, build_match_query, index_text, initialize_search_index,
+                             sync_search_index, text_segments)
+
+WEATHER_PARTS = ("晴れ", "くもり", "雨", "雪", "時々", "一時", "所により", "雷を伴う", "夜", "昼過ぎ から")
+WIND_PARTS = ("北の風", "南西の風", "やや強く", "海上 では", "後", "東の風 強く")
+WAVE_PARTS = ("０．５メートル", "１メートル", "１．５メートル", "うねり を伴う", "後")
+
+
+def sqlite_has_fts5():
+    connection = sqlite3.connect(":memory:")
+    try:
+        connection.execute("CREATE VIRTUAL TABLE t USING fts5(x)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        connection.close()
+
+
+pytestmark = pytest.mark.skipif(not sqlite_has_fts5(), reason="SQLite が FTS5 に対応していない")
+
+
+def random_text(rng, parts):
+    return "　".join(rng.choice(parts) for _ in range(rng.randint(1, 4)))
+
+
+@pytest.fixture
+def connection():
+    rng = random.Random(0)
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE weather_info (id INTEGER PRIMARY KEY AUTOINCREMENT, weather TEXT, wind TEXT, "
+                       "wave TEXT)")
+    connection.executemany("INSERT INTO weather_info (weather, wind, wave) VALUES (?, ?, ?)", [
+        (random_text(rng, WEATHER_PARTS), random_text(rng, WIND_PARTS),
+         random_text(rng, WAVE_PARTS) if rng.random() < 0.7 else None)
+        for _ in range(2000)
+    ])
+    initialize_search_index(connection)
+    yield connection
+    connection.close()
+
+
+def test_build_match_query():
+    assert build_match_query("雪") == '{weather wind wave} : ("雪"*)'
+    assert build_match_query("くもり　時々　雪") == '{weather wind wave} : ("くも もり" AND "時々" AND "雪"*)'
+    assert build_match_query("１．５メートル", columns=("wave",)) == '{wave} : ("1"* AND "5メ メー ート トル")'
+    assert build_match_query("　、。 ") is None
+
+
+def test_index_text():
+    assert index_text("くもり　時々　雪") == "くも もり り 時々 々 雪"
+    assert index_text(None) == ""
+
+
+@pytest.mark.parametrize("query", ["雪", "時々", "くもり 雨", "雷を伴う", "北の風", "やや強く", "風 強く", "後",
+                                   "1メートル", "５メ", "うねり", "昼過ぎ", "晴れ 雷"])
+def test_search_matches_substring_scan(connection, query):
+    """索引の検索結果が、全行の部分一致（検索語の区切った部分を全て含む行）と一致する"""
+    actual = {row[0] for row in connection.execute(
+        f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH ?", (build_match_query(query),)
+    )}
+    # 検索語の部分（文字と数字の並び）が、いずれかの列の部分に文字列として含まれる行
+    query_segments = text_segments(query)
+    expected = set()
+    for row_id, *values in connection.execute(f"SELECT id, {', '.join(SEARCH_COLUMNS)} FROM weather_info"):
+        segments = [segment for value in values for segment in text_segments(value)]
+        if all(any(query_segment in segment for segment in segments) for query_segment in query_segments):
+            expected.add(row_id)
+    assert expected
+    assert actual == expected
+
+
+def test_sync_search_index_follows_rewrites(connection):
+    """削除された行を索引から外し、新しい行だけを追加する"""
+    connection.execute("DELETE FROM weather_info WHERE id <= 1000")
+    connection.execute("INSERT INTO weather_info (weather, wind, wave) VALUES ('みぞれ', '北の風', NULL)")
+    assert sync_search_index(connection) == 1
+    assert connection.execute(f"SELECT COUNT(*) FROM {SEARCH_TABLE}").fetchone()[0] == 1001
+    rows = connection.execute(f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH ?",
+                              (build_match_query("みぞれ"),)).fetchall()
+    assert rows == [(2001,)]
@@ -0,0 +1,113 @@
+"""forecast_values の条件検索用テーブルと検索の SQL のテスト"""
+import random
+import sqlite3
+
+import pytest
+
+from forecast_normalizer import TABLE_COLUMNS, WEATHER_POPS, WEATHER_TEMPS, WEATHER_TT
+from forecast_values import build_threshold_query, initialize_value_table, sync_value_index
+
+AREAS = (
+    ("130010", "東京", "東京地方"),
+    ("130010", "東京", "伊豆諸島北部"),
+    ("140010", "横浜", "神奈川県東部"),
+    ("270000", "大阪", "大阪府"),
+)
+TIMES = [f"2026-10-{day:02d}T{hour:02d}:00:00+09:00" for day in (19, 20) for hour in (0, 6, 12, 18)]
+
+
+def create_source_tables(connection):
+    """元のテーブル（id 付き）と areas を作成"""
+    for table_name in (WEATHER_POPS, WEATHER_TEMPS, WEATHER_TT):
+        columns = ", ".join(f"{column} TEXT" for column in TABLE_COLUMNS[table_name])
+        connection.execute(f"CREATE TABLE {table_name} (id INTEGER PRIMARY KEY AUTOINCREMENT, {columns})")
+    connection.execute("CREATE TABLE areas (id INTEGER PRIMARY KEY AUTOINCREMENT, class10s_id TEXT, class20s_name TEXT)")
+    connection.executemany("INSERT INTO areas (class10s_id, class20s_name) VALUES (?, ?)",
+                           [(code, name) for code, _, name in AREAS])
+
+
+def insert_rows(connection, rng, report_datetime="2026-10-19T05:00:00+09:00"):
+    """降水確率（空文字を含む）と気温の行を追加"""
+    pops = [(code, "気象台", report_datetime, code, time_define, rng.choice(["", "0", "10", "50", "70", "90"]))
+            for code in ("130010", "140010", "270000") for time_define in TIMES]
+    temps = [(code, "気象台", report_datetime, name, time_define, str(rng.randint(-5, 30)))
+             for code, name, _ in AREAS[::2] for time_define in TIMES]
+    for table_name, rows in ((WEATHER_POPS, pops), (WEATHER_TEMPS, temps)):
+        columns = TABLE_COLUMNS[table_name]
+        connection.executemany(
+            f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", rows
+        )
+
+
+@pytest.fixture
+def connection():
+    connection = sqlite3.connect(":memory:")
+    create_source_tables(connection)
+    initialize_value_table(connection)
+    yield connection
+    connection.close()
+
+
+def test_sync_value_index_counts_added_rows(connection):
+    """WITH … INSERT の行（気温）も含めて追加した行の数を返す"""
+    insert_rows(connection, random.Random(1))
+    added = sync_value_index(connection)
+    assert added == connection.execute("SELECT COUNT(*) FROM weather_values").fetchone()[0]
+    assert connection.execute("SELECT COUNT(*) FROM weather_values WHERE kind = 'temp'").fetchone()[0] > 0
+    assert sync_value_index(connection) == 0
+
+    # 元の行を削除すると weather_values からも消え、追加の数には含めない
+    connection.execute(f"DELETE FROM {WEATHER_TEMPS}")
+    assert sync_value_index(connection) == 0
+    assert connection.execute("SELECT COUNT(*) FROM weather_values WHERE kind = 'temp'").fetchone()[0] == 0
+
+
+def test_sync_value_index_skips_missing_tables():
+    """areas や元のテーブルがまだ無い場合は飛ばす"""
+    connection = sqlite3.connect(":memory:")
+    initialize_value_table(connection)
+    assert sync_value_index(connection) == 0
+
+
+@pytest.mark.parametrize("descending", [True, False])
+@pytest.mark.parametrize("min_value, max_value, start, end, limit", [
+    (None, None, None, None, None),
+    (50, None, None, None, None),
+    (None, 70, TIMES[2], TIMES[6], None),
+    (10, 90, TIMES[0], None, 5),
+])
+def test_build_threshold_query_matches_brute_force(connection, descending, min_value, max_value, start, end, limit):
+    """索引を使う SQL の結果が全件を Python で絞り込んだ結果と一致する"""
+    insert_rows(connection, random.Random(2))
+    sync_value_index(connection)
+    sql, params = build_threshold_query("pop", min_value=min_value, max_value=max_value, start=start, end=end,
+                                        descending=descending, limit=limit)
+    actual = connection.execute(sql, params).fetchall()
+
+    expected = [row for row in connection.execute(
+        "SELECT kind, class10_id, area_name, time_define, value, report_datetime FROM weather_values"
+    ) if row[0] == "pop"
+        and (min_value is None or row[4] >= min_value)
+        and (max_value is None or row[4] < max_value)
+        and (start is None or row[3] >= start)
+        and (end is None or row[3] < end)]
+    expected.sort(key=lambda row: (-row[4] if descending else row[4], row[3], row[1], row[2]))
+    assert actual == expected[:limit]
+
+
+def test_build_threshold_query_per_area(connection):
+    """地域ごとに最大（小さい順なら最小）の値の行を1行返す"""
+    insert_rows(connection, random.Random(3))
+    sync_value_index(connection)
+    for descending, pick in ((True, max), (False, min)):
+        sql, params = build_threshold_query("temp", descending=descending, per_area=True)
+        rows = connection.execute(sql, params).fetchall()
+        values = {}
+        for class10_id, value in connection.execute("SELECT class10_id, value FROM weather_values WHERE kind = 'temp'"):
+            values.setdefault(class10_id, []).append(value)
+        assert {row[1]: row[4] for row in rows} == {code: pick(found) for code, found in values.items()}
+
+
+def test_build_threshold_query_rejects_unknown_kind():
+    with pytest.raises(ValueError):
+        build_threshold_query("humidity")
@@ -0,0 +1,217 @@
+"""forecast_verification の検証統計のテスト（NumPy の集計を Python のループで求めた値と比べる）"""
+import math
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import pytest
+
+from forecast_verification import (LEAD_BINS, LEAD_LABELS, SHORT_TEMP_MAX_HOUR, SHORT_TEMP_MIN_HOUR, load_history,
+                                   revision_statistics, weekly_pop_statistics, weekly_temp_statistics)
+
+START = datetime(2026, 10, 1, 5)
+OFFICES = {"130000": ["130010", "130020"], "140000": ["140010"]}
+STATIONS = {"130000": ["44132", "44171"], "140000": ["46106"]}
+
+
+def iso(moment):
+    return moment.isoformat() + "+09:00"
+
+
+class FakeArchive:
+    """テーブルごとの行を iter_history で返す"""
+
+    def __init__(self, tables):
+        self.tables = tables
+
+    def iter_history(self, table_name, columns):
+        for row in self.tables.get(table_name, ()):
+            yield tuple(row[column] for column in columns)
+
+
+def synthetic_history(seed=0, days=4):
+    """5時・11時・17時の発表ごとに、短期予報と週間予報の行を作成（値の一部は空文字）"""
+    rng = random.Random(seed)
+    tables = defaultdict(list)
+
+    def value(low, high):
+        return "" if rng.random() < 0.1 else str(rng.randint(low, high))
+
+    reports = [START + timedelta(days=day, hours=hour) for day in range(days) for hour in (0, 6, 12)]
+    for report in reports:
+        base = report.replace(hour=0)
+        for office_id, codes in OFFICES.items():
+            common = {"office_id": office_id, "report_datetime": iso(report)}
+            for code in codes:
+                for hours in range(0, 48, 6):
+                    # 発表日の 00 時など、発表日時より前の時刻も含む
+                    tables["weather_pops"].append(dict(common, offices_code=code,
+                                                       time_define=iso(base + timedelta(hours=hours)),
+                                                       pop=value(0, 10) + "0" if rng.random() < 0.9 else ""))
+                for day in range(1, 7):
+                    tables["weather_reliabilities"].append(dict(
+                        common, offices_code=code, time_define=iso(base + timedelta(days=day)),
+                        pop=value(0, 10) + "0", reliabilities=rng.choice(["", "A", "B", "C"])))
+            for code in STATIONS[office_id]:
+                for day in range(2):
+                    for hour in (SHORT_TEMP_MIN_HOUR, SHORT_TEMP_MAX_HOUR, 12):
+                        tables["weather_temps"].append(dict(
+                            common, offices_code=code, time_define=iso(base + timedelta(days=day, hours=hour)),
+                            temp=value(-3, 25)))
+                for day in range(1, 7):
+                    low, high = rng.randint(-3, 10), rng.randint(11, 25)
+                    tables["weather_tt"].append(dict(
+                        common, offices_code=code, time_define=iso(base + timedelta(days=day)),
+                        temps_min=str(low), temps_min_lower=value(-5, low), temps_min_upper=str(low + 2),
+                        temps_max=str(high), temps_max_lower=str(high - 2), temps_max_upper=value(high, 30)))
+    return tables
+
+
+def number(text):
+    return float(text) if text not in ("", None) else None
+
+
+def parse(text):
+    return datetime.fromisoformat(text[:19])
+
+
+def lead_label(report, target):
+    hours = (parse(target) - parse(report)).total_seconds() / 3600
+    return LEAD_LABELS[sum(1 for edge in LEAD_BINS if hours >= edge)]
+
+
+def summarize(groups):
+    """{キー: 値のリスト} から (件数, 平均, 平均絶対値, 二乗平均平方根)"""
+    return {key: (len(values), sum(values) / len(values), sum(abs(v) for v in values) / len(values),
+                  math.sqrt(sum(v * v for v in values) / len(values)))
+            for key, values in groups.items()}
+
+
+def expected_revisions(rows, column):
+    series = defaultdict(list)
+    for row in rows:
+        if number(row[column]) is not None:
+            series[(row["offices_code"], row["time_define"])].append(row)
+    revisions, errors = defaultdict(list), defaultdict(list)
+    for target_rows in series.values():
+        target_rows.sort(key=lambda row: row["report_datetime"])
+        final = number(target_rows[-1][column])
+        for previous, row in zip(target_rows, target_rows[1:]):
+            key = (row["office_id"], lead_label(row["report_datetime"], row["time_define"]))
+            revisions[key].append(number(row[column]) - number(previous[column]))
+        for row in target_rows[:-1]:
+            key = (row["office_id"], lead_label(row["report_datetime"], row["time_define"]))
+            errors[key].append(number(row[column]) - final)
+    expected = {}
+    for metric, groups in (("revision", revisions), ("error_vs_final", errors)):
+        for (office_id, label), stats in summarize(groups).items():
+            expected[(office_id, column, metric, label)] = stats
+    return expected
+
+
+def latest_short_values(rows, column, hour=None, daily_max=False):
+    """(地域, 日付) → (最新の発表日時, 値)。daily_max の場合は発表ごとの日最大値"""
+    by_report = defaultdict(list)
+    for row in rows:
+        target = parse(row["time_define"])
+        if number(row[column]) is None or (hour is not None and target.hour != hour):
+            continue
+        by_report[(row["offices_code"], target.date(), row["report_datetime"])].append(number(row[column]))
+    latest = {}
+    for (code, day, report), values in by_report.items():
+        if (code, day) not in latest or report > latest[(code, day)][0]:
+            latest[(code, day)] = (report, max(values) if daily_max else values[0])
+    return latest
+
+
+def as_dict(rows, key_length):
+    return {row[:key_length]: row[key_length:] for row in rows}
+
+
+def assert_rows_equal(actual, expected):
+    assert set(actual) == set(expected)
+    for key, values in expected.items():
+        assert actual[key] == pytest.approx(values), key
+
+
+@pytest.fixture(scope="module")
+def history():
+    archive = FakeArchive(synthetic_history())
+    return {
+        "pops": load_history(archive, "weather_pops", ["pop"]),
+        "temps": load_history(archive, "weather_temps", ["temp"]),
+        "weekly": load_history(archive, "weather_reliabilities", ["pop", "reliabilities"]),
+        "weekly_tt": load_history(archive, "weather_tt", ["temps_min", "temps_min_upper", "temps_min_lower",
+                                                          "temps_max", "temps_max_upper", "temps_max_lower"]),
+        "tables": archive.tables,
+    }
+
+
+def test_revision_statistics_hand_check():
+    """修正量 +30 と -50 の平均は -10、二乗平均平方根は √1700"""
+    target = START + timedelta(days=2)
+    rows = [{"office_id": "130000", "offices_code": "130010", "report_datetime": iso(target - timedelta(hours=hours)),
+             "time_define": iso(target), "pop": pop} for hours, pop in ((30, "10"), (28, "40"), (26, "-10"))]
+    results = as_dict(revision_statistics(load_history(FakeArchive({"p": rows}), "p", ["pop"]), "pop"), 4)
+    count, mean, mean_abs, rms = results[("130000", "pop", "revision", "24-48h")]
+    assert (count, mean, mean_abs) == (2, -10.0, 40.0)
+    assert rms == pytest.approx(41.23, abs=0.005)
+    # 最終値（-10）との差は 20 と 50
+    assert results[("130000", "pop", "error_vs_final", "24-48h")] == pytest.approx((2, 35.0, 35.0, math.sqrt(1450)))
+
+
+@pytest.mark.parametrize("table_name, column", [("weather_pops", "pop"), ("weather_temps", "temp")])
+def test_revision_statistics_match_loop(history, table_name, column):
+    data = history["pops"] if column == "pop" else history["temps"]
+    actual = as_dict(revision_statistics(data, column), 4)
+    assert any(key[3] == "<0h" for key in actual)
+    assert_rows_equal(actual, expected_revisions(history["tables"][table_name], column))
+
+
+def test_negative_lead_times_get_their_own_label():
+    target = START + timedelta(days=1)
+    rows = [{"office_id": "130000", "offices_code": "130010", "report_datetime": iso(target + timedelta(hours=hours)),
+             "time_define": iso(target), "pop": pop} for hours, pop in ((-3, "10"), (1, "30"))]
+    results = revision_statistics(load_history(FakeArchive({"p": rows}), "p", ["pop"]), "pop")
+    assert [(row[2], row[3], row[4]) for row in results] == [("revision", "<0h", 1), ("error_vs_final", "0-6h", 1)]
+
+
+def test_weekly_pop_statistics_match_loop(history):
+    latest = latest_short_values(history["tables"]["weather_pops"], "pop", daily_max=True)
+    errors = defaultdict(list)
+    for row in history["tables"]["weather_reliabilities"]:
+        found = latest.get((row["offices_code"], parse(row["time_define"]).date()))
+        if number(row["pop"]) is None or not found or found[0] <= row["report_datetime"]:
+            continue
+        errors[(row["office_id"], "pop", row["reliabilities"] or "-")].append(number(row["pop"]) - found[1])
+    expected = {key: (count, mean_abs, mean, None) for key, (count, mean, mean_abs, _) in summarize(errors).items()}
+
+    actual = as_dict(weekly_pop_statistics(history["weekly"], history["pops"]), 3)
+    assert {key[2] for key in actual} == {"-", "A", "B", "C"}
+    assert set(actual) == set(expected)
+    for key, (count, mae, bias, hit_rate) in expected.items():
+        assert actual[key][:3] == pytest.approx((count, mae, bias)), key
+        assert actual[key][3] is None
+
+
+def test_weekly_temp_statistics_match_loop(history):
+    expected = {}
+    for variable, hour, lower, upper in (("temps_min", SHORT_TEMP_MIN_HOUR, "temps_min_lower", "temps_min_upper"),
+                                         ("temps_max", SHORT_TEMP_MAX_HOUR, "temps_max_lower", "temps_max_upper")):
+        latest = latest_short_values(history["tables"]["weather_temps"], "temp", hour=hour)
+        errors, hits = defaultdict(list), defaultdict(list)
+        for row in history["tables"]["weather_tt"]:
+            found = latest.get((row["offices_code"], parse(row["time_define"]).date()))
+            if number(row[variable]) is None or not found or found[0] <= row["report_datetime"]:
+                continue
+            observed = found[1]
+            key = (row["office_id"], variable, "-")
+            errors[key].append(number(row[variable]) - observed)
+            low, high = number(row[lower]), number(row[upper])
+            hits[key].append(low is not None and high is not None and low <= observed <= high)
+        for key, (count, mean, mean_abs, _) in summarize(errors).items():
+            expected[key] = (count, mean_abs, mean, sum(hits[key]) / count)
+
+    actual = as_dict(weekly_temp_statistics(history["weekly_tt"], history["temps"]), 3)
+    assert len(expected) == 2 * len(OFFICES)
+    assert_rows_equal(actual, expected)
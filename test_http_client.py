@@ -0,0 +1,56 @@
+"""http_client のリトライとサーキットブレーカーのテスト"""
+import pytest
+
+pytest.importorskip("requests")
+
+import http_client
+from http_client import CircuitBreaker, ResilientClient
+
+URL = "https://www.jma.go.jp/bosai/forecast/data/forecast/130000.json"
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+@pytest.fixture
+def responses(monkeypatch):
+    """requests.get が順に返すステータスコード（呼び出しの回数も数える）"""
+    statuses = []
+    calls = []
+
+    def fake_get(url, timeout=None):
+        calls.append(url)
+        return FakeResponse(statuses.pop(0))
+
+    monkeypatch.setattr(http_client.requests, "get", fake_get)
+    return statuses, calls
+
+
+def test_half_open_breaker_closes_after_client_error(responses):
+    """open → half-open の試行が 404 でも、次のリクエストは送られる"""
+    statuses, calls = responses
+    client = ResilientClient(max_retries=0, failure_threshold=1, reset_timeout=0.0)
+    breaker = client.get_breaker(URL)
+
+    statuses.append(503)
+    assert client.get(URL) is None
+    assert breaker.state == CircuitBreaker.OPEN
+
+    statuses.append(404)
+    assert client.get(URL) is None
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    statuses.append(200)
+    assert client.get(URL).status_code == 200
+    assert len(calls) == 3
+
+
+def test_open_breaker_skips_requests(responses):
+    statuses, calls = responses
+    client = ResilientClient(max_retries=0, failure_threshold=1, reset_timeout=60.0)
+    statuses.append(500)
+    assert client.get(URL) is None
+    assert client.get(URL) is None
+    assert len(calls) == 1
@@ -0,0 +1,381 @@
+"""ingest の取り込みのパイプラインと中断した取り込みの再開のテスト"""
+import json
+import os
+import queue
+import sqlite3
+import subprocess
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("requests")
+
+import ingest
+from forecast_alerts import initialize_alert_tables
+from ingest import (PIPELINE_END, RUN_HEARTBEAT_TIMEOUT_SECONDS, IngestSummary, download_stage,
+                    ensure_database_exists, parse_stage, run_ingest)
+
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeClient:
+    """オフィスごとに応答・None（リトライ後の失敗）・例外を返すクライアント"""
+
+    def __init__(self, results):
+        self.results = results
+
+    def get(self, url, deadline=None):
+        result = self.results[url.rsplit("/", 1)[-1].split(".")[0]]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def drain(stage_queue):
+    items = []
+    while True:
+        item = stage_queue.get_nowait()
+        if item is PIPELINE_END:
+            return items
+        items.append(item)
+
+
+def test_download_stage_records_exceptions_as_failed_offices():
+    """1件のオフィスで例外が起きても残りを取得し、そのオフィスは (オフィスID, None) にする"""
+    client = FakeClient({
+        "130000": FakeResponse(b"[]"),
+        "140000": ValueError("壊れた応答"),
+        "270000": None,
+    })
+    raw_queue = queue.Queue()
+    download_stage(client, ["130000", "140000", "270000"], None, 2, raw_queue)
+    assert sorted(drain(raw_queue)) == [("130000", b"[]"), ("140000", None), ("270000", None)]
+
+
+DOCUMENT = ('[{"publishingOffice": "気象台", "reportDatetime": "2026-10-19T05:00:00+09:00", '
+            '"timeSeries": [{"timeDefines": ["2026-10-19T06:00:00+09:00"], '
+            '"areas": [{"area": {"name": "東京地方", "code": "130010"}, "pops": ["30"]}]}]}]').encode("utf-8")
+
+
+@pytest.mark.parametrize("parse_workers", [0, 1])
+@pytest.mark.parametrize("keep_document", [False, True])
+def test_parse_stage_keeps_document_only_when_requested(parse_workers, keep_document):
+    """生データは生データのアーカイブに保存する場合だけ解析結果に加える"""
+    raw_queue = queue.Queue()
+    for item in (("130000", DOCUMENT), ("140000", b"{"), ("270000", None), PIPELINE_END):
+        raw_queue.put(item)
+    parsed_queue = queue.Queue()
+    parse_stage(raw_queue, parsed_queue, parse_workers, IngestSummary(), keep_document=keep_document)
+    results = dict(drain(parsed_queue))
+
+    assert results["130000"]["report_datetime"] == "2026-10-19T05:00:00+09:00"
+    assert ("document" in results["130000"]) == keep_document
+    if keep_document:
+        assert results["130000"]["document"] == DOCUMENT
+    assert "error" in results["140000"] and "document" not in results["140000"]
+    assert results["270000"] is None
+
+
+OFFICES = {"130000": "130010", "140000": "140010", "270000": "270000"}
+
+
+def forecast_document(class10_id, report_datetime="2026-10-19T05:00:00+09:00", pop="30"):
+    return json.dumps([{
+        "publishingOffice": "気象台",
+        "reportDatetime": report_datetime,
+        "timeSeries": [{
+            "timeDefines": ["2026-10-19T06:00:00+09:00"],
+            "areas": [{"area": {"name": f"{class10_id}地方", "code": class10_id}, "weatherCodes": ["100"],
+                       "weathers": ["晴れ"], "winds": ["北の風"], "pops": [pop], "temps": ["18"]}],
+        }],
+    }], ensure_ascii=False).encode("utf-8")
+
+
+class FakeJmaClient:
+    """area.json と天気データを返すクライアント（failing のオフィスは取得に失敗する）"""
+
+    def __init__(self, failing=(), report_datetime="2026-10-19T05:00:00+09:00", pops=None):
+        self.failing = set(failing)
+        self.report_datetime = report_datetime
+        self.pops = pops or {}
+        self.requested = []
+
+    def get_json(self, url, deadline=None):
+        return {
+            "centers": {"010300": {"name": "気象台", "children": list(OFFICES)}},
+            "offices": {office: {"name": office, "children": [code]} for office, code in OFFICES.items()},
+            "class10s": {code: {"name": code, "children": [code + "0"]} for code in OFFICES.values()},
+            "class15s": {code + "0": {"name": code, "children": [code + "00"]} for code in OFFICES.values()},
+            "class20s": {code + "00": {"name": f"{code}地方"} for code in OFFICES.values()},
+        }
+
+    def get(self, url, deadline=None):
+        office = url.rsplit("/", 1)[-1].split(".")[0]
+        self.requested.append(office)
+        if office in self.failing:
+            return None
+        return FakeResponse(forecast_document(OFFICES[office], self.report_datetime, self.pops.get(office, "30")))
+
+
+def ingest_once(db_path, client, resume=True):
+    return run_ingest(db_path, workers=2, client=client, resume=resume, parse_workers=0)
+
+
+def latest_run(db_path):
+    connection = sqlite3.connect(db_path)
+    try:
+        return connection.execute(
+            "SELECT run_id, status, pid, heartbeat_at FROM ingest_runs ORDER BY run_id DESC LIMIT 1"
+        ).fetchone()
+    finally:
+        connection.close()
+
+
+def interrupt_latest_run(db_path, office, pid, heartbeat_at, process_token=ingest.PROCESS_TOKEN):
+    """最後の実行を、office の記録が無いまま status が running で残った状態にする"""
+    connection = sqlite3.connect(db_path)
+    try:
+        run_id = latest_run(db_path)[0]
+        connection.execute("UPDATE ingest_runs SET status = 'running', finished_at = NULL, pid = ?, heartbeat_at = ?, "
+                           "process_token = ? WHERE run_id = ?", (pid, heartbeat_at, process_token, run_id))
+        connection.execute("DELETE FROM ingest_checkpoints WHERE run_id = ? AND office_id = ?", (run_id, office))
+        connection.commit()
+    finally:
+        connection.close()
+    return run_id
+
+
+def finished_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_partial_run_resumes_failed_offices(tmp_path):
+    """失敗を記録して終了した実行は、次の実行で失敗したオフィスだけを取得して再開する"""
+    db_path = str(tmp_path / "weather.db")
+    summary = ingest_once(db_path, FakeJmaClient(failing=["140000"]))
+    assert summary.offices_failed == ["140000"]
+    run_id, status = latest_run(db_path)[:2]
+    assert status == "partial"
+
+    client = FakeJmaClient()
+    summary = ingest_once(db_path, client)
+    assert client.requested == ["140000"]
+    assert sorted(summary.offices_resumed) == ["130000", "270000"]
+    assert latest_run(db_path)[:2] == (run_id, "completed")
+
+    # 完了した実行は再開せず、全オフィスを取得する
+    client = FakeJmaClient()
+    ingest_once(db_path, client)
+    assert sorted(client.requested) == sorted(OFFICES)
+    assert latest_run(db_path)[0] > run_id
+
+
+def test_partial_run_is_not_resumed_without_resume(tmp_path):
+    db_path = str(tmp_path / "weather.db")
+    ingest_once(db_path, FakeJmaClient(failing=["140000"]))
+    client = FakeJmaClient()
+    ingest_once(db_path, client, resume=False)
+    assert sorted(client.requested) == sorted(OFFICES)
+
+
+def test_interrupted_run_with_stale_heartbeat_is_resumed(tmp_path):
+    """生存の記録が途絶えた running の実行は、記録の無いオフィスだけを取得して再開する"""
+    db_path = str(tmp_path / "weather.db")
+    ingest_once(db_path, FakeJmaClient())
+    stale = (datetime.now() - timedelta(seconds=RUN_HEARTBEAT_TIMEOUT_SECONDS + 60)).isoformat()
+    run_id = interrupt_latest_run(db_path, "270000", os.getpid(), stale)
+
+    client = FakeJmaClient()
+    summary = ingest_once(db_path, client)
+    assert client.requested == ["270000"]
+    assert sorted(summary.offices_resumed) == ["130000", "140000"]
+    assert latest_run(db_path)[:2] == (run_id, "completed")
+
+
+@pytest.mark.skipif(os.name != "posix", reason="プロセスの存在を確認できるのは POSIX のみ")
+def test_interrupted_run_of_exited_process_is_resumed(tmp_path):
+    db_path = str(tmp_path / "weather.db")
+    ingest_once(db_path, FakeJmaClient())
+    run_id = interrupt_latest_run(db_path, "270000", finished_pid(), datetime.now().isoformat())
+
+    client = FakeJmaClient()
+    ingest_once(db_path, client)
+    assert client.requested == ["270000"]
+    assert latest_run(db_path)[0] == run_id
+
+
+def test_run_held_by_live_process_is_not_resumed(tmp_path):
+    """他の取り込みが実行中（生存の記録が新しい）の実行は再開せず、新しい実行を開始する"""
+    db_path = str(tmp_path / "weather.db")
+    ingest_once(db_path, FakeJmaClient())
+    run_id = interrupt_latest_run(db_path, "270000", os.getpid(), datetime.now().isoformat())
+
+    client = FakeJmaClient()
+    summary = ingest_once(db_path, client)
+    assert sorted(client.requested) == sorted(OFFICES)
+    assert summary.offices_resumed == []
+    assert latest_run(db_path)[0] > run_id
+
+
+def test_run_of_previous_process_with_reused_pid_is_resumed(tmp_path):
+    """同じPIDでも、別のプロセス（再起動する前のコンテナなど）が記録した実行は再開する"""
+    db_path = str(tmp_path / "weather.db")
+    ingest_once(db_path, FakeJmaClient())
+    run_id = interrupt_latest_run(db_path, "270000", os.getpid(), datetime.now().isoformat(), "previous-process")
+
+    client = FakeJmaClient()
+    ingest_once(db_path, client)
+    assert client.requested == ["270000"]
+    assert latest_run(db_path)[0] == run_id
+
+
+def test_ensure_database_exists_keeps_populated_database(tmp_path, monkeypatch):
+    """必要なテーブルにデータがあれば、中断した実行が残っていても取り込み直さない"""
+    db_path = str(tmp_path / "weather.db")
+    ingest_once(db_path, FakeJmaClient())
+    stale = (datetime.now() - timedelta(seconds=RUN_HEARTBEAT_TIMEOUT_SECONDS + 60)).isoformat()
+    interrupt_latest_run(db_path, "270000", None, stale)
+
+    def fail_create_database(*args, **kwargs):
+        raise AssertionError("取り込みを実行しました")
+
+    monkeypatch.setattr(ingest, "create_database", fail_create_database)
+    assert ensure_database_exists(db_path) is True
+
+
+def test_alerts_evaluate_only_changed_values(tmp_path):
+    """新しい発表では、前回から値が変わった行だけをルールで評価する"""
+    db_path = str(tmp_path / "weather.db")
+    summary = ingest_once(db_path, FakeJmaClient())
+    assert summary.alerts_raised == 0
+    # 現在のデータでは評価しないよう、add_alert_rule を使わずにルールを追加する
+    connection = sqlite3.connect(db_path)
+    connection.execute("INSERT INTO alert_rules (kind, operator, threshold) VALUES ('pop', '>=', 0)")
+    connection.commit()
+
+    # 同じ発表を取り込み直しても値は変わらない
+    assert ingest_once(db_path, FakeJmaClient(), resume=False).alerts_raised == 0
+
+    summary = ingest_once(db_path, FakeJmaClient(report_datetime="2026-10-19T11:00:00+09:00", pops={"140000": "60"}),
+                          resume=False)
+    assert summary.alerts_raised == 1
+    assert connection.execute("SELECT class10_id, value FROM alert_events").fetchall() == [("140010", 60.0)]
+    connection.close()
+
+
+def test_alerts_evaluate_all_values_of_new_offices(tmp_path):
+    """初めて取り込むオフィスは全ての値を評価する"""
+    db_path = str(tmp_path / "weather.db")
+    connection = sqlite3.connect(db_path)
+    initialize_alert_tables(connection)
+    connection.execute("INSERT INTO alert_rules (kind, operator, threshold) VALUES ('pop', '>=', 30)")
+    connection.commit()
+    connection.close()
+
+    assert ingest_once(db_path, FakeJmaClient()).alerts_raised == len(OFFICES)
+
+
+def forecast_rows(db_path):
+    """天気データのテーブルの行（id を除く、順不同の比較用）"""
+    connection = sqlite3.connect(db_path)
+    try:
+        tables = {}
+        for table_name in list(ingest.TABLE_STRUCTURE) + ingest.FETCHER_TABLES:
+            columns = [row[1] for row in connection.execute(f"PRAGMA table_info({table_name})")][1:]
+            tables[table_name] = sorted(connection.execute(f"SELECT {', '.join(columns)} FROM {table_name}"),
+                                        key=repr)
+        return tables
+    finally:
+        connection.close()
+
+
+def test_replay_reproduces_ingested_tables(tmp_path):
+    """生データのアーカイブから空のデータベースに取り込み直すと、直接取り込んだテーブルと行単位で一致する"""
+    db_path, raw_archive_path = str(tmp_path / "weather.db"), str(tmp_path / "raw.db")
+    for report_datetime, pops in (("2026-10-19T05:00:00+09:00", {}),
+                                  ("2026-10-19T11:00:00+09:00", {"130000": "50"}),
+                                  ("2026-10-19T17:00:00+09:00", {"270000": "80"})):
+        summary = run_ingest(db_path, client=FakeJmaClient(report_datetime=report_datetime, pops=pops),
+                             parse_workers=0, raw_archive_path=raw_archive_path, resume=False)
+        assert not summary.has_failures
+
+    replay_path = str(tmp_path / "replay.db")
+    summary = run_ingest(replay_path, parse_workers=0, raw_archive_path=raw_archive_path, replay=True)
+    assert not summary.has_failures
+    assert len(summary.offices_updated) == 3 * len(OFFICES)
+    expected = forecast_rows(db_path)
+    assert expected["weather_pops"]
+    assert forecast_rows(replay_path) == expected
+
+
+def overview_rows(db_path):
+    connection = sqlite3.connect(db_path)
+    try:
+        return connection.execute(
+            "SELECT level, area_id, parent_id, area_name, date, min_temp, max_temp, max_pop, weather_code, "
+            "report_datetime FROM region_overview ORDER BY level, area_id, date"
+        ).fetchall()
+    finally:
+        connection.close()
+
+
+def diff_rows(db_path):
+    connection = sqlite3.connect(db_path)
+    try:
+        return connection.execute(
+            "SELECT office_id, table_name, area_code, area_name, time_define, column_name, old_value, new_value, "
+            "previous_report_datetime, report_datetime FROM region_diffs ORDER BY office_id, rowid"
+        ).fetchall()
+    finally:
+        connection.close()
+
+
+def test_json1_mode_matches_python_mode_without_python_normalization(tmp_path, monkeypatch):
+    """JSON1モードは書き込み段で JSON を Python で展開せず、Python モードと同じテーブルと概況を作る"""
+    python_path, json1_path = str(tmp_path / "python.db"), str(tmp_path / "json1.db")
+    ingest_once(python_path, FakeJmaClient())
+
+    def fail_normalize(weather_data):
+        raise AssertionError("JSON1モードで Python の正規化を実行しました")
+
+    monkeypatch.setattr(ingest, "normalize_forecast_tables", fail_normalize)
+    summary = run_ingest(json1_path, workers=2, client=FakeJmaClient(), parse_workers=0, mode=ingest.MODE_JSON1)
+    assert not summary.has_failures
+    assert forecast_rows(json1_path) == forecast_rows(python_path)
+    assert overview_rows(json1_path) == overview_rows(python_path)
+    assert overview_rows(json1_path)
+
+    # 集計テーブルが無いオフィスは、保存済みの行から集計する
+    for db_path in (python_path, json1_path):
+        connection = sqlite3.connect(db_path)
+        connection.execute("DELETE FROM region_overview WHERE area_id = '140000' OR level = 'center'")
+        connection.commit()
+        connection.close()
+    monkeypatch.undo()
+    ingest_once(python_path, FakeJmaClient(), resume=False)
+    monkeypatch.setattr(ingest, "normalize_forecast_tables", fail_normalize)
+    run_ingest(json1_path, workers=2, client=FakeJmaClient(), parse_workers=0, mode=ingest.MODE_JSON1,
+               incremental=True, resume=False)
+    assert overview_rows(json1_path) == overview_rows(python_path)
+
+
+    # 新しい発表の差分も、書き換える前の行と SQLite で作り直した行から作る
+    client_args = {"report_datetime": "2026-10-19T11:00:00+09:00", "pops": {"130000": "70", "270000": ""}}
+    monkeypatch.undo()
+    ingest_once(python_path, FakeJmaClient(**client_args), resume=False)
+    monkeypatch.setattr(ingest, "normalize_forecast_tables", fail_normalize)
+    summary = run_ingest(json1_path, workers=2, client=FakeJmaClient(**client_args), parse_workers=0,
+                         mode=ingest.MODE_JSON1, resume=False)
+    assert not summary.has_failures
+    assert forecast_rows(json1_path) == forecast_rows(python_path)
+    assert diff_rows(json1_path) == diff_rows(python_path)
+    assert [row[:7] for row in diff_rows(json1_path) if row[5] == "pop"] == [
+        ("130000", "weather_pops", "130010", "130010地方", "2026-10-19T06:00:00+09:00", "pop", "30"),
+        ("270000", "weather_pops", "270000", "270000地方", "2026-10-19T06:00:00+09:00", "pop", "30"),
+    ]
@@ -0,0 +1,97 @@
+"""region_hierarchy の整数添字の地域階層のテスト"""
+import random
+
+import pytest
+
+from region_hierarchy import (CENTER, CLASS10, CLASS20, LEVEL_NAMES, OFFICE, RegionHierarchy, load_hierarchy_cache,
+                              save_hierarchy_cache)
+
+
+def synthetic_rows(seed=0, centers=4):
+    """areas の行（AREA_COLUMNS の順）を作成（行の順は親ごとにまとまっていない）"""
+    rng = random.Random(seed)
+    rows = []
+    for center in range(centers):
+        for office in range(rng.randint(1, 4)):
+            office_id = f"{center:02d}{office:02d}00"
+            for class10 in range(rng.randint(1, 3)):
+                class10_id = f"{office_id[:4]}{class10:02d}"
+                for class15 in range(rng.randint(1, 3)):
+                    class15_id = f"{class10_id}{class15}"
+                    for class20 in range(rng.randint(1, 3)):
+                        class20_id = f"{class15_id}{class20}"
+                        rows.append((f"C{center}", f"センター{center}", office_id, f"気象台{office_id}",
+                                     class10_id, f"地域{class10_id}", class15_id, f"区域{class15_id}",
+                                     class20_id, f"市町村{class20_id}"))
+    rng.shuffle(rows)
+    return rows
+
+
+def ancestor(hierarchy, level, index, target_level):
+    while level > target_level:
+        index = hierarchy.parent(level, index)
+        level -= 1
+    return index
+
+
+@pytest.fixture
+def hierarchy():
+    return RegionHierarchy.from_rows(synthetic_rows(), version="v1")
+
+
+def test_descendants_match_parent_chains(hierarchy):
+    """子孫の範囲が、親をたどって求めた子孫と一致する"""
+    for level in range(len(LEVEL_NAMES)):
+        for target_level in range(level, len(LEVEL_NAMES)):
+            for index in hierarchy.nodes(level):
+                expected = [node for node in hierarchy.nodes(target_level)
+                            if ancestor(hierarchy, target_level, node, level) == index]
+                assert list(hierarchy.descendants(level, index, target_level)) == expected
+
+
+def test_children_and_lookup(hierarchy):
+    for level in range(CLASS20):
+        for index in hierarchy.nodes(level):
+            for child in hierarchy.children(level, index):
+                assert hierarchy.parent(level + 1, child) == index
+    office = hierarchy.index(OFFICE, "000000")
+    assert hierarchy.name(OFFICE, office) == "気象台000000"
+    assert hierarchy.find_by_name("気象台000000") == [(OFFICE, office)]
+    assert hierarchy.index(CLASS10, "missing") is None
+
+
+def test_childless_and_missing_ids():
+    """ID が空のノードは含めず、子の無い親は空の範囲になる"""
+    rows = [
+        ("C1", "センター1", "010000", "気象台1", "", "", "", "", "", ""),
+        ("C2", "センター2", "020000", "気象台2", "020010", "地域", "0200100", "区域", "02001000", "市町村"),
+    ]
+    hierarchy = RegionHierarchy.from_rows(rows)
+    assert len(hierarchy.levels[CLASS10]) == 1
+    assert list(hierarchy.descendants(CENTER, 0, CLASS20)) == []
+    assert list(hierarchy.descendants(CENTER, 1, CLASS20)) == [0]
+
+
+def test_to_nested_dict_matches_rows(hierarchy):
+    """従来の fetch_region_hierarchy と同じ入れ子の dict になる"""
+    rows = synthetic_rows()
+    expected = {}
+    for row in rows:
+        center = expected.setdefault(row[0], {"name": row[1], "children": {}})
+        office = center["children"].setdefault(row[2], {"name": row[3], "children": {}})
+        office["children"].setdefault(row[4], {"name": row[5]})
+    assert hierarchy.to_nested_dict(CLASS10) == expected
+
+
+def test_hierarchy_cache_round_trip(hierarchy, tmp_path):
+    path = str(tmp_path / "weather.db.hierarchy")
+    save_hierarchy_cache(path, hierarchy)
+    loaded = load_hierarchy_cache(path, "v1")
+    assert loaded.to_nested_dict(CLASS20) == hierarchy.to_nested_dict(CLASS20)
+    assert list(loaded.descendants(CENTER, 1, CLASS20)) == list(hierarchy.descendants(CENTER, 1, CLASS20))
+    # 鍵が異なるファイルや壊れたファイルは読まない
+    assert load_hierarchy_cache(path, "v2") is None
+    with open(path, "r+b") as f:
+        f.seek(6)
+        f.write(b"\xff\xff")
+    assert load_hierarchy_cache(path, "v1") is None
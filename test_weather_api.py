@@ -0,0 +1,145 @@
+"""weather_api の応答のキャッシュと HTTP のキャッシュ制御のテスト"""
+import gzip
+import http.client
+import json
+import os
+import re
+import threading
+
+import pytest
+
+pytest.importorskip("requests")
+
+import weather_api
+
+
+class FakeDatabaseManager:
+    def __init__(self, db_path, in_memory=False):
+        self.replica = None
+
+    def release(self):
+        pass
+
+
+def build_echo(db_manager, value):
+    return {"value": value}, None
+
+
+@pytest.fixture
+def api(monkeypatch, tmp_path):
+    monkeypatch.setattr(weather_api, "DatabaseManager", FakeDatabaseManager)
+    api = weather_api.WeatherApi(str(tmp_path / "weather.db"), in_memory=False, max_cached_responses=3)
+    api.route = lambda path: (build_echo, (path,))
+    return api
+
+
+def test_response_cache_is_bounded_lru(api):
+    """上限を超えると最も長く使われていない応答から捨てる"""
+    for path in ("/a", "/b", "/c"):
+        api.get_response(path)
+    api.get_response("/a")
+    api.get_response("/d")
+
+    assert len(api.cache) == 3
+    assert list(api.cache) == [f"build_echo{(path,)!r}" for path in ("/c", "/a", "/d")]
+    hits = api.stats["hits"]
+    api.get_response("/a")
+    assert api.stats["hits"] == hits + 1
+    api.get_response("/b")
+    assert api.stats["misses"] == 5
+    assert len(api.cache) == 3
+
+
+def test_etag_matches():
+    etag = '"abc"'
+    assert weather_api.etag_matches('"abc"', etag)
+    assert weather_api.etag_matches('W/"abc"', etag)
+    assert weather_api.etag_matches('"x", W/"abc" , "y"', etag)
+    assert weather_api.etag_matches("*", etag)
+    assert not weather_api.etag_matches('"abcd", "ab"', etag)
+    assert not weather_api.etag_matches("", etag)
+    assert not weather_api.etag_matches(None, etag)
+
+
+@pytest.fixture
+def server(monkeypatch, tmp_path):
+    """ポート 0 で起動したサーバー（/big は gzip する大きさ、/small は圧縮しない大きさの応答）"""
+    monkeypatch.setattr(weather_api, "DatabaseManager", FakeDatabaseManager)
+    db_path = tmp_path / "weather.db"
+    db_path.write_bytes(b"v1")
+    server = weather_api.create_server(str(db_path), port=0, quiet=True)
+    state = {"report_datetime": "2026-10-19T05:00:00+09:00"}
+
+    def build(db_manager, path):
+        size = 4000 if path == "/big" else 10
+        return {"path": path, "report_datetime": state["report_datetime"], "text": "晴れ" * size}, \
+            state["report_datetime"]
+
+    server.api.route = lambda path: (build, (path,)) if path in ("/big", "/small") else None
+    server.state = state
+    server.db_path = db_path
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def fetch(server, path, headers=None):
+    connection = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=10)
+    try:
+        connection.request("GET", path, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        connection.close()
+
+
+def test_cache_headers_and_gzip(server):
+    status, headers, body = fetch(server, "/big", {"Accept-Encoding": "gzip, deflate"})
+    assert status == 200
+    assert headers["Content-Encoding"] == "gzip"
+    assert headers["Vary"] == "Accept-Encoding"
+    assert json.loads(gzip.decompress(body))["path"] == "/big"
+    max_age = int(re.fullmatch(r"public, max-age=(\d+)", headers["Cache-Control"]).group(1))
+    assert weather_api.MIN_MAX_AGE <= max_age <= weather_api.MAX_MAX_AGE
+    assert re.fullmatch(r'"[0-9a-f]{20}"', headers["ETag"])
+
+    # gzip を受け付けない場合と、小さい応答は圧縮しない
+    status, plain_headers, plain = fetch(server, "/big")
+    assert "Content-Encoding" not in plain_headers
+    assert plain == gzip.decompress(body)
+    assert int(plain_headers["Content-Length"]) == len(plain)
+    _, small_headers, small = fetch(server, "/small", {"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in small_headers
+    assert json.loads(small)["path"] == "/small"
+
+    assert fetch(server, "/missing")[0] == 404
+
+
+@pytest.mark.parametrize("if_none_match", ["{etag}", "W/{etag}", '"other", {etag}', "*"])
+def test_not_modified(server, if_none_match):
+    etag = fetch(server, "/big")[1]["ETag"]
+    status, headers, body = fetch(server, "/big", {"If-None-Match": if_none_match.format(etag=etag)})
+    assert status == 304
+    assert body == b""
+    assert headers["ETag"] == etag
+    assert headers["Cache-Control"].startswith("public, max-age=")
+
+    assert fetch(server, "/big", {"If-None-Match": '"other"'})[0] == 200
+
+
+def test_database_change_invalidates_cache(server):
+    """データベースファイルが更新されるまではキャッシュを返し、更新後は応答を作り直す"""
+    _, headers, body = fetch(server, "/small")
+    server.state["report_datetime"] = "2026-10-19T11:00:00+09:00"
+    _, cached_headers, cached = fetch(server, "/small")
+    assert (cached_headers["ETag"], cached) == (headers["ETag"], body)
+
+    server.db_path.write_bytes(b"v2-updated")
+    os.utime(server.db_path, ns=(0, 10 ** 9))
+    status, new_headers, new_body = fetch(server, "/small", {"If-None-Match": headers["ETag"]})
+    assert status == 200
+    assert new_headers["ETag"] != headers["ETag"]
+    assert json.loads(new_body)["report_datetime"] == "2026-10-19T11:00:00+09:00"
@@ -0,0 +1,446 @@
+"""DatabaseManager の検索結果をJSONで返す読み取り専用のローカルHTTPサービス
+
+Flet の各クライアントが region_data.db を個別に開く代わりに、1台のホストから
+複数のダッシュボードやスクリプトへ同じデータを配信する。
+
+エンドポイント:
+    GET /api/regions                          地域階層
+    GET /api/region/{class10_id}              3日間・週間の表示に必要なデータ一式（fetch_region_bundle）
+    GET /api/three-day/{class10_id}           3日間の天気・降水確率・気温
+    GET /api/weekly/{office_id}/{class10_id}  週間天気・週間気温・平年値
+    GET /api/compare/{class10_id},{...}       複数の地域のデータ一式（fetch_region_bundles でまとめて取得）
+    GET /api/search/{検索語}                   天気・風・波の文に検索語を含む地域と日時（URLエンコードした検索語）
+    GET /api/threshold/{kind}?min=&max=&hours=&date=&start=&end=&order=&limit=&per_area=
+                                              全地域の降水確率・気温の条件検索（kind: pop / temp / temp_min / temp_max）
+    GET /api/diff/{office_id}                 前回の発表から変わった値（地域・日時・列ごと）
+
+- ETag は応答に含まれる report_datetime から作るため、再取り込みしても発表が同じなら 304 を返せる
+  （If-None-Match はカンマ区切りの複数の ETag と W/ 付きの弱い ETag も受け付ける）
+- Cache-Control の max-age は次の定時発表（5時・11時・17時）までの秒数
+- 応答はプロセス内にキャッシュし、データベースファイルが更新されるまで再利用する（gzip済みの本文も保持）
+- in_memory=True の場合はメモリ上の複製から読み、ファイルの更新を検出したら複製を作り直す
+"""
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.parse import parse_qs, unquote
+from urllib.request import Request, urlopen
+
+from database_manager import DatabaseManager
+from db_connection import IN_MEMORY_REPLICA, database_change_token
+from forecast_values import JST, VALUE_KINDS, time_window
+from ingest import DB_PATH
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# 気象庁の定時発表の時刻（日本時間）
+PUBLISH_HOURS = (5, 11, 17)
+# max-age の下限・上限（秒）
+MIN_MAX_AGE = 60
+MAX_MAX_AGE = 6 * 60 * 60
+# これより小さい応答は圧縮しない
+GZIP_MIN_BYTES = 1024
+# /api/compare で一度に指定できる地域の数
+MAX_COMPARE_REGIONS = 50
+# キャッシュする応答の数の上限（クエリ文字列を含むパスごとに増えるため、古い順に捨てる）
+MAX_CACHED_RESPONSES = 512
+
+def to_records(records):
+    """DatabaseManager の名前付きタプルを JSON 用の dict に変換"""
+    return [record._asdict() for record in records]
+
+
+def latest_report_datetime(*record_lists):
+    """応答に含まれる最新の report_datetime（日時でない値は無視する）"""
+    values = [record["report_datetime"] for records in record_lists for record in records
+              if str(record.get("report_datetime", ""))[:1].isdigit()]
+    return max(values, default="")
+
+
+def next_publish_time(now):
+    """now より後の最初の定時発表の時刻"""
+    for hour in PUBLISH_HOURS:
+        candidate = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+        if candidate > now:
+            return candidate
+    return (now + timedelta(days=1)).replace(hour=PUBLISH_HOURS[0], minute=0, second=0, microsecond=0)
+
+
+def cache_max_age(now=None):
+    """次の定時発表までの秒数（max-age に使う）"""
+    now = now or datetime.now()
+    seconds = int((next_publish_time(now) - now).total_seconds())
+    return max(MIN_MAX_AGE, min(MAX_MAX_AGE, seconds))
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match のいずれかの ETag が etag と一致するか
+
+    カンマ区切りの複数の ETag と "*" を受け付け、弱い比較（W/ の有無を区別しない）で比べる。
+    """
+    if not if_none_match:
+        return False
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def bundle_payload(bundle):
+    """RegionBundle を応答の JSON にする
+
+    Returns:
+        tuple: (JSON にする辞書, 最新の report_datetime)
+    """
+    payload = {"class10_id": bundle.class10_id, "office_id": bundle.office_id}
+    for name in bundle._fields[2:]:
+        payload[name] = to_records(getattr(bundle, name))
+    report_datetime = latest_report_datetime(payload["weather_info"], payload["pops"], payload["temps"],
+                                             payload["weekly"], payload["weekly_temps"])
+    payload["report_datetime"] = report_datetime
+    return payload, report_datetime
+
+
+def threshold_options(query):
+    """/api/threshold のクエリ文字列を fetch_threshold の引数（kind 以降）にする
+
+    hours（現在から何時間後まで）の開始は時の単位に切り捨て、同じ1時間の間は同じ応答をキャッシュから返す。
+    値が不正な場合は ValueError。
+    """
+    options = {name: values[-1] for name, values in parse_qs(query).items()}
+    now = datetime.now(JST).replace(minute=0, second=0, microsecond=0)
+    start, end = time_window(float(options["hours"]) if "hours" in options else None, options.get("date"), now)
+    number = lambda name: float(options[name]) if name in options else None
+    return (
+        number("min"),
+        number("max"),
+        options.get("start", start),
+        options.get("end", end),
+        options.get("order", "desc") != "asc",
+        int(options["limit"]) if "limit" in options else None,
+        options.get("per_area") in ("1", "true"),
+    )
+
+
+class CachedResponse:
+    """キャッシュした応答（JSONの本文と gzip 済みの本文）"""
+
+    def __init__(self, token, etag, body):
+        self.token = token
+        self.etag = etag
+        self.body = body
+        self.gzipped = gzip.compress(body) if len(body) >= GZIP_MIN_BYTES else None
+
+
+class WeatherApi:
+    """パスごとの応答の作成とキャッシュ"""
+
+    def __init__(self, db_path=DB_PATH, in_memory=IN_MEMORY_REPLICA, max_cached_responses=MAX_CACHED_RESPONSES):
+        self.db_path = db_path
+        self.db_manager = DatabaseManager(db_path, in_memory=in_memory)
+        # メモリ上の複製を作成した時点のファイルの状態
+        self.replica_token = database_change_token(db_path)
+        self.replica_lock = threading.Lock()
+        self.max_cached_responses = max_cached_responses
+        self.cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def route(self, path):
+        """パスに対応する (応答を作る関数, 引数) を返す（該当しない場合は None）"""
+        parts = [part for part in path.split("?")[0].split("/") if part]
+        if parts == ["api", "regions"]:
+            return self.build_regions, ()
+        if len(parts) == 3 and parts[:2] == ["api", "region"]:
+            return self.build_region, (parts[2],)
+        if len(parts) == 3 and parts[:2] == ["api", "three-day"]:
+            return self.build_three_day, (parts[2],)
+        if len(parts) == 4 and parts[:2] == ["api", "weekly"]:
+            return self.build_weekly, (parts[2], parts[3])
+        if len(parts) == 3 and parts[:2] == ["api", "compare"]:
+            class10_ids = [class10_id for class10_id in parts[2].split(",") if class10_id]
+            if class10_ids and len(class10_ids) <= MAX_COMPARE_REGIONS:
+                return self.build_compare, (class10_ids,)
+        if len(parts) == 3 and parts[:2] == ["api", "search"]:
+            return self.build_search, (unquote(parts[2]),)
+        if len(parts) == 3 and parts[:2] == ["api", "diff"]:
+            return self.build_diff, (parts[2],)
+        if len(parts) == 3 and parts[:2] == ["api", "threshold"] and parts[2] in VALUE_KINDS:
+            try:
+                return self.build_threshold, (parts[2],) + threshold_options(path.partition("?")[2])
+            except ValueError:
+                return None
+        return None
+
+    def build_regions(self, db_manager):
+        return {"centers": db_manager.fetch_region_hierarchy()}, ""
+
+    def build_region(self, db_manager, class10_id):
+        return bundle_payload(db_manager.fetch_region_bundle(class10_id))
+
+    def build_compare(self, db_manager, class10_ids):
+        bundles = db_manager.fetch_region_bundles(class10_ids)
+        regions = [bundle_payload(bundle)[0] for bundle in bundles.values()]
+        report_datetime = max((region["report_datetime"] for region in regions), default="")
+        return {"regions": regions, "report_datetime": report_datetime}, report_datetime
+
+    def build_search(self, db_manager, query):
+        results = to_records(db_manager.fetch_text_search(query))
+        report_datetime = latest_report_datetime(results)
+        return {"query": query, "report_datetime": report_datetime, "results": results}, report_datetime
+
+    def build_threshold(self, db_manager, kind, min_value, max_value, start, end, descending, limit, per_area):
+        results = to_records(db_manager.fetch_threshold(kind, min_value, max_value, start, end, descending, limit,
+                                                        per_area))
+        report_datetime = latest_report_datetime(results)
+        return {"kind": kind, "min": min_value, "max": max_value, "start": start, "end": end,
+                "order": "desc" if descending else "asc", "report_datetime": report_datetime,
+                "results": results}, report_datetime
+
+    def build_diff(self, db_manager, office_id):
+        changes = to_records(db_manager.fetch_region_diff(office_id))
+        report_datetime = db_manager.fetch_office_report(office_id) or ""
+        previous_report_datetime = changes[0]["previous_report_datetime"] if changes else None
+        return {"office_id": office_id, "report_datetime": report_datetime,
+                "previous_report_datetime": previous_report_datetime, "changes": changes}, report_datetime
+
+    def build_three_day(self, db_manager, class10_id):
+        bundle = db_manager.fetch_region_bundle(class10_id)
+        weather = to_records(bundle.weather_info)
+        pops = to_records(bundle.pops)
+        temps = to_records(bundle.temps)
+        report_datetime = latest_report_datetime(weather, pops, temps)
+        return {"class10_id": class10_id, "report_datetime": report_datetime,
+                "weather": weather, "pops": pops, "temps": temps}, report_datetime
+
+    def build_weekly(self, db_manager, office_id, class10_id):
+        bundle = db_manager.fetch_region_bundle(class10_id)
+        # 指定されたオフィスが地域の所属と異なる場合は、そのオフィスの週間天気を別に取得する
+        weekly_records = bundle.weekly if bundle.office_id == office_id else db_manager.fetch_weather_reliabilities(office_id)
+        weekly = to_records(weekly_records)
+        temps = to_records(bundle.weekly_temps)
+        temp_averages = to_records(bundle.temp_averages)
+        pop_averages = to_records(bundle.pop_averages)
+        report_datetime = latest_report_datetime(weekly, temps)
+        return {"office_id": office_id, "class10_id": class10_id, "report_datetime": report_datetime,
+                "weekly": weekly, "temps": temps, "temp_averages": temp_averages,
+                "pop_averages": pop_averages}, report_datetime
+
+    def refresh_replica(self, token):
+        """ファイルが更新されていれば、メモリ上の複製を作り直す（同時に1回だけ）"""
+        with self.replica_lock:
+            if token != self.replica_token:
+                self.db_manager.replica.refresh()
+                self.replica_token = token
+
+    def get_response(self, path):
+        """パスの応答を取得（データベースが更新されていなければキャッシュを返す）
+
+        Returns:
+            CachedResponse: 該当するパスが無い場合は None
+        """
+        route = self.route(path)
+        if route is None:
+            return None
+        builder, args = route
+        # クエリ文字列を使うパスがあるため、応答を作る関数と引数をキャッシュのキーにする
+        key = f"{builder.__name__}{args!r}"
+        token = database_change_token(self.db_path)
+        if self.db_manager.replica is not None and token != self.replica_token:
+            self.refresh_replica(token)
+        with self.cache_lock:
+            cached = self.cache.get(key)
+            if cached is not None and cached.token == token:
+                self.cache.move_to_end(key)
+                self.stats["hits"] += 1
+                return cached
+            self.stats["misses"] += 1
+
+        try:
+            payload, report_datetime = builder(self.db_manager, *args)
+        finally:
+            # リクエストごとにスレッドが作られるため、接続はプールに戻して次のリクエストで使う
+            self.db_manager.release()
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        # 発表日時が無い応答（地域階層）は本文から ETag を作る
+        version = report_datetime or hashlib.sha1(body).hexdigest()
+        etag = '"' + hashlib.sha1(f"{key}|{version}".encode("utf-8")).hexdigest()[:20] + '"'
+        response = CachedResponse(token, etag, body)
+        with self.cache_lock:
+            self.cache[key] = response
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.max_cached_responses:
+                self.cache.popitem(last=False)
+        return response
+
+    def close(self):
+        self.db_manager.close()
+
+
+class WeatherApiHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        try:
+            response = self.server.api.get_response(self.path)
+        except Exception as e:
+            print(f"[ERROR] {self.path} の応答の作成に失敗しました: {e}")
+            self.send_json_error(500, "internal error")
+            return
+        if response is None:
+            self.send_json_error(404, "not found")
+            return
+
+        if etag_matches(self.headers.get("If-None-Match"), response.etag):
+            self.send_response(304)
+            self.send_cache_headers(response)
+            self.end_headers()
+            return
+
+        body = response.body
+        use_gzip = response.gzipped is not None and "gzip" in self.headers.get("Accept-Encoding", "")
+        if use_gzip:
+            body = response.gzipped
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if use_gzip:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_cache_headers(response)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_cache_headers(self, response):
+        self.send_header("ETag", response.etag)
+        self.send_header("Cache-Control", f"public, max-age={cache_max_age()}")
+        self.send_header("Vary", "Accept-Encoding")
+
+    def send_json_error(self, status, message):
+        body = json.dumps({"error": message}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+class WeatherApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # 多数のクライアントが同時に接続しても待ち行列から溢れないようにする
+    request_queue_size = 128
+
+
+def create_server(db_path=DB_PATH, host=DEFAULT_HOST, port=DEFAULT_PORT, quiet=False, in_memory=IN_MEMORY_REPLICA):
+    """HTTPサーバーを作成（serve_forever は呼び出し側で実行する）"""
+    server = WeatherApiServer((host, port), WeatherApiHandler)
+    server.api = WeatherApi(db_path, in_memory=in_memory)
+    server.quiet = quiet
+    return server
+
+
+def serve(db_path=DB_PATH, host=DEFAULT_HOST, port=DEFAULT_PORT, quiet=False, in_memory=IN_MEMORY_REPLICA):
+    server = create_server(db_path, host, port, quiet, in_memory)
+    print(f"[INFO] http://{host}:{server.server_port}/api/regions で待ち受けています（Ctrl+C で終了）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.api.close()
+
+
+def run_load_test(base_url, paths, total_requests=1000, concurrency=16, revalidate=True):
+    """ローカルのAPIに並列にリクエストを送り、応答時間を計測する
+
+    Args:
+        base_url (str): http://127.0.0.1:8765 など
+        paths (list): リクエストするパス（順番に繰り返す）
+        total_requests (int): リクエストの総数
+        concurrency (int): 並列数
+        revalidate (bool): True の場合、前回の ETag を If-None-Match に付けて送る
+
+    Returns:
+        dict: 件数・ステータス別の件数・レイテンシのパーセンタイル（ミリ秒）・スループット
+    """
+    etags = {}
+    etag_lock = threading.Lock()
+
+    def request(index):
+        path = paths[index % len(paths)]
+        headers = {"Accept-Encoding": "gzip"}
+        with etag_lock:
+            if revalidate and path in etags:
+                headers["If-None-Match"] = etags[path]
+        start = time.perf_counter()
+        try:
+            with urlopen(Request(base_url + path, headers=headers), timeout=30) as response:
+                response.read()
+                status = response.status
+                etag = response.headers.get("ETag")
+        except HTTPError as e:
+            status = e.code
+            etag = e.headers.get("ETag")
+        except OSError:
+            status = 0
+            etag = None
+        elapsed = time.perf_counter() - start
+        if etag:
+            with etag_lock:
+                etags[path] = etag
+        return status, elapsed
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(request, range(total_requests)))
+    wall = time.perf_counter() - start
+
+    latencies = sorted(elapsed * 1000 for _, elapsed in results)
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))] if latencies else 0.0
+
+    return {
+        "requests": len(results),
+        "statuses": statuses,
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "requests_per_second": len(results) / wall if wall else 0.0,
+    }
+
+
+def sample_paths(db_path=DB_PATH, limit=20):
+    """負荷試験用に、データベースに存在する地域のパスを作成"""
+    db_manager = DatabaseManager(db_path)
+    try:
+        paths = ["/api/regions"]
+        for center in db_manager.fetch_region_hierarchy().values():
+            for office_id, office in center["children"].items():
+                for class10_id in office["children"]:
+                    paths.append(f"/api/three-day/{class10_id}")
+                    paths.append(f"/api/weekly/{office_id}/{class10_id}")
+                    if len(paths) >= limit:
+                        return paths
+        return paths
+    finally:
+        db_manager.close()
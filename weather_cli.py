@@ -0,0 +1,367 @@
+"""天気予報データのコマンドラインツール
+
+使用例:
+    python -m weather_cli ingest --workers 8 --incremental --db region_data.db
+    python -m weather_cli ingest --only-offices 130000,270000
+    python -m weather_cli ingest --mode json1
+    python -m weather_cli ingest --raw-archive raw/raw_archive.db
+    python -m weather_cli replay --raw-archive raw/raw_archive.db --since 2024-12-01T00:00:00+09:00
+    python -m weather_cli raw-archive --raw-archive raw/raw_archive.db --train-dictionary
+    python -m weather_cli threshold --kind pop --min 70 --hours 24 --per-area
+    python -m weather_cli threshold --kind temp_min --max 0 --date 2024-12-16 --order asc --limit 10
+    python -m weather_cli alerts --add --kind pop --operator ">=" --threshold 80 --class10 130010
+    python -m weather_cli alerts --add --kind temp_min --operator "<=" --threshold -5
+    python -m weather_cli alerts --unacknowledged
+    python -m weather_cli rebuild
+    python -m weather_cli verify --archive-dir archive
+    python -m weather_cli export --out export --format parquet
+    python -m weather_cli serve --port 8765
+    python -m weather_cli api-bench --url http://127.0.0.1:8765 --requests 2000 --concurrency 32
+"""
+import argparse
+import sqlite3
+import sys
+import time
+
+from db_connection import IN_MEMORY_REPLICA, open_write_connection
+from forecast_alerts import (ALERT_OPERATORS, acknowledge_alert_events, add_alert_rule, remove_alert_rule,
+                             rule_label)
+from forecast_archive import ARCHIVE_DIR, ARCHIVE_RETENTION_MONTHS
+from forecast_json1 import initialize_json1_schema, rebuild_from_raw
+from forecast_search import rebuild_search_index
+from forecast_values import VALUE_KINDS, rebuild_value_index, time_window
+from http_client import ResilientClient
+from ingest import (DB_PATH, DEFAULT_BATCH_SIZE, DEFAULT_PARSE_WORKERS, DEFAULT_QUEUE_SIZE, MODE_JSON1, MODE_PYTHON,
+                    run_ingest)
+from raw_archive import DEFAULT_DICTIONARY_SAMPLES, RAW_ARCHIVE_PATH, RawArchive
+from region_overview import rebuild_overview_from_raw
+
+
+def parse_office_list(value):
+    """カンマ区切りのオフィスIDをリストに変換"""
+    return [office.strip() for office in value.split(",") if office.strip()]
+
+
+def command_ingest(args):
+    """GUIを起動せずにデータベースを作成・更新"""
+    summary = run_ingest(
+        db_path=args.db,
+        workers=args.workers,
+        incremental=args.incremental,
+        only_offices=args.only_offices,
+        deadline_seconds=args.deadline,
+        client=ResilientClient(max_retries=args.retries),
+        resume=not args.no_resume,
+        parse_workers=args.parse_workers,
+        queue_size=args.queue_size,
+        batch_size=args.batch_size,
+        mode=args.mode,
+        archive_dir=args.archive_dir,
+        retention_months=args.retention_months,
+        raw_archive_path=args.raw_archive,
+    )
+    summary.print_summary()
+    # 一部でも失敗した場合は0以外で終了する
+    return 1 if summary.has_failures else 0
+
+
+def command_replay(args):
+    """生データのアーカイブから発表日時の順にデータベースへ取り込み直す"""
+    if not args.raw_archive:
+        print("[ERROR] --raw-archive（または WEATHER_RAW_ARCHIVE）を指定してください。")
+        return 1
+    summary = run_ingest(
+        db_path=args.db,
+        incremental=args.incremental,
+        only_offices=args.only_offices,
+        parse_workers=args.parse_workers,
+        queue_size=args.queue_size,
+        batch_size=args.batch_size,
+        mode=args.mode,
+        archive_dir=args.archive_dir,
+        retention_months=args.retention_months,
+        raw_archive_path=args.raw_archive,
+        replay=True,
+        replay_since=args.since,
+        replay_until=args.until,
+    )
+    summary.print_summary()
+    return 1 if summary.has_failures else 0
+
+
+def command_raw_archive(args):
+    """生データのアーカイブの辞書を作成し、保存量を表示"""
+    if not args.raw_archive:
+        print("[ERROR] --raw-archive（または WEATHER_RAW_ARCHIVE）を指定してください。")
+        return 1
+    raw_archive = RawArchive(args.raw_archive)
+    try:
+        if args.train_dictionary:
+            raw_archive.train_dictionary(samples=args.samples)
+        stats = raw_archive.stats()
+    finally:
+        raw_archive.close()
+    ratio = stats["stored_bytes"] / stats["raw_bytes"] if stats["raw_bytes"] else 0.0
+    print(f"[RESULT] 本文 {stats['documents']} 件（重複を除くと {stats['blobs']} 件）")
+    print(f"[RESULT] 元の大きさ {stats['raw_bytes'] / 1024:.1f} KiB → 保存量 {stats['stored_bytes'] / 1024:.1f} KiB"
+          f"（{ratio:.1%}）")
+    return 0
+
+
+def command_rebuild(args):
+    """raw_forecasts に保存した生データから各テーブル・全国の概況の集計・検索用の索引を作り直す"""
+    connection = sqlite3.connect(args.db)
+    try:
+        initialize_json1_schema(connection)
+        count = rebuild_from_raw(connection)
+        rebuild_overview_from_raw(connection)
+        rebuild_search_index(connection)
+        rebuild_value_index(connection)
+    finally:
+        connection.close()
+    print(f"[SUCCESS] {count} オフィス分のテーブルを生データから作り直しました。")
+    return 0
+
+
+def command_threshold(args):
+    """全地域の降水確率・気温から条件に合う地域と日時を値の順に表示"""
+    from database_manager import DatabaseManager
+    start, end = time_window(args.hours, args.date)
+    db_manager = DatabaseManager(args.db, in_memory=False)
+    try:
+        started = time.perf_counter()
+        records = db_manager.fetch_threshold(args.kind, min_value=args.min, max_value=args.max,
+                                             start=args.start or start, end=args.end or end,
+                                             descending=args.order == "desc", limit=args.limit,
+                                             per_area=args.per_area)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+    finally:
+        db_manager.close()
+    for record in records:
+        print(f"{record.class10_id}\t{record.area_name}\t{record.time_define}\t{record.value:g}")
+    print(f"[RESULT] {len(records)} 件（{elapsed_ms:.1f} ミリ秒）")
+    return 0
+
+
+def command_alerts(args):
+    """アラートのルールを追加・削除し、ルールと最近の記録を表示"""
+    from database_manager import DatabaseManager
+    if args.add or args.remove is not None or args.acknowledge:
+        if args.add and (args.kind is None or args.operator is None or args.threshold is None):
+            print("[ERROR] --add には --kind / --operator / --threshold を指定してください。")
+            return 1
+        connection = open_write_connection(args.db)
+        try:
+            if args.add:
+                rule_id, added = add_alert_rule(connection, args.kind, args.operator, args.threshold,
+                                                class10_id=args.class10, name=args.name)
+                print(f"[SUCCESS] ルール {rule_id} を追加しました（現在のデータで {added} 件該当）。")
+            if args.remove is not None:
+                if remove_alert_rule(connection, args.remove):
+                    print(f"[SUCCESS] ルール {args.remove} を削除しました。")
+                else:
+                    print(f"[WARNING] ルール {args.remove} はありません。")
+            if args.acknowledge:
+                acknowledge_alert_events(connection)
+                print("[SUCCESS] 全ての記録を確認済みにしました。")
+        finally:
+            connection.close()
+
+    db_manager = DatabaseManager(args.db, in_memory=False)
+    try:
+        rules = db_manager.fetch_alert_rules()
+        events = db_manager.fetch_alert_events(unacknowledged_only=args.unacknowledged, limit=args.limit)
+    finally:
+        db_manager.close()
+    for rule in rules:
+        print(f"[RESULT] ルール {rule.id}: {rule_label(rule.kind, rule.operator, rule.threshold, rule.name)}"
+              f"（{rule.class10_id or '全地域'}）")
+    for event in events:
+        mark = " " if event.acknowledged else "*"
+        print(f"{mark} {event.created_at[:19]}\t{rule_label(event.kind, event.operator, event.threshold, event.rule_name)}"
+              f"\t{event.class10_id}\t{event.area_name}\t{event.time_define}\t{event.value:g}")
+    print(f"[RESULT] ルール {len(rules)} 件、記録 {len(events)} 件")
+    return 0
+
+
+def command_verify(args):
+    """アーカイブの履歴から予報検証の集計テーブルを作り直す"""
+    if not args.archive_dir:
+        print("[ERROR] --archive-dir（または WEATHER_ARCHIVE_DIR）を指定してください。")
+        return 1
+    # NumPy は検証を実行するときだけ必要
+    from forecast_verification import update_verification_summary
+    revision_count, weekly_count = update_verification_summary(args.db, args.archive_dir)
+    print(f"[SUCCESS] 予報検証の集計を更新しました（修正量: {revision_count} 行、週間予報: {weekly_count} 行）。")
+    return 0
+
+
+def command_export(args):
+    """予報テーブルを分析用の列指向ファイル（Parquet / .npz）に書き出す"""
+    # NumPy / pyarrow は書き出すときだけ必要
+    from forecast_export import export_tables
+    counts = export_tables(args.db, args.out, export_format=args.format, chunk_size=args.chunk_size,
+                           incremental=not args.full)
+    print(f"[SUCCESS] {sum(counts.values())} 行を {args.out} に書き出しました。")
+    return 0
+
+
+def command_serve(args):
+    """読み取り専用のHTTP/JSON APIを起動"""
+    from weather_api import serve
+    serve(db_path=args.db, host=args.host, port=args.port, quiet=args.quiet, in_memory=args.in_memory)
+    return 0
+
+
+def command_api_bench(args):
+    """起動中のAPIに並列にリクエストを送って応答時間を計測"""
+    from weather_api import run_load_test, sample_paths
+    paths = sample_paths(args.db, limit=args.paths)
+    result = run_load_test(args.url.rstrip("/"), paths, total_requests=args.requests,
+                           concurrency=args.concurrency, revalidate=not args.no_revalidate)
+    print(f"[RESULT] {result['requests']} 件 / {result['requests_per_second']:.1f} 件/秒  "
+          f"p50 {result['p50_ms']:.1f} ms  p95 {result['p95_ms']:.1f} ms  p99 {result['p99_ms']:.1f} ms")
+    print(f"[RESULT] ステータス別: {result['statuses']}")
+    return 0 if set(result["statuses"]) <= {200, 304} else 1
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="weather_cli", description="天気予報データのコマンドラインツール")
+    # profiling モジュールが読み取るフラグ（ここでは受け付けるだけ）。サブコマンドの後にも書けるように、
+    # 同じフラグを親のパーサーで各サブコマンドにも加える（既定値は SUPPRESS にして、コマンドの前に書いた
+    # フラグをサブコマンド側の既定値で上書きしない）
+    parser.add_argument("--profile", action="store_true", help="cProfileによる計測を有効化")
+    parser.add_argument("--profile-memory", action="store_true", help="tracemallocによる計測を有効化")
+    profile_parser = argparse.ArgumentParser(add_help=False)
+    profile_parser.add_argument("--profile", action="store_true", default=argparse.SUPPRESS,
+                                help="cProfileによる計測を有効化")
+    profile_parser.add_argument("--profile-memory", action="store_true", default=argparse.SUPPRESS,
+                                help="tracemallocによる計測を有効化")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = subparsers.add_parser("ingest", help="気象庁のデータを取得してデータベースに保存", parents=[profile_parser])
+    ingest_parser.add_argument("--workers", type=int, default=4, help="並列に取得するスレッド数")
+    ingest_parser.add_argument("--mode", choices=[MODE_PYTHON, MODE_JSON1], default=MODE_PYTHON,
+                               help="json1: 生のJSONを raw_forecasts に保存し SQLite の JSON1 関数で展開")
+    ingest_parser.add_argument("--parse-workers", type=int, default=DEFAULT_PARSE_WORKERS,
+                               help="JSONを解析するプロセス数（0でスレッド内で解析）")
+    ingest_parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="段間キューの最大長")
+    ingest_parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="まとめてコミットするオフィス数")
+    ingest_parser.add_argument("--incremental", action="store_true", help="発表日時が変わっていないオフィスをスキップ")
+    ingest_parser.add_argument("--db", default=DB_PATH, help="データベースのパス")
+    ingest_parser.add_argument("--only-offices", type=parse_office_list, default=None,
+                               help="取り込むオフィスID（カンマ区切り）")
+    ingest_parser.add_argument("--retries", type=int, default=3, help="取得失敗時のリトライ回数")
+    ingest_parser.add_argument("--no-resume", action="store_true", help="中断・一部失敗した取り込みを再開せず最初から実行")
+    ingest_parser.add_argument("--deadline", type=float, default=None, help="取得全体の締め切り（秒）")
+    ingest_parser.add_argument("--archive-dir", default=ARCHIVE_DIR,
+                               help="発表ごとの予報を月単位で保存するアーカイブの保存先")
+    ingest_parser.add_argument("--retention-months", type=int, default=ARCHIVE_RETENTION_MONTHS,
+                               help="アーカイブを保持する月数（0で無期限）")
+    ingest_parser.add_argument("--raw-archive", default=RAW_ARCHIVE_PATH,
+                               help="取得した生データを保存するアーカイブのパス")
+    ingest_parser.set_defaults(handler=command_ingest)
+
+    replay_parser = subparsers.add_parser("replay", help="生データのアーカイブからデータベースへ取り込み直す", parents=[profile_parser])
+    replay_parser.add_argument("--db", default=DB_PATH, help="データベースのパス")
+    replay_parser.add_argument("--raw-archive", default=RAW_ARCHIVE_PATH, help="生データのアーカイブのパス")
+    replay_parser.add_argument("--since", default=None, help="取り込む発表日時の下限（ISO形式）")
+    replay_parser.add_argument("--until", default=None, help="取り込む発表日時の上限（ISO形式）")
+    replay_parser.add_argument("--only-offices", type=parse_office_list, default=None,
+                               help="取り込むオフィスID（カンマ区切り）")
+    replay_parser.add_argument("--incremental", action="store_true", help="発表日時が変わっていないオフィスをスキップ")
+    replay_parser.add_argument("--mode", choices=[MODE_PYTHON, MODE_JSON1], default=MODE_PYTHON,
+                               help="json1: 生のJSONを raw_forecasts に保存し SQLite の JSON1 関数で展開")
+    replay_parser.add_argument("--parse-workers", type=int, default=DEFAULT_PARSE_WORKERS,
+                               help="JSONを解析するプロセス数（0でスレッド内で解析）")
+    replay_parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="段間キューの最大長")
+    replay_parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="まとめてコミットするオフィス数")
+    replay_parser.add_argument("--archive-dir", default=ARCHIVE_DIR,
+                               help="発表ごとの予報を月単位で保存するアーカイブの保存先")
+    replay_parser.add_argument("--retention-months", type=int, default=ARCHIVE_RETENTION_MONTHS,
+                               help="アーカイブを保持する月数（0で無期限）")
+    replay_parser.set_defaults(handler=command_replay)
+
+    raw_archive_parser = subparsers.add_parser("raw-archive", help="生データのアーカイブの辞書の作成と保存量の表示", parents=[profile_parser])
+    raw_archive_parser.add_argument("--raw-archive", default=RAW_ARCHIVE_PATH, help="生データのアーカイブのパス")
+    raw_archive_parser.add_argument("--train-dictionary", action="store_true",
+                                    help="最近の本文から圧縮用の辞書を作成し、以降の保存に使う")
+    raw_archive_parser.add_argument("--samples", type=int, default=DEFAULT_DICTIONARY_SAMPLES,
+                                    help="辞書の作成に使う本文の数")
+    raw_archive_parser.set_defaults(handler=command_raw_archive)
+
+    rebuild_parser = subparsers.add_parser("rebuild", help="raw_forecasts の生データから各テーブルを作り直す", parents=[profile_parser])
+    rebuild_parser.add_argument("--db", default=DB_PATH, help="データベースのパス")
+    rebuild_parser.set_defaults(handler=command_rebuild)
+
+    threshold_parser = subparsers.add_parser("threshold", help="全地域の降水確率・気温の条件検索", parents=[profile_parser])
+    threshold_parser.add_argument("--db", default=DB_PATH, help="データベースのパス")
+    threshold_parser.add_argument("--kind", choices=VALUE_KINDS, required=True,
+                                  help="pop: 降水確率、temp: 3日間の気温、temp_min / temp_max: 週間の最低・最高気温")
+    threshold_parser.add_argument("--min", type=float, default=None, help="値の下限（以上）")
+    threshold_parser.add_argument("--max", type=float, default=None, help="値の上限（未満）")
+    threshold_parser.add_argument("--hours", type=float, default=None, help="現在から何時間後までを対象にするか")
+    threshold_parser.add_argument("--date", default=None, help="対象の日付（YYYY-MM-DD）")
+    threshold_parser.add_argument("--start", default=None, help="日時の下限（ISO形式）")
+    threshold_parser.add_argument("--end", default=None, help="日時の上限（ISO形式、この日時を含まない）")
+    threshold_parser.add_argument("--order", choices=["desc", "asc"], default="desc", help="値の大きい順 / 小さい順")
+    threshold_parser.add_argument("--limit", type=int, default=None, help="表示する件数（上位 k 件）")
+    threshold_parser.add_argument("--per-area", action="store_true", help="地域ごとに1行にまとめる")
+    threshold_parser.set_defaults(handler=command_threshold)
+
+    alerts_parser = subparsers.add_parser("alerts", help="アラートのルールの追加・削除と記録の表示", parents=[profile_parser])
+    alerts_parser.add_argument("--db", default=DB_PATH, help="データベースのパス")
+    alerts_parser.add_argument("--add", action="store_true", help="ルールを追加する")
+    alerts_parser.add_argument("--kind", choices=VALUE_KINDS, default=None, help="ルールの値の種類")
+    alerts_parser.add_argument("--operator", choices=list(ALERT_OPERATORS), default=None, help="ルールの比較")
+    alerts_parser.add_argument("--threshold", type=float, default=None, help="ルールのしきい値")
+    alerts_parser.add_argument("--class10", default=None, help="ルールの地域（class10_id、省略時は全地域）")
+    alerts_parser.add_argument("--name", default=None, help="ルールの表示名")
+    alerts_parser.add_argument("--remove", type=int, default=None, help="削除するルールの id")
+    alerts_parser.add_argument("--acknowledge", action="store_true", help="全ての記録を確認済みにする")
+    alerts_parser.add_argument("--unacknowledged", action="store_true", help="未確認の記録だけを表示する")
+    alerts_parser.add_argument("--limit", type=int, default=50, help="表示する記録の数")
+    alerts_parser.set_defaults(handler=command_alerts)
+
+    verify_parser = subparsers.add_parser("verify", help="アーカイブの履歴から予報検証の集計を計算", parents=[profile_parser])
+    verify_parser.add_argument("--db", default=DB_PATH, help="データベースのパス")
+    verify_parser.add_argument("--archive-dir", default=ARCHIVE_DIR, help="履歴アーカイブの保存先")
+    verify_parser.set_defaults(handler=command_verify)
+
+    export_parser = subparsers.add_parser("export", help="予報テーブルを分析用の列指向ファイルに書き出す", parents=[profile_parser])
+    export_parser.add_argument("--db", default=DB_PATH, help="データベースのパス")
+    export_parser.add_argument("--out", default="export", help="書き出し先のディレクトリ")
+    export_parser.add_argument("--format", choices=["auto", "parquet", "npz"], default="auto",
+                               help="auto: pyarrow があれば Parquet、無ければ .npz")
+    export_parser.add_argument("--chunk-size", type=int, default=50000, help="1回に読み込む行数")
+    export_parser.add_argument("--full", action="store_true", help="以前に書き出したファイルを削除し、全ての行を書き出す")
+    export_parser.set_defaults(handler=command_export)
+
+    serve_parser = subparsers.add_parser("serve", help="読み取り専用のHTTP/JSON APIを起動", parents=[profile_parser])
+    serve_parser.add_argument("--db", default=DB_PATH, help="データベースのパス")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="待ち受けるアドレス")
+    serve_parser.add_argument("--port", type=int, default=8765, help="待ち受けるポート")
+    serve_parser.add_argument("--quiet", action="store_true", help="リクエストごとのログを出力しない")
+    serve_parser.add_argument("--in-memory", action="store_true", default=IN_MEMORY_REPLICA,
+                               help="データベースをメモリ上に複製して読み込む（ファイルの更新時に作り直す）")
+    serve_parser.set_defaults(handler=command_serve)
+
+    bench_parser = subparsers.add_parser("api-bench", help="起動中のAPIに負荷をかけて応答時間を計測", parents=[profile_parser])
+    bench_parser.add_argument("--db", default=DB_PATH, help="リクエストする地域を選ぶデータベースのパス")
+    bench_parser.add_argument("--url", default="http://127.0.0.1:8765", help="APIのURL")
+    bench_parser.add_argument("--requests", type=int, default=1000, help="リクエストの総数")
+    bench_parser.add_argument("--concurrency", type=int, default=16, help="並列数")
+    bench_parser.add_argument("--paths", type=int, default=20, help="リクエストするパスの数")
+    bench_parser.add_argument("--no-revalidate", action="store_true", help="If-None-Match を送らない")
+    bench_parser.set_defaults(handler=command_api_bench)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())